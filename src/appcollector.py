@@ -1,56 +1,44 @@
-import json
-import math
+"""
+AppCollector command line.
+
+  python appcollector.py                  crawl the search engine, parse the compose files found and enrich the
+                                          repositories with GitHub metadata (same as 'run', enriching needs
+                                          GITHUB_TOKEN or an explicit --backend)
+  python appcollector.py run              the same, explicitly
+  python appcollector.py crawl            only the search crawl (resumes an interrupted one)
+  python appcollector.py crawl --dorks-file dorks.yml --jobs 4
+                                          crawl many dorks, 4 at a time
+  python appcollector.py crawl --shard --budget-pages 500 --jobs 3
+                                          split --dork into narrower sub-queries and spend 500 result pages on
+                                          the ones still finding new repositories
+  python appcollector.py crawl --discovery code-search --jobs 4
+                                          find compose files with GitHub's code search API instead of a browser
+  python appcollector.py compose          only fetch and parse the pending docker-compose files
+  python appcollector.py enrich           only fetch stars, issues, dates and README presence from the GitHub API
+  python appcollector.py enrich --budget 5000
+                                          spend 5000 API requests on the new and the stalest repositories
+  python appcollector.py init-db          create the database tables
+  python appcollector.py stats            what has been collected so far
+
+Every subcommand imports only what it needs (Playwright and AgentQL only for crawling in a browser, SQLAlchemy
+only for commands touching the database) and the browser is launched on the first page load, so the DB-only and
+reporting commands start quickly. See benchmarks/bench_startup.py.
+"""
 import os
-import re
-from typing import Optional
+import sys
+import argparse
+from typing import Optional, List
+
+current_dir = os.path.abspath(os.path.dirname(__file__))
+# set sys_path to also look for libs elsewhere
+sys.path.append(current_dir)
 ####  own classes ####
 from libs.logger import CustomLogger
-from scraper.agentql_scraper import AgentQLPlaywrightScraper
-import database.models
-import database.db_controller as db_controller
-
-
-from libs import misc
+from libs.metrics import metrics
 ## ---------------- ##
 logger = CustomLogger("AppCollector")
 HEADLESS=False
 
-def extract_github_project_url(full_url: str) -> tuple[str, str, str]:
-    """
-    Extract the GitHub project URL, developer, and name from a full GitHub file URL using simple string splitting.
-    
-    Example:
-    "https://github.com/blockscout/blockscout/blob/master/docker-compose/docker-compose.yml"
-    -> ("blockscout", "blockscout", "https://github.com/blockscout/blockscout")
-    
-    Args:
-        full_url (str): The full GitHub URL
-        
-    Returns:
-        tuple[str, str, str]: A tuple containing (developer, name, project_url)
-                             developer is the GitHub username or organization (e.g., "blockscout")
-                             name is the repository name (e.g., "blockscout")
-                             project_url is the extracted project URL, or the original URL if not a GitHub URL
-    """
-    if not full_url.startswith("https://github.com/"):
-        # If not a GitHub URL, return empty developer, empty name, and original URL
-        return ("", "", full_url)
-    
-    # Split by '/' and take first 5 parts: ['https:', '', 'github.com', 'owner', 'repo']
-    parts = full_url.split('/')
-    if len(parts) >= 5:
-        project_url = '/'.join(parts[:5])  # "https://github.com/owner/repo"
-        developer = parts[3]  # "owner"
-        name = parts[4]  # "repo"
-        return (developer, name, project_url)
-    else:
-        return ("", "", full_url)
-
-## init AgentQL scraper
-# Set headless to False to look more human-like
-# initiate scraper with default values that will be picked up from ENV variables
-scraper = AgentQLPlaywrightScraper(headless=False)
-
 aql="""
 {
   search_results[]
@@ -70,43 +58,250 @@ google_url="https://www.google.com"
 url_with_dork="https://www.google.com/search?q=site%3Agithub.com+inurl%3Adocker-compose.yml"
 num_pages=100
 
-apps = scraper.search_query(url=google_url,
-                            search_string=google_dork,
-                            query=aql,
-                            num_pages=num_pages)
 
-# Process the results to extract GitHub project URLs
-if apps:
+def crawl(args) -> None:
+  """
+  Runs the search crawl(s) and streams the results into the database: the --dork, or every dork of
+  --dorks-file as an independent job, --jobs of them at a time, each in its own browser context
+  (or on GitHub's code search API with --discovery code-search).
+  """
+  from pipeline.crawl_jobs import CrawlJob, CrawlRunner, load_crawl_jobs
+
+  # Stream every result page into the database as soon as it is scraped:
+  # results are written in batches and committed periodically together with a crawl checkpoint,
+  # so a crash on page 87 keeps pages 1-86 and the next run continues from there
+  defaults = dict(pages=args.pages,
+                  timeout=args.timeout,
+                  headless=args.headless,
+                  search_url=args.search_url,
+                  max_minutes=args.max_minutes,
+                  fresh=args.fresh)
+  discovery = None
+  scraper_factory = None # CrawlRunner's default, a browser per pool worker
+  if args.discovery == "code-search":
+    from scraper.code_search import CodeSearchDiscovery
+
+    # no browser: every job pages through the code search API, sharing one connection pool and search budget
+    discovery = CodeSearchDiscovery.from_env()
+    scraper_factory = lambda **kwargs: discovery.for_job()
+
   logger.info("=== PROCESSING RESULTS ===")
-  
-  # Create a single session for all database operations
+  try:
+    if args.shard:
+      from pipeline.dork_planner import DorkPlanner
+
+      # one base dork, expanded into narrower shards that share the page budget by their yield of new repositories
+      runner = CrawlRunner(query=aql, workers=args.jobs, batch_size=args.batch_size, scraper_factory=scraper_factory)
+      planner = DorkPlanner(runner,
+                            kinds=args.shard_kinds.split(","),
+                            round_pages=args.round_pages,
+                            min_yield=args.min_yield)
+      results = planner.run(args.dork, budget_pages=args.budget_pages, job_defaults=defaults)
+      runner.log_summary(results)
+      planner.log_summary()
+    else:
+      if args.dorks_file:
+        jobs = load_crawl_jobs(args.dorks_file, defaults=defaults)
+      else:
+        jobs = [CrawlJob(dork=args.dork, **defaults)]
+      runner = CrawlRunner(query=aql, workers=min(args.jobs, len(jobs)) or 1, batch_size=args.batch_size,
+                           scraper_factory=scraper_factory)
+      results = runner.run(jobs)
+      runner.log_summary(results)
+  finally:
+    if discovery is not None:
+      logger.info(f"Code search API: {discovery.stats()}")
+      discovery.close()
+  if results and all(result.status == "failed" for result in results):
+    raise RuntimeError("Every crawl job failed")
+
+
+def compose(args) -> None:
+  """Fetches the docker-compose files registered by the crawl and fills num_containers / docker_images_used"""
+  from datetime import datetime
+  from pipeline.compose_stage import ComposeStage
+
+  logger.info("=== PARSING DOCKER-COMPOSE FILES ===")
+  fetched_before = datetime.fromisoformat(args.refetch_before) if args.refetch_before else None
+  stage = ComposeStage(max_workers=args.workers)
+  try:
+    stage.run(fetched_before=fetched_before, limit=args.compose_limit)
+  finally:
+    stage.close()
+
+
+def enrich(args) -> None:
+  """Fetches num_stars, num_issues, created_at, last_commit and has_readme of the repositories missing them"""
+  from datetime import datetime
+  from pipeline.enrichment_stage import EnrichmentStage
+
+  logger.info("=== ENRICHING REPOSITORIES WITH GITHUB METADATA ===")
+  fetched_before = datetime.fromisoformat(args.refresh_before) if args.refresh_before else None
+  stage = EnrichmentStage(backend=args.backend, batch_size=args.github_batch_size, max_workers=args.github_workers)
+  try:
+    if args.budget is not None:
+      from datetime import timedelta
+      from pipeline.refresh_scheduler import RefreshScheduler
+
+      scheduler = RefreshScheduler(min_age=timedelta(days=args.min_age_days))
+      plan = scheduler.plan(budget=args.budget, requests_per_repository=stage.requests_per_repository)
+      stage.run(repositories=plan)
+    else:
+      stage.run(fetched_before=fetched_before, limit=args.enrich_limit)
+  finally:
+    stage.client.close()
+
+
+def run(args) -> None:
+  """
+  The whole pipeline: crawl, compose, then enrich. Without GITHUB_TOKEN the enrich step is skipped, unless a
+  --backend is given: the anonymous GitHub API allows 60 requests per hour.
+  """
+  crawl(args)
+  compose(args)
+  if os.getenv("GITHUB_TOKEN") or args.backend != "auto":
+    enrich(args)
+  else:
+    logger.warning("GITHUB_TOKEN is not set, skipping the enrich step (run 'enrich', or pass --backend rest to "
+                   "enrich over the anonymous GitHub API)")
+
+
+def init_db(args) -> None:
+  """Creates the tables (drops everything first with --force)"""
+  import database.db_controller as db_controller
+
+  created, existing_tables = db_controller.create_db(force_recreate=args.force)
+  if created:
+    logger.info("✅  Database tables created")
+  elif isinstance(existing_tables, list):
+    logger.warning(f"⚠️  Database already has tables, kept them and only added missing columns and indexes (use --force to recreate): {existing_tables}")
+  else:
+    logger.error(f"❌  There was an error during initializing the database\n{existing_tables}")
+
+
+def stats(args) -> None:
+  """Logs what has been collected so far"""
+  import database.db_controller as db_controller
+
   session = db_controller.get_session()
   try:
-    for page_results in apps:
-      if 'search_results' in page_results:
-        for result in page_results['search_results']:
-          if 'url' in result and result['url']:
-            original_url = result['url']
-            title = result['title']
-            about = result['about']
-            developer, name, project_url = extract_github_project_url(original_url)
-            repo = db_controller.add_or_update_github_repository(session=session,
-                                                          developer=developer,
-                                                          name=name,
-                                                          url=project_url,
-                                                          about=about)
-            logger.info(f"Added/Updated repository: {developer}/{name}")
-    
-    # Commit all changes at once
-    session.commit()
-    logger.info("All repository data committed to database")
-    
-  except Exception as e:
-    logger.error(f"Error processing results: {e}")
-    session.rollback()
-    raise
+    for key, value in db_controller.get_collection_stats(session).items():
+      logger.info(f"{key:<35} {value}")
   finally:
-    # Always close the session when done
     session.close()
-  logger.info(f"\n=== UNIQUE GITHUB PROJECTS FOUND ===")
 
+
+def add_crawl_arguments(parser) -> None:
+  """The crawl options, on a parser or an argument group"""
+  parser.add_argument("--dork", default=google_dork, help="search string (default: %(default)s)")
+  parser.add_argument("--dorks-file", default=None, metavar="PATH",
+                      help="crawl every dork of this file instead (one per line, or a YAML/JSON list with "
+                           "per-dork pages/timeout/headless/search_url/max_minutes, see pipeline.crawl_jobs)")
+  parser.add_argument("--jobs", type=int, default=1, help="dorks crawled in parallel (default: %(default)s)")
+  parser.add_argument("--search-url", default=google_url, help="search engine to open (default: %(default)s)")
+  parser.add_argument("--pages", type=int, default=num_pages, help="result pages to crawl (default: %(default)s)")
+  parser.add_argument("--timeout", type=int, default=60000,
+                      help="page load / AgentQL query timeout in milliseconds (default: %(default)s)")
+  parser.add_argument("--max-minutes", type=float, default=None, help="wall-clock budget per dork")
+  parser.add_argument("--headless", action="store_true", default=HEADLESS, help="run the browser without a window")
+  parser.add_argument("--fresh", action="store_true", help="ignore the stored checkpoint and start from page 1")
+  parser.add_argument("--batch-size", type=int, default=100, help="rows per database commit (default: %(default)s)")
+  parser.add_argument("--discovery", choices=("browser", "code-search"), default=os.getenv("DISCOVERY_BACKEND", "browser"),
+                      help="how to find compose files: the search engine in a browser, or GitHub's code search API "
+                           "(needs GITHUB_TOKEN, dorks are translated, see scraper.code_search) "
+                           "(default: DISCOVERY_BACKEND or %(default)s)")
+  parser.add_argument("--shard", action="store_true",
+                      help="expand --dork into narrower sub-queries (file name variants, years, developers and "
+                           "keywords of the collected repositories) and give the pages to the ones still finding "
+                           "new repositories, --jobs at a time (see pipeline.dork_planner)")
+  parser.add_argument("--shard-kinds", default="path,date,org,keyword",
+                      help="with --shard, the kinds of sub-queries to build (default: %(default)s)")
+  parser.add_argument("--budget-pages", type=int, default=300,
+                      help="with --shard, result pages to crawl over all sub-queries (default: %(default)s)")
+  parser.add_argument("--round-pages", type=int, default=3,
+                      help="with --shard, pages crawled per job after the one-page probe (default: %(default)s)")
+  parser.add_argument("--min-yield", type=float, default=1.0,
+                      help="with --shard, drop a sub-query finding fewer new repositories per page (default: %(default)s)")
+
+
+def add_compose_arguments(parser, standalone: bool = False) -> None:
+  """The compose options, on a parser or an argument group; standalone also accepts --limit for --compose-limit"""
+  parser.add_argument("--workers", type=int, default=8, help="parallel fetch/parse workers (default: %(default)s)")
+  parser.add_argument("--compose-limit", *(["--limit"] if standalone else []), type=int, default=None,
+                      help="process at most this many files")
+  parser.add_argument("--refetch-before", default=None, metavar="ISO_DATETIME",
+                      help="also re-fetch files last fetched before this time")
+
+
+def add_enrich_arguments(parser, standalone: bool = False) -> None:
+  """The enrich options, on a parser or an argument group; standalone also accepts --limit for --enrich-limit"""
+  parser.add_argument("--backend", choices=("auto", "graphql", "rest"), default="auto",
+                      help="GitHub API to use, auto is GraphQL if GITHUB_TOKEN is set (default: %(default)s)")
+  parser.add_argument("--github-workers", type=int, default=4, help="parallel GitHub API requests (default: %(default)s)")
+  parser.add_argument("--github-batch-size", type=int, default=50,
+                      help="repositories per GraphQL query (default: %(default)s)")
+  parser.add_argument("--refresh-before", default=None, metavar="ISO_DATETIME",
+                      help="also refresh repositories enriched before this time (UTC)")
+  parser.add_argument("--budget", type=int, default=None, metavar="REQUESTS",
+                      help="spend at most this many API requests, on the new repositories first and then on the "
+                           "stalest ones by last fetch, commit recency and star velocity (overrides --refresh-before)")
+  parser.add_argument("--min-age-days", type=float, default=1.0,
+                      help="with --budget, never refresh repositories enriched more recently (default: %(default)s)")
+  parser.add_argument("--enrich-limit", *(["--limit"] if standalone else []), type=int, default=None,
+                      help="enrich at most this many repositories")
+
+
+def build_parser() -> argparse.ArgumentParser:
+  parser = argparse.ArgumentParser(prog="appcollector", description="Collects dockerized applications from GitHub")
+  subparsers = parser.add_subparsers(dest="command")
+
+  run_parser = subparsers.add_parser("run", help="crawl, parse the compose files found, then enrich the repositories "
+                                                 "with GitHub metadata (skipped without GITHUB_TOKEN) (default)")
+  add_crawl_arguments(run_parser.add_argument_group("crawl"))
+  add_compose_arguments(run_parser.add_argument_group("compose"))
+  add_enrich_arguments(run_parser.add_argument_group("enrich"))
+  run_parser.set_defaults(func=run)
+
+  crawl_parser = subparsers.add_parser("crawl", help="only the search crawl")
+  add_crawl_arguments(crawl_parser)
+  crawl_parser.set_defaults(func=crawl)
+
+  compose_parser = subparsers.add_parser("compose", help="only fetch and parse pending docker-compose files")
+  add_compose_arguments(compose_parser, standalone=True)
+  compose_parser.set_defaults(func=compose)
+
+  enrich_parser = subparsers.add_parser("enrich", help="only fetch GitHub metadata of the repositories missing it")
+  add_enrich_arguments(enrich_parser, standalone=True)
+  enrich_parser.set_defaults(func=enrich)
+
+  init_parser = subparsers.add_parser("init-db", help="create the database tables")
+  init_parser.add_argument("--force", action="store_true", help="drop all tables and views first")
+  init_parser.set_defaults(func=init_db)
+
+  stats_parser = subparsers.add_parser("stats", help="what has been collected so far")
+  stats_parser.set_defaults(func=stats)
+  return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+  argv = list(argv if argv is not None else sys.argv[1:])
+  if not argv or (argv[0].startswith("-") and argv[0] not in ("-h", "--help")):
+    # no subcommand: the whole pipeline, as the script always did
+    argv = ["run"] + argv
+  parser = build_parser()
+  args = parser.parse_args(argv)
+  if getattr(args, "shard", False) and args.dorks_file:
+    parser.error("--shard expands --dork, it cannot be combined with --dorks-file")
+
+  # per-stage timings and counters are summarized at the end of the run,
+  # set METRICS_PORT to also expose them in Prometheus format while the command is running
+  metrics.start_http_server_from_env(logger)
+  try:
+    args.func(args)
+  finally:
+    metrics.log_summary(logger)
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,71 @@
+"""
+Benchmark: the snapshot archive (scraper/snapshot_archive.py) on result pages of benchmarks/serp_server.py, offline.
+
+Archives num_dorks x num_pages result pages into a throw-away archive as a crawl run, then the same crawl again as
+a second run (every page unchanged, as when a dork is re-crawled before the results change), and reads them all back.
+Reported are the captures/s, the compression ratio, what the second run added to the disk and the read throughput.
+The result pages carry no filler here: its repeated bytes would make the ratio meaningless.
+
+Usage:
+  python benchmarks/bench_archive.py [num_dorks] [num_pages] [level]      (default: 50 dorks, 10 pages, level 10)
+"""
+import os
+import sys
+import time
+import tempfile
+
+current_dir = os.path.abspath(os.path.dirname(__file__))
+src_dir = os.path.abspath(os.path.join(current_dir, '..'))
+# set sys_path to also look for libs elsewhere
+sys.path.append(src_dir)
+from libs.logger import CustomLogger
+from benchmarks.serp_server import SerpServer
+from scraper.snapshot_archive import SnapshotArchive
+
+logger = CustomLogger("BenchArchive")
+
+
+def disk_usage(path: str) -> int:
+  return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def crawl(archive: SnapshotArchive, server: SerpServer, dorks: list, num_pages: int) -> float:
+  started = time.perf_counter()
+  for dork in dorks:
+    for page_number in range(1, num_pages + 1):
+      archive.put(server.result_page(dork, page_number), server.search_url(dork, page_number),
+                  page_number=page_number, label=dork)
+  return time.perf_counter() - started
+
+
+if __name__ == "__main__":
+  num_dorks = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+  num_pages = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+  level = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+  dorks = [f'site:github.com inurl:docker-compose.yml "{word}"' for word in range(num_dorks)]
+  # only used for its pages and URLs, never started
+  server = SerpServer(num_pages=num_pages, filler_kb=0)
+  with tempfile.TemporaryDirectory(prefix="bench-archive-") as path:
+    first = SnapshotArchive(path, run_id="run-1", level=level)
+    first_seconds = crawl(first, server, dorks, num_pages)
+    first_disk = disk_usage(os.path.join(path, "blobs"))
+    second = SnapshotArchive(path, run_id="run-2", level=level)
+    second_seconds = crawl(second, server, dorks, num_pages)
+    second_disk = disk_usage(os.path.join(path, "blobs"))
+
+    started = time.perf_counter()
+    read_bytes = sum(len(html) for _, html in second.iter_pages("run-1"))
+    read_seconds = time.perf_counter() - started
+    first_stats = first.stats()
+    first.close()
+    second.close()
+    index_bytes = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path) if name.startswith("index.sqlite"))
+
+  captures = num_dorks * num_pages
+  logger.info(f"run 1: {captures} pages in {first_seconds:.2f}s ({captures / first_seconds:.0f} pages/s) | "
+              f"{first_stats['raw_bytes'] / 1024:.0f} KB of HTML -> {first_disk / 1024:.0f} KB of blobs "
+              f"(ratio {first_stats['raw_bytes'] / first_disk:.1f}x)")
+  logger.info(f"run 2: {captures} unchanged pages in {second_seconds:.2f}s ({captures / second_seconds:.0f} pages/s) | "
+              f"blobs grew by {(second_disk - first_disk) / 1024:.0f} KB")
+  logger.info(f"read back {captures} pages ({read_bytes / 1024:.0f} KB) in {read_seconds:.2f}s "
+              f"({captures / read_seconds:.0f} pages/s) | index {index_bytes / 1024:.0f} KB")
@@ -0,0 +1,110 @@
+"""
+Benchmark: discovering compose files with the code search backend (scraper/code_search.py), offline.
+
+Pages through the code search of the default dork of appcollector.py (and the file name variants of DorkPlanner)
+on benchmarks/github_api_server.py, every response held back SEARCH_DELAY seconds (default: 0.3, about what GitHub's
+code search takes), with 1 page at a time and with more pages fetched at the same time. Reported are pages/s, the
+results and whether the concurrent runs yielded the same pages in the same order.
+
+Then the same searches run as crawl jobs (CrawlRunner with the backend as scraper_factory) into a throw-away SQLite
+database, reporting the repositories and compose files written, and once more against a search rate limit of
+10 requests per 2 seconds, reporting how long the client's RateLimiter waited and how many requests the server
+refused (should be none: the budget is learnt from the X-RateLimit-* headers).
+No browser, network access or GitHub token is needed.
+
+Usage:
+  python benchmarks/bench_discovery.py [num_pages] [workers]      (default: 10 pages, 4 workers)
+"""
+import os
+import sys
+import time
+import tempfile
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+current_dir = os.path.abspath(os.path.dirname(__file__))
+src_dir = os.path.abspath(os.path.join(current_dir, '..'))
+# set sys_path to also look for libs elsewhere
+sys.path.append(src_dir)
+from libs.logger import CustomLogger
+from libs.github_api import GitHubApiClient, RateLimiter
+from database.models import Base
+import database.db_controller as db_controller
+from benchmarks.github_api_server import GitHubApiMock
+from pipeline.crawl_jobs import CrawlJob, CrawlRunner
+from scraper.code_search import CodeSearchDiscovery
+
+logger = CustomLogger("BenchDiscovery")
+
+DORKS = ["site:github.com inurl:docker-compose.yml",
+         "site:github.com inurl:docker-compose.yaml",
+         "site:github.com inurl:compose.yml -inurl:docker-compose.yml"]
+
+
+def discovery(mock: GitHubApiMock, workers: int) -> CodeSearchDiscovery:
+  client = GitHubApiClient(token="bench", api_url=mock.url, pool_size=workers, rate_limiter=RateLimiter(max_wait=60))
+  return CodeSearchDiscovery(client=client, max_workers=workers)
+
+
+def search(mock: GitHubApiMock, workers: int, num_pages: int) -> tuple:
+  """(seconds, pages) of every dork searched one after the other"""
+  backend = discovery(mock, workers)
+  started = time.perf_counter()
+  try:
+    pages = [scraped for dork in DORKS
+             for scraped in backend.iter_search_query(url=None, search_string=dork, query="", num_pages=num_pages,
+                                                      raise_errors=True)]
+  finally:
+    backend.close()
+  return time.perf_counter() - started, pages
+
+
+def crawl(mock: GitHubApiMock, workers: int, num_pages: int, tmp: str, label: str) -> dict:
+  """The dorks as crawl jobs into a new SQLite database"""
+  engine = create_engine(f"sqlite:///{os.path.join(tmp, label + '.sqlite')}")
+  Base.metadata.create_all(engine)
+  Session = sessionmaker(bind=engine)
+  backend = discovery(mock, workers)
+  runner = CrawlRunner(query="", workers=1, session_factory=Session, scraper_factory=lambda **kwargs: backend.for_job())
+  refused_before = mock.requests.get("rate_limited", 0)
+  try:
+    results = runner.run([CrawlJob(dork=dork, pages=num_pages) for dork in DORKS])
+  finally:
+    backend.close()
+  session = Session()
+  try:
+    stats = db_controller.get_collection_stats(session)
+  finally:
+    session.close()
+  return dict(pages=sum(result.pages for result in results),
+              failed=sum(result.status == "failed" for result in results),
+              seconds=runner.elapsed,
+              repositories=stats["repositories"],
+              compose_files=stats["compose_files"],
+              waited=backend.client.rate_limiter.waited,
+              refused=mock.requests.get("rate_limited", 0) - refused_before)
+
+
+if __name__ == "__main__":
+  num_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+  workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+  delay = float(os.getenv("SEARCH_DELAY", 0.3))
+  with tempfile.TemporaryDirectory(prefix="bench-discovery-") as tmp:
+    with GitHubApiMock(delay=delay, search_rate_limit=100000) as mock:
+      runs = {f"{n} worker(s)": search(mock, n, num_pages) for n in (1, workers)}
+      crawled = crawl(mock, workers, num_pages, tmp, "unlimited")
+    with GitHubApiMock(delay=delay, search_rate_limit=10, search_window=2) as mock:
+      limited = crawl(mock, workers, num_pages, tmp, "limited")
+
+  baseline_pages = list(runs.values())[0][1]
+  for label, (seconds, pages) in runs.items():
+    results = sum(len(scraped.data["search_results"]) for scraped in pages)
+    logger.info(f"{label:<12} {len(pages)} pages in {seconds:5.2f}s ({len(pages) / seconds:5.2f} pages/s) | "
+                f"{results} results | same pages: {pages == baseline_pages}")
+  for label, run in (("crawl", crawled), ("rate limited", limited)):
+    logger.info(f"{label:<12} {run['pages']} pages in {run['seconds']:5.2f}s | {run['repositories']} repositories, "
+                f"{run['compose_files']} compose files written | failed jobs: {run['failed']} | "
+                f"limiter waited {run['waited']:.1f}s, {run['refused']} request(s) refused")
+  same = all(pages == baseline_pages for _, pages in runs.values())
+  sys.exit(0 if same and not crawled["failed"] and not limited["failed"] and crawled["repositories"] else 1)
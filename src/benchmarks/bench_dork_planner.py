@@ -0,0 +1,198 @@
+"""
+Benchmark: new repositories per result page with DorkPlanner's shards instead of a single dork, offline.
+
+A simulated search engine serves a synthetic corpus of compose files (developers, file names, years and about
+texts drawn from skewed distributions) and understands the operators the shards use (inurl:, -inurl:,
+site:github.com/<developer>, after:/before:, "keyword"). Like Google, it ranks every query the same way (by a
+fixed popularity of the repository) and returns at most RESULT_CEILING_PAGES pages per query, however many exist.
+The crawl jobs run with CrawlRunner's scraper_factory hook on a throw-away SQLite database, so neither a browser
+nor an AgentQL API key is needed.
+
+The database is seeded with the first SEED_PAGES pages of the base dork, then the same page budget is spent
+  - "single dork": on the base dork's later pages (the crawl as it was),
+  - "even split":  on every shard of DorkPlanner.expand(), the same number of pages each,
+  - "planner":     by DorkPlanner, to the shards with the highest yield of new repositories.
+Reported are the pages crawled, the new repositories, the new repositories per page and the wall time.
+
+Usage:
+  python benchmarks/bench_dork_planner.py [budget_pages] [corpus_size]      (default: 300 pages, 20000 files)
+  SERP_DELAY=0.05 python benchmarks/bench_dork_planner.py                  (every page held back 0.05s)
+"""
+import os
+import sys
+import time
+import random
+import hashlib
+import tempfile
+import threading
+from typing import NamedTuple, Optional, Dict, List
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+current_dir = os.path.abspath(os.path.dirname(__file__))
+src_dir = os.path.abspath(os.path.join(current_dir, '..'))
+# set sys_path to also look for libs elsewhere
+sys.path.append(src_dir)
+from libs.logger import CustomLogger
+from database.models import Base
+import database.db_controller as db_controller
+from pipeline.crawl_jobs import CrawlJob, CrawlRunner
+from pipeline.dork_planner import DorkPlanner, PATH_VARIANTS
+
+logger = CustomLogger("BenchDorkPlanner")
+
+BASE_DORK = "site:github.com inurl:docker-compose.yml"
+RESULT_CEILING_PAGES = 25
+RESULTS_PER_PAGE = 10
+SEED_PAGES = 10
+TOPICS = ["wordpress", "nginx", "postgres", "redis", "kafka", "grafana", "prometheus", "django", "flask", "node",
+          "react", "mongodb", "mysql", "elasticsearch", "traefik", "jenkins", "gitlab", "minio", "rabbitmq", "airflow",
+          "spark", "keycloak", "nextcloud", "home-assistant", "mqtt", "laravel", "rails", "golang", "rust", "vault"]
+
+
+class SimulatedPage(NamedTuple):
+  """What RepositorySink.add_scraped_page() reads of a scraper.agentql_scraper.ScrapedPage"""
+  page_number: int
+  url: str
+  next_url: Optional[str]
+  data: dict
+
+
+class SearchEngine:
+  """Ranks a fixed corpus for a dork, at most RESULT_CEILING_PAGES pages of it"""
+  def __init__(self, corpus_size: int, delay: float = 0.0, seed: int = 7):
+    rng = random.Random(seed)
+    self.delay = delay
+    self.documents = []
+    for i in range(corpus_size):
+      developer = f"dev{int(rng.paretovariate(1.2)) % 3000}"
+      path = rng.choices(PATH_VARIANTS, weights=[60, 15, 15, 10])[0]
+      if rng.random() < 0.3:
+        path = f"{rng.choice(['deploy', 'docker', 'infra'])}/{path}"
+      words = {TOPICS[min(int(rng.expovariate(1 / 6)), len(TOPICS) - 1)] for _ in range(rng.randint(1, 3))}
+      self.documents.append(dict(developer=developer, name=f"repo{i}", path=path, year=rng.randint(2015, 2026),
+                                 words=words, about=f"A {' and '.join(sorted(words))} setup",
+                                 popularity=rng.random()))
+    self.documents.sort(key=lambda document: -document["popularity"])
+    self._results: Dict[str, List[dict]] = {}
+    self._lock = threading.Lock()
+
+  @staticmethod
+  def _matches(document: dict, terms: List[str]) -> bool:
+    for term in terms:
+      if term.startswith("-inurl:") and term[7:] in document["path"]:
+        return False
+      if term.startswith("inurl:") and term[6:] not in document["path"]:
+        return False
+      if term.startswith("site:github.com/") and term[16:] != document["developer"]:
+        return False
+      if term.startswith("after:") and document["year"] < int(term[6:10]):
+        return False
+      if term.startswith("before:") and document["year"] >= int(term[7:11]):
+        return False
+      if term.startswith('"') and term.strip('"') not in document["words"]:
+        return False
+    return True
+
+  def results(self, dork: str) -> List[dict]:
+    with self._lock:
+      if dork not in self._results:
+        terms = dork.split()
+        matches = [document for document in self.documents if self._matches(document, terms)]
+        self._results[dork] = matches[:RESULT_CEILING_PAGES * RESULTS_PER_PAGE]
+      return self._results[dork]
+
+
+class SimulatedScraper:
+  """The part of AgentQLPlaywrightScraper's interface CrawlRunner uses"""
+  def __init__(self, engine: SearchEngine, **kwargs):
+    self.engine = engine
+
+  def iter_search_query(self, url: str, search_string: str, query: str, num_pages: int,
+                        resume_url: Optional[str] = None, start_page: int = 1, **kwargs):
+    results = self.engine.results(search_string)
+    last_page = (len(results) + RESULTS_PER_PAGE - 1) // RESULTS_PER_PAGE
+    token = hashlib.sha1(search_string.encode()).hexdigest()[:12]
+    for page_number in range(start_page, min(num_pages, last_page) + 1):
+      if self.engine.delay:
+        time.sleep(self.engine.delay)
+      page = results[(page_number - 1) * RESULTS_PER_PAGE:page_number * RESULTS_PER_PAGE]
+      data = {"search_results": [dict(title=document["name"], about=document["about"],
+                                      url=f"https://github.com/{document['developer']}/{document['name']}/blob/main/{document['path']}")
+                                 for document in page]}
+      next_url = f"sim://{token}?page={page_number + 1}" if page_number < last_page else None
+      yield SimulatedPage(page_number=page_number, url=f"sim://{token}?page={page_number}", next_url=next_url, data=data)
+
+  def close(self) -> None:
+    pass
+
+
+def new_database(tmp: str, label: str, engine: SearchEngine):
+  """A database seeded with the first SEED_PAGES pages of the base dork, returns (session factory, runner factory)"""
+  db = create_engine(f"sqlite:///{os.path.join(tmp, label.replace(' ', '-') + '.sqlite')}")
+  Base.metadata.create_all(db)
+  Session = sessionmaker(bind=db)
+
+  def runner(workers: int) -> CrawlRunner:
+    return CrawlRunner(query="", workers=workers, session_factory=Session,
+                       scraper_factory=lambda **kwargs: SimulatedScraper(engine, **kwargs))
+
+  runner(1).run([CrawlJob(dork=BASE_DORK, pages=SEED_PAGES)])
+  return Session, runner
+
+
+def count_repositories(Session) -> int:
+  session = Session()
+  try:
+    return db_controller.get_collection_stats(session)["repositories"]
+  finally:
+    session.close()
+
+
+def measure(tmp: str, label: str, engine: SearchEngine, strategy) -> dict:
+  Session, runner = new_database(tmp, label, engine)
+  before = count_repositories(Session)
+  started = time.perf_counter()
+  pages = strategy(runner)
+  elapsed = time.perf_counter() - started
+  new = count_repositories(Session) - before
+  return dict(label=label, pages=pages, new=new, per_page=new / pages if pages else 0.0, seconds=elapsed)
+
+
+if __name__ == "__main__":
+  budget = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+  corpus_size = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+  workers = 4
+  engine = SearchEngine(corpus_size, delay=float(os.getenv("SERP_DELAY", 0.0)))
+
+  def single_dork(runner) -> int:
+    results = runner(1).run([CrawlJob(dork=BASE_DORK, pages=SEED_PAGES + budget)])
+    return sum(result.pages for result in results)
+
+  def even_split(runner) -> int:
+    crawl_runner = runner(workers)
+    shards = DorkPlanner(crawl_runner).expand(BASE_DORK)
+    per_shard = max(1, budget // len(shards))
+    # the base dork continues after its seeded pages, like in the other runs
+    jobs = [CrawlJob(dork=shard.dork, pages=per_shard + (SEED_PAGES if shard.dork == BASE_DORK else 0))
+            for shard in shards]
+    return sum(result.pages for result in crawl_runner.run(jobs))
+
+  def planner(runner) -> int:
+    dork_planner = DorkPlanner(runner(workers))
+    dork_planner.run(BASE_DORK, budget_pages=budget)
+    dork_planner.log_summary()
+    return dork_planner.pages_spent
+
+  with tempfile.TemporaryDirectory(prefix="bench-dork-planner-") as tmp:
+    runs = [measure(tmp, label, engine, strategy)
+            for label, strategy in (("single dork", single_dork), ("even split", even_split), ("planner", planner))]
+
+  logger.info(f"corpus: {corpus_size} compose files, result ceiling {RESULT_CEILING_PAGES} pages per query, "
+              f"seeded with {SEED_PAGES} pages of '{BASE_DORK}', budget {budget} pages")
+  for run in runs:
+    logger.info(f"{run['label']:<12} {run['pages']:4d} pages | {run['new']:5d} new repositories | "
+                f"{run['per_page']:5.2f} new/page | {run['seconds']:.1f}s")
+  planner_run, single_run = runs[-1], runs[0]
+  sys.exit(0 if planner_run["new"] > single_run["new"] else 1)
@@ -0,0 +1,85 @@
+"""
+Benchmark: GitHub metadata enrichment against the local mock API (benchmarks/github_api_server.py), offline.
+
+A throw-away SQLite database is filled with synthetic repositories and enriched
+  - over GraphQL (one query per batch),
+  - over REST (three requests per repository), cold,
+  - over REST again for every repository (refresh), now answered from the ETag cache with 304s,
+  - over GraphQL with a rate limit too small for the run and no waiting for the reset: the run stops early
+    and leaves the rest for the next one.
+Reported are the repositories per second and the requests the mock answered.
+
+Usage:
+  python benchmarks/bench_enrichment.py [num_repositories] [delay]      (default: 2000 repositories, 0.02s per response)
+"""
+import os
+import sys
+import tempfile
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+current_dir = os.path.abspath(os.path.dirname(__file__))
+src_dir = os.path.abspath(os.path.join(current_dir, '..'))
+# set sys_path to also look for libs elsewhere
+sys.path.append(src_dir)
+from libs.logger import CustomLogger
+from libs.misc import get_current_utc_time
+from libs.github_api import GitHubApiClient, ETagCache, RateLimiter
+from database.models import Base
+import database.db_controller as db_controller
+from pipeline.enrichment_stage import EnrichmentStage
+from benchmarks.github_api_server import GitHubApiMock
+
+logger = CustomLogger("BenchEnrichment")
+
+
+def make_rows(num_rows: int) -> list:
+  return [dict(developer=f"dev{i % 300}", name=f"repo{i}", url=f"https://github.com/dev{i % 300}/repo{i}")
+          for i in range(num_rows)]
+
+
+def enrich(Session, client: GitHubApiClient, backend: str, fetched_before=None, workers: int = 4) -> dict:
+  session = Session()
+  try:
+    stats = EnrichmentStage(client=client, backend=backend, max_workers=workers).run(session=session,
+                                                                                     fetched_before=fetched_before)
+    session.commit()
+  finally:
+    session.close()
+  return stats
+
+
+if __name__ == "__main__":
+  num_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+  delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.02
+  with tempfile.TemporaryDirectory(prefix="bench-enrichment-") as tmp:
+    engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.sqlite')}")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    db_controller.bulk_upsert_github_repositories(session, make_rows(num_rows))
+    session.commit()
+    session.close()
+
+    runs = []
+    with GitHubApiMock(delay=delay, rate_limit=100000) as mock:
+      def client(token=None, cache_name=None, **kwargs):
+        cache = ETagCache(os.path.join(tmp, cache_name)) if cache_name else None
+        return GitHubApiClient(token=token, api_url=mock.url, etag_cache=cache, **kwargs)
+
+      graphql_client = client(token="bench")
+      runs.append(("graphql", mock, enrich(Session, graphql_client, "graphql")))
+      rest_client = client(cache_name="etags.sqlite")
+      runs.append(("rest (cold)", mock, enrich(Session, rest_client, "rest", fetched_before=get_current_utc_time())))
+      runs.append(("rest (refresh)", mock, enrich(Session, rest_client, "rest", fetched_before=get_current_utc_time())))
+
+    with GitHubApiMock(delay=delay, rate_limit=max(1, num_rows // 100)) as limited:
+      limited_client = GitHubApiClient(token="bench", api_url=limited.url, rate_limiter=RateLimiter(max_wait=1))
+      runs.append(("graphql (rate limited)", limited, enrich(Session, limited_client, "graphql", fetched_before=get_current_utc_time())))
+    engine.dispose()
+
+  for label, _, stats in runs:
+    logger.info(f"{label:<24} {stats['repos_per_second']:8.1f} repos/s | enriched={stats['enriched']} "
+                f"not_found={stats['not_found']} skipped={stats['skipped']} failed={stats['failed']} | "
+                f"requests={stats['requests']} not_modified={stats['not_modified']} in {stats['seconds']}s")
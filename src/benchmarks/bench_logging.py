@@ -0,0 +1,80 @@
+"""
+Benchmark: cost of a log call on the calling thread, the old synchronous CustomLogger setup vs. the queue-based one.
+
+"before" rebuilds what CustomLogger used to attach on the calling thread: a colour-formatting StreamHandler on stdout
+and a FileHandler. "after" is the current CustomLogger, which only puts the record on a queue; the time the
+background listener needs to write everything out is reported separately ("drained").
+The console goes to /dev/null and the log files to a temporary directory, so the terminal does not skew the numbers.
+
+Usage:
+  python benchmarks/bench_logging.py [num_records]      (default: 200000)
+"""
+import os
+import sys
+import time
+import logging
+import tempfile
+
+current_dir = os.path.abspath(os.path.dirname(__file__))
+src_dir = os.path.abspath(os.path.join(current_dir, '..'))
+# set sys_path to also look for libs elsewhere
+sys.path.append(src_dir)
+
+log_dir = tempfile.mkdtemp(prefix="bench-logging-")
+os.environ["LOG_DIR"] = log_dir
+from libs.logger import CustomLogger, ColoredFormatter, LOG_FORMAT, LOG_DATEFMT, flush_logs
+
+
+def legacy_logger(name: str, stream) -> logging.Logger:
+  """The handlers CustomLogger used to add: formatting and I/O on the calling thread"""
+  logger = logging.getLogger(name)
+  logger.setLevel(logging.DEBUG)
+  logger.propagate = False
+  ch = logging.StreamHandler(stream)
+  ch.setLevel(logging.DEBUG)
+  ch.setFormatter(ColoredFormatter(LOG_FORMAT, datefmt=LOG_DATEFMT))
+  fh = logging.FileHandler(os.path.join(log_dir, "legacy.log"), mode='a')
+  fh.setLevel(logging.DEBUG)
+  fh.setFormatter(logging.Formatter(LOG_FORMAT, datefmt=LOG_DATEFMT))
+  logger.addHandler(ch)
+  logger.addHandler(fh)
+  return logger
+
+
+def run(log_call, num_records: int) -> float:
+  """Time spent on the calling thread for num_records debug lines like the scraper's"""
+  start = time.perf_counter()
+  for i in range(num_records):
+    log_call(f"Paginating {i}/{num_records}... waiting 0.42s before navigation")
+  return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+  num_records = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+  report = CustomLogger("BenchLogging")
+  results = []
+
+  with open(os.devnull, "w") as devnull:
+    stdout = sys.stdout
+    sys.stdout = devnull
+    try:
+      legacy = legacy_logger("BenchLegacy", devnull)
+      results.append(("before: sync stream + file handlers", run(legacy.debug, num_records), None))
+
+      logger = CustomLogger("BenchQueue")
+      flush_logs()
+      caller_time = run(logger.debug, num_records)
+      drain_start = time.perf_counter()
+      flush_logs()
+      results.append(("after: queue handler", caller_time, time.perf_counter() - drain_start))
+
+      # what LOG_LEVEL=INFO does to the same debug lines
+      logger.logger.setLevel(logging.INFO)
+      results.append(("after: debug disabled (LOG_LEVEL=INFO)", run(logger.debug, num_records), None))
+    finally:
+      sys.stdout = stdout
+
+  report.info(f"{num_records} records, log files in {log_dir}")
+  for label, seconds, drained in results:
+    drained_str = f" | drained by the listener {drained:6.2f}s later" if drained is not None else ""
+    report.info(f"{label:<42} {seconds:6.2f}s on the caller | {num_records / seconds:10.0f} records/s{drained_str}")
@@ -0,0 +1,69 @@
+"""
+Benchmark: re-processing a crawl from its snapshot archive instead of the live site, offline.
+
+Crawls num_pages result pages of benchmarks/serp_server.py with search_query() and paginate_query() while archiving
+them (scraper/snapshot_archive.py), with the default adaptive pacing as on a live site and every response of the
+server held back SERP_DELAY seconds (default: 0.5). The server is then stopped and the same calls are replayed from
+the archive (scraper/replay.py) with the humanisation delays off. LocalExtractor extracts in both, so no AgentQL
+API key is needed, only Playwright's Chromium.
+
+Reported are the wall time of the live crawl and of the replay, and whether the replay extracted the same data.
+
+Usage:
+  python benchmarks/bench_replay.py [num_pages]      (default: 10 pages)
+  SCRAPER_PACING=off python benchmarks/bench_replay.py     (live crawl without delays, only the server latency)
+"""
+import os
+import sys
+import time
+import tempfile
+
+current_dir = os.path.abspath(os.path.dirname(__file__))
+src_dir = os.path.abspath(os.path.join(current_dir, '..'))
+# set sys_path to also look for libs elsewhere
+sys.path.append(src_dir)
+from libs.logger import CustomLogger
+from benchmarks.serp_server import SerpServer
+from benchmarks.bench_scraper import DORK, QUERY
+from scraper.agentql_scraper import AgentQLPlaywrightScraper
+from scraper.extractors import LocalExtractor
+from scraper.snapshot_archive import SnapshotArchive
+from scraper.replay import ArchiveReplay
+
+logger = CustomLogger("BenchReplay")
+
+
+def crawl(scraper: AgentQLPlaywrightScraper, home_url: str, search_url: str, num_pages: int) -> tuple:
+  """(seconds, data of search_query(), data of paginate_query())"""
+  started = time.perf_counter()
+  try:
+    searched = scraper.search_query(url=home_url, search_string=DORK, query=QUERY, num_pages=num_pages)
+    paginated = scraper.paginate_query(url=search_url, query=QUERY, max_pages=num_pages)
+  finally:
+    scraper.close()
+  return time.perf_counter() - started, searched, paginated
+
+
+if __name__ == "__main__":
+  num_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+  with tempfile.TemporaryDirectory(prefix="bench-replay-") as tmp:
+    archive = SnapshotArchive(os.path.join(tmp, "archive"), run_id="live")
+    with SerpServer(num_pages=num_pages, delay=float(os.getenv("SERP_DELAY", 0.5))) as server:
+      home_url, search_url = server.url, server.search_url(DORK)
+      live = AgentQLPlaywrightScraper(headless=True, user_data_dir=os.path.join(tmp, "live"), response_cache=None,
+                                      extractor=LocalExtractor(), archive=archive)
+      live_seconds, live_searched, live_paginated = crawl(live, home_url, search_url, num_pages)
+
+    # the server is gone, every page has to come from the archive
+    replay = ArchiveReplay(archive, run_id="live")
+    replayer = AgentQLPlaywrightScraper(headless=True, user_data_dir=os.path.join(tmp, "replay"), response_cache=None,
+                                        extractor=LocalExtractor(), replay=replay)
+    replay_seconds, replay_searched, replay_paginated = crawl(replayer, home_url, search_url, num_pages)
+    archive.close()
+
+  pages = len(live_searched) + len(live_paginated)
+  same = (replay_searched, replay_paginated) == (live_searched, live_paginated)
+  logger.info(f"live crawl: {pages} pages in {live_seconds:.1f}s | replay: {len(replay_searched) + len(replay_paginated)} "
+              f"pages in {replay_seconds:.1f}s ({live_seconds / replay_seconds:.0f}x faster) | same data: {same} | "
+              f"replay stats: {replay.stats()}")
+  sys.exit(0 if same and pages else 1)
@@ -0,0 +1,86 @@
+"""
+Benchmark: what blocking heavy resources saves per scraped page, offline.
+
+Runs paginate_query() of AgentQLPlaywrightScraper with a headless Chromium against the result pages of
+benchmarks/serp_server.py with assets (a thumbnail per result, a web font and an analytics script), extracting with
+LocalExtractor and with the pacing delays off, twice:
+  - "load all": a ResourcePolicy that blocks nothing, so it only counts what the browser loads,
+  - "blocking": the default policy (images, media, fonts) plus the local analytics script.
+Reported per run are pages/s, the per-page latency and, per page, the requests and bytes loaded and blocked
+(the asset requests the server answered are counted too, independently of the policy's own numbers).
+No network access and no AgentQL API key are needed, only Playwright's Chromium.
+
+Usage:
+  python benchmarks/bench_resource_policy.py [num_pages] [rounds]      (default: 10 pages, 3 rounds)
+  SERP_DELAY=0.05 python benchmarks/bench_resource_policy.py           (every response held back 0.05s)
+"""
+import os
+import sys
+import time
+import tempfile
+
+current_dir = os.path.abspath(os.path.dirname(__file__))
+src_dir = os.path.abspath(os.path.join(current_dir, '..'))
+# set sys_path to also look for libs elsewhere
+sys.path.append(src_dir)
+from libs.logger import CustomLogger
+from benchmarks.serp_server import SerpServer
+from benchmarks.bench_scraper import DORK, QUERY, timed_pages, percentile
+from scraper.agentql_scraper import AgentQLPlaywrightScraper
+from scraper.extractors import LocalExtractor
+from scraper.pacing import NoPacer
+from scraper.resource_policy import ResourcePolicy, DEFAULT_BLOCK_PATTERNS
+
+logger = CustomLogger("BenchResourcePolicy")
+
+
+def run(server: SerpServer, policy: ResourcePolicy, num_pages: int, rounds: int) -> dict:
+  assets_before = server.asset_requests
+  with tempfile.TemporaryDirectory(prefix="bench-resource-policy-") as user_data_dir:
+    scraper = AgentQLPlaywrightScraper(headless=True,
+                                       user_data_dir=user_data_dir,
+                                       response_cache=None,
+                                       pacer=NoPacer(),
+                                       extractor=LocalExtractor(),
+                                       resource_policy=policy)
+    timings = []
+    try:
+      scraper.start()
+      started = time.perf_counter()
+      for _ in range(rounds):
+        timings.extend(timed_pages(scraper.iter_paginate_query(url=server.search_url(DORK), query=QUERY,
+                                                               max_pages=num_pages, raise_errors=True)))
+      elapsed = time.perf_counter() - started
+    finally:
+      scraper.close()
+  pages = len(timings)
+  latencies = [seconds for seconds, _ in timings]
+  stats = policy.stats()
+  return dict(pages=pages,
+              pages_per_second=pages / elapsed,
+              p50=percentile(latencies, 50),
+              p90=percentile(latencies, 90),
+              loaded=stats["allowed"] / pages,
+              blocked=stats["blocked"] / pages,
+              kb_loaded=stats["bytes_loaded"] / pages / 1024,
+              kb_saved=stats["bytes_saved"] / pages / 1024,
+              asset_requests=(server.asset_requests - assets_before) / pages,
+              complete=all(results == server.results_per_page for _, results in timings))
+
+
+if __name__ == "__main__":
+  num_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+  rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+  with SerpServer(num_pages=num_pages, delay=float(os.getenv("SERP_DELAY", 0.0)), assets=True) as server:
+    runs = {
+      "load all": run(server, ResourcePolicy(block_types=[], block_patterns=[], hosts={}), num_pages, rounds),
+      "blocking": run(server, ResourcePolicy(block_patterns=DEFAULT_BLOCK_PATTERNS + [r"/assets/analytics\.js"]),
+                      num_pages, rounds),
+    }
+
+  for label, result in runs.items():
+    logger.info(f"{label:<9} {result['pages_per_second']:6.2f} pages/s | latency p50={result['p50'] * 1000:7.1f}ms "
+                f"p90={result['p90'] * 1000:7.1f}ms | per page: {result['loaded']:.1f} requests / {result['kb_loaded']:.0f} KB "
+                f"loaded, {result['blocked']:.1f} blocked (~{result['kb_saved']:.0f} KB), "
+                f"{result['asset_requests']:.1f} asset requests served | all results: {result['complete']}")
+  sys.exit(0 if all(result["complete"] for result in runs.values()) else 1)
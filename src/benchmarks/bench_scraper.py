@@ -0,0 +1,112 @@
+"""
+Benchmark: end-to-end scraper throughput, offline.
+
+Runs search_query() (home page, search form, pagination) and paginate_query() (straight to the first result page)
+of AgentQLPlaywrightScraper with a headless Chromium against the local result pages of benchmarks/serp_server.py,
+extracting with LocalExtractor instead of AgentQL and with the pacing delays off (SCRAPER_PACING=off).
+No network access and no AgentQL API key are needed, only Playwright's Chromium.
+
+Reported per method are the pages scraped, pages/sec and the percentiles of the per-page latency (time between two
+result pages reaching the caller, the first one including the home page / search form). Every page has to yield
+all of its results, otherwise the benchmark exits with 1, so it can gate CI runs.
+The fixed human-like pauses of paginate_query() (mouse movement and scrolling on the first page) are not paced
+and are part of its numbers.
+
+Usage:
+  python benchmarks/bench_scraper.py [num_pages] [rounds]      (default: 10 pages, 3 rounds)
+  SERP_DELAY=0.2 python benchmarks/bench_scraper.py            (every response of the local server held back 0.2s)
+"""
+import os
+import sys
+import time
+import tempfile
+import statistics
+
+current_dir = os.path.abspath(os.path.dirname(__file__))
+src_dir = os.path.abspath(os.path.join(current_dir, '..'))
+# set sys_path to also look for libs elsewhere
+sys.path.append(src_dir)
+from libs.logger import CustomLogger
+from libs.metrics import metrics
+from benchmarks.serp_server import SerpServer
+from scraper.agentql_scraper import AgentQLPlaywrightScraper
+from scraper.extractors import LocalExtractor
+from scraper.pacing import NoPacer
+
+logger = CustomLogger("BenchScraper")
+
+DORK = "site:github.com inurl:docker-compose.yml"
+QUERY = """
+{
+  search_results[]
+  {
+    title
+    about
+    url
+  }
+}
+"""
+
+
+def timed_pages(pages) -> list:
+  """Drains an iterator of ScrapedPage, returns (seconds since the previous page, number of results) per page"""
+  timings = []
+  previous = time.perf_counter()
+  for scraped in pages:
+    now = time.perf_counter()
+    timings.append((now - previous, len((scraped.data or {}).get("search_results") or [])))
+    previous = now
+  return timings
+
+
+def percentile(values: list, q: int) -> float:
+  if len(values) < 2:
+    return values[0] if values else 0.0
+  return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def report(label: str, timings: list, elapsed: float) -> None:
+  latencies = [seconds for seconds, _ in timings]
+  logger.info(f"{label:<15} {len(timings):4d} pages in {elapsed:6.2f}s | {len(timings) / elapsed:6.2f} pages/s | "
+              f"latency p50={percentile(latencies, 50) * 1000:7.1f}ms p90={percentile(latencies, 90) * 1000:7.1f}ms "
+              f"p99={percentile(latencies, 99) * 1000:7.1f}ms max={max(latencies) * 1000:7.1f}ms")
+
+
+if __name__ == "__main__":
+  num_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+  rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+  failures = []
+
+  with SerpServer(num_pages=num_pages, delay=float(os.getenv("SERP_DELAY", 0.0))) as server, \
+       tempfile.TemporaryDirectory(prefix="bench-scraper-") as user_data_dir:
+    scraper = AgentQLPlaywrightScraper(headless=True,
+                                       user_data_dir=user_data_dir,
+                                       response_cache=None,
+                                       pacer=NoPacer(),
+                                       extractor=LocalExtractor())
+    methods = {
+      "search_query": lambda: scraper.iter_search_query(url=server.url, search_string=DORK, query=QUERY,
+                                                        num_pages=num_pages, raise_errors=True),
+      "paginate_query": lambda: scraper.iter_paginate_query(url=server.search_url(DORK), query=QUERY,
+                                                            max_pages=num_pages, raise_errors=True),
+    }
+    try:
+      scraper.start()
+      for label, pages in methods.items():
+        timings = []
+        started = time.perf_counter()
+        for _ in range(rounds):
+          round_timings = timed_pages(pages())
+          if len(round_timings) != num_pages:
+            failures.append(f"{label}: {len(round_timings)}/{num_pages} pages scraped")
+          if any(results != server.results_per_page for _, results in round_timings):
+            failures.append(f"{label}: pages with missing results {[results for _, results in round_timings]}")
+          timings.extend(round_timings)
+        report(label, timings, time.perf_counter() - started)
+    finally:
+      scraper.close()
+
+  metrics.log_summary(logger)
+  for failure in failures:
+    logger.error(failure)
+  sys.exit(1 if failures else 0)
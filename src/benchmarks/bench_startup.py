@@ -0,0 +1,74 @@
+"""
+Benchmark: startup cost of the appcollector.py subcommands, measured with `python -X importtime`.
+
+Every command runs in a fresh interpreter against a throw-away SQLite database (DATABASE_URL) with the console
+output off. Reported are the wall-clock time of the whole process, the total import time and the slowest
+top-level imports. For comparison, "eager imports" imports everything the script used to import up front
+(Playwright, AgentQL, dotenv, SQLAlchemy and dateparser) without doing anything else.
+
+Usage:
+  python benchmarks/bench_startup.py [repeats]      (default: 3, the best run is reported)
+"""
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+current_dir = os.path.abspath(os.path.dirname(__file__))
+src_dir = os.path.abspath(os.path.join(current_dir, '..'))
+# set sys_path to also look for libs elsewhere
+sys.path.append(src_dir)
+from libs.logger import CustomLogger
+
+logger = CustomLogger("BenchStartup")
+
+COMMANDS = [
+  ("--help", ["appcollector.py", "--help"]),
+  ("init-db", ["appcollector.py", "init-db"]),
+  ("stats", ["appcollector.py", "stats"]),
+  ("eager imports", ["-c", "import playwright.sync_api, agentql, dotenv, sqlalchemy, dateparser"]),
+]
+
+
+def parse_importtime(stderr: str) -> tuple:
+  """Total import time (seconds) and the top-level imports sorted by their cumulative time"""
+  top_level = []
+  for line in stderr.splitlines():
+    if not line.startswith("import time:") or "self [us]" in line:
+      continue
+    _, cumulative, name = line[len("import time:"):].split("|")
+    # nested imports are indented below their parent
+    if not name.startswith("  "):
+      top_level.append((int(cumulative) / 1e6, name.strip()))
+  return sum(seconds for seconds, _ in top_level), sorted(top_level, reverse=True)
+
+
+def measure(args: list, env: dict) -> tuple:
+  """Runs one command, returns (wall-clock seconds, import seconds, slowest imports, error)"""
+  start = time.perf_counter()
+  result = subprocess.run([sys.executable, "-X", "importtime"] + args, cwd=src_dir, env=env,
+                          capture_output=True, text=True)
+  wall = time.perf_counter() - start
+  import_time, slowest = parse_importtime(result.stderr)
+  error = None
+  if result.returncode != 0:
+    error = next((line for line in reversed(result.stderr.splitlines()) if not line.startswith("import time:")), "failed")
+  return wall, import_time, slowest, error
+
+
+if __name__ == "__main__":
+  repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+  with tempfile.TemporaryDirectory(prefix="bench-startup-") as tmp:
+    env = dict(os.environ,
+               DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.sqlite')}",
+               LOG_CONSOLE="0",
+               LOG_DIR=tmp)
+    for label, args in COMMANDS:
+      wall, import_time, slowest, error = min((measure(args, env) for _ in range(repeats)), key=lambda r: r[0])
+      if error is not None and not slowest:
+        logger.info(f"{label:<15} n/a ({error})")
+        continue
+      top = ", ".join(f"{name} {seconds:.3f}s" for seconds, name in slowest[:4])
+      logger.info(f"{label:<15} wall={wall:6.3f}s imports={import_time:6.3f}s | slowest: {top}"
+                  + (f" | {error}" if error else ""))
@@ -0,0 +1,83 @@
+"""
+Benchmark: today's per-URL extract_github_project_url() loop vs. the batch canonicalization + dedup stage.
+
+A synthetic corpus of search-result URLs is generated with the kind of near-duplicates Google returns for the
+dork: blob vs raw vs raw.githubusercontent.com links, other branches, tracking parameters, fragments and case changes.
+Besides the run time, the number of rows that would reach the database is reported for both.
+
+Usage:
+  python benchmarks/bench_url_dedup.py [num_urls]      (default: 1000000)
+"""
+import os
+import sys
+import time
+import random
+
+current_dir = os.path.abspath(os.path.dirname(__file__))
+src_dir = os.path.abspath(os.path.join(current_dir, '..'))
+# set sys_path to also look for libs elsewhere
+sys.path.append(src_dir)
+from libs.logger import CustomLogger
+from libs.github_url import extract_github_project_url, GitHubUrlDeduplicator
+
+logger = CustomLogger("BenchUrlDedup")
+
+VARIANTS = [
+  "https://github.com/{o}/{r}/blob/{b}/{p}",
+  "https://github.com/{o}/{r}/raw/{b}/{p}",
+  "https://raw.githubusercontent.com/{o}/{r}/{b}/{p}",
+  "https://github.com/{O}/{r}/blob/{b}/{p}",
+  "https://github.com/{o}/{r}/blob/{b}/{p}?utm_source=google&utm_medium=organic",
+  "https://github.com/{o}/{r}/blob/{b}/{p}#L1-L20",
+  "https://github.com/{o}/{r}",
+]
+BRANCHES = ["master", "main", "develop"]
+PATHS = ["docker-compose.yml", "deploy/docker-compose.yml", "docker/docker-compose.yml"]
+
+
+def make_corpus(num_urls: int, num_repos: int, seed: int = 42) -> list:
+  """Synthetic search results: num_urls URLs over num_repos repositories"""
+  rng = random.Random(seed)
+  corpus = []
+  for _ in range(num_urls):
+    repo = rng.randrange(num_repos)
+    owner = f"dev{repo % (num_repos // 3 + 1)}"
+    corpus.append(rng.choice(VARIANTS).format(o=owner, O=owner.capitalize(), r=f"repo{repo}",
+                                             b=rng.choice(BRANCHES), p=rng.choice(PATHS)))
+  return corpus
+
+
+def run_per_url(corpus: list) -> tuple:
+  """Today's path: one extract_github_project_url() and one database row per search result"""
+  start = time.perf_counter()
+  rows = []
+  for url in corpus:
+    developer, name, project_url = extract_github_project_url(url)
+    rows.append(dict(developer=developer, name=name, url=project_url))
+  return time.perf_counter() - start, len(rows), len({row["url"] for row in rows})
+
+
+def run_batch(corpus: list, page_size: int = 10) -> tuple:
+  """New path: canonicalize + dedup page by page, rows only for repositories not seen before"""
+  start = time.perf_counter()
+  deduplicator = GitHubUrlDeduplicator()
+  rows = []
+  for offset in range(0, len(corpus), page_size):
+    new_repositories, _ = deduplicator.dedupe([{"url": url} for url in corpus[offset:offset + page_size]])
+    rows.extend(dict(developer=c.developer, name=c.name, url=c.project_url) for c, _ in new_repositories)
+  return time.perf_counter() - start, len(rows), deduplicator.stats()
+
+
+if __name__ == "__main__":
+  num_urls = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+  corpus = make_corpus(num_urls, num_repos=max(num_urls // 20, 1))
+  logger.info(f"Corpus: {num_urls} URLs")
+
+  per_url_time, per_url_rows, per_url_unique = run_per_url(corpus)
+  logger.info(f"per-URL split loop: {per_url_time:6.2f}s | {num_urls / per_url_time:10.0f} URLs/s | "
+              f"{per_url_rows} rows to the database ({per_url_unique} distinct repository URLs)")
+
+  batch_time, batch_rows, stats = run_batch(corpus)
+  logger.info(f"batch canonicalize: {batch_time:6.2f}s | {num_urls / batch_time:10.0f} URLs/s | "
+              f"{batch_rows} rows to the database")
+  logger.info(f"dedup stats: {stats}")
@@ -0,0 +1,334 @@
+"""
+Local mock of the parts of the GitHub API the enrichment uses, for offline tests and benchmarks:
+
+  GET  /repos/{owner}/{name}            stars, open issues, created_at, pushed_at, default_branch
+  GET  /repos/{owner}/{name}/commits    the latest commit (per_page is ignored)
+  GET  /repos/{owner}/{name}/readme     200 or 404
+  POST /graphql                         aliased repository(owner: $oN, name: $nN) selections as built by
+                                        pipeline.enrichment_stage.GraphQLMetadataFetcher, plus rateLimit
+  GET  /search/code?q=&per_page=&page=  code search results as used by scraper.code_search.CodeSearchDiscovery
+
+The data of a repository is derived from the hash of its name, so runs are comparable: about 1 in 20
+repositories does not exist and about 1 in 4 has no README. REST answers carry an ETag and are answered with
+304 to a matching If-None-Match (not counted against the rate limit, like on GitHub); every resource has its
+own rate limit window with the X-RateLimit-* headers, and a 403 "rate limit exceeded" once it is used up.
+Code search needs a token and has its own, much smaller limit (the 'search' resource); like on GitHub, it serves
+the first 1000 results of a query only. Its results are derived from the hash of the query and the result index,
+and the file name is the one of the query's filename: qualifier.
+
+Usage:
+  python benchmarks/github_api_server.py [--port 8766] [--rate-limit 5000] [--search-rate-limit 10] [--delay 0.05]
+"""
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timezone, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from typing import Optional, Dict, Any
+
+current_dir = os.path.abspath(os.path.dirname(__file__))
+src_dir = os.path.abspath(os.path.join(current_dir, '..'))
+# set sys_path to also look for libs elsewhere
+sys.path.append(src_dir)
+from libs.logger import CustomLogger
+
+_REPOSITORY_SELECTION_RE = re.compile(r"(\w+)\s*:\s*repository\(\s*owner:\s*\$(\w+)\s*,\s*name:\s*\$(\w+)\s*\)")
+_README_SELECTION_RE = re.compile(r'(\w+)\s*:\s*object\(\s*expression:\s*"HEAD:([^"]+)"\s*\)')
+_REPO_PATH_RE = re.compile(r"^/repos/([^/]+)/([^/]+)(/commits|/readme)?/?$")
+_QUALIFIER_RE = re.compile(r"(?<!\S)(filename|path|user):(\S+)")
+
+EPOCH = datetime(2015, 1, 1, tzinfo=timezone.utc)
+
+
+def _iso(moment: datetime) -> str:
+  return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class GitHubApiMock:
+  """
+  Threaded local HTTP server of the mock API.
+
+  Example:
+    with GitHubApiMock(rate_limit=100) as mock:
+      client = GitHubApiClient(token="test", api_url=mock.url)
+  """
+  def __init__(self,
+               host: str = "127.0.0.1",
+               port: int = 0,
+               rate_limit: int = 5000,
+               window: float = 3600.0,
+               delay: float = 0.0,
+               search_rate_limit: int = 10,
+               search_window: float = 60.0):
+    """
+      Args:
+        host (str): address to listen on
+        port (int): port to listen on (0: any free port, see url)
+        rate_limit (int): requests (REST) or queries (GraphQL) per window and resource
+        window (float): seconds until a rate limit window resets
+        delay (float): seconds every response is held back, to mimic the real API's latency
+        search_rate_limit (int): code search requests per search window
+        search_window (float): seconds until the code search rate limit window resets
+    """
+    self.logger = CustomLogger(self.__class__.__name__)
+    self.rate_limit = rate_limit
+    self.window = window
+    self.delay = delay
+    self.search_rate_limit = search_rate_limit
+    self.search_window = search_window
+    self.requests: Dict[str, int] = {} # answered requests per kind (rest, graphql, search, not_modified, rate_limited)
+    self._windows: Dict[str, list] = {} # resource -> [used, reset_at]
+    self._lock = threading.Lock()
+    self._server = ThreadingHTTPServer((host, port), self._handler_class())
+    self._server.daemon_threads = True
+
+  @property
+  def url(self) -> str:
+    host, port = self._server.server_address[:2]
+    return f"http://{host}:{port}"
+
+  def _count(self, kind: str) -> None:
+    with self._lock:
+      self.requests[kind] = self.requests.get(kind, 0) + 1
+
+  def limit(self, resource: str) -> tuple:
+    """(requests per window, window in seconds) of the resource"""
+    if resource == "search":
+      return self.search_rate_limit, self.search_window
+    return self.rate_limit, self.window
+
+  def take(self, resource: str) -> tuple:
+    """Uses one request of the resource, returns (allowed, remaining, reset_at)"""
+    rate_limit, seconds = self.limit(resource)
+    with self._lock:
+      now = time.time()
+      window = self._windows.get(resource)
+      if window is None or window[1] <= now:
+        window = self._windows[resource] = [0, int(now + seconds)]
+      if window[0] >= rate_limit:
+        return False, 0, window[1]
+      window[0] += 1
+      return True, rate_limit - window[0], window[1]
+
+  def peek(self, resource: str) -> tuple:
+    """(remaining, reset_at) of the resource without using a request"""
+    rate_limit, seconds = self.limit(resource)
+    with self._lock:
+      window = self._windows.get(resource)
+      if window is None or window[1] <= time.time():
+        return rate_limit, int(time.time() + seconds)
+      return rate_limit - window[0], window[1]
+
+  @staticmethod
+  def repository(owner: str, name: str) -> Optional[Dict[str, Any]]:
+    """The mock data of a repository, None if it "does not exist\""""
+    digest = int(hashlib.sha1(f"{owner}/{name}".lower().encode("utf-8")).hexdigest(), 16)
+    if digest % 20 == 0:
+      return None
+    created = EPOCH + timedelta(days=digest % 3000)
+    last_commit = created + timedelta(days=(digest >> 12) % 800, seconds=(digest >> 24) % 86400)
+    return dict(full_name=f"{owner}/{name}",
+                stargazers_count=(digest >> 8) % 5000,
+                open_issues_count=(digest >> 16) % 120,
+                created_at=_iso(created),
+                pushed_at=_iso(last_commit + timedelta(hours=1)),
+                last_commit=_iso(last_commit),
+                default_branch="main" if digest % 3 else "master",
+                has_readme=digest % 4 != 0)
+
+  def rest(self, path: str) -> tuple:
+    """(status, body) of a REST GET"""
+    match = _REPO_PATH_RE.match(path)
+    repo = self.repository(match.group(1), match.group(2)) if match else None
+    if repo is None:
+      return 404, {"message": "Not Found"}
+    if match.group(3) == "/commits":
+      return 200, [{"sha": hashlib.sha1(repo["last_commit"].encode("utf-8")).hexdigest(),
+                    "commit": {"committer": {"date": repo["last_commit"]}}}]
+    if match.group(3) == "/readme":
+      return (200, {"name": "README.md", "path": "README.md"}) if repo["has_readme"] else (404, {"message": "Not Found"})
+    return 200, {key: value for key, value in repo.items() if key not in ("last_commit", "has_readme")}
+
+  @staticmethod
+  def search_total(search_query: str) -> int:
+    """The number of results of a code search (a repository qualifier narrows it down)"""
+    digest = int(hashlib.sha1(search_query.encode("utf-8")).hexdigest(), 16)
+    return digest % 80 + 1 if "user:" in search_query else 300 + digest % 4000
+
+  def search_code(self, params: Dict[str, list]) -> tuple:
+    """(status, body) of a code search GET"""
+    search_query = (params.get("q") or [""])[0].strip()
+    if not search_query:
+      return 422, {"message": "Validation Failed", "errors": [{"resource": "Search", "field": "q", "code": "missing"}]}
+    per_page = min(int((params.get("per_page") or ["30"])[0]), 100)
+    page = int((params.get("page") or ["1"])[0])
+    if (page - 1) * per_page >= 1000:
+      return 422, {"message": "Only the first 1000 search results are available"}
+    qualifiers = {name: value for name, value in _QUALIFIER_RE.findall(search_query)}
+    filename = qualifiers.get("filename", "docker-compose.yml")
+    total = self.search_total(search_query)
+    items = []
+    for index in range((page - 1) * per_page, min(page * per_page, total, 1000)):
+      digest = int(hashlib.sha1(f"{search_query}#{index}".encode("utf-8")).hexdigest(), 16)
+      owner = qualifiers.get("user") or f"user{digest % 997}"
+      name = f"project{(digest >> 10) % 5000}"
+      path = f"{qualifiers['path'].strip('/')}/{filename}" if "path" in qualifiers else (
+        filename if digest % 3 else f"deploy/{filename}")
+      commit = hashlib.sha1(f"{owner}/{name}".encode("utf-8")).hexdigest()
+      items.append(dict(name=filename,
+                        path=path,
+                        sha=hashlib.sha1(f"{owner}/{name}/{path}".encode("utf-8")).hexdigest(),
+                        html_url=f"https://github.com/{owner}/{name}/blob/{commit}/{path}",
+                        repository=dict(full_name=f"{owner}/{name}",
+                                        html_url=f"https://github.com/{owner}/{name}",
+                                        description=None if digest % 5 == 0 else f"Dockerized {name} by {owner}",
+                                        owner=dict(login=owner))))
+    return 200, {"total_count": total, "incomplete_results": False, "items": items}
+
+  def graphql(self, query: str, variables: Dict[str, Any]) -> Dict[str, Any]:
+    """The response of a GraphQL query with aliased repository() selections"""
+    readme_aliases = [alias for alias, _ in _README_SELECTION_RE.findall(query)]
+    data, errors = {}, []
+    for alias, owner_var, name_var in _REPOSITORY_SELECTION_RE.findall(query):
+      owner, name = variables.get(owner_var), variables.get(name_var)
+      repo = self.repository(owner, name)
+      if repo is None:
+        data[alias] = None
+        errors.append({"type": "NOT_FOUND", "path": [alias],
+                       "message": f"Could not resolve to a Repository with the name '{owner}/{name}'."})
+        continue
+      node = {"stargazerCount": repo["stargazers_count"],
+              "issues": {"totalCount": repo["open_issues_count"]},
+              "createdAt": repo["created_at"],
+              "pushedAt": repo["pushed_at"],
+              "defaultBranchRef": {"target": {"committedDate": repo["last_commit"]}}}
+      for i, readme_alias in enumerate(readme_aliases):
+        # the repository has its README under the first name asked for
+        node[readme_alias] = {"id": f"readme-{owner}-{name}"} if repo["has_readme"] and i == 0 else None
+      data[alias] = node
+    payload = {"data": data}
+    if errors:
+      payload["errors"] = errors
+    return payload
+
+  def _handler_class(self):
+    mock = self
+
+    class GitHubApiHandler(BaseHTTPRequestHandler):
+      def _send(self, status: int, body: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        payload = json.dumps(body).encode("utf-8") if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+          self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+      def _rate_limited(self, resource: str, reset_at: int) -> None:
+        mock._count("rate_limited")
+        self._send(403, {"message": "API rate limit exceeded"},
+                   {"X-RateLimit-Limit": str(mock.limit(resource)[0]), "X-RateLimit-Remaining": "0",
+                    "X-RateLimit-Reset": str(reset_at), "X-RateLimit-Resource": resource})
+
+      def do_GET(self):
+        if mock.delay:
+          time.sleep(mock.delay)
+        parsed = urlparse(self.path)
+        if parsed.path.rstrip("/") == "/search/code":
+          if not self.headers.get("Authorization"):
+            self._send(401, {"message": "Requires authentication"})
+            return
+          resource = "search"
+          status, body = mock.search_code(parse_qs(parsed.query))
+        else:
+          resource = "core"
+          status, body = mock.rest(parsed.path)
+        etag = '"%s"' % hashlib.sha1(json.dumps(body, sort_keys=True).encode("utf-8")).hexdigest()
+        if status == 200 and self.headers.get("If-None-Match") == etag:
+          # conditional requests answered with 304 do not count against the rate limit
+          mock._count("not_modified")
+          remaining, reset_at = mock.peek(resource)
+          self._send(304, None, {"ETag": etag, "X-RateLimit-Remaining": str(remaining),
+                                 "X-RateLimit-Reset": str(reset_at), "X-RateLimit-Resource": resource})
+          return
+        allowed, remaining, reset_at = mock.take(resource)
+        if not allowed:
+          self._rate_limited(resource, reset_at)
+          return
+        mock._count("search" if resource == "search" else "rest")
+        headers = {"X-RateLimit-Limit": str(mock.limit(resource)[0]), "X-RateLimit-Remaining": str(remaining),
+                   "X-RateLimit-Reset": str(reset_at), "X-RateLimit-Resource": resource}
+        if status == 200:
+          headers["ETag"] = etag
+        self._send(status, body, headers)
+
+      def do_POST(self):
+        if mock.delay:
+          time.sleep(mock.delay)
+        if urlparse(self.path).path != "/graphql":
+          self._send(404, {"message": "Not Found"})
+          return
+        if not self.headers.get("Authorization"):
+          self._send(401, {"message": "This endpoint requires you to be authenticated."})
+          return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        allowed, remaining, reset_at = mock.take("graphql")
+        if not allowed:
+          self._rate_limited("graphql", reset_at)
+          return
+        mock._count("graphql")
+        payload = mock.graphql(request.get("query", ""), request.get("variables") or {})
+        payload["data"]["rateLimit"] = {"cost": 1, "remaining": remaining,
+                                        "resetAt": _iso(datetime.fromtimestamp(reset_at, timezone.utc))}
+        self._send(200, payload, {"X-RateLimit-Limit": str(mock.rate_limit), "X-RateLimit-Remaining": str(remaining),
+                                  "X-RateLimit-Reset": str(reset_at), "X-RateLimit-Resource": "graphql"})
+
+      def log_message(self, format, *args):
+        mock.logger.debug(format % args)
+
+    return GitHubApiHandler
+
+  def start(self) -> "GitHubApiMock":
+    """Serves in a daemon thread"""
+    threading.Thread(target=self._server.serve_forever, name="github-api-mock", daemon=True).start()
+    self.logger.info(f"Mock GitHub API served at {self.url} (rate limit {self.rate_limit}/{self.window:.0f}s)")
+    return self
+
+  def stop(self) -> None:
+    self._server.shutdown()
+    self._server.server_close()
+
+  def __enter__(self) -> "GitHubApiMock":
+    return self.start()
+
+  def __exit__(self, exc_type, exc, tb):
+    self.stop()
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Local mock of the GitHub API for offline enrichment runs")
+  parser.add_argument("--host", default="127.0.0.1")
+  parser.add_argument("--port", type=int, default=8766)
+  parser.add_argument("--rate-limit", type=int, default=5000, help="requests per window and resource (default: %(default)s)")
+  parser.add_argument("--window", type=float, default=3600, help="seconds per rate limit window (default: %(default)s)")
+  parser.add_argument("--delay", type=float, default=0.0, help="seconds every response is held back")
+  parser.add_argument("--search-rate-limit", type=int, default=10,
+                      help="code search requests per search window (default: %(default)s)")
+  parser.add_argument("--search-window", type=float, default=60,
+                      help="seconds per code search rate limit window (default: %(default)s)")
+  args = parser.parse_args()
+  mock = GitHubApiMock(host=args.host, port=args.port, rate_limit=args.rate_limit, window=args.window, delay=args.delay,
+                       search_rate_limit=args.search_rate_limit, search_window=args.search_window)
+  mock.start()
+  try:
+    while True:
+      time.sleep(3600)
+  except KeyboardInterrupt:
+    mock.stop()
@@ -0,0 +1,219 @@
+"""
+Local, offline stand-in for the search engine: serves a search form and paginated result pages with Google's markup
+(div#search > div.g > a > h3, div.VwiC3b snippets, a#pnnext), so the scraper runs its normal search and pagination
+path against it with LocalExtractor(GOOGLE_SERP_RULES) and neither Google nor AgentQL is contacted.
+
+The results are GitHub docker-compose.yml URLs (with some repositories appearing more than once, as on the real
+thing), deterministic for a given query, so runs are comparable. Every page carries some filler markup and inline
+script so its size is in the range of a real result page. With assets, result pages also pull in what a real one
+does: a thumbnail per result, a stylesheet with a web font and an analytics script (served from /assets/).
+
+Usage:
+  python benchmarks/serp_server.py [--port 8765] [--pages 10] [--delay 0.05] [--assets]
+"""
+import os
+import sys
+import time
+import html
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, urlencode
+
+current_dir = os.path.abspath(os.path.dirname(__file__))
+src_dir = os.path.abspath(os.path.join(current_dir, '..'))
+# set sys_path to also look for libs elsewhere
+sys.path.append(src_dir)
+from libs.logger import CustomLogger
+
+COMPOSE_PATHS = ("docker-compose.yml", "deploy/docker-compose.yml", "docker/docker-compose.yml", "compose/docker-compose.yml")
+
+HOME_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Local Search</title></head>
+<body>
+<form action="/search" method="get" role="search">
+  <textarea name="q" title="Search" rows="1"></textarea>
+  <input type="submit" name="btnK" value="Search">
+</form>
+</body></html>"""
+
+RESULT = """<div class="MjjYud"><div class="g"><div class="yuRUbf"><a href="{url}"><h3 class="LC20lb">{title}</h3>
+<cite>{cite}</cite></a></div><div class="VwiC3b">{about}</div></div></div>"""
+
+
+class SerpServer:
+  """
+  Threaded local HTTP server of the result pages.
+
+  Example:
+    with SerpServer(num_pages=5) as server:
+      scraper.search_query(url=server.url, search_string=dork, query=aql, num_pages=5)
+  """
+  def __init__(self,
+               host: str = "127.0.0.1",
+               port: int = 0,
+               num_pages: int = 10,
+               results_per_page: int = 10,
+               delay: float = 0.0,
+               filler_kb: int = 200,
+               assets: bool = False,
+               asset_kb: int = 30):
+    """
+      Args:
+        host (str): address to listen on
+        port (int): port to listen on (0: any free port, see url)
+        num_pages (int): result pages of every query, the last one has no "next" link
+        results_per_page (int): results on every page
+        delay (float): seconds every response is held back, to mimic a remote server
+        filler_kb (int): approximate KB of filler markup per result page
+        assets (bool): whether result pages reference images, a font, a stylesheet and an analytics script
+        asset_kb (int): KB of every image, font and script asset
+    """
+    self.logger = CustomLogger(self.__class__.__name__)
+    self.num_pages = num_pages
+    self.results_per_page = results_per_page
+    self.delay = delay
+    self.filler = "<script>/*" + "x" * (filler_kb * 1024) + "*/</script>" if filler_kb else ""
+    self.assets = assets
+    self.asset_bytes = asset_kb * 1024
+    self.asset_requests = 0
+    self.requests = 0
+    self._lock = threading.Lock()
+    self._server = ThreadingHTTPServer((host, port), self._handler_class())
+    self._server.daemon_threads = True
+    self._thread = None
+
+  @property
+  def url(self) -> str:
+    host, port = self._server.server_address[:2]
+    return f"http://{host}:{port}"
+
+  def search_url(self, query: str, page_number: int = 1) -> str:
+    """URL of a result page, like the ones the search form and the "next" links lead to"""
+    return f"{self.url}/search?{urlencode({'q': query, 'start': (page_number - 1) * self.results_per_page})}"
+
+  def result_urls(self, query: str, page_number: int) -> list:
+    """The result URLs of a page: docker-compose.yml files of about 2/3 as many repositories as results"""
+    urls = []
+    for index in range((page_number - 1) * self.results_per_page, page_number * self.results_per_page):
+      digest = int(hashlib.sha1(f"{query}|{index * 2 // 3}".encode("utf-8")).hexdigest(), 16)
+      owner, repo = f"dev{digest % 997}", f"app-{digest % 100003}"
+      branch = "main" if digest % 3 else "master"
+      urls.append(f"https://github.com/{owner}/{repo}/blob/{branch}/{COMPOSE_PATHS[index % len(COMPOSE_PATHS)]}")
+    return urls
+
+  def result_page(self, query: str, page_number: int) -> str:
+    results = []
+    for index, url in enumerate(self.result_urls(query, page_number)):
+      owner, repo = url.split("/")[3:5]
+      if self.assets:
+        results.append(f'<img src="/assets/img/{page_number}-{index}.png" alt="" width="92" height="92">')
+      results.append(RESULT.format(url=html.escape(url),
+                                   title=html.escape(f"{url.rsplit('/', 1)[-1]} - {owner}/{repo} - GitHub"),
+                                   cite=html.escape(f"https://github.com › {owner} › {repo}"),
+                                   about=html.escape(f"Deploy {repo} with Docker Compose: services, volumes and networks "
+                                                     f"for running {repo} locally or in production.")))
+    next_link = ""
+    if page_number < self.num_pages:
+      next_link = f'<a id="pnnext" href="{html.escape(self.search_url(query, page_number + 1))}">Next</a>'
+    head = ('<link rel="stylesheet" href="/assets/style.css"><script src="/assets/analytics.js" async></script>'
+            if self.assets else "")
+    return ("<!DOCTYPE html><html><head><meta charset=\"utf-8\">"
+            f"<title>{html.escape(query)} - Local Search</title>{head}</head><body>"
+            f"<form action=\"/search\" method=\"get\" role=\"search\"><textarea name=\"q\">{html.escape(query)}</textarea>"
+            "<input type=\"submit\" name=\"btnK\" value=\"Search\"></form>"
+            f"<div id=\"search\"><div id=\"rso\">{''.join(results)}</div></div>"
+            f"<div role=\"navigation\"><span>Page {page_number}</span>{next_link}</div>"
+            f"{self.filler}</body></html>")
+
+  def _send_asset(self, handler: BaseHTTPRequestHandler, path: str) -> None:
+    with self._lock:
+      self.asset_requests += 1
+    if path == "/assets/style.css":
+      payload = b"@font-face{font-family:Local;src:url(/assets/font.woff2) format('woff2')}body{font-family:Local,sans-serif}"
+      content_type = "text/css"
+    else:
+      payload = b"\0" * self.asset_bytes
+      content_type = {".png": "image/png", ".woff2": "font/woff2", ".js": "application/javascript"}.get(os.path.splitext(path)[1],
+                                                                                                       "application/octet-stream")
+    handler.send_response(200)
+    handler.send_header("Content-Type", content_type)
+    handler.send_header("Content-Length", str(len(payload)))
+    handler.end_headers()
+    handler.wfile.write(payload)
+
+  def _handler_class(self):
+    server = self
+
+    class SerpHandler(BaseHTTPRequestHandler):
+      def do_GET(self):
+        with server._lock:
+          server.requests += 1
+        if server.delay:
+          time.sleep(server.delay)
+        parsed = urlparse(self.path)
+        params = parse_qs(parsed.query)
+        if parsed.path == "/":
+          body, status = HOME_PAGE, 200
+        elif parsed.path == "/search" and params.get("q"):
+          start = int((params.get("start") or ["0"])[0] or 0)
+          page_number = start // server.results_per_page + 1
+          if 1 <= page_number <= server.num_pages:
+            body, status = server.result_page(params["q"][0], page_number), 200
+          else:
+            body, status = "<html><body><div id=\"search\"></div></body></html>", 200
+        elif parsed.path.startswith("/assets/") and server.assets:
+          server._send_asset(self, parsed.path)
+          return
+        elif parsed.path == "/favicon.ico":
+          body, status = "", 204
+        else:
+          body, status = "<html><body>Not found</body></html>", 404
+        payload = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+      def log_message(self, format, *args):
+        server.logger.debug(format % args)
+
+    return SerpHandler
+
+  def start(self) -> "SerpServer":
+    """Serves in a daemon thread"""
+    self._thread = threading.Thread(target=self._server.serve_forever, name="serp-server", daemon=True)
+    self._thread.start()
+    self.logger.info(f"Local result pages served at {self.url} ({self.num_pages} pages x {self.results_per_page} results)")
+    return self
+
+  def stop(self) -> None:
+    self._server.shutdown()
+    self._server.server_close()
+
+  def __enter__(self) -> "SerpServer":
+    return self.start()
+
+  def __exit__(self, exc_type, exc, tb):
+    self.stop()
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Local search result pages for offline scraper runs")
+  parser.add_argument("--host", default="127.0.0.1")
+  parser.add_argument("--port", type=int, default=8765)
+  parser.add_argument("--pages", type=int, default=10, help="result pages per query (default: %(default)s)")
+  parser.add_argument("--results", type=int, default=10, help="results per page (default: %(default)s)")
+  parser.add_argument("--delay", type=float, default=0.0, help="seconds every response is held back")
+  parser.add_argument("--assets", action="store_true", help="result pages load images, a font and scripts")
+  args = parser.parse_args()
+  server = SerpServer(host=args.host, port=args.port, num_pages=args.pages, results_per_page=args.results,
+                      delay=args.delay, assets=args.assets)
+  server.start()
+  try:
+    while True:
+      time.sleep(3600)
+  except KeyboardInterrupt:
+    server.stop()
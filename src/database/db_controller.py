@@ -1,9 +1,10 @@
-from sqlalchemy import create_engine, inspect, text, func
+from sqlalchemy import create_engine, inspect, text, func, select, update, bindparam, make_url, Engine
 from sqlalchemy.orm import sessionmaker, Session
 
 import os
 import sys
-from typing import Optional, Any, Dict
+import threading
+from typing import Optional, Any, Dict, Iterable, List
 from datetime import datetime
 
 current_dir = os.path.abspath(os.path.dirname(__file__))
@@ -11,8 +12,11 @@ src_dir= os.path.abspath(os.path.join(current_dir, '..'))
 # set sys_path to also look for libs elsewhere
 sys.path.append(src_dir)
 from libs.logger import CustomLogger
+from libs.metrics import metrics
+from libs.github_url import is_commit_sha
+from libs.misc import get_current_utc_time
 
-from database.models import Base, GitHubRepository
+from database.models import Base, GitHubRepository, CrawlCheckpoint, ComposeFile
 
 # Fetch from environment
 POSTGRES_USER = os.getenv("POSTGRES_USER", "appcollector_user")
@@ -20,16 +24,102 @@ POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "eg2ooHooQu")
 POSTGRES_DB = os.getenv("POSTGRES_DB", "appcollector")
 POSTGRES_CONTAINER = os.getenv("POSTGRES_CONTAINER", "172.18.1.24")
 POSTGRES_PORT=os.getenv("POSTGRES_PORT", 5432)
+# "psycopg2" (default) or "psycopg" for psycopg v3
+DB_DRIVER = os.getenv("DB_DRIVER", "psycopg2")
 
-# Replace with your actual database URL
-DATABASE_URL = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_CONTAINER}:{POSTGRES_PORT}/{POSTGRES_DB}"
-
-# Create engine and session factory
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(bind=engine)
+# Replace with your actual database URL (or set DATABASE_URL, e.g., to a sqlite:/// URL for local runs)
+DATABASE_URL = os.getenv("DATABASE_URL",
+                         f"postgresql+{DB_DRIVER}://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_CONTAINER}:{POSTGRES_PORT}/{POSTGRES_DB}")
 
 logger = CustomLogger("INITIALIZE_DB")
 
+# The engine and the session factory are created on first use, so importing this module never touches the database
+_engine: Optional[Engine] = None
+_session_factory: Optional[sessionmaker] = None
+_engine_lock = threading.Lock()
+
+
+def engine_options_from_env(database_url: str = DATABASE_URL) -> Dict[str, Any]:
+  """
+  create_engine() keyword arguments from the environment:
+    DB_POOL_SIZE            connections kept open in the pool (default: 5)
+    DB_MAX_OVERFLOW         extra connections opened under load, closed when returned (default: 10)
+    DB_POOL_TIMEOUT         seconds to wait for a free connection before failing (default: 30)
+    DB_POOL_RECYCLE         seconds after which a connection is replaced, -1 disables it (default: 1800)
+    DB_POOL_PRE_PING        1 checks every connection before handing it out, so connections killed by a
+                            Postgres restart are replaced transparently (default: 1)
+    DB_STATEMENT_TIMEOUT_MS Postgres statement_timeout of every connection, 0 disables it (default: 0)
+    DB_EXECUTEMANY_MODE     psycopg2 executemany_mode, e.g., "values_plus_batch" (default: SQLAlchemy's)
+  Pool settings only apply to server databases; SQLite keeps SQLAlchemy's defaults.
+  """
+  options: Dict[str, Any] = dict(pool_pre_ping=os.getenv("DB_POOL_PRE_PING", "1") == "1")
+  url = make_url(database_url)
+  if url.get_backend_name() == "sqlite":
+    return options
+
+  options.update(pool_size=int(os.getenv("DB_POOL_SIZE", 5)),
+                 max_overflow=int(os.getenv("DB_MAX_OVERFLOW", 10)),
+                 pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", 30)),
+                 pool_recycle=int(os.getenv("DB_POOL_RECYCLE", 1800)))
+  statement_timeout = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 0))
+  if statement_timeout > 0:
+    options["connect_args"] = {"options": f"-c statement_timeout={statement_timeout}"}
+  executemany_mode = os.getenv("DB_EXECUTEMANY_MODE")
+  if executemany_mode and url.get_driver_name() == "psycopg2":
+    options["executemany_mode"] = executemany_mode
+  return options
+
+
+def create_db_engine(database_url: Optional[str] = None, **overrides) -> Engine:
+  """
+  Engine factory: a new engine for database_url (default: DATABASE_URL) with the pool settings from the env.
+
+  Args:
+    database_url (str, optional): SQLAlchemy database URL
+    overrides: create_engine() keyword arguments taking precedence over the env
+
+  Returns:
+    Engine: a new SQLAlchemy engine (no connection is opened yet)
+  """
+  database_url = database_url or DATABASE_URL
+  options = {**engine_options_from_env(database_url), **overrides}
+  new_engine = create_engine(database_url, **options)
+  logger.debug(f"Created engine for {make_url(database_url).render_as_string(hide_password=True)} "
+               f"with {({k: v for k, v in options.items() if k != 'connect_args'})}")
+  return new_engine
+
+
+def get_engine() -> Engine:
+  """The shared engine of the process, created on first use (thread-safe), whose pool all workers share"""
+  global _engine, _session_factory
+  if _engine is None:
+    with _engine_lock:
+      if _engine is None:
+        _engine = create_db_engine()
+        _session_factory = sessionmaker(bind=_engine)
+  return _engine
+
+
+def dispose_engine() -> None:
+  """Closes every pooled connection and forgets the engine, the next get_engine() builds a new one (e.g., after a fork)"""
+  global _engine, _session_factory
+  with _engine_lock:
+    if _engine is not None:
+      _engine.dispose()
+    _engine = None
+    _session_factory = None
+
+
+def __getattr__(name: str):
+  # db_controller.engine / db_controller.SessionLocal used to be created at import time
+  if name == "engine":
+    return get_engine()
+  if name == "SessionLocal":
+    get_engine()
+    return _session_factory
+  raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 def get_session():
   """
   Creates and returns a new database session.
@@ -38,13 +128,16 @@ def get_session():
   Returns:
     Session: SQLAlchemy session object
   """
-  return SessionLocal()
+  get_engine()
+  return _session_factory()
 
+@metrics.timed("db.create_db")
 def create_db(force_recreate:bool = False) -> tuple[bool, Optional[list | str]]:
   """
   This function is to (re)create a database!
   """
   session = get_session() # Create a session for this function
+  engine = get_engine()
   try:
     inspector = inspect(engine)
     existing_tables = inspector.get_table_names()
@@ -86,6 +179,9 @@ def create_db(force_recreate:bool = False) -> tuple[bool, Optional[list | str]]:
       else:
         logger.warning("Database initialization was halted - database exists with the following tables:")
         logger.warning(existing_tables)
+        added = upgrade_db(engine)
+        if added:
+          logger.info(f"Added what the models gained since the tables were created: {added}")
         return (False, existing_tables)
     else:
       logger.info("No existing tables found. Creating all tables...")
@@ -99,8 +195,98 @@ def create_db(force_recreate:bool = False) -> tuple[bool, Optional[list | str]]:
   finally:
     session.close() # Always close the session
   
+def upgrade_db(engine: Optional[Engine] = None) -> List[str]:
+  """
+  Brings an existing database up to date with the models without touching its data: creates the missing
+  tables and adds the (nullable) columns and the indexes the models gained since the tables were created.
+
+  Args:
+    engine (Engine, optional): the database (default: get_engine())
+
+  Returns:
+    List[str]: the tables, columns (table.column) and indexes added
+  """
+  engine = engine if engine is not None else get_engine()
+  inspector = inspect(engine)
+  existing_tables = set(inspector.get_table_names())
+  added = []
+  with engine.begin() as connection:
+    for table in Base.metadata.sorted_tables:
+      if table.name not in existing_tables:
+        table.create(connection)
+        added.append(table.name)
+        continue
+      columns = {column["name"] for column in inspector.get_columns(table.name)}
+      for column in table.columns:
+        if column.name in columns:
+          continue
+        if not column.nullable:
+          logger.warning(f"Column {table.name}.{column.name} is missing and NOT NULL, recreate the database to get it")
+          continue
+        column_type = column.type.compile(dialect=connection.dialect)
+        connection.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+        added.append(f"{table.name}.{column.name}")
+      indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+      for index in table.indexes:
+        if index.name not in indexes:
+          index.create(connection)
+          added.append(index.name)
+    if "compose_files" in existing_tables:
+      _mark_pinned_compose_files(connection)
+      added += _key_compose_files_by_path(connection, inspector)
+  return added
+
+def _mark_pinned_compose_files(connection) -> int:
+  """
+  Sets compose_files.pinned of the rows written before the column existed, with the is_commit_sha() of their
+  branch like bulk_add_compose_files() does for new rows.
+
+  Returns:
+    int: number of rows marked
+  """
+  table = ComposeFile.__table__
+  rows = connection.execute(select(table.c.id, table.c.branch).where(table.c.pinned.is_(None))).all()
+  if rows:
+    connection.execute(update(table).where(table.c.id == bindparam("row_id")).values(pinned=bindparam("row_pinned")),
+                       [dict(row_id=row.id, row_pinned=is_commit_sha(row.branch)) for row in rows])
+  return len(rows)
+
+def _key_compose_files_by_path(connection, inspector) -> List[str]:
+  """
+  Compose files used to be unique per (repository, branch, path), so the same file found on master, main or a
+  commit SHA was several rows. Keeps one row per (repository, path), the one on a named branch (else the most
+  recently fetched), recomputes the totals of the repositories that lost rows and swaps the unique constraint.
+  SQLite cannot drop a constraint, there the rows stay and refresh_repository_compose_stats() counts a path once.
+
+  Returns:
+    List[str]: the constraint added, if any
+  """
+  constraints = {constraint["name"] for constraint in inspector.get_unique_constraints("compose_files")}
+  if "uq_compose_files_repository_branch_path" not in constraints:
+    return []
+  if connection.dialect.name != "postgresql":
+    logger.warning("compose_files is still unique per branch, recreate the database to key it by path")
+    return []
+  repository_ids = connection.execute(text("""
+    DELETE FROM compose_files WHERE id IN (
+      SELECT id FROM (
+        SELECT id, ROW_NUMBER() OVER (PARTITION BY repository_id, path
+                                      ORDER BY pinned, fetched_at DESC NULLS LAST, id DESC) AS rank
+        FROM compose_files) AS ranked
+      WHERE rank > 1)
+    RETURNING repository_id""")).scalars().all()
+  if repository_ids:
+    logger.info(f"Collapsed the compose files of {len(set(repository_ids))} repositories to one row per path")
+    with Session(bind=connection) as session:
+      # joins the migration's transaction, committed with it
+      refresh_repository_compose_stats(session, repository_ids)
+  connection.execute(text('ALTER TABLE compose_files DROP CONSTRAINT uq_compose_files_repository_branch_path'))
+  connection.execute(text('ALTER TABLE compose_files ADD CONSTRAINT uq_compose_files_repository_path UNIQUE (repository_id, path)'))
+  return ["uq_compose_files_repository_path"]
+  
 # Example usage:
 
+@metrics.timed("db.add_or_update_github_repository")
 def add_or_update_github_repository(session: Session,
                                     developer: Optional[str] = None,
                                     name: Optional[str] = None,
@@ -108,18 +294,20 @@ def add_or_update_github_repository(session: Session,
                                     about: Optional[str] = None,
                                     created_at: Optional[datetime] = None,
                                     last_commit: Optional[datetime] = None,
-                                    num_stars: int = 0,
-                                    num_issues: int = 0,
-                                    num_containers: int = 0,
+                                    num_stars: Optional[int] = None,
+                                    num_issues: Optional[int] = None,
+                                    num_containers: Optional[int] = None,
                                     docker_images_used: Optional[Any] = None,
-                                    has_readme: bool = True,
-                                    useful_traffic: bool = True,
-                                    num_packets: int = 0,
+                                    has_readme: Optional[bool] = None,
+                                    useful_traffic: Optional[bool] = None,
+                                    num_packets: Optional[int] = None,
                                     crawled_at: Optional[datetime] = None,
                                     updated_at: Optional[datetime] = None) -> GitHubRepository:
   """
   Adds a new GitHubRepository entry to the database. If an entry with the same url exists,
   updates its details with the provided arguments.
+  Arguments left at None are not touched on update and get the model defaults on insert, so re-crawling a
+  repository never overwrites what the enrichment (see pipeline.enrichment_stage) found out about it.
 
   Args:
     session (Session): SQLAlchemy session object.
@@ -129,13 +317,13 @@ def add_or_update_github_repository(session: Session,
     about (Optional[str]): Repository description/about text.
     created_at (Optional[datetime]): When the repository was created on GitHub.
     last_commit (Optional[datetime]): Timestamp of the last commit to the repository.
-    num_stars (int): Number of stars the repository has.
-    num_issues (int): Number of open issues.
-    num_containers (int): Number of containers defined in docker-compose files.
+    num_stars (Optional[int]): Number of stars the repository has.
+    num_issues (Optional[int]): Number of open issues.
+    num_containers (Optional[int]): Number of containers defined in docker-compose files.
     docker_images_used (Optional[Any]): JSON array of Docker images used in the repository.
-    has_readme (bool): Whether the repository has a README file.
-    useful_traffic (bool): Whether the repository shows signs of useful/active traffic.
-    num_packets (int): Number of network packets or traffic metrics.
+    has_readme (Optional[bool]): Whether the repository has a README file.
+    useful_traffic (Optional[bool]): Whether the repository shows signs of useful/active traffic.
+    num_packets (Optional[int]): Number of network packets or traffic metrics.
     crawled_at (Optional[datetime]): When this record was crawled/created.
     updated_at (Optional[datetime]): When this record was last updated.
 
@@ -178,6 +366,472 @@ def add_or_update_github_repository(session: Session,
     session.add(instance)
     # Don't commit here - let the caller handle it
     return instance
+
+
+# columns the bulk upsert is allowed to write; the primary key is always generated by the database
+_UPSERT_COLUMNS = [c.name for c in GitHubRepository.__table__.columns if not c.primary_key]
+
+def _merge_rows_by_url(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+  """
+  Collapses rows sharing the same url into one row, applying the same rule as the per-row path:
+  later non-None values overwrite earlier ones. PostgreSQL refuses to touch the same row twice
+  within one INSERT ... ON CONFLICT statement, so this has to happen before the chunk is sent.
+  The rows come back sorted by url: concurrent writers (e.g., parallel crawl jobs) then lock the
+  rows they share in the same order and cannot deadlock on each other.
+
+  Args:
+    rows (List[Dict[str, Any]]): repository dicts (keys are GitHubRepository column names)
+
+  Returns:
+    List[Dict[str, Any]]: one dict per url with None values dropped, sorted by url
+  """
+  merged: Dict[str, Dict[str, Any]] = {}
+  for row in rows:
+    url = row.get("url")
+    if not url:
+      raise ValueError("'url' must be provided for every row")
+    values = {k: v for k, v in row.items() if v is not None and k in _UPSERT_COLUMNS}
+    if url in merged:
+      merged[url].update(values)
+    else:
+      merged[url] = values
+  return [merged[url] for url in sorted(merged)]
+
+def _dialect_insert(session: Session):
+  """Returns the insert() construct supporting ON CONFLICT for the session's database"""
+  # the dialect modules are imported on first use, they are not needed to start up
+  dialect = session.get_bind().dialect.name
+  if dialect == "postgresql":
+    from sqlalchemy.dialects import postgresql
+    return postgresql.insert
+  if dialect == "sqlite":
+    from sqlalchemy.dialects import sqlite
+    return sqlite.insert
+  raise NotImplementedError(f"Bulk upsert is not supported for the '{dialect}' dialect")
+
+def _upsert_chunk(session: Session, rows: List[Dict[str, Any]]) -> None:
+  """
+  Writes one chunk of already merged rows with INSERT ... ON CONFLICT (url) DO UPDATE.
+  Rows carrying a different set of columns are sent as separate statements, so that columns a
+  row does not mention fall back to their model defaults on insert and are left untouched on update.
+  """
+  insert = _dialect_insert(session)
+  table = GitHubRepository.__table__
+  groups: Dict[tuple, List[Dict[str, Any]]] = {}
+  for row in rows:
+    groups.setdefault(tuple(sorted(row)), []).append(row)
+
+  for columns, group in groups.items():
+    stmt = insert(table).values(group)
+    # only the provided (non-None) columns overwrite, and updated_at is always bumped
+    update_set = {col: stmt.excluded[col] for col in columns if col not in ("url", "updated_at")}
+    update_set["updated_at"] = func.now()
+    stmt = stmt.on_conflict_do_update(index_elements=[table.c.url], set_=update_set)
+    session.execute(stmt)
+
+@metrics.timed("db.bulk_upsert_github_repositories")
+def bulk_upsert_github_repositories(session: Session,
+                                    rows: Iterable[Dict[str, Any]],
+                                    chunk_size: int = 500) -> int:
+  """
+  Batch counterpart of add_or_update_github_repository(). Instead of one SELECT per repository,
+  rows are written in chunks with a single INSERT ... ON CONFLICT (url) DO UPDATE statement per chunk.
+  The merge rule is the same: only non-None fields overwrite existing values and updated_at is always bumped.
+  Unlike the per-row path, no field defaults are injected - a field missing from a row is simply not touched.
+
+  Works on PostgreSQL and on SQLite (used as a local stand-in for benchmarks).
+
+  Args:
+    session (Session): SQLAlchemy session object.
+    rows (Iterable[Dict[str, Any]]): list or iterator of repository dicts, each having at least 'url'.
+    chunk_size (int): number of rows sent per statement (default: 500)
+
+  Returns:
+    int: number of unique repositories written
+  """
+  if chunk_size < 1:
+    raise ValueError("'chunk_size' must be at least 1")
+
+  written = 0
+  chunk: List[Dict[str, Any]] = []
+  for row in rows:
+    chunk.append(row)
+    if len(chunk) >= chunk_size:
+      merged = _merge_rows_by_url(chunk)
+      _upsert_chunk(session, merged)
+      written += len(merged)
+      chunk = []
+  if chunk:
+    merged = _merge_rows_by_url(chunk)
+    _upsert_chunk(session, merged)
+    written += len(merged)
+  # Don't commit here - let the caller handle it
+  return written
+
+@metrics.timed("db.get_existing_repository_urls")
+def get_existing_repository_urls(session: Session,
+                                 urls: Iterable[str],
+                                 chunk_size: int = 500) -> set:
+  """
+  Returns which of the given repository URLs are already in the database, one indexed IN query per chunk.
+  Called before an upsert, it tells the new repositories from the known ones.
+
+  Args:
+    session (Session): SQLAlchemy session object.
+    urls (Iterable[str]): canonical repository URLs
+    chunk_size (int): number of URLs sent per statement (default: 500)
+
+  Returns:
+    set: the URLs that exist
+  """
+  urls = list(dict.fromkeys(urls))
+  existing = set()
+  for start in range(0, len(urls), chunk_size):
+    chunk = urls[start:start + chunk_size]
+    existing.update(session.execute(select(GitHubRepository.url).where(GitHubRepository.url.in_(chunk))).scalars())
+  return existing
+
+@metrics.timed("db.bulk_add_compose_files")
+def bulk_add_compose_files(session: Session,
+                           files: Iterable[Dict[str, Any]],
+                           chunk_size: int = 500) -> int:
+  """
+  Registers compose files found by the crawl, one INSERT ... ON CONFLICT per chunk and kind of branch.
+  A file is a path in a repository, whatever branch or commit it was found on. Files already known are left
+  untouched, unless they were registered on a commit SHA (e.g., by code search) and now show up on a named
+  branch: then they move to that branch and are fetched again. Files of repositories that are not in the
+  database (yet) are skipped.
+
+  Args:
+    session (Session): SQLAlchemy session object.
+    files (Iterable[Dict[str, Any]]): dicts with 'repository_url', 'branch', 'path' and 'url'
+    chunk_size (int): number of files sent per statement (default: 500)
+
+  Returns:
+    int: number of files submitted for insertion
+  """
+  insert = _dialect_insert(session)
+  table = ComposeFile.__table__
+  submitted = 0
+  files = list(files)
+  for start in range(0, len(files), chunk_size):
+    chunk = files[start:start + chunk_size]
+    repository_urls = {f["repository_url"] for f in chunk}
+    repository_ids = dict(session.execute(select(GitHubRepository.url, GitHubRepository.id)
+                                          .where(GitHubRepository.url.in_(repository_urls))).all())
+    rows: Dict[tuple, Dict[str, Any]] = {}
+    for f in chunk:
+      repository_id = repository_ids.get(f["repository_url"])
+      if repository_id is None:
+        continue
+      known = rows.get((repository_id, f["path"]))
+      if known is not None and not (is_commit_sha(known["branch"]) and not is_commit_sha(f["branch"])):
+        continue
+      rows[(repository_id, f["path"])] = dict(repository_id=repository_id,
+                                              branch=f["branch"],
+                                              pinned=is_commit_sha(f["branch"]),
+                                              path=f["path"],
+                                              url=f["url"])
+    # sorted by the conflict key, so concurrent writers lock the rows in the same order
+    named = [row for _, row in sorted(rows.items()) if not row["pinned"]]
+    pinned = [row for _, row in sorted(rows.items()) if row["pinned"]]
+    conflict = [table.c.repository_id, table.c.path]
+    if named:
+      stmt = insert(table).values(named)
+      session.execute(stmt.on_conflict_do_update(index_elements=conflict,
+                                                 set_=dict(branch=stmt.excluded.branch,
+                                                           pinned=False,
+                                                           url=stmt.excluded.url,
+                                                           fetched_at=None),
+                                                 where=table.c.pinned.is_(True)))
+    if pinned:
+      session.execute(insert(table).values(pinned).on_conflict_do_nothing(index_elements=conflict))
+    submitted += len(rows)
+  # Don't commit here - let the caller handle it
+  return submitted
+
+@metrics.timed("db.get_compose_files_to_fetch")
+def get_compose_files_to_fetch(session: Session,
+                               fetched_before: Optional[datetime] = None,
+                               limit: Optional[int] = None,
+                               now: Optional[datetime] = None) -> List[ComposeFile]:
+  """
+  Returns the compose files that were never fetched, or (if fetched_before is given) not since then.
+  Files whose last fetch failed are left out until their retry_after, and come after the others.
+  Served by the index on compose_files.fetched_at.
+
+  Args:
+    session (Session): SQLAlchemy session object.
+    fetched_before (Optional[datetime]): also return files last fetched before this time
+    limit (Optional[int]): maximum number of files to return
+    now (Optional[datetime]): the current time (UTC) retry_after is compared with (default: now)
+  """
+  now = now if now is not None else get_current_utc_time()
+  condition = ComposeFile.fetched_at.is_(None)
+  if fetched_before is not None:
+    condition = condition | (ComposeFile.fetched_at < fetched_before)
+  condition = condition & (ComposeFile.retry_after.is_(None) | (ComposeFile.retry_after <= now))
+  query = (session.query(ComposeFile)
+           .filter(condition)
+           .order_by(func.coalesce(ComposeFile.fetch_attempts, 0), ComposeFile.id))
+  if limit is not None:
+    query = query.limit(limit)
+  return query.all()
+
+@metrics.timed("db.bulk_update_compose_files")
+def bulk_update_compose_files(session: Session, updates: List[Dict[str, Any]]) -> None:
+  """
+  Writes fetch results (content_hash, num_containers, docker_images, fetched_at, or the fetch_* columns and
+  retry_after of a failed fetch) of many compose files at once.
+
+  Args:
+    session (Session): SQLAlchemy session object.
+    updates (List[Dict[str, Any]]): one dict per file, with its 'id' and the columns to set
+  """
+  if updates:
+    session.execute(update(ComposeFile), updates)
+  # Don't commit here - let the caller handle it
+
+@metrics.timed("db.refresh_repository_compose_stats")
+def refresh_repository_compose_stats(session: Session, repository_ids: Iterable[int]) -> int:
+  """
+  Recomputes num_containers and docker_images_used of the given repositories from all of their
+  fetched compose files (containers are summed, images merged). A path counts once: should a database
+  created before files were keyed by path still hold it on several branches, the one on a named branch
+  (else the most recently fetched) is used.
+
+  Args:
+    session (Session): SQLAlchemy session object.
+    repository_ids (Iterable[int]): the repositories to refresh
+
+  Returns:
+    int: number of repositories updated
+  """
+  repository_ids = list(set(repository_ids))
+  if not repository_ids:
+    return 0
+  files = session.execute(select(ComposeFile.repository_id, ComposeFile.path, ComposeFile.branch,
+                                 ComposeFile.fetched_at, ComposeFile.num_containers, ComposeFile.docker_images)
+                          .where(ComposeFile.repository_id.in_(repository_ids),
+                                 ComposeFile.content_hash.is_not(None))).all()
+  latest: Dict[tuple, Any] = {}
+  for file in files:
+    rank = (not is_commit_sha(file.branch), file.fetched_at or datetime.min)
+    if (file.repository_id, file.path) not in latest or rank > latest[(file.repository_id, file.path)][0]:
+      latest[(file.repository_id, file.path)] = (rank, file)
+  stats: Dict[int, Dict[str, Any]] = {}
+  for _, file in latest.values():
+    entry = stats.setdefault(file.repository_id, dict(num_containers=0, images=set()))
+    entry["num_containers"] += file.num_containers or 0
+    entry["images"].update(file.docker_images or [])
+  updates = [dict(id=repository_id,
+                  num_containers=entry["num_containers"],
+                  docker_images_used=sorted(entry["images"]),
+                  updated_at=datetime.now())
+             for repository_id, entry in stats.items()]
+  if updates:
+    session.execute(update(GitHubRepository), updates)
+  # Don't commit here - let the caller handle it
+  return len(updates)
+
+@metrics.timed("db.get_repositories_to_enrich")
+def get_repositories_to_enrich(session: Session,
+                               fetched_before: Optional[datetime] = None,
+                               limit: Optional[int] = None) -> List[tuple]:
+  """
+  Returns the repositories whose GitHub metadata was never fetched, or (if fetched_before is given) not since then.
+  Served by the index on github_repositories.metadata_fetched_at.
+
+  Args:
+    session (Session): SQLAlchemy session object.
+    fetched_before (Optional[datetime]): also return repositories last enriched before this time
+    limit (Optional[int]): maximum number of repositories to return
+
+  Returns:
+    List[tuple]: (id, developer, name, num_stars, metadata_fetched_at) of the repositories, the last two being the
+                 values of the previous fetch (for the star velocity)
+  """
+  condition = GitHubRepository.metadata_fetched_at.is_(None)
+  if fetched_before is not None:
+    condition = condition | (GitHubRepository.metadata_fetched_at < fetched_before)
+  query = (select(GitHubRepository.id, GitHubRepository.developer, GitHubRepository.name,
+                  GitHubRepository.num_stars, GitHubRepository.metadata_fetched_at)
+           .where(condition).order_by(GitHubRepository.id))
+  if limit is not None:
+    query = query.limit(limit)
+  return [tuple(row) for row in session.execute(query).all()]
+
+def iter_refresh_candidates(session: Session,
+                            stale_before: datetime,
+                            page_size: int = 1000) -> Iterable[tuple]:
+  """
+  Streams the repositories enriched before stale_before, least recently enriched first, a page at a time with
+  keyset pagination over (metadata_fetched_at, id): every page is a range scan of the index on
+  metadata_fetched_at, so neither the table nor a deep OFFSET is ever read at once.
+  Repositories that were never enriched are not included (see get_repositories_to_enrich()).
+
+  Args:
+    session (Session): SQLAlchemy session object.
+    stale_before (datetime): only repositories enriched before this time
+    page_size (int): rows fetched per query
+
+  Yields:
+    tuple: (id, developer, name, num_stars, metadata_fetched_at, last_commit, star_velocity)
+  """
+  repo = GitHubRepository
+  columns = (repo.id, repo.developer, repo.name, repo.num_stars, repo.metadata_fetched_at,
+             repo.last_commit, repo.star_velocity)
+  last_fetched_at, last_id = None, None
+  while True:
+    query = select(*columns).where(repo.metadata_fetched_at < stale_before)
+    if last_id is not None:
+      # the redundant >= gives the planner an index range to start from instead of filtering the OR from the top
+      query = query.where(repo.metadata_fetched_at >= last_fetched_at,
+                          (repo.metadata_fetched_at > last_fetched_at) | (repo.id > last_id))
+    rows = session.execute(query.order_by(repo.metadata_fetched_at, repo.id).limit(page_size)).all()
+    for row in rows:
+      yield tuple(row)
+    if len(rows) < page_size:
+      return
+    last_id, last_fetched_at = rows[-1][0], rows[-1][4]
+
+@metrics.timed("db.bulk_update_repository_metadata")
+def bulk_update_repository_metadata(session: Session, updates: List[Dict[str, Any]]) -> None:
+  """
+  Writes GitHub metadata (num_stars, num_issues, star_velocity, created_at, last_commit, has_readme,
+  metadata_fetched_at) of many repositories at once.
+
+  Args:
+    session (Session): SQLAlchemy session object.
+    updates (List[Dict[str, Any]]): one dict per repository, with its 'id' and the columns to set
+  """
+  # rows with different column sets (e.g., a repository that was not found only gets metadata_fetched_at)
+  # go in separate executemany batches
+  groups: Dict[tuple, List[Dict[str, Any]]] = {}
+  for row in updates:
+    groups.setdefault(tuple(sorted(row)), []).append(row)
+  for group in groups.values():
+    session.execute(update(GitHubRepository), group)
+  # Don't commit here - let the caller handle it
+
+@metrics.timed("db.get_crawl_checkpoint")
+def get_crawl_checkpoint(session: Session, dork: str) -> Optional[CrawlCheckpoint]:
+  """
+  Returns the checkpoint of the given search crawl, or None if it was never started.
+
+  Args:
+    session (Session): SQLAlchemy session object.
+    dork (str): the search string (e.g., Google dork) of the crawl
+  """
+  return session.query(CrawlCheckpoint).filter_by(dork=dork).first()
+
+@metrics.timed("db.save_crawl_checkpoint")
+def save_crawl_checkpoint(session: Session,
+                          dork: str,
+                          last_page: int,
+                          last_page_url: Optional[str] = None,
+                          next_page_url: Optional[str] = None,
+                          page_hashes: Optional[list] = None,
+                          status: str = "running") -> CrawlCheckpoint:
+  """
+  Creates or overwrites the checkpoint of a search crawl.
+  It is meant to be written in the same transaction as the results of the pages it covers.
+
+  Args:
+    session (Session): SQLAlchemy session object.
+    dork (str): the search string (e.g., Google dork) of the crawl
+    last_page (int): 1-based index of the last page whose results are committed
+    last_page_url (Optional[str]): URL of that page
+    next_page_url (Optional[str]): URL to continue the crawl from, None if there is no next page
+    page_hashes (Optional[list]): hashes of the committed pages' results, in page order
+    status (str): running, finished or failed
+
+  Returns:
+    CrawlCheckpoint: the CrawlCheckpoint instance (added or updated)
+  """
+  instance = get_crawl_checkpoint(session, dork)
+  if instance is None:
+    instance = CrawlCheckpoint(dork=dork)
+    session.add(instance)
+  instance.last_page = last_page
+  instance.last_page_url = last_page_url
+  instance.next_page_url = next_page_url
+  instance.page_hashes = list(page_hashes) if page_hashes is not None else []
+  instance.status = status
+  # Don't commit here - let the caller handle it
+  return instance
+
+
+@metrics.timed("db.get_top_developers")
+def get_top_developers(session: Session,
+                       limit: int = 20,
+                       min_repositories: int = 2) -> List[tuple]:
+  """
+  Returns the users and organizations with the most collected repositories.
+
+  Args:
+    session (Session): SQLAlchemy session object.
+    limit (int): maximum number of developers to return
+    min_repositories (int): leave out developers with fewer repositories
+
+  Returns:
+    List[tuple]: (developer, number of repositories), most repositories first
+  """
+  count = func.count(GitHubRepository.id)
+  query = (select(GitHubRepository.developer, count)
+           .group_by(GitHubRepository.developer)
+           .having(count >= min_repositories)
+           .order_by(count.desc(), GitHubRepository.developer)
+           .limit(limit))
+  return [tuple(row) for row in session.execute(query).all()]
+
+@metrics.timed("db.get_about_texts")
+def get_about_texts(session: Session, limit: Optional[int] = 20000) -> List[str]:
+  """
+  Returns the non-empty about texts of the most recently crawled repositories.
+
+  Args:
+    session (Session): SQLAlchemy session object.
+    limit (Optional[int]): maximum number of texts to return (None: all of them)
+
+  Returns:
+    List[str]: the about texts, newest repository first
+  """
+  query = (select(GitHubRepository.about)
+           .where(GitHubRepository.about.is_not(None), GitHubRepository.about != "")
+           .order_by(GitHubRepository.id.desc()))
+  if limit is not None:
+    query = query.limit(limit)
+  return list(session.execute(query).scalars())
+
+@metrics.timed("db.get_collection_stats")
+def get_collection_stats(session: Session) -> Dict[str, Any]:
+  """
+  Counts what the collector has gathered so far, with a handful of aggregate queries.
+
+  Args:
+    session (Session): SQLAlchemy session object.
+
+  Returns:
+    Dict[str, Any]: repositories (total, with parsed containers and with GitHub metadata), compose files (total and not fetched yet)
+                    and crawl checkpoints per status
+  """
+  repositories = session.execute(select(func.count(GitHubRepository.id))).scalar_one()
+  with_containers = session.execute(select(func.count(GitHubRepository.id))
+                                    .where(GitHubRepository.num_containers > 0)).scalar_one()
+  enriched = session.execute(select(func.count(GitHubRepository.id))
+                             .where(GitHubRepository.metadata_fetched_at.is_not(None))).scalar_one()
+  compose_files = session.execute(select(func.count(ComposeFile.id))).scalar_one()
+  compose_pending = session.execute(select(func.count(ComposeFile.id))
+                                    .where(ComposeFile.fetched_at.is_(None))).scalar_one()
+  crawls = dict(session.execute(select(CrawlCheckpoint.status, func.count(CrawlCheckpoint.id))
+                                .group_by(CrawlCheckpoint.status)).all())
+  return dict(repositories=repositories,
+              repositories_with_containers=with_containers,
+              repositories_enriched=enriched,
+              compose_files=compose_files,
+              compose_files_pending=compose_pending,
+              crawls=crawls)
   
 
 if __name__ == "__main__":
@@ -4,8 +4,9 @@ Database models for the GitHub repository collector.
 This module contains SQLAlchemy models for storing collected GitHub repository data.
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, JSON
+from sqlalchemy import Column, Integer, Float, String, DateTime, Boolean, Text, JSON, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
 
@@ -21,6 +22,12 @@ class GitHubRepository(Base):
   """
   
   __tablename__ = 'github_repositories'
+  __table_args__ = (
+    # lookups by owner/repository name, e.g., when joining data from the GitHub API
+    Index('ix_github_repositories_developer_name', 'developer', 'name'),
+    # "which repositories have no GitHub metadata (or old metadata)" without a full table scan, oldest first
+    Index('ix_github_repositories_metadata_fetched_at', 'metadata_fetched_at'),
+  )
   
   # Primary key
   id = Column(Integer, primary_key=True, autoincrement=True, comment="Unique identifier for the repository record")
@@ -38,6 +45,7 @@ class GitHubRepository(Base):
   # Repository statistics
   num_stars = Column(Integer, default=0, nullable=True, comment="Number of stars the repository has")
   num_issues = Column(Integer, default=0, nullable=True, comment="Number of open issues")
+  star_velocity = Column(Float, nullable=True, comment="Stars gained per day between the last two metadata fetches, NULL until fetched twice")
   
   # Docker/Container related information
   num_containers = Column(Integer, default=0, nullable=True, comment="Number of containers defined in docker-compose files")
@@ -51,8 +59,11 @@ class GitHubRepository(Base):
   num_packets = Column(Integer, default=0, nullable=True, comment="Number of network packets or traffic metrics")
   
   # Audit fields
+  metadata_fetched_at = Column(DateTime, nullable=True, comment="When stars, issues, created_at, last_commit and has_readme were last fetched from the GitHub API (UTC), NULL if never")
   crawled_at = Column(DateTime, default=func.now(), nullable=True, comment="When this record was crawled/created")
   updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), nullable=True, comment="When this record was last updated")
+
+  compose_files = relationship("ComposeFile", back_populates="repository", cascade="all, delete-orphan", passive_deletes=True)
   
   def __repr__(self) -> str:
       """String representation of the GitHubRepository object."""
@@ -67,11 +78,13 @@ class GitHubRepository(Base):
           f"last_commit={self.last_commit}, "
           f"num_stars={self.num_stars}, "
           f"num_issues={self.num_issues}, "
+          f"star_velocity={self.star_velocity}, "
           f"num_containers={self.num_containers}, "
           f"docker_images_used={self.docker_images_used}, "
           f"has_readme={self.has_readme}, "
           f"useful_traffic={self.useful_traffic}, "
           f"num_packets={self.num_packets}, "
+          f"metadata_fetched_at={self.metadata_fetched_at}, "
           f"crawled_at={self.crawled_at}, "
           f"updated_at={self.updated_at}"
           f")>"
@@ -92,4 +105,90 @@ class GitHubRepository(Base):
           f"Crawled: {self.crawled_at}, \n"
           f"Updated: {self.updated_at}"
       )
-  
\ No newline at end of file
+  
+
+
+class ComposeFile(Base):
+  """
+  Model for storing the docker-compose files found in a GitHub repository.
+
+  A repository can have several compose files (in different directories), each of them is a separate row.
+  The same path found on several branches or commits is one file, branch and url tell where it was found
+  (a named branch rather than a commit SHA). content_hash and fetched_at tell which files were never fetched
+  or have changed; fetch_attempts, fetch_error and retry_after keep files that fail (deleted repositories, moved
+  branches) from being fetched again on every run.
+  """
+
+  __tablename__ = 'compose_files'
+  __table_args__ = (
+    UniqueConstraint('repository_id', 'path', name='uq_compose_files_repository_path'),
+    # "which files have not been fetched (for a while)" without a full table scan
+    Index('ix_compose_files_fetched_at', 'fetched_at'),
+    # the same file content shows up in many forks
+    Index('ix_compose_files_content_hash', 'content_hash'),
+  )
+
+  id = Column(Integer, primary_key=True, autoincrement=True, comment="Unique identifier for the compose file record")
+  repository_id = Column(Integer, ForeignKey('github_repositories.id', ondelete='CASCADE'), nullable=False, comment="The repository the file belongs to")
+  branch = Column(String(255), nullable=False, comment="Branch (or tag/commit) the file was found on (e.g., 'master'), a named branch is preferred over a commit SHA")
+  pinned = Column(Boolean, nullable=True, comment="Whether branch is a commit SHA (libs.github_url.is_commit_sha), set with branch")
+  path = Column(String(1000), nullable=False, comment="Path of the file within the repository (e.g., 'docker-compose/docker-compose.yml')")
+  url = Column(Text, nullable=False, comment="Full GitHub URL of the file as found by the search")
+  content_hash = Column(String(64), nullable=True, comment="SHA-256 of the file content at the last fetch, NULL if never fetched")
+  num_containers = Column(Integer, nullable=True, comment="Number of containers defined in this file")
+  docker_images = Column(JSON, nullable=True, comment="JSON array of Docker images used in this file")
+  fetched_at = Column(DateTime, nullable=True, comment="When the file content was last fetched (UTC), NULL if never fetched")
+  fetch_attempts = Column(Integer, nullable=True, comment="Failed fetches in a row, NULL since the last successful fetch")
+  fetch_error = Column(Text, nullable=True, comment="Why the last fetch failed (e.g., a 404), NULL if it did not fail")
+  retry_after = Column(DateTime, nullable=True, comment="A file whose fetch failed is not fetched again before this time (UTC)")
+  created_at = Column(DateTime, default=func.now(), nullable=True, comment="When this record was created")
+
+  repository = relationship("GitHubRepository", back_populates="compose_files")
+
+  def __repr__(self) -> str:
+      """String representation of the ComposeFile object."""
+      return (
+          f"<ComposeFile("
+          f"id={self.id}, "
+          f"repository_id={self.repository_id}, "
+          f"branch='{self.branch}', "
+          f"path='{self.path}', "
+          f"content_hash='{self.content_hash}', "
+          f"num_containers={self.num_containers}, "
+          f"fetched_at={self.fetched_at}"
+          f")>"
+      )
+
+
+class CrawlCheckpoint(Base):
+  """
+  Model for storing the progress of a paginated search crawl (e.g., a Google dork).
+
+  A crawl that dies half way (CAPTCHA, timeout, browser crash) can resume from next_page_url
+  instead of starting over from page 1 and paying for the AgentQL calls of pages it already has.
+  """
+
+  __tablename__ = 'crawl_checkpoints'
+
+  id = Column(Integer, primary_key=True, autoincrement=True, comment="Unique identifier for the checkpoint record")
+  dork = Column(String(500), nullable=False, unique=True, comment="The search string (e.g., Google dork) being crawled")
+  last_page = Column(Integer, default=0, nullable=False, comment="1-based index of the last page whose results are committed")
+  last_page_url = Column(Text, nullable=True, comment="URL of the last committed page")
+  next_page_url = Column(Text, nullable=True, comment="URL of the page to continue with, NULL if there is no next page")
+  page_hashes = Column(JSON, nullable=True, comment="JSON array of the SHA-256 hashes of the committed pages' results, in page order")
+  status = Column(String(20), default='running', nullable=False, comment="running, finished, rate_limited or blocked (resumed by the next run), failed")
+  created_at = Column(DateTime, default=func.now(), nullable=True, comment="When the crawl was started")
+  updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), nullable=True, comment="When the checkpoint was last written")
+
+  def __repr__(self) -> str:
+      """String representation of the CrawlCheckpoint object."""
+      return (
+          f"<CrawlCheckpoint("
+          f"id={self.id}, "
+          f"dork='{self.dork}', "
+          f"last_page={self.last_page}, "
+          f"next_page_url='{self.next_page_url}', "
+          f"status='{self.status}', "
+          f"updated_at={self.updated_at}"
+          f")>"
+      )
@@ -0,0 +1,328 @@
+import os
+import sys
+import time
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Optional, Dict, Any, NamedTuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+current_dir = os.path.abspath(os.path.dirname(__file__))
+src_dir= os.path.abspath(os.path.join(current_dir, '..'))
+# set sys_path to also look for libs elsewhere
+sys.path.append(src_dir)
+from libs.logger import CustomLogger
+from libs.metrics import metrics
+
+GITHUB_API_URL = "https://api.github.com"
+
+
+class RateLimitExceeded(Exception):
+  """The rate limit of a resource is used up and resets later than the caller is willing to wait"""
+  def __init__(self, resource: str, reset_in: float):
+    super().__init__(f"GitHub '{resource}' rate limit exhausted, it resets in {reset_in:.0f}s")
+    self.resource = resource
+    self.reset_in = reset_in
+
+
+class _Budget:
+  """What is known about one rate limit resource (core, graphql, search, ...)"""
+  def __init__(self):
+    self.remaining: Optional[int] = None # None until the first response tells
+    self.reset_at = 0.0 # epoch seconds
+    self.blocked_until = 0.0 # epoch seconds, set by Retry-After / secondary limits
+
+
+class RateLimiter:
+  """
+  Client-side view of GitHub's rate limits, shared by the worker threads of a client.
+
+  Every response updates the remaining budget of its resource (X-RateLimit-* headers, or the rateLimit
+  object of a GraphQL response); acquire() takes from it before a request is sent, so parallel workers
+  do not all fire the last few requests. Once the budget (minus reserve) is used up, acquire() sleeps until
+  the reset, unless that is further away than max_wait, in which case it raises RateLimitExceeded so the
+  caller can stop and leave the rest for the next run. Retry-After (secondary limits, abuse detection)
+  blocks the resource the same way.
+  """
+  def __init__(self, reserve: int = 0, max_wait: float = 900.0):
+    """
+      Args:
+        reserve (int): requests of every resource left for others (e.g., other tools using the same token)
+        max_wait (float): seconds acquire() is willing to sleep for a reset
+    """
+    self.logger = CustomLogger(self.__class__.__name__)
+    self.reserve = reserve
+    self.max_wait = max_wait
+    self.budgets: Dict[str, _Budget] = {}
+    self.waited = 0.0
+    self._lock = threading.Lock()
+
+  def _budget(self, resource: str) -> _Budget:
+    return self.budgets.setdefault(resource, _Budget())
+
+  def acquire(self, resource: str, cost: int = 1) -> None:
+    """Blocks until cost requests of the resource may be sent"""
+    while True:
+      with self._lock:
+        budget = self._budget(resource)
+        now = time.time()
+        if budget.blocked_until > now:
+          wait = budget.blocked_until - now
+        elif budget.remaining is None or budget.remaining - cost >= self.reserve:
+          if budget.remaining is not None:
+            budget.remaining -= cost
+          return
+        elif budget.reset_at <= now:
+          # the window has reset, the next response tells the new budget
+          budget.remaining = None
+          continue
+        else:
+          wait = budget.reset_at - now + 1
+      if wait > self.max_wait:
+        raise RateLimitExceeded(resource, wait)
+      self.logger.warning(f"GitHub '{resource}' rate limit reached, waiting {wait:.0f}s")
+      metrics.observe("github.rate_limit_wait", wait)
+      self.waited += wait
+      time.sleep(wait)
+
+  def release(self, resource: str, cost: int = 1) -> None:
+    """Gives back what acquire() took for a request that did not count (a 304 answer to a conditional request)"""
+    with self._lock:
+      budget = self._budget(resource)
+      if budget.remaining is not None:
+        budget.remaining += cost
+
+  def update(self, resource: str, remaining: Optional[int], reset_at: Optional[float]) -> None:
+    """Records the budget a response reported (reset_at in epoch seconds)"""
+    if remaining is None:
+      return
+    with self._lock:
+      budget = self._budget(resource)
+      if reset_at is not None and reset_at > budget.reset_at:
+        # a new window: the server's number is the truth
+        budget.remaining, budget.reset_at = remaining, reset_at
+      else:
+        # responses arrive out of order, the lowest number is the most recent
+        budget.remaining = remaining if budget.remaining is None else min(budget.remaining, remaining)
+
+  def update_from_headers(self, headers, default_resource: str) -> str:
+    """Records the X-RateLimit-* headers of a response, returns the resource they are about"""
+    resource = headers.get("X-RateLimit-Resource", default_resource)
+    remaining, reset = headers.get("X-RateLimit-Remaining"), headers.get("X-RateLimit-Reset")
+    if remaining is not None and remaining.isdigit():
+      self.update(resource, int(remaining), float(reset) if reset and reset.isdigit() else None)
+    return resource
+
+  def block(self, resource: str, seconds: float) -> None:
+    """Stops requests of the resource for the given time (Retry-After)"""
+    with self._lock:
+      budget = self._budget(resource)
+      budget.blocked_until = max(budget.blocked_until, time.time() + seconds)
+
+  def stats(self) -> Dict[str, Any]:
+    with self._lock:
+      return dict(waited=round(self.waited, 1),
+                  **{f"{resource}_remaining": budget.remaining for resource, budget in self.budgets.items()})
+
+
+class ETagCache:
+  """
+  SQLite cache of GitHub API responses keyed by URL, with their ETag. A cached URL is requested with
+  If-None-Match, and a 304 answer (which does not count against the rate limit) is served from the cache.
+  """
+  def __init__(self, path: str = "/tmp/github-etag-cache.sqlite"):
+    self.path = path
+    self._lock = threading.Lock()
+    self.connection = sqlite3.connect(path, check_same_thread=False)
+    self.connection.execute("CREATE TABLE IF NOT EXISTS responses (url TEXT PRIMARY KEY, etag TEXT NOT NULL, body TEXT NOT NULL)")
+    self.connection.commit()
+
+  def get(self, url: str) -> Optional[tuple]:
+    """(etag, decoded body) of a cached response, or None"""
+    with self._lock:
+      row = self.connection.execute("SELECT etag, body FROM responses WHERE url = ?", (url,)).fetchone()
+    return (row[0], json.loads(row[1])) if row else None
+
+  def put(self, url: str, etag: str, body: Any) -> None:
+    with self._lock:
+      self.connection.execute("INSERT OR REPLACE INTO responses (url, etag, body) VALUES (?, ?, ?)",
+                              (url, etag, json.dumps(body)))
+      self.connection.commit()
+
+  def close(self) -> None:
+    with self._lock:
+      self.connection.close()
+
+
+class ApiResponse(NamedTuple):
+  """A GitHub REST response"""
+  status: int # HTTP status; 304 answers are returned as the cached 200
+  data: Any # decoded JSON body, None for 404
+  from_cache: bool = False # served from the ETag cache after a 304
+
+
+class GitHubApiClient:
+  """
+  Thread-safe GitHub REST and GraphQL client: one pooled keep-alive session sized for the worker threads,
+  conditional requests through an ETagCache, and a RateLimiter every request goes through. Rate limited
+  answers (403/429 with an exhausted budget or a Retry-After) are retried after the wait.
+  The API URL can point to a local mock (see benchmarks/github_api_server.py).
+
+  Example:
+    client = GitHubApiClient.from_env()
+    repo = client.get("/repos/cslev/dockerized_appcollector").data
+  """
+  def __init__(self,
+               token: Optional[str] = None,
+               api_url: str = GITHUB_API_URL,
+               pool_size: int = 8,
+               timeout: int = 30,
+               etag_cache: Optional[ETagCache] = None,
+               rate_limiter: Optional[RateLimiter] = None,
+               max_retries: int = 3):
+    """
+      Args:
+        token (str): GitHub token (without one only the REST API is usable, at 60 requests/hour)
+        api_url (str): REST API root, GraphQL is <api_url>/graphql
+        pool_size (int): connections kept open, i.e., the number of threads using the client at the same time
+        timeout (int): seconds per request
+        etag_cache (ETagCache): cache for conditional requests (default: none)
+        rate_limiter (RateLimiter): shared rate limit state (default: a new one)
+        max_retries (int): attempts of a rate limited or failed (5xx) request before giving up
+    """
+    self.logger = CustomLogger(self.__class__.__name__)
+    self.token = token
+    self.api_url = api_url.rstrip("/")
+    self.timeout = timeout
+    self.etag_cache = etag_cache
+    self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter()
+    self.max_retries = max_retries
+    self.requests = 0
+    self.not_modified = 0
+    self._lock = threading.Lock()
+    self.session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=2)
+    self.session.mount("https://", adapter)
+    self.session.mount("http://", adapter)
+    self.session.headers.update({"Accept": "application/vnd.github+json", "X-GitHub-Api-Version": "2022-11-28"})
+    if token:
+      self.session.headers["Authorization"] = f"Bearer {token}"
+
+  @classmethod
+  def from_env(cls, pool_size: int = 8) -> "GitHubApiClient":
+    """
+    Builds a client from GITHUB_TOKEN, GITHUB_API_URL (default: the public API), GITHUB_ETAG_CACHE
+    (SQLite file of the ETag cache, default: /tmp/github-etag-cache.sqlite, empty: no cache)
+    and GITHUB_RATE_LIMIT_MAX_WAIT (seconds to wait for a rate limit reset, default: 900)
+    """
+    cache_path = os.getenv("GITHUB_ETAG_CACHE", "/tmp/github-etag-cache.sqlite")
+    return cls(token=os.getenv("GITHUB_TOKEN") or None,
+               api_url=os.getenv("GITHUB_API_URL", GITHUB_API_URL),
+               pool_size=pool_size,
+               etag_cache=ETagCache(cache_path) if cache_path else None,
+               rate_limiter=RateLimiter(max_wait=float(os.getenv("GITHUB_RATE_LIMIT_MAX_WAIT", 900))))
+
+  def _count(self, not_modified: bool = False) -> None:
+    with self._lock:
+      self.requests += 1
+      if not_modified:
+        self.not_modified += 1
+
+  def _retry_wait(self, response, resource: str, attempt: int) -> Optional[float]:
+    """Seconds to wait before retrying a response, None if it is not worth retrying"""
+    if response.status_code not in (403, 429) and response.status_code < 500:
+      return None
+    retry_after = response.headers.get("Retry-After", "")
+    if retry_after.isdigit():
+      return float(retry_after)
+    if response.status_code in (403, 429) and response.headers.get("X-RateLimit-Remaining") == "0":
+      # the limiter knows the budget is gone, acquire() waits for the reset
+      return 0.0
+    if response.status_code >= 500:
+      return float(2 ** attempt)
+    return None
+
+  def _send(self, method: str, url: str, resource: str, **kwargs) -> requests.Response:
+    """Sends a request through the rate limiter, retrying rate limited and failed answers"""
+    for attempt in range(self.max_retries):
+      self.rate_limiter.acquire(resource)
+      with metrics.timer(f"github.{resource}_request"):
+        response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+      self._count(not_modified=response.status_code == 304)
+      if response.status_code == 304:
+        self.rate_limiter.release(resource)
+      resource = self.rate_limiter.update_from_headers(response.headers, resource)
+      wait = self._retry_wait(response, resource, attempt)
+      if wait is None or attempt == self.max_retries - 1:
+        return response
+      self.logger.warning(f"{method} {url} answered {response.status_code}, retrying in {wait:.0f}s")
+      if wait:
+        self.rate_limiter.block(resource, wait)
+    return response
+
+  def get(self, path: str, params: Optional[Dict[str, Any]] = None, resource: str = "core") -> ApiResponse:
+    """
+    GET of a REST resource, conditional if the URL is in the ETag cache.
+
+    Args:
+      path (str): path below the API URL, e.g., /repos/owner/name
+      params (Dict[str, Any], optional): query parameters
+      resource (str): rate limit resource the request counts against (core, search, ...)
+
+    Returns:
+      ApiResponse: status, decoded body (None for a 404) and whether it came from the cache
+
+    Raises:
+      requests.HTTPError: for error answers other than 404
+      RateLimitExceeded: if the rate limit resets later than the limiter's max_wait
+    """
+    url = f"{self.api_url}{path}"
+    cache_key = requests.Request("GET", url, params=params).prepare().url
+    cached = self.etag_cache.get(cache_key) if self.etag_cache is not None else None
+    headers = {"If-None-Match": cached[0]} if cached else {}
+    response = self._send("GET", url, resource, params=params, headers=headers)
+    if response.status_code == 304 and cached:
+      metrics.count("github.not_modified")
+      return ApiResponse(status=200, data=cached[1], from_cache=True)
+    if response.status_code == 404:
+      return ApiResponse(status=404, data=None)
+    response.raise_for_status()
+    data = response.json()
+    etag = response.headers.get("ETag")
+    if etag and self.etag_cache is not None:
+      self.etag_cache.put(cache_key, etag, data)
+    return ApiResponse(status=response.status_code, data=data)
+
+  def graphql(self, query: str, variables: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Runs a GraphQL query (needs a token). If the query selects rateLimit { remaining resetAt },
+    the limiter learns the GraphQL budget from it as well.
+
+    Returns:
+      Dict[str, Any]: the whole response: data (None for the parts that failed) and errors, if any
+
+    Raises:
+      requests.HTTPError: if the request itself failed
+      RateLimitExceeded: if the rate limit resets later than the limiter's max_wait
+    """
+    if not self.token:
+      raise ValueError("The GitHub GraphQL API needs a token (GITHUB_TOKEN)")
+    response = self._send("POST", f"{self.api_url}/graphql", "graphql", json=dict(query=query, variables=variables or {}))
+    response.raise_for_status()
+    payload = response.json()
+    rate_limit = (payload.get("data") or {}).get("rateLimit")
+    if rate_limit and rate_limit.get("resetAt"):
+      reset_at = datetime.fromisoformat(rate_limit["resetAt"].replace("Z", "+00:00")).timestamp()
+      self.rate_limiter.update("graphql", rate_limit.get("remaining"), reset_at)
+    return payload
+
+  def stats(self) -> Dict[str, Any]:
+    return dict(requests=self.requests, not_modified=self.not_modified, **self.rate_limiter.stats())
+
+  def close(self) -> None:
+    self.session.close()
+    if self.etag_cache is not None:
+      self.etag_cache.close()
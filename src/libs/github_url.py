@@ -0,0 +1,257 @@
+"""
+Helpers for turning GitHub file URLs found by the search engine into repository identifiers.
+"""
+import re
+from typing import Optional, NamedTuple, Iterable, List, Dict, Any
+
+
+def extract_github_project_url(full_url: str) -> tuple[str, str, str]:
+  """
+  Extract the GitHub project URL, developer, and name from a full GitHub file URL using simple string splitting.
+
+  Example:
+  "https://github.com/blockscout/blockscout/blob/master/docker-compose/docker-compose.yml"
+  -> ("blockscout", "blockscout", "https://github.com/blockscout/blockscout")
+
+  Args:
+    full_url (str): The full GitHub URL
+
+  Returns:
+    tuple[str, str, str]: A tuple containing (developer, name, project_url)
+                          developer is the GitHub username or organization (e.g., "blockscout")
+                          name is the repository name (e.g., "blockscout")
+                          project_url is the extracted project URL, or the original URL if not a GitHub URL
+  """
+  if not full_url.startswith("https://github.com/"):
+    # If not a GitHub URL, return empty developer, empty name, and original URL
+    return ("", "", full_url)
+
+  # Split by '/' and take first 5 parts: ['https:', '', 'github.com', 'owner', 'repo']
+  parts = full_url.split('/')
+  if len(parts) >= 5:
+    project_url = '/'.join(parts[:5])  # "https://github.com/owner/repo"
+    developer = parts[3]  # "owner"
+    name = parts[4]  # "repo"
+    return (developer, name, project_url)
+  else:
+    return ("", "", full_url)
+
+def github_raw_url(full_url: str) -> str:
+  """
+  Convert a GitHub file URL into the URL of the raw file content.
+
+  Example:
+  "https://github.com/blockscout/blockscout/blob/master/docker-compose/docker-compose.yml"
+  -> "https://raw.githubusercontent.com/blockscout/blockscout/master/docker-compose/docker-compose.yml"
+
+  Args:
+    full_url (str): The full GitHub file URL (blob, raw or raw.githubusercontent.com)
+
+  Returns:
+    str: the raw content URL, or the original URL if it does not point to a file on GitHub
+  """
+  if full_url.startswith("https://raw.githubusercontent.com/"):
+    return full_url
+  if not full_url.startswith("https://github.com/"):
+    return full_url
+
+  # ['https:', '', 'github.com', 'owner', 'repo', 'blob', 'branch', 'path', ...]
+  parts = full_url.split('#')[0].split('?')[0].split('/')
+  if len(parts) >= 8 and parts[5] in ("blob", "raw"):
+    return '/'.join(["https://raw.githubusercontent.com"] + parts[3:5] + parts[6:])
+  return full_url
+
+def extract_github_file_location(full_url: str) -> Optional[tuple[str, str, str, str, str]]:
+  """
+  Extract the repository and the location of a file within it from a full GitHub file URL.
+
+  Example:
+  "https://github.com/blockscout/blockscout/blob/master/docker-compose/docker-compose.yml"
+  -> ("blockscout", "blockscout", "https://github.com/blockscout/blockscout", "master", "docker-compose/docker-compose.yml")
+
+  Args:
+    full_url (str): The full GitHub file URL (blob or raw)
+
+  Returns:
+    tuple[str, str, str, str, str] or None: (developer, name, project_url, branch, path),
+                                            or None if the URL does not point to a file on GitHub
+  """
+  if not full_url.startswith("https://github.com/"):
+    return None
+
+  # ['https:', '', 'github.com', 'owner', 'repo', 'blob', 'branch', 'path', ...]
+  parts = full_url.split('#')[0].split('?')[0].split('/')
+  if len(parts) >= 8 and parts[5] in ("blob", "raw") and parts[-1]:
+    developer, name, project_url = extract_github_project_url(full_url)
+    return (developer, name, project_url, parts[6], '/'.join(parts[7:]))
+  return None
+
+
+# Canonical form of the GitHub URLs found by the search engine
+
+# One line of a newline-joined batch of URLs: github.com/<owner>/<repo>[/blob|raw/<branch>/<path>] or
+# raw.githubusercontent.com/<owner>/<repo>/<branch>/<path>, any case, with or without scheme/www.
+# Lines that are not GitHub URLs still match (with empty groups), so there is exactly one match per input URL.
+_GITHUB_URL_BATCH_RE = re.compile(r"^[ \t]*(?:(?:https?://)?(?:www\.)?"
+                                  r"(?:github\.com/([^/?#\s]+)/([^/?#\s]+)(?:/(?:blob|raw)/([^/?#\s]+)/([^?#\s]+))?"
+                                  r"|raw\.githubusercontent\.com/([^/?#\s]+)/([^/?#\s]+)/([^/?#\s]+)/([^?#\s]+))"
+                                  r"[^\n]*|[^\n]*)$",
+                                  re.IGNORECASE | re.MULTILINE)
+# first path segments of github.com that are not user or organization names
+_RESERVED_OWNERS = frozenset(("orgs", "topics", "features", "marketplace", "search", "settings", "sponsors",
+                              "collections", "apps", "login", "notifications", "explore", "about", "enterprise"))
+
+
+def _parse_github_urls(urls: List[str]) -> List[Optional[tuple]]:
+  """
+  Parses a batch of URLs with a single regex pass over the newline-joined batch (the per-URL work left
+  in Python is a few comparisons).
+
+  Returns:
+    List[Optional[tuple]]: (owner, name, branch, path) per URL, owner and name as spelled in the URL,
+                           branch and path None for repository URLs; None for non-GitHub URLs
+  """
+  if not urls:
+    return []
+  matches = _GITHUB_URL_BATCH_RE.findall("\n".join(urls))
+  if len(matches) != len(urls):
+    # some URL contained a line break, parse them one by one
+    return [parsed for url in urls for parsed in _parse_github_urls([url.replace("\n", "")])]
+
+  parsed = []
+  append = parsed.append
+  for owner, name, branch, path, raw_owner, raw_name, raw_branch, raw_path in matches:
+    if not owner:
+      if not raw_owner:
+        append(None)
+        continue
+      owner, name, branch, path = raw_owner, raw_name, raw_branch, raw_path
+    if name.lower().endswith(".git"):
+      name = name[:-4]
+    if owner.lower() in _RESERVED_OWNERS or not name:
+      append(None)
+    else:
+      append((owner, name, branch or None, path or None))
+  return parsed
+
+
+class GitHubUrl(NamedTuple):
+  """Canonical form of a GitHub repository or file URL"""
+  developer: str # owner as spelled in the URL, e.g. "Blockscout"
+  name: str # repository name as spelled in the URL, without a .git suffix, e.g. "blockscout"
+  project_url: str # "https://github.com/<developer>/<name>"
+  branch: Optional[str] # branch of the file, None for repository URLs
+  path: Optional[str] # path of the file within the repository (case preserved), None for repository URLs
+
+  @property
+  def key(self) -> tuple[str, str]:
+    """(owner, name) lowercased: GitHub owner and repository names are case-insensitive, compare by this"""
+    return (self.developer.lower(), self.name.lower())
+
+
+def canonicalize_github_url(url: str) -> Optional[GitHubUrl]:
+  """
+  Canonicalize a GitHub URL, so that blob/raw/raw.githubusercontent.com links, tracking parameters,
+  fragments and .git suffixes all map to the same value. The owner and repository keep their spelling
+  (it is what gets stored and shown); compare canonical URLs by their key to ignore case differences.
+
+  Example:
+  "HTTPS://GitHub.com/Blockscout/blockscout/raw/master/docker-compose/docker-compose.yml?utm_source=x"
+  -> GitHubUrl("Blockscout", "blockscout", "https://github.com/Blockscout/blockscout", "master", "docker-compose/docker-compose.yml")
+
+  Args:
+    url (str): any URL
+
+  Returns:
+    GitHubUrl or None: None if the URL does not point into a GitHub repository
+  """
+  return canonicalize_github_urls([url])[0]
+
+
+def canonicalize_github_urls(urls: Iterable[str]) -> List[Optional[GitHubUrl]]:
+  """
+  Batch version of canonicalize_github_url(), parsing the whole batch with a single regex pass.
+
+  Args:
+    urls (Iterable[str]): URLs to canonicalize
+
+  Returns:
+    List[Optional[GitHubUrl]]: the canonical forms, in input order
+  """
+  return [GitHubUrl(parsed[0], parsed[1], f"https://github.com/{parsed[0]}/{parsed[1]}", parsed[2], parsed[3])
+          if parsed is not None else None
+          for parsed in _parse_github_urls(list(urls))]
+
+
+_COMMIT_SHA_RE = re.compile(r'[0-9a-fA-F]{40}')
+
+def is_commit_sha(branch: Optional[str]) -> bool:
+  """
+  Tells a commit SHA (e.g., in the permalinks code search returns) from a branch or tag name.
+
+  Args:
+    branch (str): the branch part of a GitHub file URL
+
+  Returns:
+    bool: True if it is a full 40 character commit SHA
+  """
+  return branch is not None and _COMMIT_SHA_RE.fullmatch(branch) is not None
+
+class GitHubUrlDeduplicator:
+  """
+  Collapses duplicate and near-duplicate GitHub URLs of search results across a whole run,
+  before they reach the database, and keeps statistics about how much was collapsed.
+  Repositories are told apart by their lowercased (owner, name), but keep the spelling they were first
+  seen with, so the stored URL (the upsert key) stays the one earlier runs stored.
+  A file is one path in a repository whatever branch or commit it was found on; a file first seen on a commit
+  SHA is passed on once more when it shows up on a named branch, which db_controller.bulk_add_compose_files() prefers.
+  """
+  def __init__(self):
+    self.seen_repositories: Dict[tuple, tuple] = {} # lowercased (owner, name) -> (owner, name) first seen
+    self.seen_files: Dict[tuple, str] = {} # (lowercased (owner, name), path) -> branch
+    self.num_results = 0 # results having a URL
+    self.num_invalid = 0 # results not pointing into a GitHub repository
+
+  def dedupe(self, results: List[Dict[str, Any]]) -> tuple[List[tuple], List[GitHubUrl]]:
+    """
+    Canonicalizes the URLs of a batch of search results and drops everything seen before.
+
+    Args:
+      results (List[Dict[str, Any]]): search results, each with a 'url'
+
+    Returns:
+      tuple: ([(GitHubUrl, result) for every new repository], [GitHubUrl of every new file])
+    """
+    results = [result for result in results if result.get('url')]
+    self.num_results += len(results)
+    new_repositories, new_files = [], []
+    seen_repositories, seen_files = self.seen_repositories, self.seen_files
+    # GitHubUrl objects are only built for what is new, the duplicates are dropped on the parsed tuples
+    for result, parsed in zip(results, _parse_github_urls([result['url'] for result in results])):
+      if parsed is None:
+        self.num_invalid += 1
+        continue
+      owner, name, branch, path = parsed
+      key = (owner.lower(), name.lower())
+      canonical = None
+      first_seen = seen_repositories.get(key)
+      if first_seen is None:
+        seen_repositories[key] = (owner, name)
+        canonical = GitHubUrl(owner, name, f"https://github.com/{owner}/{name}", branch, path)
+        new_repositories.append((canonical, result))
+      else:
+        owner, name = first_seen
+      if path is not None and ((key, path) not in seen_files or
+                               is_commit_sha(seen_files[(key, path)]) and not is_commit_sha(branch)):
+        seen_files[(key, path)] = branch
+        new_files.append(canonical or GitHubUrl(owner, name, f"https://github.com/{owner}/{name}", branch, path))
+    return new_repositories, new_files
+
+  def stats(self) -> Dict[str, Any]:
+    """Number of results, invalid URLs, unique repositories/files and the repository dedup ratio"""
+    valid = self.num_results - self.num_invalid
+    return dict(results=self.num_results,
+                invalid=self.num_invalid,
+                unique_repositories=len(self.seen_repositories),
+                unique_files=len(self.seen_files),
+                dedup_ratio=1 - len(self.seen_repositories) / valid if valid else 0.0)
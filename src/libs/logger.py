@@ -1,6 +1,13 @@
 import logging
+import logging.handlers
 import sys
 import os
+import gzip
+import json
+import shutil
+import queue
+import atexit
+import threading
 from pathlib import Path
 import colorama
 from colorama import Fore, Style
@@ -17,59 +24,291 @@ log_level_colors = {
   logging.CRITICAL: Fore.MAGENTA
 }
 
+LOG_FORMAT = '%(asctime)s - [%(name)s] - %(levelname)s - %(message)s'
+LOG_DATEFMT = '%Y-%m-%d %H:%M:%S'
+
 class ColoredFormatter(logging.Formatter):
   def format(self, record):
     # Get the color for the log level
     level_color = log_level_colors.get(record.levelno, Fore.WHITE)  # Default to white if level not found
-    
+
     # Format the log message
     log_message = super().format(record)
     return f"{level_color}{log_message}{Style.RESET_ALL}"
 
+
+def _env_level(name: str, default: str) -> int:
+  """
+  Log level from an env variable holding a level name (DEBUG, INFO, ...) or number.
+  Anything else falls back to INFO with a warning on stderr (the logging it configures is not set up yet).
+  """
+  value = os.getenv(name, default).strip().upper()
+  if value.isdigit():
+    return int(value)
+  level = logging.getLevelNamesMapping().get(value)
+  if level is None:
+    sys.stderr.write(f"Unknown log level {name}={value!r}, using INFO\n")
+    return logging.INFO
+  return level
+
+
+class LogConfig:
+  """
+  Logging settings read from the environment once per process:
+    LOG_LEVEL          lowest level that is logged at all (default: DEBUG)
+    LOG_CONSOLE_LEVEL  lowest level printed to the console (default: LOG_LEVEL)
+    LOG_FILE_LEVEL     lowest level written to the log file (default: LOG_LEVEL)
+    LOG_CONSOLE        0 disables the console output (default: 1)
+    LOG_FILE           0 disables the log file (default: 1)
+    LOG_COLOR          0 disables the colours on the console (default: 1)
+    LOG_DIR            directory of the log files (default: src/logs)
+    LOG_MAX_BYTES      size at which a log file is rolled over, 0 disables it (default: 50 MB)
+    LOG_ROTATE_WHEN    roll over by time instead of size, e.g., "midnight" or "H" (see TimedRotatingFileHandler)
+    LOG_BACKUP_COUNT   number of rolled (gzipped) files kept (default: 10)
+    LOG_JSON           1 also writes every record as a JSON line to <log file name>.jsonl (default: 0)
+  """
+  def __init__(self):
+    self.level = _env_level("LOG_LEVEL", "DEBUG")
+    self.console_level = _env_level("LOG_CONSOLE_LEVEL", logging.getLevelName(self.level))
+    self.file_level = _env_level("LOG_FILE_LEVEL", logging.getLevelName(self.level))
+    self.console = os.getenv("LOG_CONSOLE", "1") != "0"
+    self.file = os.getenv("LOG_FILE", "1") != "0"
+    self.color = os.getenv("LOG_COLOR", "1") != "0"
+    # --- Determine logs directory one level above this file ---
+    self.logs_dir = Path(os.getenv("LOG_DIR", Path(__file__).resolve().parent.parent / "logs"))
+    self.max_bytes = int(os.getenv("LOG_MAX_BYTES", 50 * 1024 * 1024))
+    self.rotate_when = os.getenv("LOG_ROTATE_WHEN") or None
+    self.backup_count = int(os.getenv("LOG_BACKUP_COUNT", 10))
+    self.json = os.getenv("LOG_JSON", "0") == "1"
+
+  @property
+  def effective_level(self) -> int:
+    """Lowest level any output takes, records below it are dropped before a LogRecord is even created"""
+    levels = ([self.console_level] if self.console else []) + ([self.file_level] if self.file else [])
+    return max(self.level, min(levels)) if levels else logging.CRITICAL + 1
+
+
+class JsonLinesFormatter(logging.Formatter):
+  """One JSON object per record: time, level, logger, thread, message and the traceback if there is one"""
+  def format(self, record):
+    entry = dict(time=self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+                 level=record.levelname,
+                 logger=record.name,
+                 thread=record.threadName,
+                 message=record.getMessage())
+    if record.exc_info:
+      entry["exception"] = self.formatException(record.exc_info)
+    return json.dumps(entry, ensure_ascii=False)
+
+
+def _gzip_namer(name: str) -> str:
+  return name + ".gz"
+
+
+def _gzip_rotator(source: str, dest: str) -> None:
+  """Compresses the rolled over log file, runs on the listener thread"""
+  with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+    shutil.copyfileobj(f_in, f_out)
+  os.remove(source)
+
+
+def rotating_file_handler(path: Path, config: LogConfig) -> logging.Handler:
+  """
+  File handler rolling over by time (LOG_ROTATE_WHEN) or by size (LOG_MAX_BYTES), keeping
+  LOG_BACKUP_COUNT gzipped old files next to it (appcollector.log.1.gz, ...).
+  """
+  if config.rotate_when:
+    handler = logging.handlers.TimedRotatingFileHandler(path, when=config.rotate_when,
+                                                        backupCount=config.backup_count, encoding="utf-8")
+  else:
+    handler = logging.handlers.RotatingFileHandler(path, mode='a', maxBytes=config.max_bytes,
+                                                   backupCount=config.backup_count, encoding="utf-8")
+  handler.namer = _gzip_namer
+  handler.rotator = _gzip_rotator
+  return handler
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+  """
+  Puts records on the queue without formatting them: the caller's thread only merges the message arguments,
+  all formatting and I/O happens on the listener thread. Records carry the log file they belong to.
+  """
+  def __init__(self, log_queue, logfile_name: str):
+    super().__init__(log_queue)
+    self.logfile_name = logfile_name
+
+  def prepare(self, record):
+    # the queue stays in this process, so the record (and its exc_info) can be handed over as is
+    record.msg = record.getMessage()
+    record.args = None
+    record.logfile_name = self.logfile_name
+    return record
+
+
+class _ConsoleHandler(logging.StreamHandler):
+  """StreamHandler writing to whatever sys.stdout is at the time of writing, it may be redirected after the first CustomLogger"""
+  def __init__(self):
+    super().__init__(sys.stdout)
+
+  @property
+  def stream(self):
+    return sys.stdout
+
+  @stream.setter
+  def stream(self, value):
+    pass
+
+
+class _Dispatcher(logging.Handler):
+  """Runs on the listener thread and hands every record to the console and to the file handler of its log file"""
+  def __init__(self, config: LogConfig):
+    super().__init__()
+    self.config = config
+    self.console_handler = None
+    if config.console:
+      self.console_handler = _ConsoleHandler()
+      self.console_handler.setLevel(config.console_level)
+      formatter_class = ColoredFormatter if config.color else logging.Formatter
+      self.console_handler.setFormatter(formatter_class(LOG_FORMAT, datefmt=LOG_DATEFMT))
+    self.file_handlers = {}
+    self._lock = threading.Lock()
+
+  def file_handlers_of(self, logfile_name: str) -> list:
+    """The handlers of a log file (the text file and, with LOG_JSON, its JSON-lines twin), opened on first use"""
+    with self._lock:
+      handlers = self.file_handlers.get(logfile_name)
+      if handlers is None:
+        self.config.logs_dir.mkdir(parents=True, exist_ok=True)
+        handler = rotating_file_handler(self.config.logs_dir / logfile_name, self.config)
+        handler.setFormatter(logging.Formatter(LOG_FORMAT, datefmt=LOG_DATEFMT))
+        handlers = [handler]
+        if self.config.json:
+          json_handler = rotating_file_handler(self.config.logs_dir / f"{Path(logfile_name).stem}.jsonl", self.config)
+          json_handler.setFormatter(JsonLinesFormatter())
+          handlers.append(json_handler)
+        for handler in handlers:
+          handler.setLevel(self.config.file_level)
+        self.file_handlers[logfile_name] = handlers
+      return handlers
+
+  def emit(self, record):
+    if self.console_handler is not None and record.levelno >= self.console_handler.level:
+      self.console_handler.handle(record)
+    if self.config.file and record.levelno >= self.config.file_level:
+      for handler in self.file_handlers_of(getattr(record, "logfile_name", "appcollector.log")):
+        handler.handle(record)
+
+  def flush(self):
+    if self.console_handler is not None:
+      self.console_handler.flush()
+    with self._lock:
+      for handlers in self.file_handlers.values():
+        for handler in handlers:
+          handler.flush()
+
+  def close(self):
+    self.flush()
+    with self._lock:
+      for handlers in self.file_handlers.values():
+        for handler in handlers:
+          handler.close()
+    super().close()
+
+
+class _LogBackend:
+  """The one queue and background listener thread of the process, started by the first CustomLogger"""
+  _lock = threading.Lock()
+  _instance = None
+
+  def __init__(self):
+    self.config = LogConfig()
+    self.queue = queue.SimpleQueue()
+    self.dispatcher = _Dispatcher(self.config)
+    self.listener = logging.handlers.QueueListener(self.queue, self.dispatcher)
+    self.queue_handlers = {}
+    self.listener.start()
+    # drain the queue before the interpreter goes away
+    atexit.register(self.stop)
+
+  @classmethod
+  def get(cls) -> "_LogBackend":
+    with cls._lock:
+      if cls._instance is None:
+        cls._instance = cls()
+      return cls._instance
+
+  def queue_handler(self, logfile_name: str) -> _QueueHandler:
+    with self._lock:
+      handler = self.queue_handlers.get(logfile_name)
+      if handler is None:
+        handler = self.queue_handlers[logfile_name] = _QueueHandler(self.queue, logfile_name)
+      return handler
+
+  def flush(self):
+    """Blocks until every record queued so far is written"""
+    with self._lock:
+      if self.listener._thread is not None:
+        # stopping the listener drains the queue, then it starts over with a new thread
+        self.listener.stop()
+        self.dispatcher.flush()
+        self.listener.start()
+
+  def stop(self):
+    """Processes the records still queued, then stops the listener (safe to call more than once)"""
+    with self._lock:
+      if self.listener._thread is not None:
+        self.listener.stop()
+        self.dispatcher.close()
+
+
+def flush_logs():
+  """Blocks until every record logged so far is written, e.g., before reading the log file or forking"""
+  if _LogBackend._instance is not None:
+    _LogBackend._instance.flush()
+
+
 class CustomLogger:
+  """
+  Colourful console + file logger.
+
+  Records are put on a queue and written by a single background thread (a QueueListener shared by all
+  CustomLoggers of the process), so logging costs the calling thread a queue put; levels disabled through
+  the env (see LogConfig) are dropped before a record is even created.
+  Log files roll over by size or time and the rolled files are gzipped; LOG_JSON=1 adds a JSON-lines copy.
+  """
   def __init__(self, name, logfile_name:str="appcollector.log"):
+    backend = _LogBackend.get()
     self.logger = logging.getLogger(name)
-    self.logger.setLevel(logging.DEBUG)
+    self.logger.setLevel(backend.config.effective_level)
+    # Creating a CustomLogger with the same name again (scraper re-instantiation, notebooks, ...) must not
+    # multiply the output: the logger keeps exactly one queue handler, the one of its (latest) log file
+    queue_handler = backend.queue_handler(logfile_name)
+    for handler in list(self.logger.handlers):
+      if isinstance(handler, _QueueHandler) and handler is not queue_handler:
+        self.logger.removeHandler(handler)
+    self.logger.addHandler(queue_handler)
+    # and nothing goes out a second time through handlers a library may have put on the root logger
+    self.logger.propagate = False
 
-    # Create console handler
-    ch = logging.StreamHandler(sys.stdout)
-    ch.setLevel(logging.DEBUG)
-    # Create a formatter with the current log level colors
-    formatter = ColoredFormatter('%(asctime)s - [%(name)s] - %(levelname)s - %(message)s', 
-                                 datefmt='%Y-%m-%d %H:%M:%S')
-    ch.setFormatter(formatter)
+  def debug(self, message, exc_info=False):
+    self.logger.debug(message, exc_info=exc_info)
 
+  def info(self, message, exc_info=False):
+    self.logger.info(message, exc_info=exc_info)
 
-    # File handler
-    # --- Determine logs directory one level above this file ---
-    base_dir = Path(__file__).resolve().parent.parent
-    logs_dir = base_dir / "logs"
-    logs_dir.mkdir(parents=True, exist_ok=True)
-    logfile = logs_dir / logfile_name
-    fh = logging.FileHandler(logfile, mode='a') #rewrite the logfile always
-    fh.setLevel(logging.DEBUG)
-    fh.setFormatter(logging.Formatter('%(asctime)s - [%(name)s] - %(levelname)s - %(message)s', 
-                                      datefmt='%Y-%m-%d %H:%M:%S'))
-
-    # Add the handler to the logger
-    self.logger.addHandler(ch)
-    self.logger.addHandler(fh)
-
-  def debug(self, message, exc_info=False): 
-    self.logger.debug(message, exc_info=exc_info) 
-
-  def info(self, message, exc_info=False): 
-    self.logger.info(message, exc_info=exc_info) 
-
-  def warning(self, message, exc_info=False): 
+  def warning(self, message, exc_info=False):
     self.logger.warning(message, exc_info=exc_info)
 
-  def error(self, message, exc_info=False): 
-    self.logger.error(message, exc_info=exc_info) 
+  def error(self, message, exc_info=False):
+    self.logger.error(message, exc_info=exc_info)
 
-  def critical(self, message, exc_info=False): 
+  def critical(self, message, exc_info=False):
     self.logger.critical(message, exc_info=exc_info)
 
+  def isEnabledFor(self, level: int) -> bool:
+    """For guarding expensive log messages: if logger.isEnabledFor(logging.DEBUG): logger.debug(...)"""
+    return self.logger.isEnabledFor(level)
+
 # Example usage
 if __name__ == "__main__":
   logger1 = CustomLogger('MyClass')
@@ -84,11 +323,11 @@ if __name__ == "__main__":
   logger2.info("This is an info message from AnotherClass.")
 
   try:
-    a=1 / 0 
+    a=1 / 0
   except ZeroDivisionError as e:
     logger3.error(f"An error occurred during division: {e}", exc_info=True) # NEW: Pass exc_info=True
 
   try:
       int("hello")
   except ValueError as e:
-      logger2.warning(f"Conversion failed: {e}", exc_info=True)
\ No newline at end of file
+      logger2.warning(f"Conversion failed: {e}", exc_info=True)
@@ -0,0 +1,195 @@
+import os
+import sys
+import time
+import bisect
+import functools
+import threading
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Callable
+
+current_dir = os.path.abspath(os.path.dirname(__file__))
+src_dir= os.path.abspath(os.path.join(current_dir, '..'))
+# set sys_path to also look for libs elsewhere
+sys.path.append(src_dir)
+from libs.logger import CustomLogger
+
+# upper bounds (seconds) of the latency histogram buckets, from keystroke pauses to stuck page loads
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class Histogram:
+  """Latency histogram of one stage with cumulative (Prometheus style) buckets"""
+  def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+    self.buckets = buckets
+    self.bucket_counts = [0] * (len(buckets) + 1) # the last one is +Inf
+    self.count = 0
+    self.sum = 0.0
+    self.min = None
+    self.max = None
+
+  def observe(self, value: float) -> None:
+    self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+    self.count += 1
+    self.sum += value
+    self.min = value if self.min is None else min(self.min, value)
+    self.max = value if self.max is None else max(self.max, value)
+
+  def quantile(self, q: float) -> Optional[float]:
+    """Upper bound of the bucket holding the q-quantile (the observed max for the +Inf bucket)"""
+    if not self.count:
+      return None
+    rank = q * self.count
+    seen = 0
+    for i, bucket_count in enumerate(self.bucket_counts):
+      seen += bucket_count
+      if seen >= rank:
+        return round(min(self.buckets[i], self.max) if i < len(self.buckets) else self.max, 4)
+    return round(self.max, 4)
+
+  def summary(self) -> Dict[str, Any]:
+    return dict(count=self.count,
+                total=round(self.sum, 3),
+                mean=round(self.sum / self.count, 4) if self.count else None,
+                min=round(self.min, 4) if self.min is not None else None,
+                p50=self.quantile(0.5),
+                p95=self.quantile(0.95),
+                max=round(self.max, 4) if self.max is not None else None)
+
+
+class MetricsRegistry:
+  """
+  Per-stage timings and counters of a collector run.
+
+  Stages are dotted names like "scraper.navigation" or "db.bulk_upsert_github_repositories"; every timing goes into
+  the stage's latency histogram, counters (results, bytes, rows, ...) are plain running totals.
+  Everything is thread-safe, so the scraper pool and the compose stage workers can share the registry.
+
+  Example:
+    with metrics.timer("scraper.navigation"):
+      page.goto(url)
+    metrics.count("scraper.page_bytes", len(page.content()))
+
+    @metrics.timed("db.bulk_upsert")
+    def bulk_upsert(...): ...
+  """
+  def __init__(self, prefix: str = "appcollector"):
+    self.prefix = prefix
+    self.histograms: Dict[str, Histogram] = {}
+    self.counters: Dict[str, float] = {}
+    self.started = time.monotonic()
+    self._lock = threading.Lock()
+    self._server = None
+
+  def observe(self, stage: str, seconds: float) -> None:
+    """Records one duration of a stage"""
+    with self._lock:
+      histogram = self.histograms.get(stage)
+      if histogram is None:
+        histogram = self.histograms[stage] = Histogram()
+      histogram.observe(seconds)
+
+  def count(self, name: str, value: float = 1) -> None:
+    """Adds value to a counter"""
+    with self._lock:
+      self.counters[name] = self.counters.get(name, 0) + value
+
+  @contextmanager
+  def timer(self, stage: str):
+    """Context manager timing its body into the stage's histogram (also when the body raises)"""
+    started = time.perf_counter()
+    try:
+      yield
+    finally:
+      self.observe(stage, time.perf_counter() - started)
+
+  def timed(self, stage: str) -> Callable:
+    """Decorator timing every call of a function into the stage's histogram"""
+    def decorator(func):
+      @functools.wraps(func)
+      def wrapper(*args, **kwargs):
+        with self.timer(stage):
+          return func(*args, **kwargs)
+      return wrapper
+    return decorator
+
+  def summary(self) -> Dict[str, Any]:
+    """Histogram summaries per stage, the counters and the wall-clock time since the registry was created"""
+    with self._lock:
+      return dict(elapsed=round(time.monotonic() - self.started, 3),
+                  stages={stage: histogram.summary() for stage, histogram in sorted(self.histograms.items())},
+                  counters=dict(sorted(self.counters.items())))
+
+  def log_summary(self, logger: CustomLogger) -> None:
+    """Logs one line per stage (sorted by total time) and per counter"""
+    summary = self.summary()
+    elapsed = summary["elapsed"]
+    logger.info(f"=== TIMINGS ({elapsed:.1f}s wall clock) ===")
+    for stage, stats in sorted(summary["stages"].items(), key=lambda item: -item[1]["total"]):
+      share = 100 * stats["total"] / elapsed if elapsed else 0
+      logger.info(f"{stage:<45} total={stats['total']:9.2f}s ({share:5.1f}%) count={stats['count']:7d} "
+                  f"mean={stats['mean']:.3f}s p50<={stats['p50']}s p95<={stats['p95']}s max={stats['max']}s")
+    for name, value in summary["counters"].items():
+      logger.info(f"{name:<45} {value}")
+
+  def prometheus_text(self) -> str:
+    """The metrics in the Prometheus text exposition format"""
+    lines = [f"# HELP {self.prefix}_stage_seconds Time spent per collector stage",
+             f"# TYPE {self.prefix}_stage_seconds histogram"]
+    with self._lock:
+      for stage, histogram in sorted(self.histograms.items()):
+        cumulative = 0
+        for bound, bucket_count in zip(list(histogram.buckets) + ["+Inf"], histogram.bucket_counts):
+          cumulative += bucket_count
+          lines.append(f'{self.prefix}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+        lines.append(f'{self.prefix}_stage_seconds_sum{{stage="{stage}"}} {histogram.sum}')
+        lines.append(f'{self.prefix}_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+      for name, value in sorted(self.counters.items()):
+        metric = f"{self.prefix}_{name.replace('.', '_')}_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {value}")
+    return "\n".join(lines) + "\n"
+
+  def start_http_server(self, port: int, address: str = "127.0.0.1") -> None:
+    """Serves prometheus_text() on http://address:port/metrics from a daemon thread"""
+    if self._server is not None:
+      return
+    # only imported when the endpoint is actually wanted, it is not needed for the summary
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    registry = self
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+      def do_GET(self):
+        body = registry.prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+      def log_message(self, format, *args):
+        # keep scrapes out of the console
+        pass
+
+    self._server = ThreadingHTTPServer((address, port), MetricsHandler)
+    threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+
+  def start_http_server_from_env(self, logger: Optional[CustomLogger] = None) -> bool:
+    """Starts the Prometheus endpoint if METRICS_PORT is set (METRICS_ADDRESS defaults to 127.0.0.1)"""
+    port = os.getenv("METRICS_PORT")
+    if not port:
+      return False
+    address = os.getenv("METRICS_ADDRESS", "127.0.0.1")
+    self.start_http_server(int(port), address=address)
+    if logger is not None:
+      logger.info(f"Prometheus metrics exposed on http://{address}:{port}/metrics")
+    return True
+
+  def stop_http_server(self) -> None:
+    if self._server is not None:
+      self._server.shutdown()
+      self._server.server_close()
+      self._server = None
+
+
+# the registry of the process, shared by the scraper, the pipeline and the database layer
+metrics = MetricsRegistry()
@@ -1,14 +1,20 @@
-from datetime import datetime
+from datetime import datetime, timezone
 import re
 import os
 import json
-import dateparser #this guy can convert relative timestamps (e.g., 2 days ago) to datetime
 from typing import Optional
 
 def get_current_time():
   current_local_time_naive = datetime.now()
   return current_local_time_naive
 
+def get_current_utc_time() -> datetime:
+  """
+  The current time in UTC as a naive datetime, like the GitHub timestamps stored in the database
+  (see pipeline.enrichment_stage.parse_github_time), so the two can be compared.
+  """
+  return datetime.now(timezone.utc).replace(tzinfo=None)
+
 def get_timestamp():
   """
   Get the current timestamp as a formatted string.
@@ -37,6 +43,9 @@ def convert_relative_date(rel_date:str)-> Optional[datetime]:
     # if(contains_chinese(text=rel_date)):
     #   result = translator.translate(rel_date, src='zh-cn', dest='en')
     #   rel_date = result.text
+    # imported here, dateparser takes about a second to import and only this function needs it;
+    # outside the try, so a missing dependency is raised instead of turning every date into None
+    import dateparser #this guy can convert relative timestamps (e.g., 2 days ago) to datetime
     try:
       date = dateparser.parse(rel_date)
     except Exception as e:
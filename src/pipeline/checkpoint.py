@@ -0,0 +1,137 @@
+import os
+import sys
+import json
+import hashlib
+from typing import Optional, List, Any, Callable, NamedTuple
+
+current_dir = os.path.abspath(os.path.dirname(__file__))
+src_dir= os.path.abspath(os.path.join(current_dir, '..'))
+# set sys_path to also look for libs elsewhere
+sys.path.append(src_dir)
+from libs.logger import CustomLogger
+import database.db_controller as db_controller
+
+
+def page_hash(page_data: Any) -> str:
+  """
+  SHA-256 of a page's extracted data in canonical JSON form.
+  Identical result pages (e.g., a search engine serving the last page again and again) get identical hashes.
+  """
+  canonical = json.dumps(page_data, sort_keys=True, ensure_ascii=False, default=str)
+  return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResumePoint(NamedTuple):
+  """Where a crawl has to continue from"""
+  start_page: int # page number to be scraped next
+  resume_url: Optional[str] # URL of that page, None means start with a fresh search
+  finished: bool # the previous run went through all of its pages
+
+
+class CrawlCheckpointer:
+  """
+  Tracks the progress of one search crawl in the crawl_checkpoints table.
+
+  record() is called for every scraped page; the checkpoint itself is only written by save(), which
+  RepositorySink calls in the same transaction as the page results. So the stored checkpoint never
+  runs ahead of the data that is actually committed.
+
+  Example:
+    checkpointer = CrawlCheckpointer(dork)
+    resume = checkpointer.load()
+    with RepositorySink(checkpointer=checkpointer) as sink:
+      for scraped in scraper.iter_search_query(..., resume_url=resume.resume_url, start_page=resume.start_page):
+        if not sink.add_scraped_page(scraped):
+          break
+  """
+  def __init__(self, dork: str, session_factory: Optional[Callable] = None):
+    """
+      Args:
+        dork (str): the search string identifying the crawl
+        session_factory (Callable): returns a new SQLAlchemy session (default: db_controller.get_session)
+    """
+    self.logger = CustomLogger(self.__class__.__name__)
+    self.dork = dork
+    self.session_factory = session_factory if session_factory is not None else db_controller.get_session
+    self.last_page = 0
+    self.last_page_url: Optional[str] = None
+    self.next_page_url: Optional[str] = None
+    self.page_hashes: List[str] = []
+    self.status = "running"
+    self.dirty = False
+
+  def load(self, fresh: bool = False) -> ResumePoint:
+    """
+    Reads the stored checkpoint of the crawl.
+
+    Args:
+      fresh (bool): ignore the stored progress and start over from page 1
+
+    Returns:
+      ResumePoint: where to continue; a finished crawl starts over as well
+    """
+    session = self.session_factory()
+    try:
+      checkpoint = db_controller.get_crawl_checkpoint(session, self.dork)
+      if checkpoint is None or fresh:
+        return ResumePoint(start_page=1, resume_url=None, finished=False)
+      if checkpoint.status == "finished":
+        self.logger.info(f"Crawl '{self.dork}' already finished after {checkpoint.last_page} page(s), starting over")
+        return ResumePoint(start_page=1, resume_url=None, finished=True)
+      if not checkpoint.next_page_url:
+        # e.g., blocked before the first result page was stored
+        self.logger.info(f"Crawl '{self.dork}' has no page to resume from (previous status: {checkpoint.status}), "
+                         f"starting with a fresh search")
+        return ResumePoint(start_page=1, resume_url=None, finished=False)
+
+      self.last_page = checkpoint.last_page
+      self.last_page_url = checkpoint.last_page_url
+      self.next_page_url = checkpoint.next_page_url
+      self.page_hashes = list(checkpoint.page_hashes or [])
+      self.logger.info(f"Resuming crawl '{self.dork}' from page {self.last_page + 1} (previous status: {checkpoint.status})")
+      return ResumePoint(start_page=self.last_page + 1, resume_url=self.next_page_url, finished=False)
+    finally:
+      session.close()
+
+  def record(self, page_number: int, page_url: Optional[str], next_url: Optional[str], page_data: Any) -> bool:
+    """
+    Registers a scraped page as the new crawl position (persisted with the next save()).
+
+    Returns:
+      bool: False if the page has the same results as an earlier page of this crawl, meaning the
+            search engine is serving the same page again and the crawl should stop
+    """
+    digest = page_hash(page_data)
+    if digest in self.page_hashes:
+      self.logger.warning(f"Page {page_number} repeats the results of page {self.page_hashes.index(digest) + 1}, stopping the crawl")
+      self.next_page_url = None
+      self.status = "finished"
+      self.dirty = True
+      return False
+    self.page_hashes.append(digest)
+    self.last_page = page_number
+    self.last_page_url = page_url
+    self.next_page_url = next_url
+    self.status = "running" if next_url else "finished"
+    self.dirty = True
+    return True
+
+  def save(self, session, status: Optional[str] = None) -> None:
+    """
+    Writes the current position into the given session. The caller commits.
+
+    Args:
+      session (Session): the session holding the page results covered by this checkpoint
+      status (str, optional): overrides the status (e.g., "failed", or "rate_limited" and "blocked", which the
+                              next run resumes)
+    """
+    if status is not None:
+      self.status = status
+    db_controller.save_crawl_checkpoint(session=session,
+                                        dork=self.dork,
+                                        last_page=self.last_page,
+                                        last_page_url=self.last_page_url,
+                                        next_page_url=self.next_page_url,
+                                        page_hashes=self.page_hashes,
+                                        status=self.status)
+    self.dirty = False
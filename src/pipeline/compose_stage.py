@@ -0,0 +1,304 @@
+import os
+import sys
+import json
+import sqlite3
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, NamedTuple
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+import yaml
+
+current_dir = os.path.abspath(os.path.dirname(__file__))
+src_dir= os.path.abspath(os.path.join(current_dir, '..'))
+# set sys_path to also look for libs elsewhere
+sys.path.append(src_dir)
+from libs.logger import CustomLogger
+from libs.github_url import github_raw_url
+from libs.misc import get_current_utc_time
+from libs.metrics import metrics
+import database.db_controller as db_controller
+
+# the C LibYAML based loader is an order of magnitude faster, fall back to the pure Python one if PyYAML was built without it
+YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+# top-level keys of the version 2/3 formats (and the Compose Specification), a file with any of them has no services
+# at the top level, even if it has no "version"
+_TOP_LEVEL_KEYS = ("version", "services", "volumes", "networks", "configs", "secrets", "name", "include")
+
+
+class FetchFailure(NamedTuple):
+  """A compose file that could not be fetched"""
+  error: str
+
+
+class ComposeSummary(NamedTuple):
+  """What we keep from a parsed docker-compose file"""
+  num_containers: int # number of services (times their replicas, if set)
+  images: List[str] # Docker images referenced by the services, sorted and unique
+
+
+def parse_compose(content: str) -> ComposeSummary:
+  """
+  Parses a docker-compose file and counts its containers and images.
+
+  Args:
+    content (str): the raw YAML
+
+  Returns:
+    ComposeSummary: number of containers and the images used
+
+  Raises:
+    ValueError: if the content is not a docker-compose file
+  """
+  document = yaml.load(content, Loader=YamlLoader)
+  if not isinstance(document, dict):
+    raise ValueError("not a YAML mapping")
+  if "services" in document:
+    services = document["services"]
+  elif any(key in _TOP_LEVEL_KEYS or str(key).startswith("x-") for key in document):
+    services = None
+  else:
+    # the version 1 format has the services at the top level
+    services = document
+  if not isinstance(services, dict):
+    raise ValueError("no services defined")
+
+  num_containers = 0
+  images = set()
+  for service in services.values():
+    if not isinstance(service, dict):
+      continue
+    deploy = service.get("deploy")
+    replicas = deploy.get("replicas", 1) if isinstance(deploy, dict) else 1
+    # a service scaled to 0 runs no container, anything that is not a count (e.g., a variable) counts as 1
+    num_containers += replicas if isinstance(replicas, int) and not isinstance(replicas, bool) and replicas >= 0 else 1
+    if isinstance(service.get("image"), str):
+      images.add(service["image"])
+  return ComposeSummary(num_containers=num_containers, images=sorted(images))
+
+
+class HttpComposeFetcher:
+  """Downloads raw compose files from GitHub over a pooled, keep-alive HTTP session"""
+  def __init__(self, pool_size: int = 16, timeout: int = 30):
+    self.timeout = timeout
+    self.session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=2)
+    self.session.mount("https://", adapter)
+    self.session.mount("http://", adapter)
+
+  def fetch(self, url: str) -> str:
+    response = self.session.get(github_raw_url(url), timeout=self.timeout)
+    response.raise_for_status()
+    return response.text
+
+  def close(self) -> None:
+    self.session.close()
+
+
+class DirectoryComposeFetcher:
+  """
+  Serves compose files from a local directory instead of GitHub, laid out like the raw URLs:
+  https://github.com/owner/repo/blob/main/docker-compose.yml -> <root>/owner/repo/main/docker-compose.yml
+  """
+  def __init__(self, root: str):
+    self.root = os.path.abspath(root)
+
+  def fetch(self, url: str) -> str:
+    path = os.path.abspath(os.path.join(self.root, urlparse(github_raw_url(url)).path.lstrip("/")))
+    if not path.startswith(self.root + os.sep):
+      raise ValueError(f"{url} points outside of {self.root}")
+    with open(path, encoding="utf-8") as f:
+      return f.read()
+
+
+class ComposeParseCache:
+  """SQLite cache of parse results keyed by the SHA-256 of the compose file content"""
+  def __init__(self, path: str = "/tmp/compose-parse-cache.sqlite"):
+    self.path = path
+    self._lock = threading.Lock()
+    self.connection = sqlite3.connect(path, check_same_thread=False)
+    self.connection.execute("CREATE TABLE IF NOT EXISTS compose_summaries (content_hash TEXT PRIMARY KEY, summary TEXT NOT NULL)")
+    self.connection.commit()
+
+  def get(self, content_hash: str) -> Optional[ComposeSummary]:
+    with self._lock:
+      row = self.connection.execute("SELECT summary FROM compose_summaries WHERE content_hash = ?", (content_hash,)).fetchone()
+    return ComposeSummary(**json.loads(row[0])) if row else None
+
+  def put(self, content_hash: str, summary: ComposeSummary) -> None:
+    with self._lock:
+      self.connection.execute("INSERT OR REPLACE INTO compose_summaries (content_hash, summary) VALUES (?, ?)",
+                              (content_hash, json.dumps(summary._asdict())))
+      self.connection.commit()
+
+  def close(self) -> None:
+    with self._lock:
+      self.connection.close()
+
+
+class ComposeStage:
+  """
+  Fetches the docker-compose files registered in the compose_files table that were not fetched yet
+  (or not since a given time), parses them and fills num_containers and docker_images_used of their repositories.
+
+  Files are fetched and parsed by a pool of worker threads; content that is already in the parse cache
+  (e.g., the same file in many forks) is not parsed again. The results are written back in bulk every write_every
+  files (committed, so an interrupted run keeps what it fetched) and only repositories with a changed compose file
+  get their totals recomputed. A file that cannot be fetched (deleted repository, moved branch, ...) gets its
+  error recorded and is not tried again before retry_backoff, doubled with every failure in a row up to
+  max_retry_backoff, so dead files do not come back at the head of every run.
+
+  Example:
+    stage = ComposeStage(fetcher=DirectoryComposeFetcher("fixtures/compose"))
+    stats = stage.run()
+  """
+  def __init__(self,
+               fetcher=None,
+               cache: Optional[ComposeParseCache] = None,
+               max_workers: int = 8,
+               write_every: int = 500,
+               retry_backoff: timedelta = timedelta(hours=1),
+               max_retry_backoff: timedelta = timedelta(days=30)):
+    """
+      Args:
+        fetcher: anything with a fetch(url) -> str method (default: HttpComposeFetcher)
+        cache (ComposeParseCache): parse result cache (default: a new cache in /tmp)
+        max_workers (int): number of parallel fetch/parse workers
+        write_every (int): files written (and committed) per database round trip
+        retry_backoff (timedelta): how long a file is not fetched again after a failed fetch
+        max_retry_backoff (timedelta): the most the backoff grows to
+    """
+    self.logger = CustomLogger(self.__class__.__name__)
+    # the fetcher and the cache created here are closed by close(), the ones passed in are the caller's
+    self.fetcher = fetcher if fetcher is not None else HttpComposeFetcher(pool_size=max_workers)
+    self.cache = cache if cache is not None else ComposeParseCache()
+    self._owned = ([self.fetcher] if fetcher is None else []) + ([self.cache] if cache is None else [])
+    self.max_workers = max_workers
+    self.write_every = write_every
+    self.retry_backoff = retry_backoff
+    self.max_retry_backoff = max_retry_backoff
+    self.stats = dict(files=0, fetched=0, parsed=0, cache_hits=0, changed=0, failed=0)
+    self._stats_lock = threading.Lock()
+
+  def _count(self, key: str) -> None:
+    with self._stats_lock:
+      self.stats[key] += 1
+
+  def process_file(self, url: str):
+    """
+    Fetches and parses (or looks up) a single compose file.
+
+    Returns:
+      tuple or FetchFailure: (content hash, ComposeSummary or None if it is not a compose file),
+                             or why the file could not be fetched
+    """
+    try:
+      with metrics.timer("compose.fetch"):
+        content = self.fetcher.fetch(url)
+    except Exception as e:
+      self.logger.warning(f"Could not fetch {url}: {e}")
+      self._count("failed")
+      return FetchFailure(error=(str(e) or e.__class__.__name__)[:1000])
+    self._count("fetched")
+    metrics.count("compose.bytes", len(content.encode("utf-8")))
+
+    content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    summary = self.cache.get(content_hash)
+    if summary is not None:
+      self._count("cache_hits")
+      return (content_hash, summary)
+    try:
+      with metrics.timer("compose.parse"):
+        summary = parse_compose(content)
+    except (yaml.YAMLError, ValueError) as e:
+      self.logger.warning(f"Could not parse {url}: {e}")
+      self._count("failed")
+      return (content_hash, None)
+    self._count("parsed")
+    self.cache.put(content_hash, summary)
+    return (content_hash, summary)
+
+  def _failed_fetch(self, file_id: int, attempts: Optional[int], error: str, now: datetime) -> Dict:
+    """The update of a file whose fetch failed: its earlier content (if any) stays, the next try is backed off"""
+    attempts = (attempts or 0) + 1
+    backoff = min(self.retry_backoff * 2 ** (attempts - 1), self.max_retry_backoff)
+    return dict(id=file_id, fetch_attempts=attempts, fetch_error=error, retry_after=now + backoff)
+
+  def _write(self, session, updates: List[Dict], changed_repositories: set, commit: bool) -> set:
+    """Writes a chunk of file results, recomputes the totals of the changed repositories and returns their ids"""
+    db_controller.bulk_update_compose_files(session, updates)
+    db_controller.refresh_repository_compose_stats(session, changed_repositories)
+    if commit:
+      session.commit()
+    return set(changed_repositories)
+
+  def run(self,
+          session=None,
+          fetched_before: Optional[datetime] = None,
+          limit: Optional[int] = None) -> Dict[str, int]:
+    """
+    Processes the pending compose files and writes the results back in bulk, every write_every files.
+
+    Args:
+      session (Session): SQLAlchemy session to use (default: a new one, committed every write_every files and closed here)
+      fetched_before (datetime, optional): also re-fetch files last fetched before this time
+      limit (int, optional): maximum number of files to process
+
+    Returns:
+      Dict[str, int]: counters of files, fetched, parsed, cache_hits, changed, failed and updated repositories
+    """
+    own_session = session is None
+    if own_session:
+      session = db_controller.get_session()
+    updated = set()
+    try:
+      files = db_controller.get_compose_files_to_fetch(session, fetched_before=fetched_before, limit=limit)
+      jobs = [(f.id, f.repository_id, f.url, f.content_hash, f.fetch_attempts) for f in files]
+      self.stats["files"] += len(jobs)
+      self.logger.info(f"Fetching {len(jobs)} compose file(s) with {self.max_workers} workers")
+
+      updates = []
+      changed_repositories = set()
+      with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+        for (file_id, repository_id, _, old_hash, attempts), result in zip(jobs, executor.map(lambda job: self.process_file(job[2]), jobs)):
+          if isinstance(result, FetchFailure):
+            updates.append(self._failed_fetch(file_id, attempts, result.error, get_current_utc_time()))
+          else:
+            content_hash, summary = result
+            updates.append(dict(id=file_id,
+                                content_hash=content_hash,
+                                num_containers=summary.num_containers if summary else None,
+                                docker_images=summary.images if summary else None,
+                                fetched_at=get_current_utc_time(),
+                                fetch_attempts=None,
+                                fetch_error=None,
+                                retry_after=None))
+            if content_hash != old_hash:
+              self._count("changed")
+              changed_repositories.add(repository_id)
+          if len(updates) >= self.write_every:
+            updated |= self._write(session, updates, changed_repositories, commit=own_session)
+            updates, changed_repositories = [], set()
+      updated |= self._write(session, updates, changed_repositories, commit=own_session)
+    except Exception as e:
+      self.logger.error(f"Error writing compose file data to the database: {e}")
+      if own_session:
+        session.rollback()
+      raise
+    finally:
+      if own_session:
+        session.close()
+
+    stats = dict(self.stats, repositories=len(updated))
+    self.logger.info(f"Compose stage done: {stats}")
+    return stats
+
+  def close(self) -> None:
+    """Closes the HTTP session and the parse cache the stage created itself"""
+    for resource in self._owned:
+      resource.close()
+    self._owned = []
@@ -0,0 +1,309 @@
+import os
+import sys
+import json
+import time
+import threading
+from concurrent.futures import Future
+from typing import Optional, List, Dict, Any, Callable, NamedTuple
+
+import yaml
+
+current_dir = os.path.abspath(os.path.dirname(__file__))
+src_dir= os.path.abspath(os.path.join(current_dir, '..'))
+# set sys_path to also look for libs elsewhere
+sys.path.append(src_dir)
+from libs.logger import CustomLogger
+from libs.github_api import RateLimitExceeded
+from scraper.discovery import SearchBlocked
+import database.db_controller as db_controller
+from pipeline.repository_sink import RepositorySink
+from pipeline.checkpoint import CrawlCheckpointer
+from scraper.scraper_pool import AgentQLScraperPool
+
+
+class CrawlJob(NamedTuple):
+  """One search crawl: a dork and how to run it"""
+  dork: str # the search string
+  pages: int = 100 # result pages to crawl at most
+  timeout: int = 60000 # page load / AgentQL query timeout in milliseconds
+  headless: bool = False # run this job's browser without a window
+  search_url: str = "https://www.google.com" # search engine to open
+  max_minutes: Optional[float] = None # wall-clock budget, the crawl stops after the page running when it is used up
+  fresh: bool = False # ignore the stored checkpoint of the dork
+
+
+class CrawlJobResult(NamedTuple):
+  """What one crawl job did"""
+  dork: str
+  status: str # finished, stopped (repeated page / budget used up), rate_limited or blocked (resume later), failed
+  pages: int
+  results: int
+  written: int # repositories upserted (new or updated)
+  elapsed: float # seconds
+  error: Optional[str] = None
+  new: int = 0 # repositories that were not in the database before
+
+
+def load_crawl_jobs(path: str, defaults: Optional[Dict[str, Any]] = None) -> List[CrawlJob]:
+  """
+  Reads the crawl jobs from a dorks file.
+
+  Plain text files have one dork per line (empty lines and lines starting with # are skipped), and every
+  job gets the defaults. YAML (.yml/.yaml) and JSON files hold a list whose items are either a dork string
+  or a mapping with a dork and any CrawlJob field to override, e.g.:
+
+    - site:github.com inurl:docker-compose.yml
+    - dork: site:github.com inurl:compose.yaml
+      pages: 20
+      timeout: 30000
+      headless: true
+
+  Args:
+    path (str): the dorks file
+    defaults (Dict[str, Any], optional): CrawlJob fields applied to every job unless the job overrides them
+
+  Returns:
+    List[CrawlJob]: the jobs in file order
+  """
+  defaults = {k: v for k, v in (defaults or {}).items() if v is not None}
+  with open(path, encoding="utf-8") as f:
+    if path.endswith((".yml", ".yaml")):
+      entries = yaml.safe_load(f) or []
+    elif path.endswith(".json"):
+      entries = json.load(f)
+    else:
+      entries = [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+  jobs = []
+  for entry in entries:
+    fields = dict(defaults)
+    if isinstance(entry, str):
+      fields["dork"] = entry
+    elif isinstance(entry, dict) and entry.get("dork"):
+      unknown = set(entry) - set(CrawlJob._fields)
+      if unknown:
+        raise ValueError(f"Unknown crawl job field(s) {sorted(unknown)} in {path}")
+      fields.update(entry)
+    else:
+      raise ValueError(f"Crawl job without a dork in {path}: {entry!r}")
+    jobs.append(CrawlJob(**fields))
+  return jobs
+
+
+class CrawlJobFailed(Exception):
+  """A crawl job failed in its pool worker (which then replaces the scraper), carries the job's result"""
+  def __init__(self, result: CrawlJobResult):
+    super().__init__(result.error)
+    self.result = result
+
+
+class CrawlRunner:
+  """
+  Runs crawl jobs as independent jobs on a scraper.scraper_pool.AgentQLScraperPool.
+
+  Every worker of the pool owns a scraper, i.e., its own Playwright instance and browser context (started with
+  the headless setting of its first job and replaced when a job needs another one or failed), and every job
+  gets its own RepositorySink and its own checkpoint, so jobs never share a page and a failing job does not take
+  the others down. Browser profiles (user_data_dir) are bound to the workers rather than jobs, so cookies
+  survive from one job of a worker to the next but two running jobs never share one.
+
+  Example:
+    runner = CrawlRunner(workers=3, query=aql)
+    results = runner.run(load_crawl_jobs("dorks.txt", defaults=dict(pages=10, headless=True)))
+    runner.log_summary(results)
+  """
+  def __init__(self,
+               query: str,
+               workers: int = 2,
+               user_data_dir_base: str = "/tmp/playwright-user-data",
+               batch_size: int = 100,
+               scraper_factory: Optional[Callable[..., Any]] = None,
+               session_factory: Optional[Callable] = None):
+    """
+      Args:
+        query (str): AgentQL query extracting the search results of a page
+        workers (int): number of jobs running at the same time
+        user_data_dir_base (str): worker N uses <user_data_dir_base>-N as browser profile (a single worker
+                                  <user_data_dir_base> itself, like the single-dork crawl always did)
+        batch_size (int): rows per database commit of each job's sink
+        scraper_factory (Callable): builds a scraper from headless and user_data_dir
+                                    (default: AgentQLPlaywrightScraper, override it for tests)
+        session_factory (Callable): returns a new SQLAlchemy session (default: db_controller.get_session)
+    """
+    if workers < 1:
+      raise ValueError("'workers' must be at least 1")
+    self.logger = CustomLogger(self.__class__.__name__)
+    self.query = query
+    self.workers = workers
+    self.user_data_dir_base = user_data_dir_base
+    self.batch_size = batch_size
+    self.scraper_factory = scraper_factory
+    self.session_factory = session_factory if session_factory is not None else db_controller.get_session
+    self._pool: Optional[AgentQLScraperPool] = None
+    self._pool_lock = threading.Lock()
+    self.new_repositories = 0
+    self.elapsed = 0.0
+
+  def _get_pool(self) -> AgentQLScraperPool:
+    """The scraper pool, started with the first job after a close()"""
+    with self._pool_lock:
+      if self._pool is None:
+        self._pool = AgentQLScraperPool(num_contexts=self.workers,
+                                        user_data_dir_base=self.user_data_dir_base,
+                                        scraper_factory=self.scraper_factory)
+      return self._pool
+
+  def _crawl(self, scraper, slot: int, job: CrawlJob) -> CrawlJobResult:
+    """Runs one crawl job with the scraper of pool worker `slot`"""
+    started = time.monotonic()
+    deadline = started + job.max_minutes * 60 if job.max_minutes else None
+    status, error = "finished", None
+    sink = None
+    try:
+      checkpointer = CrawlCheckpointer(dork=job.dork, session_factory=self.session_factory)
+      resume = checkpointer.load(fresh=job.fresh)
+      self.logger.info(f"[slot {slot}] Crawling '{job.dork}' from page {resume.start_page} "
+                       f"(pages={job.pages}, timeout={job.timeout}ms, headless={job.headless})")
+      with RepositorySink(batch_size=self.batch_size,
+                          session_factory=self.session_factory,
+                          checkpointer=checkpointer) as sink:
+        try:
+          for scraped in scraper.iter_search_query(url=job.search_url,
+                                                   search_string=job.dork,
+                                                   query=self.query,
+                                                   num_pages=job.pages,
+                                                   agentql_query_timeout=job.timeout,
+                                                   resume_url=resume.resume_url,
+                                                   start_page=resume.start_page,
+                                                   raise_errors=True):
+            if not sink.add_scraped_page(scraped):
+              status = "stopped"
+              break
+            self.logger.info(f"[slot {slot}] '{job.dork}' page {scraped.page_number}: "
+                             f"{len((scraped.data or {}).get('search_results') or [])} search results")
+            if deadline is not None and time.monotonic() > deadline:
+              self.logger.warning(f"[slot {slot}] '{job.dork}' used up its {job.max_minutes} minute(s), stopping")
+              status = "stopped"
+              break
+        except RateLimitExceeded as e:
+          # not a failure and not the end of the search: the checkpoint says so, the next run resumes it
+          status, error = "rate_limited", str(e)
+          self.logger.warning(f"[slot {slot}] '{job.dork}' stopped: {error}")
+          sink.flush(status="rate_limited")
+        except SearchBlocked as e:
+          # a CAPTCHA: the checkpoint stays on the last result page, the next run resumes from there
+          status, error = "blocked", str(e)
+          self.logger.warning(f"[slot {slot}] '{job.dork}' stopped: {error}")
+          sink.flush(status="blocked")
+    except Exception as e:
+      status, error = "failed", str(e) or e.__class__.__name__
+      self.logger.error(f"[slot {slot}] Crawl '{job.dork}' failed: {error}")
+
+    result = CrawlJobResult(dork=job.dork,
+                            status=status,
+                            pages=sink.num_pages if sink else 0,
+                            results=sink.num_results if sink else 0,
+                            written=sink.num_written if sink else 0,
+                            elapsed=time.monotonic() - started,
+                            error=error,
+                            new=sink.num_new if sink else 0)
+    if status == "failed":
+      raise CrawlJobFailed(result)
+    return result
+
+  def submit(self, job: CrawlJob) -> Future:
+    """
+    Queues a crawl job for the next free pool worker.
+
+    Returns:
+      Future: resolves to the CrawlJobResult, a failed job included; raises what the scraper raised outside of
+              Exception (e.g., SystemExit when it finds no API key)
+    """
+    future: Future = Future()
+
+    def resolve(pool_future: Future) -> None:
+      try:
+        future.set_result(pool_future.result())
+      except CrawlJobFailed as e:
+        future.set_result(e.result)
+      except Exception as e:
+        # the scraper could not be built, e.g., the browser did not start
+        self.logger.error(f"Crawl '{job.dork}' failed: {e}")
+        future.set_result(CrawlJobResult(dork=job.dork, status="failed", pages=0, results=0, written=0,
+                                         elapsed=0.0, error=str(e) or e.__class__.__name__))
+      except BaseException as e:  # e.g., SystemExit, not a failed job: the caller re-raises it
+        future.set_exception(e)
+
+    self._get_pool().submit(self._crawl, headless=job.headless, job=job).add_done_callback(resolve)
+    return future
+
+  def run_job(self, job: CrawlJob) -> CrawlJobResult:
+    """Runs one crawl job on a free pool worker (blocks until it is done)"""
+    return self.submit(job).result()
+
+  def close(self, cancel_pending: bool = False) -> None:
+    """Closes the scraper pool (and every browser), failing the queued jobs if cancel_pending is set"""
+    with self._pool_lock:
+      pool, self._pool = self._pool, None
+    if pool is not None:
+      pool.close(cancel_pending=cancel_pending)
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc, tb):
+    self.close(cancel_pending=exc_type is not None)
+
+  def _count_repositories(self) -> int:
+    session = self.session_factory()
+    try:
+      return db_controller.get_collection_stats(session)["repositories"]
+    finally:
+      session.close()
+
+  def run(self, jobs: List[CrawlJob]) -> List[CrawlJobResult]:
+    """
+    Runs the jobs, at most `workers` at a time.
+
+    Returns:
+      List[CrawlJobResult]: the results, in the same order as the jobs
+    """
+    repositories_before = self._count_repositories()
+    self.logger.info(f"Running {len(jobs)} crawl job(s) with {self.workers} worker(s)")
+    started = time.monotonic()
+    with self:
+      futures = [self.submit(job) for job in jobs]
+      results = [future.result() for future in futures]
+    self.elapsed = time.monotonic() - started
+    self.new_repositories = self._count_repositories() - repositories_before
+    return results
+
+  def summary(self, results: List[CrawlJobResult]) -> Dict[str, Any]:
+    """Combined throughput of the last run(): totals and pages, results and new repositories per minute"""
+    minutes = self.elapsed / 60 if self.elapsed else 0
+    pages = sum(result.pages for result in results)
+    num_results = sum(result.results for result in results)
+    return dict(jobs=len(results),
+                failed=sum(result.status == "failed" for result in results),
+                minutes=round(minutes, 2),
+                pages=pages,
+                results=num_results,
+                written=sum(result.written for result in results),
+                new_repositories=self.new_repositories,
+                pages_per_min=round(pages / minutes, 2) if minutes else 0.0,
+                results_per_min=round(num_results / minutes, 2) if minutes else 0.0,
+                new_repos_per_min=round(self.new_repositories / minutes, 2) if minutes else 0.0)
+
+  def log_summary(self, results: List[CrawlJobResult]) -> Dict[str, Any]:
+    """Logs one line per job and the combined throughput, returns summary()"""
+    self.logger.info("=== CRAWL SUMMARY ===")
+    for result in results:
+      rate = result.pages / (result.elapsed / 60) if result.elapsed else 0
+      self.logger.info(f"{result.status:<8} '{result.dork}': {result.pages} pages, {result.results} results, "
+                       f"{result.written} repositories written ({result.new} new) in {result.elapsed / 60:.1f} min ({rate:.2f} pages/min)"
+                       + (f" - {result.error}" if result.error else ""))
+    summary = self.summary(results)
+    self.logger.info(f"Total: {summary['pages']} pages, {summary['results']} results, {summary['new_repositories']} new "
+                     f"repositories in {summary['minutes']} min | {summary['pages_per_min']} pages/min, "
+                     f"{summary['results_per_min']} results/min, {summary['new_repos_per_min']} new repos/min")
+    return summary
@@ -0,0 +1,390 @@
+import os
+import re
+import sys
+import time
+from datetime import date
+from collections import Counter
+from concurrent.futures import wait, FIRST_COMPLETED
+from typing import Optional, List, Dict, Any, Iterable, NamedTuple
+
+current_dir = os.path.abspath(os.path.dirname(__file__))
+src_dir= os.path.abspath(os.path.join(current_dir, '..'))
+# set sys_path to also look for libs elsewhere
+sys.path.append(src_dir)
+from libs.logger import CustomLogger
+from libs.metrics import metrics
+import database.db_controller as db_controller
+from pipeline.crawl_jobs import CrawlJob, CrawlJobResult, CrawlRunner
+
+# compose file names the path shards search for; Google's inurl: matches substrings, so every variant excludes
+# the longer variants containing it (compose.yml -> -inurl:docker-compose.yml) to keep the shards disjoint
+PATH_VARIANTS = ["docker-compose.yml", "docker-compose.yaml", "compose.yml", "compose.yaml"]
+
+# shard kinds in the order their untried shards are probed
+SHARD_KINDS = ("path", "date", "org", "keyword")
+
+# words of about texts that say nothing about what a repository is
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in into is it its of on or that the this to with without your you
+our we can will using use used based simple example examples project projects repository repo code app apps
+application applications docker compose dockerized container containers github version new more how all not
+""".split())
+
+_WORD_RE = re.compile(r"[a-z][a-z0-9+#.-]*[a-z0-9+#]")
+_INURL_RE = re.compile(r"(?<!\S)inurl:(\S+)")
+_SITE_RE = re.compile(r"(?<!\S)site:github\.com(?=\s|$)")
+
+
+class Shard(NamedTuple):
+  """A narrower sub-query of a base dork"""
+  dork: str # the search string of the shard
+  kind: str # base, path, date, org or keyword
+  value: str # what narrows it down: the file name, the year, the developer or the keyword
+
+
+def about_keywords(texts: Iterable[str],
+                   limit: int = 20,
+                   min_count: int = 3,
+                   max_share: float = 0.2,
+                   exclude: Iterable[str] = ()) -> List[str]:
+  """
+  Picks keywords that split the collected repositories into large but not overwhelming groups: the words found
+  in the most about texts, leaving out stop words and words found in more than max_share of the texts.
+
+  Args:
+    texts (Iterable[str]): about texts of collected repositories
+    limit (int): maximum number of keywords
+    min_count (int): leave out words found in fewer texts
+    max_share (float): leave out words found in a larger share of the texts (they barely narrow the query)
+    exclude (Iterable[str]): further words to leave out, e.g., the words of the base dork
+
+  Returns:
+    List[str]: the keywords, most frequent first
+  """
+  excluded = STOPWORDS | {word.lower() for word in exclude}
+  counts: Counter = Counter()
+  num_texts = 0
+  for text in texts:
+    num_texts += 1
+    counts.update({word.strip(".-") for word in _WORD_RE.findall(text.lower())} - excluded)
+  max_count = max(min_count, int(num_texts * max_share))
+  keywords = [word for word, count in sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+              if min_count <= count <= max_count and len(word) > 2 and word not in excluded]
+  return keywords[:limit]
+
+
+def _with_path(base_dork: str, path: str, variants: List[str]) -> str:
+  match = _INURL_RE.search(base_dork)
+  dork = (base_dork[:match.start()] + f"inurl:{path}" + base_dork[match.end():] if match
+          else f"{base_dork} inurl:{path}")
+  exclusions = [f"-inurl:{other}" for other in variants if other != path and path in other]
+  return " ".join([dork] + exclusions)
+
+
+def expand_dork(base_dork: str,
+                kinds: Iterable[str] = SHARD_KINDS,
+                path_variants: Optional[List[str]] = None,
+                years: Iterable[int] = (),
+                developers: Iterable[str] = (),
+                keywords: Iterable[str] = ()) -> List[Shard]:
+  """
+  Expands a base dork into narrower sub-queries, each reaching results the base dork's result ceiling hides:
+    - path:    one per compose file name (inurl:), disjoint thanks to the -inurl: exclusions
+    - date:    one per year (after:/before:), disjoint up to the day at the boundary
+    - org:     one per developer (site:github.com/<developer>), disjoint from each other
+    - keyword: one per keyword ("<keyword>"), overlapping where an about text has several of them
+  The base dork itself comes first. Shards with the same search string are dropped.
+
+  Args:
+    base_dork (str): the dork to expand, e.g., 'site:github.com inurl:docker-compose.yml'
+    kinds (Iterable[str]): which kinds of shards to build, see SHARD_KINDS
+    path_variants (List[str]): compose file names (default: PATH_VARIANTS)
+    years (Iterable[int]): years of the date shards
+    developers (Iterable[str]): users / organizations of the org shards
+    keywords (Iterable[str]): keywords of the keyword shards
+
+  Returns:
+    List[Shard]: the shards, the base dork first, then by kind in the order of kinds
+  """
+  variants = path_variants if path_variants is not None else PATH_VARIANTS
+  shards = [Shard(dork=base_dork, kind="base", value="")]
+  for kind in kinds:
+    if kind == "path":
+      shards += [Shard(_with_path(base_dork, path, variants), kind, path) for path in variants]
+    elif kind == "date":
+      shards += [Shard(f"{base_dork} after:{year}-01-01 before:{year + 1}-01-01", kind, str(year)) for year in years]
+    elif kind == "org":
+      for developer in developers:
+        dork = (_SITE_RE.sub(f"site:github.com/{developer}", base_dork, count=1) if _SITE_RE.search(base_dork)
+                else f"{base_dork} site:github.com/{developer}")
+        shards.append(Shard(dork, kind, developer))
+    elif kind == "keyword":
+      shards += [Shard(f'{base_dork} "{keyword}"', kind, keyword) for keyword in keywords]
+    else:
+      raise ValueError(f"Unknown shard kind '{kind}', use one of {SHARD_KINDS}")
+
+  seen, unique = set(), []
+  for shard in shards:
+    if shard.dork not in seen:
+      seen.add(shard.dork)
+      unique.append(shard)
+  return unique
+
+
+class _ShardState:
+  """What the planner knows about one shard"""
+  def __init__(self, shard: Shard):
+    self.shard = shard
+    self.pages = 0 # result pages crawled so far, including earlier runs (the checkpoint)
+    self.new = 0 # new repositories found during this run
+    self.runs = 0
+    self.failures = 0
+    self.yield_estimate: Optional[float] = None # smoothed new repositories per page, None until probed
+    self.exhausted = False # no more pages, or given up on
+    self.fresh = False # the first job ignores the stored checkpoint
+    self.running = False
+
+
+class DorkPlanner:
+  """
+  Gets past the result ceiling of a single dork (a few hundred results however many pages are requested)
+  by crawling many narrower shards of it (see expand_dork()) under one budget of result pages.
+
+  Every shard is probed with probe_pages pages first, then the budget goes round_pages at a time to the shard
+  with the highest marginal yield: new repositories (not in the database before) per page, smoothed over its
+  last jobs. Yields fall as a shard goes deeper and its results repeat what other shards found, so the budget
+  moves on by itself; shards yielding less than min_yield are dropped, as are shards whose search has no next
+  page. The jobs run on the CrawlRunner's scraper pool, a new one is scheduled as soon as one finishes, and
+  every shard keeps its own checkpoint, so the next job of a shard (and the next run) continues where it stopped.
+
+  Example:
+    runner = CrawlRunner(query=aql, workers=3)
+    planner = DorkPlanner(runner)
+    results = planner.run("site:github.com inurl:docker-compose.yml", budget_pages=300)
+    planner.log_summary()
+  """
+  MAX_FAILURES = 2
+
+  def __init__(self,
+               runner: CrawlRunner,
+               kinds: Iterable[str] = SHARD_KINDS,
+               probe_pages: int = 1,
+               round_pages: int = 3,
+               min_yield: float = 1.0,
+               smoothing: float = 0.5,
+               max_developers: int = 20,
+               max_keywords: int = 20,
+               since_year: int = 2015):
+    """
+      Args:
+        runner (CrawlRunner): runs the shard jobs, its workers are the shards crawled at the same time
+        kinds (Iterable[str]): kinds of shards to build, see SHARD_KINDS
+        probe_pages (int): pages of the first job of every shard
+        round_pages (int): pages of every later job
+        min_yield (float): drop a shard once it finds fewer new repositories per page
+        smoothing (float): weight of the latest job in the yield estimate (1: only the latest job counts)
+        max_developers (int): org shards for the developers with the most collected repositories
+        max_keywords (int): keyword shards from the collected about texts
+        since_year (int): first year of the date shards (the last one is the current year)
+    """
+    if probe_pages < 1 or round_pages < 1:
+      raise ValueError("'probe_pages' and 'round_pages' must be at least 1")
+    if not 0 < smoothing <= 1:
+      raise ValueError("'smoothing' must be in (0, 1]")
+    self.logger = CustomLogger(self.__class__.__name__)
+    self.runner = runner
+    self.kinds = tuple(kinds)
+    self.probe_pages = probe_pages
+    self.round_pages = round_pages
+    self.min_yield = min_yield
+    self.smoothing = smoothing
+    self.max_developers = max_developers
+    self.max_keywords = max_keywords
+    self.since_year = since_year
+    self.states: List[_ShardState] = []
+    self.pages_spent = 0
+    self.rate_limited = False # a job ran out of search budget or was blocked, no new jobs are scheduled
+    self.elapsed = 0.0
+
+  def expand(self, base_dork: str) -> List[Shard]:
+    """The shards of a base dork, with the developers and keywords taken from what is collected already"""
+    developers, keywords = [], []
+    if "org" in self.kinds or "keyword" in self.kinds:
+      session = self.runner.session_factory()
+      try:
+        if "org" in self.kinds:
+          developers = [developer for developer, _ in
+                        db_controller.get_top_developers(session, limit=self.max_developers)]
+        if "keyword" in self.kinds:
+          keywords = about_keywords(db_controller.get_about_texts(session), limit=self.max_keywords,
+                                    exclude=_WORD_RE.findall(base_dork.lower()))
+      finally:
+        session.close()
+    return expand_dork(base_dork,
+                       kinds=self.kinds,
+                       years=range(self.since_year, date.today().year + 1),
+                       developers=developers,
+                       keywords=keywords)
+
+  def _load_states(self, shards: List[Shard], fresh: bool, max_pages: int) -> List[_ShardState]:
+    """One state per shard, starting where the shard's stored checkpoint is"""
+    states = []
+    session = self.runner.session_factory()
+    try:
+      for shard in shards:
+        state = _ShardState(shard)
+        checkpoint = db_controller.get_crawl_checkpoint(session, shard.dork)
+        if fresh:
+          state.fresh = checkpoint is not None
+        elif checkpoint is not None:
+          state.pages = checkpoint.last_page
+          state.exhausted = checkpoint.status == "finished" or not checkpoint.next_page_url
+        state.exhausted = state.exhausted or state.pages >= max_pages
+        states.append(state)
+    finally:
+      session.close()
+    return states
+
+  def _next_state(self) -> Optional[_ShardState]:
+    """The shard to crawl next: an unprobed one in expansion order, otherwise the one with the highest yield"""
+    candidates = [state for state in self.states if not state.running and not state.exhausted]
+    for state in candidates:
+      if state.yield_estimate is None:
+        return state
+    candidates = [state for state in candidates if state.yield_estimate >= self.min_yield]
+    return max(candidates, key=lambda state: state.yield_estimate, default=None)
+
+  def _shard_finished(self, dork: str) -> bool:
+    """Whether the stored checkpoint of a shard says its search has no next page"""
+    session = self.runner.session_factory()
+    try:
+      checkpoint = db_controller.get_crawl_checkpoint(session, dork)
+      return checkpoint is None or checkpoint.status == "finished" or not checkpoint.next_page_url
+    finally:
+      session.close()
+
+  def _update(self, state: _ShardState, result: CrawlJobResult, max_pages: int) -> None:
+    state.running = False
+    state.runs += 1
+    state.pages += result.pages
+    state.new += result.new
+    metrics.count(f"pipeline.shard_pages.{state.shard.kind}", result.pages)
+    metrics.count(f"pipeline.shard_new_repositories.{state.shard.kind}", result.new)
+    if result.status in ("rate_limited", "blocked"):
+      # the shard is not done, its checkpoint resumes it in the next run
+      if not self.rate_limited:
+        reason = "The search rate limit is used up" if result.status == "rate_limited" else "The search engine blocked the crawl"
+        self.logger.warning(f"{reason}, no more shards are scheduled in this run")
+      self.rate_limited = True
+      return
+    if result.status == "failed":
+      state.failures += 1
+      state.exhausted = state.failures >= self.MAX_FAILURES
+      return
+    if result.pages:
+      marginal = result.new / result.pages
+      state.yield_estimate = (marginal if state.yield_estimate is None
+                              else self.smoothing * marginal + (1 - self.smoothing) * state.yield_estimate)
+    state.exhausted = not result.pages or state.pages >= max_pages or self._shard_finished(state.shard.dork)
+    if state.yield_estimate is not None and state.yield_estimate < self.min_yield:
+      self.logger.info(f"Shard '{state.shard.dork}' dropped: {state.yield_estimate:.2f} new repositories per page")
+
+  def run(self,
+          base_dork: str,
+          budget_pages: int,
+          job_defaults: Optional[Dict[str, Any]] = None) -> List[CrawlJobResult]:
+    """
+    Expands the base dork and crawls its shards until the page budget is spent or no shard is worth crawling.
+
+    Args:
+      base_dork (str): the dork to expand
+      budget_pages (int): result pages to crawl at most, over all shards
+      job_defaults (Dict[str, Any], optional): CrawlJob fields of every job (timeout, headless, search_url,
+                                               max_minutes, fresh); pages is the page limit of every shard
+
+    Returns:
+      List[CrawlJobResult]: the results of every job, in the order they finished
+    """
+    defaults = {k: v for k, v in (job_defaults or {}).items() if v is not None}
+    max_pages = defaults.pop("pages", CrawlJob._field_defaults["pages"])
+    fresh = defaults.pop("fresh", False)
+    defaults.pop("dork", None)
+
+    self.states = self._load_states(self.expand(base_dork), fresh=fresh, max_pages=max_pages)
+    counts: Counter = Counter(state.shard.kind for state in self.states)
+    self.logger.info(f"Expanded '{base_dork}' into {len(self.states)} shard(s) {dict(counts)}, "
+                     f"{sum(state.exhausted for state in self.states)} already finished; budget {budget_pages} page(s)")
+
+    repositories_before = self._count_repositories()
+    started = time.monotonic()
+    results: List[CrawlJobResult] = []
+    pending: Dict[Any, tuple] = {} # future -> (shard state, pages reserved)
+    reserved = 0
+    self.pages_spent = 0
+    self.rate_limited = False
+    with self.runner:
+      while True:
+        while len(pending) < self.runner.workers and self.pages_spent + reserved < budget_pages and not self.rate_limited:
+          state = self._next_state()
+          if state is None:
+            break
+          pages = min(self.probe_pages if state.yield_estimate is None else self.round_pages,
+                      budget_pages - self.pages_spent - reserved,
+                      max_pages - state.pages)
+          job = CrawlJob(dork=state.shard.dork, pages=state.pages + pages, fresh=state.fresh, **defaults)
+          state.running, state.fresh = True, False
+          reserved += pages
+          pending[self.runner.submit(job)] = (state, pages)
+        if not pending:
+          break
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+          state, pages = pending.pop(future)
+          result = future.result()
+          reserved -= pages
+          self.pages_spent += result.pages
+          self._update(state, result, max_pages)
+          results.append(result)
+    self.elapsed = time.monotonic() - started
+    # the runner's summary covers the jobs of the planner as well
+    self.runner.elapsed = self.elapsed
+    self.runner.new_repositories = self._count_repositories() - repositories_before
+    return results
+
+  def _count_repositories(self) -> int:
+    session = self.runner.session_factory()
+    try:
+      return db_controller.get_collection_stats(session)["repositories"]
+    finally:
+      session.close()
+
+  def shard_stats(self) -> List[Dict[str, Any]]:
+    """Pages, new repositories and yield of every shard crawled during the last run(), highest yield first"""
+    rows = [dict(dork=state.shard.dork,
+                 kind=state.shard.kind,
+                 jobs=state.runs,
+                 pages=state.pages,
+                 new=state.new,
+                 yield_estimate=round(state.yield_estimate, 2) if state.yield_estimate is not None else None,
+                 exhausted=state.exhausted)
+            for state in self.states if state.runs]
+    return sorted(rows, key=lambda row: -(row["yield_estimate"] or 0))
+
+  def log_summary(self) -> Dict[str, Any]:
+    """Logs one line per crawled shard and the new repositories per kind, returns the totals"""
+    self.logger.info("=== SHARD SUMMARY ===")
+    rows = self.shard_stats()
+    for row in rows:
+      self.logger.info(f"{row['kind']:<8} {row['yield_estimate'] or 0:6.2f} new/page | {row['jobs']} job(s), "
+                       f"{row['pages']} pages, {row['new']} new | '{row['dork']}'" + (" (done)" if row["exhausted"] else ""))
+    by_kind: Dict[str, int] = {}
+    for row in rows:
+      by_kind[row["kind"]] = by_kind.get(row["kind"], 0) + row["new"]
+    totals = dict(shards=len(self.states),
+                  crawled=len(rows),
+                  pages=self.pages_spent,
+                  new=sum(row["new"] for row in rows),
+                  new_by_kind=by_kind)
+    self.logger.info(f"{totals['crawled']}/{totals['shards']} shard(s) crawled, {totals['pages']} pages, "
+                     f"{totals['new']} new repositories {by_kind}")
+    return totals
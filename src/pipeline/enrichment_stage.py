@@ -0,0 +1,296 @@
+import os
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any, NamedTuple
+
+current_dir = os.path.abspath(os.path.dirname(__file__))
+src_dir= os.path.abspath(os.path.join(current_dir, '..'))
+# set sys_path to also look for libs elsewhere
+sys.path.append(src_dir)
+from libs.logger import CustomLogger
+from libs.metrics import metrics
+from libs.misc import get_current_utc_time
+from libs.github_api import GitHubApiClient, RateLimitExceeded
+import database.db_controller as db_controller
+
+# file names checked for has_readme over GraphQL (the REST API finds any README by itself)
+README_NAMES = ("README.md", "README", "README.rst", "README.txt", "README.markdown", "readme.md", "Readme.md")
+
+GRAPHQL_FRAGMENT = """
+fragment RepoMetadata on Repository {
+  stargazerCount
+  issues(states: OPEN) { totalCount }
+  createdAt
+  pushedAt
+  defaultBranchRef { target { ... on Commit { committedDate } } }
+%s
+}
+""" % "\n".join(f'  readme{i}: object(expression: "HEAD:{name}") {{ id }}' for i, name in enumerate(README_NAMES))
+
+
+class RepoMetadata(NamedTuple):
+  """What the enrichment fetches about a repository"""
+  num_stars: int
+  num_issues: int # open issues
+  created_at: Optional[datetime]
+  last_commit: Optional[datetime] # last commit on the default branch
+  has_readme: bool
+
+
+def parse_github_time(value: Optional[str]) -> Optional[datetime]:
+  """GitHub's ISO 8601 UTC timestamps (2024-01-31T12:00:00Z) as naive UTC datetimes, like the database columns"""
+  if not value:
+    return None
+  return datetime.fromisoformat(value.replace("Z", "+00:00")).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class GraphQLMetadataFetcher:
+  """Fetches the metadata of many repositories with one GraphQL query (one aliased repository() per repository)"""
+  def __init__(self, client: GitHubApiClient):
+    self.client = client
+
+  @staticmethod
+  def build_query(repositories: List[tuple]) -> tuple:
+    """The query and the variables for a list of (owner, name)"""
+    declarations = ", ".join(f"$o{i}: String!, $n{i}: String!" for i in range(len(repositories)))
+    selections = "\n".join(f"  r{i}: repository(owner: $o{i}, name: $n{i}) {{ ...RepoMetadata }}" for i in range(len(repositories)))
+    query = f"query({declarations}) {{\n  rateLimit {{ cost remaining resetAt }}\n{selections}\n}}\n{GRAPHQL_FRAGMENT}"
+    variables = {}
+    for i, (owner, name) in enumerate(repositories):
+      variables[f"o{i}"], variables[f"n{i}"] = owner, name
+    return query, variables
+
+  @staticmethod
+  def parse_repository(node: Dict[str, Any]) -> RepoMetadata:
+    target = (node.get("defaultBranchRef") or {}).get("target") or {}
+    return RepoMetadata(num_stars=node.get("stargazerCount") or 0,
+                        num_issues=(node.get("issues") or {}).get("totalCount") or 0,
+                        created_at=parse_github_time(node.get("createdAt")),
+                        last_commit=parse_github_time(target.get("committedDate") or node.get("pushedAt")),
+                        has_readme=any(node.get(f"readme{i}") for i in range(len(README_NAMES))))
+
+  def fetch(self, repositories: List[tuple]) -> Dict[int, Optional[RepoMetadata]]:
+    """
+    Args:
+      repositories (List[tuple]): (owner, name) of the repositories
+
+    Returns:
+      Dict[int, Optional[RepoMetadata]]: metadata by position in repositories, None for the ones that do not
+                                         exist (any more); positions that failed otherwise are missing
+    """
+    query, variables = self.build_query(repositories)
+    payload = self.client.graphql(query, variables)
+    data = payload.get("data") or {}
+    not_found = {str(error["path"][0]) for error in payload.get("errors") or []
+                 if error.get("type") == "NOT_FOUND" and error.get("path")}
+    results = {}
+    for i in range(len(repositories)):
+      node = data.get(f"r{i}")
+      if node is not None:
+        results[i] = self.parse_repository(node)
+      elif f"r{i}" in not_found:
+        results[i] = None
+    return results
+
+
+class RestMetadataFetcher:
+  """
+  Fetches the metadata one repository at a time over the REST API (three conditional requests each:
+  the repository, its latest commit and its README), for running without a token.
+  Note that the REST API counts open pull requests as issues.
+  """
+  def __init__(self, client: GitHubApiClient):
+    self.logger = CustomLogger(self.__class__.__name__)
+    self.client = client
+
+  def fetch_one(self, owner: str, name: str) -> Optional[RepoMetadata]:
+    repository = self.client.get(f"/repos/{owner}/{name}")
+    if repository.data is None:
+      return None
+    repo = repository.data
+    commits = self.client.get(f"/repos/{owner}/{name}/commits", params={"per_page": 1, "sha": repo.get("default_branch")})
+    commit = commits.data[0] if isinstance(commits.data, list) and commits.data else {}
+    committed = ((commit.get("commit") or {}).get("committer") or {}).get("date")
+    readme = self.client.get(f"/repos/{owner}/{name}/readme")
+    return RepoMetadata(num_stars=repo.get("stargazers_count") or 0,
+                        num_issues=repo.get("open_issues_count") or 0,
+                        created_at=parse_github_time(repo.get("created_at")),
+                        last_commit=parse_github_time(committed or repo.get("pushed_at")),
+                        has_readme=readme.data is not None)
+
+  def fetch(self, repositories: List[tuple]) -> Dict[int, Optional[RepoMetadata]]:
+    """Same as GraphQLMetadataFetcher.fetch()"""
+    results = {}
+    for i, (owner, name) in enumerate(repositories):
+      try:
+        results[i] = self.fetch_one(owner, name)
+      except RateLimitExceeded:
+        raise
+      except Exception as e:
+        self.logger.warning(f"Could not fetch {owner}/{name}: {e}")
+    return results
+
+
+class EnrichmentStage:
+  """
+  Fills num_stars, num_issues, created_at, last_commit and has_readme of the repositories that have no GitHub
+  metadata yet (or none since a given time) from the GitHub API.
+
+  Repositories are fetched in batches (one GraphQL query per batch with a token, REST requests otherwise) by a
+  pool of worker threads sharing one pooled GitHubApiClient, so its connections, ETag cache and rate limit
+  state are shared too. When the rate limit is used up and resets later than the client is willing to wait,
+  the run stops and the rest is left for the next one. Results are written back in bulk every write_every
+  repositories, so an interrupted run keeps what it fetched.
+
+  Example:
+    stage = EnrichmentStage(client=GitHubApiClient(token="...", api_url="http://127.0.0.1:8766"))
+    stats = stage.run(limit=1000)
+  """
+  def __init__(self,
+               client: Optional[GitHubApiClient] = None,
+               backend: str = "auto",
+               batch_size: int = 50,
+               max_workers: int = 4,
+               write_every: int = 500):
+    """
+      Args:
+        client (GitHubApiClient): the API client (default: GitHubApiClient.from_env())
+        backend (str): graphql, rest or auto (graphql if the client has a token)
+        batch_size (int): repositories per GraphQL query / per worker task
+        max_workers (int): batches fetched at the same time
+        write_every (int): repositories written (and committed) per database round trip
+    """
+    self.logger = CustomLogger(self.__class__.__name__)
+    self.client = client if client is not None else GitHubApiClient.from_env(pool_size=max_workers)
+    if backend == "auto":
+      backend = "graphql" if self.client.token else "rest"
+    if backend not in ("graphql", "rest"):
+      raise ValueError(f"Unknown backend '{backend}', use graphql, rest or auto")
+    self.backend = backend
+    self.fetcher = GraphQLMetadataFetcher(self.client) if backend == "graphql" else RestMetadataFetcher(self.client)
+    self.batch_size = batch_size
+    self.max_workers = max_workers
+    self.write_every = write_every
+    self.stats = dict(repositories=0, enriched=0, not_found=0, failed=0, skipped=0)
+    self._stop = threading.Event()
+
+  @property
+  def requests_per_repository(self) -> float:
+    """API requests one repository costs at most: a share of a GraphQL query, or three REST requests"""
+    return 1 / self.batch_size if self.backend == "graphql" else 3.0
+
+  @staticmethod
+  def star_velocity(previous_stars: Optional[int],
+                    previous_fetched_at: Optional[datetime],
+                    stars: int,
+                    fetched_at: datetime) -> Optional[float]:
+    """Stars gained per day since the previous fetch, None on the first one"""
+    if previous_stars is None or previous_fetched_at is None:
+      return None
+    days = max((fetched_at - previous_fetched_at).total_seconds() / 86400, 1 / 24)
+    return (stars - previous_stars) / days
+
+  def fetch_batch(self, batch: List[tuple]) -> List[tuple]:
+    """
+    Fetches one batch of (id, owner, name, ...).
+
+    Returns:
+      List[tuple]: (id, RepoMetadata or None if the repository does not exist) of the repositories fetched
+    """
+    if self._stop.is_set():
+      return []
+    try:
+      with metrics.timer(f"enrichment.{self.backend}_batch"):
+        results = self.fetcher.fetch([(repository[1], repository[2]) for repository in batch])
+    except RateLimitExceeded as e:
+      if not self._stop.is_set():
+        self.logger.warning(f"{e}, leaving the remaining repositories for the next run")
+      self._stop.set()
+      return []
+    except Exception as e:
+      self.logger.warning(f"Could not fetch a batch of {len(batch)} repositories: {e}")
+      return []
+    return [(batch[i][0], metadata) for i, metadata in results.items()]
+
+  def _write(self, session, updates: List[Dict[str, Any]], commit: bool) -> None:
+    db_controller.bulk_update_repository_metadata(session, updates)
+    if commit:
+      session.commit()
+
+  def run(self,
+          session=None,
+          fetched_before: Optional[datetime] = None,
+          limit: Optional[int] = None,
+          repositories: Optional[List[tuple]] = None) -> Dict[str, Any]:
+    """
+    Enriches the pending repositories and writes the results back in bulk.
+
+    Args:
+      session (Session): SQLAlchemy session to use (default: a new one, committed and closed here)
+      fetched_before (datetime, optional): also refresh repositories enriched before this time (naive UTC)
+      limit (int, optional): maximum number of repositories to enrich
+      repositories (List[tuple], optional): (id, developer, name, num_stars, metadata_fetched_at) of the
+                                            repositories to enrich, e.g., a RefreshScheduler plan, instead of the
+                                            pending ones
+
+    Returns:
+      Dict[str, Any]: counters of repositories, enriched, not_found, failed and skipped (rate limit), the client's
+                      request counters and the throughput
+    """
+    own_session = session is None
+    if own_session:
+      session = db_controller.get_session()
+    started = time.monotonic()
+    requests_before, not_modified_before = self.client.requests, self.client.not_modified
+    try:
+      if repositories is None:
+        repositories = db_controller.get_repositories_to_enrich(session, fetched_before=fetched_before, limit=limit)
+      previous = {repository[0]: repository for repository in repositories}
+      self.stats["repositories"] += len(repositories)
+      batches = [repositories[i:i + self.batch_size] for i in range(0, len(repositories), self.batch_size)]
+      self.logger.info(f"Enriching {len(repositories)} repositories over {self.backend} "
+                       f"in {len(batches)} batch(es) with {self.max_workers} workers")
+
+      updates = []
+      done = set()
+      with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="enrich") as executor:
+        for future in as_completed([executor.submit(self.fetch_batch, batch) for batch in batches]):
+          for repository_id, metadata in future.result():
+            done.add(repository_id)
+            row = dict(id=repository_id, metadata_fetched_at=get_current_utc_time())
+            if metadata is None:
+              self.stats["not_found"] += 1
+            else:
+              self.stats["enriched"] += 1
+              row.update(metadata._asdict())
+              _, _, _, previous_stars, previous_fetched_at = previous[repository_id][:5]
+              row["star_velocity"] = self.star_velocity(previous_stars, previous_fetched_at,
+                                                        metadata.num_stars, row["metadata_fetched_at"])
+            updates.append(row)
+          if len(updates) >= self.write_every:
+            self._write(session, updates, commit=own_session)
+            updates = []
+      self._write(session, updates, commit=own_session)
+    except Exception as e:
+      self.logger.error(f"Error writing repository metadata to the database: {e}")
+      if own_session:
+        session.rollback()
+      raise
+    finally:
+      if own_session:
+        session.close()
+
+    missing = len(repositories) - len(done)
+    self.stats["skipped" if self._stop.is_set() else "failed"] += missing
+    elapsed = time.monotonic() - started
+    stats = dict(self.stats,
+                 **self.client.stats(),
+                 seconds=round(elapsed, 2),
+                 repos_per_second=round(len(done) / elapsed, 2) if elapsed else 0.0)
+    # the client may be shared by several runs, count this one's requests only
+    stats.update(requests=self.client.requests - requests_before, not_modified=self.client.not_modified - not_modified_before)
+    self.logger.info(f"Enrichment done: {stats}")
+    return stats
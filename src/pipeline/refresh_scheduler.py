@@ -0,0 +1,157 @@
+import os
+import sys
+import math
+import heapq
+from datetime import datetime, timedelta
+from typing import Optional, List, NamedTuple
+
+current_dir = os.path.abspath(os.path.dirname(__file__))
+src_dir= os.path.abspath(os.path.join(current_dir, '..'))
+# set sys_path to also look for libs elsewhere
+sys.path.append(src_dir)
+from libs.logger import CustomLogger
+from libs.metrics import metrics
+from libs.misc import get_current_utc_time
+import database.db_controller as db_controller
+
+
+class RefreshCandidate(NamedTuple):
+  """A repository chosen for re-enrichment, its first five fields are what EnrichmentStage.run() takes"""
+  id: int
+  developer: str
+  name: str
+  num_stars: Optional[int]
+  metadata_fetched_at: Optional[datetime]
+  score: float
+
+
+class RefreshScheduler:
+  """
+  Chooses which repositories to (re-)enrich next under a fixed budget of GitHub API requests.
+
+  Repositories never enriched come first, in crawl order. The rest of the budget goes to the enriched
+  repositories with the highest staleness score:
+
+    score = days since the last fetch * activity weight * popularity weight
+    activity weight   = 1 + ACTIVITY_BOOST * 0.5 ** (days since the last commit / commit_half_life)
+    popularity weight = 1 + min(log1p(stars gained per day), POPULARITY_CAP)
+
+  so a repository committed to yesterday and gaining stars is refreshed within days, while an abandoned one
+  waits weeks. The time of the last fetch is metadata_fetched_at rather than updated_at, which every other
+  stage moves too (e.g., when the compose files are parsed).
+
+  The candidates are streamed from the metadata_fetched_at index in pages, least recently fetched first, into a
+  heap holding the best ones for the budget, so memory stays O(budget + page_size) however large the table is.
+  As the stream gets fresher, no later row can score higher than its age times the maximum weight; once the
+  heap is full and its worst score beats that bound, the scan stops early.
+
+  Example:
+    stage = EnrichmentStage()
+    plan = RefreshScheduler().plan(budget=5000, requests_per_repository=stage.requests_per_repository)
+    stage.run(repositories=plan)
+  """
+  ACTIVITY_BOOST = 4.0
+  POPULARITY_CAP = 3.0
+  MAX_WEIGHT = (1 + ACTIVITY_BOOST) * (1 + POPULARITY_CAP)
+
+  def __init__(self,
+               min_age: timedelta = timedelta(days=1),
+               commit_half_life: float = 90.0,
+               page_size: int = 1000):
+    """
+      Args:
+        min_age (timedelta): repositories enriched more recently than this are never refreshed
+        commit_half_life (float): days after which a commit counts half as much towards activity
+        page_size (int): rows streamed from the database per query
+    """
+    self.logger = CustomLogger(self.__class__.__name__)
+    self.min_age = min_age
+    self.commit_half_life = commit_half_life
+    self.page_size = page_size
+    self.stats = dict(never_enriched=0, scanned=0, chosen=0, stopped_early=False)
+
+  def score(self,
+            fetched_at: datetime,
+            last_commit: Optional[datetime],
+            star_velocity: Optional[float],
+            now: datetime) -> float:
+    """
+    The staleness score of an enriched repository, higher is refreshed sooner.
+
+    Args:
+      fetched_at (datetime): when the metadata was last fetched
+      last_commit (datetime, optional): the last commit on the default branch
+      star_velocity (float, optional): stars gained per day between the last two fetches
+      now (datetime): the time of planning
+
+    Returns:
+      float: the score
+    """
+    age = max((now - fetched_at).total_seconds() / 86400, 0.0)
+    activity = 1.0
+    if last_commit is not None:
+      commit_age = max((now - last_commit).total_seconds() / 86400, 0.0)
+      activity += self.ACTIVITY_BOOST * 0.5 ** (commit_age / self.commit_half_life)
+    popularity = 1.0 + min(math.log1p(max(star_velocity or 0.0, 0.0)), self.POPULARITY_CAP)
+    return age * activity * popularity
+
+  def plan(self,
+           session=None,
+           budget: int = 1000,
+           requests_per_repository: float = 1.0,
+           now: Optional[datetime] = None) -> List[RefreshCandidate]:
+    """
+    Picks the repositories to enrich with a budget of requests.
+
+    Args:
+      session (Session): SQLAlchemy session to use (default: a new one, closed here)
+      budget (int): GitHub API requests the run may spend
+      requests_per_repository (float): requests one repository costs (see EnrichmentStage.requests_per_repository)
+      now (datetime, optional): the time of planning, naive UTC like the database (default: now)
+
+    Returns:
+      List[RefreshCandidate]: the repositories, never enriched ones first, then by descending score
+    """
+    own_session = session is None
+    if own_session:
+      session = db_controller.get_session()
+    now = now or get_current_utc_time()
+    capacity = int(budget / requests_per_repository) if requests_per_repository > 0 else 0
+    try:
+      with metrics.timer("refresh_scheduler.plan"):
+        chosen = self._plan(session, capacity, now)
+    finally:
+      if own_session:
+        session.close()
+    self.stats["chosen"] = len(chosen)
+    self.logger.info(f"Planned {len(chosen)} repositories for a budget of {budget} requests "
+                     f"({requests_per_repository:g} per repository): {self.stats}")
+    return chosen
+
+  def _plan(self, session, capacity: int, now: datetime) -> List[RefreshCandidate]:
+    if capacity <= 0:
+      return []
+    chosen = [RefreshCandidate(*row, score=math.inf)
+              for row in db_controller.get_repositories_to_enrich(session, limit=capacity)]
+    self.stats["never_enriched"] = len(chosen)
+    capacity -= len(chosen)
+    if capacity <= 0:
+      return chosen
+
+    # min-heap of the best (score, id, candidate) so far, heap[0] is the one to drop next
+    heap: List[tuple] = []
+    for row in db_controller.iter_refresh_candidates(session, stale_before=now - self.min_age, page_size=self.page_size):
+      repository_id, developer, name, num_stars, fetched_at, last_commit, star_velocity = row
+      self.stats["scanned"] += 1
+      age = (now - fetched_at).total_seconds() / 86400
+      if len(heap) == capacity and heap[0][0] >= age * self.MAX_WEIGHT:
+        # rows come least recently fetched first, no later one can beat the heap any more
+        self.stats["stopped_early"] = True
+        break
+      score = self.score(fetched_at, last_commit, star_velocity, now)
+      entry = (score, repository_id, RefreshCandidate(repository_id, developer, name, num_stars, fetched_at, score))
+      if len(heap) < capacity:
+        heapq.heappush(heap, entry)
+      elif entry[:2] > heap[0][:2]:
+        heapq.heapreplace(heap, entry)
+    return chosen + [candidate for _, _, candidate in sorted(heap, key=lambda entry: entry[:2], reverse=True)]
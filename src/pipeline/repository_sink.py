@@ -0,0 +1,192 @@
+import os
+import sys
+from typing import Optional, List, Dict, Any, Callable
+
+current_dir = os.path.abspath(os.path.dirname(__file__))
+src_dir= os.path.abspath(os.path.join(current_dir, '..'))
+# set sys_path to also look for libs elsewhere
+sys.path.append(src_dir)
+from libs.logger import CustomLogger
+from libs.github_url import GitHubUrlDeduplicator
+from libs.metrics import metrics
+import database.db_controller as db_controller
+from pipeline.checkpoint import CrawlCheckpointer
+from scraper.discovery import ScrapedPage
+
+
+@metrics.timed("pipeline.url_extraction")
+def search_results_to_rows(page_data: Any,
+                           deduplicator: Optional[GitHubUrlDeduplicator] = None) -> tuple[List[Dict[str, Any]], List[Dict[str, str]]]:
+  """
+  Turns the AgentQL result of one search page ({"search_results": [{title, about, url}, ...]}) into
+  repository rows for db_controller.bulk_upsert_github_repositories() and compose file rows for
+  db_controller.bulk_add_compose_files(). URLs are canonicalized and duplicates are dropped.
+
+  Args:
+    page_data (Any): data extracted from one result page
+    deduplicator (GitHubUrlDeduplicator): remembers what was seen on earlier pages (default: only dedupe within this page)
+
+  Returns:
+    tuple: (repository rows, compose file rows) for the repositories and files not seen before
+  """
+  if deduplicator is None:
+    deduplicator = GitHubUrlDeduplicator()
+  results = (page_data or {}).get('search_results') or []
+  new_repositories, new_files = deduplicator.dedupe(results)
+  rows = [dict(developer=canonical.developer,
+               name=canonical.name,
+               url=canonical.project_url,
+               about=result.get('about'))
+          for canonical, result in new_repositories]
+  files = [dict(repository_url=canonical.project_url,
+                branch=canonical.branch,
+                path=canonical.path,
+                url=f"{canonical.project_url}/blob/{canonical.branch}/{canonical.path}")
+           for canonical in new_files]
+  return rows, files
+
+
+class RepositorySink:
+  """
+  Streams scraped search pages into the database while the crawl is still running.
+
+  Rows are buffered and written with one bulk upsert per batch, and every flush is committed,
+  so memory stays flat and everything flushed survives a crash later in the crawl.
+  With a CrawlCheckpointer, the crawl position is committed in the same transaction as the rows.
+
+  Example:
+    with RepositorySink(batch_size=100) as sink:
+      for scraped in scraper.iter_search_query(...):
+        sink.add_page(scraped.data)
+  """
+  def __init__(self,
+               batch_size: int = 100,
+               session_factory: Optional[Callable] = None,
+               checkpointer: Optional[CrawlCheckpointer] = None):
+    """
+      Args:
+        batch_size (int): number of buffered rows that triggers a write + commit
+        session_factory (Callable): returns a new SQLAlchemy session (default: db_controller.get_session)
+        checkpointer (CrawlCheckpointer): optional crawl progress tracker saved with every flush
+    """
+    if batch_size < 1:
+      raise ValueError("'batch_size' must be at least 1")
+    self.logger = CustomLogger(self.__class__.__name__)
+    self.batch_size = batch_size
+    self.session_factory = session_factory if session_factory is not None else db_controller.get_session
+    self.checkpointer = checkpointer
+    self.session = None
+    self.buffer: List[Dict[str, Any]] = []
+    # compose files the search found, registered in the compose_files table for the ComposeStage
+    self.compose_buffer: List[Dict[str, str]] = []
+    # canonicalizes the result URLs and drops the duplicates of the whole run, see dedup_stats()
+    self.deduplicator = GitHubUrlDeduplicator()
+    self.num_pages = 0
+    self.num_results = 0
+    self.num_written = 0
+    self.num_new = 0 # repositories that were not in the database before this sink wrote them
+
+  def add_page(self, page_data: Any) -> int:
+    """
+    Buffers the results of one scraped page and flushes once the batch is full.
+    Repositories and compose files already seen during this run are dropped right here.
+
+    Args:
+      page_data (Any): data extracted from one result page
+
+    Returns:
+      int: number of results taken from the page
+    """
+    num_results_before = self.deduplicator.num_results
+    rows, files = search_results_to_rows(page_data, deduplicator=self.deduplicator)
+    num_results = self.deduplicator.num_results - num_results_before
+    self.num_pages += 1
+    self.num_results += num_results
+    metrics.count("pipeline.search_results", num_results)
+    self.buffer.extend(rows)
+    self.compose_buffer.extend(files)
+    if len(self.buffer) >= self.batch_size:
+      self.flush()
+    return num_results
+
+  def add_scraped_page(self, scraped: ScrapedPage) -> bool:
+    """
+    Like add_page(), but also moves the crawl checkpoint (if any) to this page.
+
+    Args:
+      scraped (ScrapedPage): a page yielded by a discovery backend's iter_search_query() (or the scraper's iter_*_query())
+
+    Returns:
+      bool: False if the checkpointer detected a repeated page and the crawl should stop
+    """
+    if self.checkpointer is not None:
+      if not self.checkpointer.record(page_number=scraped.page_number,
+                                      page_url=scraped.url,
+                                      next_url=scraped.next_url,
+                                      page_data=scraped.data):
+        return False
+    self.add_page(scraped.data)
+    return True
+
+  def flush(self, status: Optional[str] = None) -> int:
+    """
+    Writes and commits everything buffered so far, together with the crawl checkpoint.
+
+    Args:
+      status (str, optional): checkpoint status to store (e.g., "failed"), see CrawlCheckpointer.save()
+
+    Returns:
+      int: number of unique repositories written
+    """
+    checkpoint_pending = self.checkpointer is not None and (self.checkpointer.dirty or status is not None)
+    if not self.buffer and not checkpoint_pending:
+      return 0
+    if self.session is None:
+      self.session = self.session_factory()
+    try:
+      urls = [row["url"] for row in self.buffer]
+      new = len(urls) - len(db_controller.get_existing_repository_urls(session=self.session, urls=urls))
+      written = db_controller.bulk_upsert_github_repositories(session=self.session, rows=self.buffer)
+      db_controller.bulk_add_compose_files(session=self.session, files=self.compose_buffer)
+      if checkpoint_pending:
+        self.checkpointer.save(self.session, status=status)
+      with metrics.timer("db.commit"):
+        self.session.commit()
+    except Exception as e:
+      self.logger.error(f"Error writing {len(self.buffer)} results to the database: {e}")
+      self.session.rollback()
+      raise
+    self.num_written += written
+    self.num_new += new
+    metrics.count("db.repositories_written", written)
+    metrics.count("db.repositories_new", new)
+    self.logger.info(f"Committed {written} repositories, {new} new (pages so far: {self.num_pages}, "
+                     f"written so far: {self.num_written}, new so far: {self.num_new})")
+    self.buffer = []
+    self.compose_buffer = []
+    return written
+
+  def dedup_stats(self) -> Dict[str, Any]:
+    """How many results were dropped as invalid or duplicate, see GitHubUrlDeduplicator.stats()"""
+    return self.deduplicator.stats()
+
+  def close(self, status: Optional[str] = None) -> None:
+    """
+    Flushes the remaining rows (and checkpoint) and closes the session.
+
+    Args:
+      status (str, optional): checkpoint status to store (e.g., "failed")
+    """
+    try:
+      self.flush(status=status)
+    finally:
+      if self.session is not None:
+        self.session.close()
+        self.session = None
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc, tb):
+    # keep what was scraped before the error, but mark the crawl as failed
+    self.close(status="failed" if exc_type is not None else None)
@@ -0,0 +1,164 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Optional, Any, Dict
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+
+current_dir = os.path.abspath(os.path.dirname(__file__))
+src_dir= os.path.abspath(os.path.join(current_dir, '..'))
+# set sys_path to also look for libs elsewhere
+sys.path.append(src_dir)
+from libs.logger import CustomLogger
+
+# query parameters that only track the visitor and never change the page content
+TRACKING_PARAMS = {"ved", "ei", "sa", "usg", "sei", "gs_lcrp", "sclient", "oq", "aqs", "sourceid", "ie", "fbclid", "gclid"}
+
+
+def normalize_url(url: str) -> str:
+  """
+  Normalizes a URL for cache lookups: lowercase scheme and host, no fragment,
+  no tracking parameters (utm_*, Google's ved/ei/...) and sorted query parameters.
+  """
+  parsed = urlparse(url)
+  params = sorted((k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True)
+                  if k not in TRACKING_PARAMS and not k.startswith("utm_"))
+  return urlunparse((parsed.scheme.lower(), parsed.netloc.lower(), parsed.path or "/", "", urlencode(params), ""))
+
+
+class AgentQLResponseCache:
+  """
+  On-disk (SQLite) cache of AgentQL query_data() responses.
+
+  Entries are keyed by (query text, normalized URL, SHA-256 of the page content), so a hit means the very
+  same query already ran on the very same DOM. Entries expire after ttl_seconds and once there are more than
+  max_entries, the least recently used ones are evicted in a batch down to 90% of max_entries. Hit/miss/eviction
+  counters are kept per instance.
+
+  Only query_data() responses are cacheable: query_elements() returns live element handles of the current page.
+  """
+  def __init__(self,
+               path: str = "/tmp/agentql-cache.sqlite",
+               ttl_seconds: int = 7 * 24 * 3600,
+               max_entries: int = 10000):
+    """
+      Args:
+        path (str): SQLite file of the cache (created if missing)
+        ttl_seconds (int): how long an entry is served after it was stored
+        max_entries (int): number of entries kept before the least recently used ones are evicted
+    """
+    self.logger = CustomLogger(self.__class__.__name__)
+    self.path = path
+    self.ttl_seconds = ttl_seconds
+    self.max_entries = max_entries
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    # one connection shared by the threads of a scraper pool, guarded by a lock
+    self._lock = threading.Lock()
+    self.connection = sqlite3.connect(path, check_same_thread=False)
+    self.connection.execute("PRAGMA journal_mode=WAL")
+    self.connection.execute("""
+      CREATE TABLE IF NOT EXISTS agentql_responses (
+        key TEXT PRIMARY KEY,
+        url TEXT NOT NULL,
+        response TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        last_access REAL NOT NULL
+      )
+    """)
+    self.connection.execute("CREATE INDEX IF NOT EXISTS ix_agentql_responses_last_access ON agentql_responses (last_access)")
+    self.connection.commit()
+    # running count of the stored entries, so that put() does not count the table on every insert
+    self._entries = self.connection.execute("SELECT COUNT(*) FROM agentql_responses").fetchone()[0]
+
+  @classmethod
+  def from_env(cls) -> Optional["AgentQLResponseCache"]:
+    """
+    Builds a cache from AGENTQL_CACHE_PATH, AGENTQL_CACHE_TTL (seconds) and AGENTQL_CACHE_MAX_ENTRIES.
+
+    Returns:
+      AgentQLResponseCache or None: None if AGENTQL_CACHE_PATH is not set
+    """
+    path = os.getenv("AGENTQL_CACHE_PATH")
+    if not path:
+      return None
+    return cls(path=path,
+               ttl_seconds=int(os.getenv("AGENTQL_CACHE_TTL", 7 * 24 * 3600)),
+               max_entries=int(os.getenv("AGENTQL_CACHE_MAX_ENTRIES", 10000)))
+
+  @staticmethod
+  def make_key(query: str, url: str, content: str) -> str:
+    """Cache key of a query on a given page (URL + content)"""
+    content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    key_material = "\0".join((" ".join(query.split()), normalize_url(url), content_hash))
+    return hashlib.sha256(key_material.encode("utf-8")).hexdigest()
+
+  def get(self, query: str, url: str, content: str) -> Optional[Any]:
+    """
+    Looks up the response of a query on a page.
+
+    Returns:
+      Any: the cached response, or None on a miss (or an expired entry)
+    """
+    key = self.make_key(query, url, content)
+    now = time.time()
+    with self._lock:
+      row = self.connection.execute("SELECT response, created_at FROM agentql_responses WHERE key = ?", (key,)).fetchone()
+      if row is None or now - row[1] > self.ttl_seconds:
+        if row is not None:
+          self._entries -= self.connection.execute("DELETE FROM agentql_responses WHERE key = ?", (key,)).rowcount
+          self.connection.commit()
+        self.misses += 1
+        return None
+      self.connection.execute("UPDATE agentql_responses SET last_access = ? WHERE key = ?", (now, key))
+      self.connection.commit()
+      self.hits += 1
+    self.logger.debug(f"AgentQL cache hit for {url}")
+    return json.loads(row[0])
+
+  def put(self, query: str, url: str, content: str, response: Any) -> None:
+    """Stores the response of a query on a page and evicts the least recently used entries if the cache is full"""
+    key = self.make_key(query, url, content)
+    now = time.time()
+    values = (normalize_url(url), json.dumps(response, default=str), now, now, key)
+    with self._lock:
+      stored = self.connection.execute("UPDATE agentql_responses SET url = ?, response = ?, created_at = ?, last_access = ? "
+                                       "WHERE key = ?", values).rowcount
+      if not stored:
+        self.connection.execute("INSERT INTO agentql_responses (url, response, created_at, last_access, key) "
+                                "VALUES (?, ?, ?, ?, ?)", values)
+        self._entries += 1
+        if self._entries > self.max_entries:
+          self._evict()
+      self.connection.commit()
+
+  def _evict(self) -> None:
+    # recounted, the file may be shared with other processes; evicting a batch keeps this off the next inserts
+    self._entries = self.connection.execute("SELECT COUNT(*) FROM agentql_responses").fetchone()[0]
+    if self._entries <= self.max_entries:
+      return
+    overflow = self._entries - (self.max_entries - self.max_entries // 10)
+    evicted = self.connection.execute("DELETE FROM agentql_responses WHERE rowid IN "
+                                      "(SELECT rowid FROM agentql_responses ORDER BY last_access LIMIT ?)",
+                                      (overflow,)).rowcount
+    self._entries -= evicted
+    self.evictions += evicted
+
+  def stats(self) -> Dict[str, Any]:
+    """Hit/miss/eviction counters of this instance and the number of stored entries"""
+    with self._lock:
+      entries = self.connection.execute("SELECT COUNT(*) FROM agentql_responses").fetchone()[0]
+    lookups = self.hits + self.misses
+    return dict(hits=self.hits,
+                misses=self.misses,
+                hit_rate=self.hits / lookups if lookups else 0.0,
+                evictions=self.evictions,
+                entries=entries)
+
+  def close(self) -> None:
+    with self._lock:
+      self.connection.close()
@@ -1,15 +1,8 @@
 import os
-import agentql
-from playwright.sync_api import sync_playwright
-import json
-import re
-import os
 import time
 import sys
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Iterator, Any
 from dotenv import load_dotenv
-# import paginate tool from agentql tools
-from agentql.tools.sync_api import paginate
 from urllib.parse import urlparse
 import random
 
@@ -19,14 +12,55 @@ src_dir= os.path.abspath(os.path.join(current_dir, '..'))
 sys.path.append(src_dir)
 from libs.logger import CustomLogger
 from libs import misc
+from libs.metrics import metrics
+from scraper.agentql_cache import AgentQLResponseCache
+from scraper.browser_profile import BASE_HEADERS, BROWSER_ARGS, STEALTH_JS, context_options
+from scraper.pacing import Pacer, NoPacer, pacer_from_env, detect_captcha
+from scraper.extractors import PageExtractor, extractor_from_env
+from scraper.resource_policy import ResourcePolicy
+from scraper.snapshot_archive import SnapshotArchive
+from scraper.replay import Replay, replay_from_env
+from scraper.discovery import DiscoveryBackend, ScrapedPage, SearchBlocked
+
+
+def load_api_key(logger: CustomLogger, api_key: Optional[str] = None) -> None:
+  """
+    Makes sure AGENTQL_API_KEY is set in the environment, where the AgentQL SDK picks it up from.
+    Order: existing ENV, .env file, the api_key argument. Exits if none of them has it.
+
+    Args:
+      logger (CustomLogger): the logger of the calling scraper
+      api_key (str): API key passed to the scraper, if any
+  """
+  # Try to load environment variables from .env file if they don't exist
+  if "AGENTQL_API_KEY" not in os.environ:
+      logger.info("AGENTQL_API_KEY not found in environment, trying to load from .env file...")
+      load_dotenv()
+  
+  try:
+    api_key = os.environ["AGENTQL_API_KEY"]
+  except KeyError as e:
+    logger.warning("No API key is set to for AgentQL...checking function argument...")
+    if api_key is not None:
+      logger.info("API key found as function argument...setting it as ENV for AgentQL")
+      os.environ["AGENTQL_API_KEY"] = api_key
+    else:
+      logger.error("No API key was found at all for AgentQL...exiting")
+      exit(-1)
 
 
-class AgentQLPlaywrightScraper:
+class AgentQLPlaywrightScraper(DiscoveryBackend):
   def __init__(self, 
                 api_key: Optional[str] = None,
                 headless: bool = False,
                 proxy_address: Optional[str] = None,
-                user_data_dir: str = "/tmp/playwright-user-data"):
+                user_data_dir: str = "/tmp/playwright-user-data",
+                response_cache: Optional[AgentQLResponseCache] = None,
+                pacer: Optional[Pacer] = None,
+                extractor: Optional[PageExtractor] = None,
+                resource_policy: Optional[ResourcePolicy] = None,
+                archive: Optional[SnapshotArchive] = None,
+                replay: Optional[Replay] = None):
     """
       Initialize the AgentQLScraper with your API key.
 
@@ -34,51 +68,69 @@ class AgentQLPlaywrightScraper:
         headless (bool): whether we want to see the browser or not
         proxy_address (str): the actual Tor proxy address
         user_data_dir (str): directory to persist browser session data
+        response_cache (AgentQLResponseCache): cache of query_data() responses
+                                               (default: built from AGENTQL_CACHE_PATH if set, otherwise no caching)
+        pacer (Pacer): decides the delays between actions per host (default: from SCRAPER_PACING*, see scraper.pacing)
+        extractor (PageExtractor): pulls the data out of the pages (default: from SCRAPER_EXTRACTOR, i.e., AgentQL
+                                   behind learned selectors, see scraper.extractors and scraper.fastpath)
+        resource_policy (ResourcePolicy): blocks the requests text extraction does not need (default: from
+                                          SCRAPER_RESOURCE_POLICY, i.e., no images, media, fonts, ads and analytics;
+                                          "off" loads everything)
+        archive (SnapshotArchive): keeps the raw HTML of every result page and queried page
+                                   (default: built from SCRAPER_ARCHIVE_PATH if set, otherwise nothing is kept)
+        replay (Replay): serve recorded traffic (a HAR file or a SnapshotArchive, see scraper.replay) instead of
+                         the live sites, with every humanisation delay off and no resource policy or archiving
+                         (default: from SCRAPER_REPLAY if set, otherwise the live sites are scraped)
     """ 
-    self.base_headers = {
-        # Realistic User-Agent for Chrome on Windows
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36",
-        # Standard Accept header for HTML documents
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",   
-        # Prioritize US English, then generic English
-        "Accept-Language": "en-US,en;q=0.9",
-        # Common Accept-Encoding for compression
-        "Accept-Encoding": "gzip, deflate, br, zstd",
-        # Keep-alive for persistent connections
-        "Connection": "keep-alive",
-        # Request secure connection if possible
-        "Upgrade-Insecure-Requests": "1",
-        # Additional headers to look more like a real browser
-        "Sec-Fetch-Dest": "document",
-        "Sec-Fetch-Mode": "navigate",
-        "Sec-Fetch-Site": "none",
-        "Sec-Fetch-User": "?1",
-        "Cache-Control": "max-age=0"
-    }
+    self.base_headers = dict(BASE_HEADERS)
         
     self.logger = CustomLogger(self.__class__.__name__)
     
-    # Try to load environment variables from .env file if they don't exist
-    if "AGENTQL_API_KEY" not in os.environ:
-        self.logger.info("AGENTQL_API_KEY not found in environment, trying to load from .env file...")
-        load_dotenv()
-    
-    try:
-      api_key = os.environ["AGENTQL_API_KEY"]
-    except KeyError as e:
-      self.logger.warning("No API key is set to for AgentQL...checking function argument...")
-      if api_key is not None:
-        self.logger.info("API key found as function argument...setting it as ENV for AgentQL")
-        os.environ["AGENTQL_API_KEY"] = api_key
-      else:
-        self.logger.error("No API key was found at all for AgentQL...exiting")
-        exit(-1)
+    self.extractor = extractor if extractor is not None else extractor_from_env()
+    if self.extractor.uses_agentql:
+      load_api_key(self.logger, api_key)
+    else:
+      self.logger.info(f"Extracting data with {self.extractor.__class__.__name__}, no AgentQL API key needed")
     
     self.headless = headless
     self.proxy_address = proxy_address
     self.user_data_dir = user_data_dir if user_data_dir is not None else "/tmp/playwright-user-data"
-    self.logger.info("Initiated with API_KEY")
-
+    self.response_cache = response_cache if response_cache is not None else AgentQLResponseCache.from_env()
+    if self.response_cache is not None:
+      self.logger.info(f"AgentQL responses are cached in {self.response_cache.path}")
+    self.replay = replay if replay is not None else replay_from_env()
+    if self.replay is not None:
+      # nobody is watching a recording: no delays, nothing to block and nothing new to archive
+      self.logger.info(f"Replay mode: serving recorded traffic with {self.replay.__class__.__name__}")
+      pacer, resource_policy, archive = NoPacer(), None, None
+    self.pacer = pacer if pacer is not None else pacer_from_env()
+    self.logger.info(f"Pacing actions with {self.pacer.__class__.__name__}")
+    self.resource_policy = resource_policy if resource_policy is not None or self.replay is not None else ResourcePolicy.from_env()
+    self.archive = archive if archive is not None or self.replay is not None else SnapshotArchive.from_env()
+    # the cache and the archive opened here (from the environment) are closed by close(), the ones passed in are the caller's
+    self._owns_response_cache = response_cache is None and self.response_cache is not None
+    self._owns_archive = archive is None and self.archive is not None
+    if self.archive is not None:
+      self.logger.info(f"Archiving the scraped pages in {self.archive.path} (run {self.archive.run_id})")
+    if self.extractor.uses_agentql:
+      self.logger.info("Initiated with API_KEY")
+
+    # the browser is launched by start(), on the first call that needs it
+    self.playwright = None
+    self.context = None
+    self.page = None
+    # (url, HTML) of the page last read by _page_content(), dropped by the next navigation
+    self._content = None
+
+  def start(self) -> "AgentQLPlaywrightScraper":
+    """
+    Starts Playwright and the persistent browser context. Called by every method that needs the browser,
+    so creating a scraper is cheap and no Chromium is launched unless something is scraped.
+    It has to be called from the thread that will use the scraper (Playwright's sync API is thread-bound).
+    """
+    if self.context is not None:
+      return self
+    from playwright.sync_api import sync_playwright
     self.playwright = sync_playwright().start()
 
     # create new context
@@ -100,47 +152,37 @@ class AgentQLPlaywrightScraper:
     else:
       self.page = self.context.new_page()
       self.logger.info("Created new page in browser context")
+    return self
 
   
   def _create_new_context(self):
     """Create a new persistent browser context with anti-detection features"""
     self.logger.info("Creating new persistent browser context with anti-detection...")
     
-    # Browser arguments to look more like a real browser
-    args = [
-      '--disable-blink-features=AutomationControlled',
-      '--disable-dev-shm-usage',
-      '--disable-ipc-flooding-protection',
-      '--disable-renderer-backgrounding',
-      '--disable-backgrounding-occluded-windows',
-      '--disable-background-timer-throttling',
-      '--disable-features=TranslateUI',
-      '--disable-features=VizDisplayCompositor',
-      '--no-first-run',
-      '--no-default-browser-check',
-      '--no-sandbox',
-      '--disable-web-security',
-      '--disable-extensions-except',
-      '--disable-plugins-discovery',
-      '--start-maximized'
-    ]
-    
+    # Route the whole context through the proxy if one was given (e.g., socks5://127.0.0.1:9050 for Tor)
+    proxy = {"server": self.proxy_address} if self.proxy_address else None
+    if proxy:
+      self.logger.info(f"Using proxy {self.proxy_address} for the browser context")
+
+    # SCRAPER_RECORD_HAR keeps the traffic of the session for SCRAPER_REPLAY=har:<file> (written when the context closes)
+    record_har_path = os.getenv("SCRAPER_RECORD_HAR") if self.replay is None else None
+    har_options = dict(record_har_path=record_har_path, record_har_content="embed") if record_har_path else {}
+    if record_har_path:
+      self.logger.info(f"Recording the session into {record_har_path}")
+
     # Create context with realistic browser settings
     self.context = self.playwright.chromium.launch_persistent_context(
         self.user_data_dir,
         headless=self.headless,
-        args=args,
-        viewport={'width': 1920, 'height': 1080},
-        user_agent=self.base_headers["User-Agent"],
-        locale='en-US',
-        timezone_id='America/New_York',
-        extra_http_headers=self.base_headers,
-        ignore_https_errors=True,
-        java_script_enabled=True,
-        accept_downloads=True,
-        bypass_csp=True,
-        color_scheme='light'
+        proxy=proxy,
+        args=BROWSER_ARGS,
+        **har_options,
+        **context_options(self.base_headers)
     )
+    if self.replay is not None:
+      self.replay.attach(self.context)
+    elif self.resource_policy is not None:
+      self.resource_policy.attach(self.context)
     
     # Get the default page
     if len(self.context.pages) > 0:
@@ -153,83 +195,48 @@ class AgentQLPlaywrightScraper:
 
   def _add_stealth_scripts(self):
     """Add JavaScript to make the browser appear more human-like"""
-    stealth_js = """
-    // Remove webdriver property
-    Object.defineProperty(navigator, 'webdriver', {
-      get: () => undefined,
-    });
-
-    // Mock languages and plugins
-    Object.defineProperty(navigator, 'languages', {
-      get: () => ['en-US', 'en'],
-    });
-
-    Object.defineProperty(navigator, 'plugins', {
-      get: () => [1, 2, 3, 4, 5],
-    });
-
-    // Mock screen resolution
-    Object.defineProperty(screen, 'width', {
-      get: () => 1920,
-    });
-    Object.defineProperty(screen, 'height', {
-      get: () => 1080,
-    });
-
-    // Add some randomness to mouse movements
-    const originalAddEventListener = EventTarget.prototype.addEventListener;
-    EventTarget.prototype.addEventListener = function(type, listener, options) {
-      if (type === 'mousemove') {
-        const newListener = function(e) {
-          setTimeout(() => listener(e), Math.random() * 100);
-        };
-        return originalAddEventListener.call(this, type, newListener, options);
-      }
-      return originalAddEventListener.call(this, type, listener, options);
-    };
-    """
-    
-    self.page.add_init_script(stealth_js)
+    self.page.add_init_script(STEALTH_JS)
     self.logger.debug("Anti-detection scripts added")
 
   def _simulate_human_behavior(self):
     """Simulate human-like behavior on the page"""
+    if self.replay is not None:
+      return
     try:
       # Random mouse movements
       for _ in range(random.randint(2, 5)):
         x = random.randint(100, 1800)
         y = random.randint(100, 900)
         self.page.mouse.move(x, y)
-        time.sleep(random.uniform(0.1, 0.5))
+        self.pacer.wait(self.page.url, "mouse_move")
       
       # Random scroll
       scroll_amount = random.randint(100, 500)
       self.page.evaluate(f"window.scrollBy(0, {scroll_amount})")
-      time.sleep(random.uniform(0.5, 1.5))
+      self.pacer.wait(self.page.url, "scroll")
       
       # Scroll back up a bit
       scroll_back = random.randint(50, 200)
       self.page.evaluate(f"window.scrollBy(0, -{scroll_back})")
-      time.sleep(random.uniform(0.3, 1.0))
+      self.pacer.wait(self.page.url, "scroll_back")
         
     except Exception as e:
       self.logger.debug(f"Error in human behavior simulation: {e}")
 
   def _human_type(self, element, text):
     """Type text with human-like delays"""
+    if self.replay is not None:
+      element.fill(text)
+      return
     try:
       # Clear the field first
       element.clear()
-      time.sleep(random.uniform(0.2, 0.5))
+      self.pacer.wait(self.page.url, "clear")
       
-      # Type each character with random delays
+      # Type each character with random delays (mimics human typing), longer pause at spaces
       for char in text:
         element.type(char)
-        # Random delay between keystrokes (mimics human typing)
-        delay = random.uniform(0.05, 0.3)
-        if char == ' ':
-          delay = random.uniform(0.1, 0.5)  # Longer pause at spaces
-        time.sleep(delay)
+        self.pacer.wait(self.page.url, "space" if char == ' ' else "keystroke")
             
     except Exception as e:
       self.logger.debug(f"Error in human typing: {e}")
@@ -238,11 +245,32 @@ class AgentQLPlaywrightScraper:
 
   def close(self):
     """
-    Closing browser and playwright
+    Closing browser and playwright, and the response cache and snapshot archive the scraper opened itself
     Note: If connected to existing browser, this will only close our connection,
     not the actual browser (which is what we want)
     """
     self.logger.info("Closing browser connection and Playwright")
+    if self.response_cache is not None:
+      self.logger.info(f"AgentQL response cache stats: {self.response_cache.stats()}")
+    self.logger.info(f"Pacing stats: {self.pacer.stats()}")
+    extractor_stats = self.extractor.stats()
+    if extractor_stats:
+      self.logger.info(f"{self.extractor.__class__.__name__} stats: {extractor_stats}")
+    if self.resource_policy is not None:
+      self.logger.info(f"Resource policy stats: {self.resource_policy.stats()}")
+    if self.archive is not None:
+      self.logger.info(f"Snapshot archive stats: {self.archive.stats()}")
+    if self.replay is not None:
+      self.logger.info(f"Replay stats: {self.replay.stats()}")
+    if self._owns_response_cache:
+      self.response_cache.close()
+      self.response_cache, self._owns_response_cache = None, False
+    if self._owns_archive:
+      self.archive.close()
+      self.archive, self._owns_archive = None, False
+    if self.context is None:
+      # the browser was never started
+      return
     try:
       self.logger.info("Closing our own browser instance")
       self.context.close()
@@ -253,30 +281,219 @@ class AgentQLPlaywrightScraper:
         self.playwright.stop()
       except Exception as e:
         self.logger.warning(f"Error stopping Playwright: {e}")
+      self.context = None
+      self.playwright = None
 
 
 
-  def paginate_query(self, 
-                     url: str, 
-                     query: str, 
-                     max_pages: int = 1,
-                     agentql_query_timeout=60000,
-                     referer: Optional[str] = None,
-                     new_tab: bool = False) -> list:
+  def _page_content(self, page) -> Optional[str]:
     """
-    Loads the page, runs the AgentQL query, and paginates through up to max_pages.
-    Returns a list of results aggregated from all pages.
+    The HTML of the page, read once per navigation: the CAPTCHA check, the archive, the response cache and
+    the extractor share it instead of each serializing the DOM again. None if the page cannot be read.
+    """
+    url = page.url
+    if self._content is not None and self._content[0] == url:
+      return self._content[1]
+    try:
+      content = page.content()
+    except Exception as e:
+      self.logger.debug(f"Could not read the content of {url}: {e}")
+      return None
+    metrics.count("scraper.page_bytes", len(content.encode("utf-8")))
+    self._content = (url, content)
+    return content
+
+  def _query_data(self, agql_page, query: str, **kwargs):
+    """
+    agql_page.query_data() behind the response cache (if any): the page content is hashed and a
+    response stored for the same query, URL and content is returned without calling AgentQL.
+    Extractors reading the HTML themselves (PageExtractor.takes_content) get the content already read.
+    """
+    stage = f"scraper.{self.extractor.name}_query_data"
+    content = None
+    if self.extractor.takes_content or (self.response_cache is not None and self.extractor.uses_agentql):
+      content = self._page_content(agql_page)
+    if self.extractor.takes_content and content is not None:
+      kwargs["content"] = content
+    if self.response_cache is None or not self.extractor.uses_agentql or content is None:
+      # local extraction is cheaper than a cache lookup
+      with metrics.timer(stage):
+        return agql_page.query_data(query, **kwargs)
+    page_url = agql_page.url
+    data = self.response_cache.get(query, page_url, content)
+    if data is None:
+      with metrics.timer(stage):
+        data = agql_page.query_data(query, **kwargs)
+      self.response_cache.put(query, page_url, content, data)
+    else:
+      metrics.count("scraper.agentql_cache_hits")
+    return data
+
+  def _archive_page(self, page, page_number: Optional[int] = None, label: Optional[str] = None) -> None:
+    """Stores the current HTML of the page in the archive (if any), a failure is logged and never stops the scraping"""
+    if self.archive is None:
+      return
+    content = self._page_content(page)
+    if content is None:
+      self.logger.warning(f"Could not archive {page.url}: the page content is not readable")
+      return
+    try:
+      self.archive.put(content, page.url, page_number=page_number, label=label)
+    except Exception as e:
+      self.logger.warning(f"Could not archive {page.url}: {e}")
+
+  def _observe_navigation(self, page, started: float, response=None, result_page: bool = False) -> bool:
+    """
+    Reports a finished navigation to the pacer: its latency, the HTTP status of the main document
+    (if there was a response) and whether the site answered with a CAPTCHA.
+
+    Args:
+      page: the Playwright (or AgentQL-wrapped) page that navigated
+      started (float): time.monotonic() taken right before the navigation
+      response: Playwright's Response of the main document, if any
+      result_page (bool): the page is a result page: only its URL is checked here, its content by
+                          _check_result_page() once it is known whether its results could be extracted
+
+    Returns:
+      bool: True if the page is a CAPTCHA / bot challenge
+    """
+    latency = time.monotonic() - started
+    metrics.observe("scraper.navigation", latency)
+    status, retry_after = None, None
+    if response is not None:
+      status = response.status
+      retry_after_header = (response.headers or {}).get("retry-after", "")
+      retry_after = float(retry_after_header) if retry_after_header.isdigit() else None
+    # a new document: read it once more, the archive and the extractor reuse it
+    self._content = None
+    content = self._page_content(page)
+    captcha = detect_captcha(page.url, None if result_page else content)
+    if captcha:
+      metrics.count("scraper.captchas")
+      self.logger.warning(f"CAPTCHA / bot challenge detected at {page.url}")
+    if self.resource_policy is not None:
+      page_stats = self.resource_policy.take_page_stats(page.url)
+      self.logger.debug(f"{page.url}: {page_stats['blocked']} request(s) blocked (~{page_stats['bytes_saved'] // 1024} KB saved), "
+                        f"{page_stats['allowed']} loaded ({page_stats['bytes_loaded'] // 1024} KB)")
+    self.pacer.observe(page.url, latency=latency, status=status, captcha=captcha, retry_after=retry_after)
+    return captcha
+
+  def _check_result_page(self, page, data: Any) -> bool:
+    """
+    The content check of a result page, after its results were extracted: a page with results is no
+    challenge page, whatever it quotes; one without is checked for its host's challenge markers and
+    reported to the pacer as a CAPTCHA if it has them.
+
+    Returns:
+      bool: True if the page is a CAPTCHA / bot challenge
+    """
+    if detect_captcha(page.url):
+      # caught by its URL, reported by _observe_navigation() already
+      return True
+    parsed = any(data.values()) if isinstance(data, dict) else bool(data)
+    if parsed or not detect_captcha(page.url, self._page_content(page)):
+      return False
+    metrics.count("scraper.captchas")
+    self.logger.warning(f"CAPTCHA / bot challenge detected at {page.url}")
+    self.pacer.observe(page.url, captcha=True)
+    return True
+
+  def _iter_pages(self,
+                  agql_page,
+                  query: str,
+                  num_pages: int,
+                  timeout: Optional[int] = None,
+                  first_page_number: int = 1,
+                  label: Optional[str] = None) -> Iterator[ScrapedPage]:
+    """
+    Page-by-page version of agentql's paginate(): runs the query on the current page, asks AgentQL for the
+    next page and navigates there, then yields the page's result right away, up to page number num_pages.
+    Navigating before yielding lets every ScrapedPage carry the URL to continue from (see CrawlCheckpointer).
+    A challenge page is never yielded: if the site answers a page, or the navigation to the next one, with a
+    CAPTCHA, SearchBlocked is raised before that page, so the crawl position stays on a real result page.
+
+    Args:
+      agql_page: the AgentQL-wrapped page already showing the first page
+      query (str): AgentQL query
+      num_pages (int): The page number to stop at (inclusive)
+      timeout (int, optional): Timeout passed on to the AgentQL calls
+      first_page_number (int, optional): The page number of the page currently shown (default: 1)
+      label (str, optional): What the pages are scraped for (e.g., the search string), kept with the archived pages
+    Yields:
+      ScrapedPage: the page number, the page URL, the data extracted from it and the next page's URL
+    Raises:
+      SearchBlocked: the site answered with a CAPTCHA / bot challenge
+    """
+    timeout_kwargs = {"timeout": timeout} if timeout is not None else {}
+    for page_number in range(first_page_number, num_pages + 1):
+      self.logger.info(f"Paginating {page_number}/{num_pages}...")
+      page_url = agql_page.url
+      if detect_captcha(page_url):
+        raise SearchBlocked(f"CAPTCHA / bot challenge instead of page {page_number}: {page_url}")
+      self._archive_page(agql_page, page_number, label)
+      data = self._query_data(agql_page, query, **timeout_kwargs)
+      if self._check_result_page(agql_page, data):
+        raise SearchBlocked(f"CAPTCHA / bot challenge instead of page {page_number}: {page_url}")
+
+      next_url = None
+      navigation_error = None
+      blocked = False
+      if page_number < num_pages:
+        try:
+          with metrics.timer("scraper.agentql_pagination_info"):
+            pagination_info = agql_page.get_pagination_info(**timeout_kwargs)
+          if pagination_info.has_next_page:
+            self.pacer.wait(page_url, "next_page")
+            started = time.monotonic()
+            pagination_info.navigate_to_next_page()
+            agql_page.wait_for_page_ready_state()
+            blocked = self._observe_navigation(agql_page, started, result_page=True)
+            next_url = agql_page.url
+          else:
+            self.logger.info(f"No more pages after page {page_number}")
+        except Exception as e:
+          # hand out the data we already have before failing
+          navigation_error = e
+      if blocked:
+        # its next_url would be the challenge page: the page is not handed out and stays the crawl position
+        # (the previous page's next_url), a resumed crawl scrapes it again
+        raise SearchBlocked(f"CAPTCHA / bot challenge after page {page_number}: {next_url}")
+      metrics.count("scraper.pages")
+      yield ScrapedPage(page_number=page_number, url=page_url, data=data, next_url=next_url)
+
+      if navigation_error is not None:
+        raise navigation_error
+      if next_url is None:
+        break
+
+  def iter_paginate_query(self, 
+                          url: str, 
+                          query: str,
+                          max_pages: int = 1,
+                          agentql_query_timeout=60000,
+                          referer: Optional[str] = None,
+                          new_tab: bool = False,
+                          raise_errors: bool = False) -> Iterator[ScrapedPage]:
+    """
+    Streaming version of paginate_query(): loads the page, runs the AgentQL query, and yields the result
+    of every page as soon as it is extracted, up to max_pages.
+    Errors are logged and end the iteration (unless raise_errors is set); pages yielded before that are not lost.
+
     Args:
       url (str): The base URL to load and start the query process.
       query (str): AgentQL query
       max_pages (int, optional): The maximum number of pages to paginate through. Defaults to 1.
-      close_browser_on_finish (bool, optional): Whether to close the browser after pagination is complete. Defaults to True.
+      agentql_query_timeout (int, optional): Timeout for loading the page and for AgentQL queries
       referer (str, optional): The HTTP-REREFER string to be set for the browser. If not set the base URL will be used
       new_tab (bool, optional): Open a new tab for the URL to be scraped (default: False)
-    Returns:
-      list: Aggregated results from all pages, or an empty list on error
+      raise_errors (bool, optional): Re-raise errors after logging them, so the caller can tell a failed crawl
+                                     from a finished one (default: False)
+    Yields:
+      ScrapedPage: the page number, the page URL, the data extracted from it and the next page's URL
     """
+    current_page = None # Initialize to None for scope
     try:
+      self.start()
       if not referer:
         self.logger.info("REFERER was not set, let's use the base URL then as a referer...")
         parsed_url = urlparse(url)
@@ -285,7 +502,6 @@ class AgentQLPlaywrightScraper:
       headers_for_this_navigation = {**self.base_headers, "Referer": referer}
       self.logger.debug(f"Extra headers set for this query:\n{headers_for_this_navigation}")
 
-      current_page = None # Initialize to None for scope
       agql_page = None # Initialize agql_page for broader scope
 
       if new_tab:
@@ -293,25 +509,32 @@ class AgentQLPlaywrightScraper:
         current_page = self.context.new_page() # Assign to current_page
         current_page.set_extra_http_headers(headers_for_this_navigation)
         self.logger.debug(f"Waiting for the page to be loaded completely...")
-        current_page.goto(url, wait_until="load", timeout=agentql_query_timeout)
+        self.pacer.wait(url, "navigation")
+        started = time.monotonic()
+        response = current_page.goto(url, wait_until="load", timeout=agentql_query_timeout)
         current_page.wait_for_load_state("domcontentloaded") 
         self.logger.debug(f"domcontentLoaded event fired")
-        agql_page = agentql.wrap(current_page) # Assign to agql_current_page
+        self._observe_navigation(current_page, started, response, result_page=True)
+        agql_page = self.extractor.wrap(current_page) # Assign to agql_current_page
       else:
         self.context.set_extra_http_headers(headers_for_this_navigation)
         self.logger.debug(f"Opening page in existing tab: {url}")
         self.logger.debug(f"Waiting for the page to be loaded completely...")
-        self.page.goto(url,  wait_until="load", timeout=agentql_query_timeout)
+        self.pacer.wait(url, "navigation")
+        started = time.monotonic()
+        response = self.page.goto(url,  wait_until="load", timeout=agentql_query_timeout)
         self.page.wait_for_load_state("domcontentloaded") # Wait for 'domcontentloaded'
         self.logger.debug(f"domcontentLoaded event fired")
-        agql_page = agentql.wrap(self.page)
+        self._observe_navigation(self.page, started, response, result_page=True)
+        agql_page = self.extractor.wrap(self.page)
         current_page = self.page # Keep track of the current Playwright page object
 
       agql_page.wait_for_page_ready_state(True)
       self.logger.debug(f"Page ready state reported for {url}")
 
-      self.logger.debug(f"[DONE]...but let's wait 2 more seconds")
-      agql_page.wait_for_timeout(2000)  # Waits 2 seconds
+      settle_delay = self.pacer.delay(url, "settle")
+      self.logger.debug(f"[DONE]...but let's wait {settle_delay:.2f} more seconds")
+      agql_page.wait_for_timeout(settle_delay * 1000)
 
       # do some human actions like scrolling and random mouse movement
       self.mimic_human_actions(current_page)
@@ -324,37 +547,62 @@ class AgentQLPlaywrightScraper:
       self.logger.info(f"Scraping started at {misc.get_current_time()} with timeout of {agentql_query_timeout} for {max_pages} page(s)")
       self.logger.info(f"Be patient ah!")
       self.logger.info(f"###################################################################")
-      paginated_data = paginate(page=agql_page, 
-              query=query, 
-              number_of_pages=max_pages, 
-              timeout=agentql_query_timeout
-              )
-      return paginated_data
+      yield from self._iter_pages(agql_page, query, max_pages, timeout=agentql_query_timeout)
     except Exception as e:
       self.logger.error(f"AgentQL paginated query failed\n{e}", exc_info=True)
-      return []
+      if raise_errors:
+        raise
     finally:
       if new_tab and current_page:
-        self.logger.debug("Closing tab...sleeping for 2 seconds")
+        self.logger.debug("Closing tab...")
         current_page.close()
-        time.sleep(2)
-    # If for some reason the try block does not return, always return a list
+        self.pacer.wait(url, "tab_close")
+  # End of iter_paginate_query
+
+  def paginate_query(self, 
+                     url: str, 
+                     query: str, 
+                     max_pages: int = 1,
+                     agentql_query_timeout=60000,
+                     referer: Optional[str] = None,
+                     new_tab: bool = False) -> list:
+    """
+    Loads the page, runs the AgentQL query, and paginates through up to max_pages.
+    Returns a list of results aggregated from all pages.
+    Args:
+      url (str): The base URL to load and start the query process.
+      query (str): AgentQL query
+      max_pages (int, optional): The maximum number of pages to paginate through. Defaults to 1.
+      agentql_query_timeout (int, optional): Timeout for loading the page and for AgentQL queries
+      referer (str, optional): The HTTP-REREFER string to be set for the browser. If not set the base URL will be used
+      new_tab (bool, optional): Open a new tab for the URL to be scraped (default: False)
+    Returns:
+      list: Aggregated results from all pages scraped before any error, or an empty list
+    """
+    return [scraped.data for scraped in self.iter_paginate_query(url=url,
+                                                                 query=query,
+                                                                 max_pages=max_pages,
+                                                                 agentql_query_timeout=agentql_query_timeout,
+                                                                 referer=referer,
+                                                                 new_tab=new_tab)]
   # End of paginate_query
 
 
-  def search_query(self,
-                   url: str,
-                   search_string: str,
-                   query: str,
-                   num_pages: int,
-                   agentql_query_timeout:int=60000) -> List[Dict]:
+  def iter_search_query(self,
+                        url: str,
+                        search_string: str,
+                        query: str,
+                        num_pages: int,
+                        agentql_query_timeout:int=60000,
+                        resume_url: Optional[str] = None,
+                        start_page: int = 1,
+                        raise_errors: bool = False) -> Iterator[ScrapedPage]:
     """
-    Given a URL and a search string, 
-    this method will look for the search field and button on the page,
-    type in the search string, and click the search button.
-    
-    This is useful for automating searches on websites like Google, Bing, 
-    or any site with a search functionality.
+    Streaming version of search_query(): performs the search and yields the result of every
+    result page as soon as it is extracted, so callers can persist it while the crawl is still running.
+    Errors are logged and end the iteration (unless raise_errors is set); pages yielded before that are not lost.
+    An interrupted crawl can be continued by passing the next_url of the last persisted page as resume_url:
+    the search form is skipped and pagination goes on from there.
     
     Args:
       url (str): The URL of the web page to navigate to
@@ -362,12 +610,14 @@ class AgentQLPlaywrightScraper:
       query (str): The AgentQL query to run after the search is performed
       num_pages (int): The number of pages to paginate through after the search
       agentql_query_timeout (int): Timeout for AgentQL queries in milliseconds
-    Returns:
-      List[Dict]: List of dictionaries containing search results from all pages,
-                  or empty list if search failed or no results found
-      
+      resume_url (str, optional): result page URL to continue an interrupted crawl from
+      start_page (int, optional): page number of resume_url (default: 1)
+      raise_errors (bool, optional): Re-raise errors after logging them, so the caller can tell a failed crawl
+                                     from a finished one (default: False)
+    Yields:
+      ScrapedPage: the page number, the page URL, the data extracted from it and the next page's URL
     Raises:
-      Exception: If the search field or button cannot be found on the page
+      SearchBlocked: whatever raise_errors says, if the search engine answered with a CAPTCHA, see _iter_pages()
     """
     SEARCH_FIELD_QUERY="""
     {
@@ -375,81 +625,147 @@ class AgentQLPlaywrightScraper:
       search_button
     }
     """
+    if num_pages is None:
+      self.logger.warning("Pagination depth was not defined...reverting it to 1")
+      num_pages = 1
     try:
+      self.start()
+      if not resume_url and self.replay is not None:
+        # an archive has the result pages only, not the search form
+        resume_url = self.replay.first_page(search_string)
+      if resume_url:
+        yield from self._resume_search(resume_url=resume_url,
+                                       query=query,
+                                       num_pages=num_pages,
+                                       start_page=start_page,
+                                       label=search_string,
+                                       timeout=agentql_query_timeout)
+        return
+
       self.logger.debug(f"Opening page: {url}")
       
-      # Add random delay before navigation
-      random_delay = random.uniform(2, 5)
-      self.logger.debug(f"Waiting {random_delay:.2f}s before navigation...")
-      time.sleep(random_delay)
+      # Paced delay before navigation
+      random_delay = self.pacer.wait(url, "navigation")
+      self.logger.debug(f"Waited {random_delay:.2f}s before navigation")
       
-      self.page.goto(url, wait_until="domcontentloaded")
+      started = time.monotonic()
+      response = self.page.goto(url, wait_until="domcontentloaded", timeout=agentql_query_timeout)
+      self._observe_navigation(self.page, started, response)
       
-      # Random delay after page load
-      page_load_delay = random.uniform(3, 7)
-      self.logger.debug(f"Page loaded, waiting {page_load_delay:.2f}s...")
-      time.sleep(page_load_delay)
+      # Paced delay after page load
+      page_load_delay = self.pacer.wait(url, "page_load")
+      self.logger.debug(f"Page loaded, waited {page_load_delay:.2f}s")
       
       # Simulate human-like mouse movement
       self._simulate_human_behavior()
       
       self.logger.debug("Wrapping playwright page for agentQL querying")
-      agql_page = agentql.wrap(self.page)
+      agql_page = self.extractor.wrap(self.page)
       
       self.logger.debug("Looking for search field and button...")
-      response = agql_page.query_elements(SEARCH_FIELD_QUERY)
+      with metrics.timer("scraper.agentql_query_elements"):
+        response = agql_page.query_elements(SEARCH_FIELD_QUERY, timeout=agentql_query_timeout)
       
       if response.search_query and response.search_button:
         # Click on the search field first (more human-like)
         self.logger.debug("Clicking on search field...")
         response.search_query.click()
-        time.sleep(random.uniform(1, 2))
+        self.pacer.wait(url, "click")
         
         # Type with human-like delays
         self.logger.debug(f"Typing search string: {search_string}")
         self._human_type(response.search_query, search_string)
         
-        # Random delay before clicking search
-        search_delay = random.uniform(1, 3)
+        # Paced delay before clicking search
+        search_delay = self.pacer.delay(url, "submit")
         self.logger.debug(f"Waiting {search_delay:.2f}s before searching...")
         time.sleep(search_delay)
         
         self.logger.debug("Clicking search button...")
+        started = time.monotonic()
         response.search_button.click()
         
         # Wait for the search results to load
-        self.page.wait_for_load_state("domcontentloaded")
+        self.page.wait_for_load_state("domcontentloaded", timeout=agentql_query_timeout)
+        self._observe_navigation(self.page, started, result_page=True)
         self.logger.debug("Search completed successfully")
         
-        # Additional wait with some randomness
-        result_wait = random.uniform(3, 6)
+        # Additional paced wait for the results
+        result_wait = self.pacer.delay(url, "results_load")
         self.logger.debug(f"Waiting {result_wait:.2f}s for results to fully load...")
         time.sleep(result_wait)
         
         # Wrap the page for AgentQL querying after search
-        agql_page = agentql.wrap(self.page)
-        if num_pages is None:
-          self.logger.warning("Pagination depth was not defined...reverting it to 1")
-          num_pages = 1
+        agql_page = self.extractor.wrap(self.page)
         self.logger.info(f"###################################################################")
         self.logger.info(f"Scraping started at {misc.get_current_time()} with timeout of {agentql_query_timeout} for {num_pages} page(s)")
         self.logger.info(f"Be patient ah!")
         self.logger.info(f"###################################################################")
-        paginated_data = paginate(page=agql_page, 
-                                  query=query, 
-                                  number_of_pages=num_pages)
-        if paginated_data:
-            return paginated_data
-        else:
-            self.logger.warning("No data returned from pagination")
-            return []
+        yield from self._iter_pages(agql_page, query, num_pages, timeout=agentql_query_timeout, label=search_string)
       else:
         self.logger.error("Search field or button not found on the page")
-        return []
           
+    except SearchBlocked as e:
+      self.logger.warning(f"Search '{search_string}' blocked: {e}")
+      raise
     except Exception as e:
       self.logger.error(f"Error during search: {e}")
-      return []
+      if raise_errors:
+        raise
+
+  def _resume_search(self,
+                     resume_url: str,
+                     query: str,
+                     num_pages: int,
+                     start_page: int,
+                     label: Optional[str] = None,
+                     timeout: Optional[int] = None) -> Iterator[ScrapedPage]:
+    """Opens a result page of an interrupted search directly and paginates on from there (timeout in milliseconds)"""
+    random_delay = self.pacer.delay(resume_url, "navigation")
+    self.logger.info(f"Resuming search at page {start_page}: {resume_url} (waiting {random_delay:.2f}s before navigation)")
+    time.sleep(random_delay)
+    started = time.monotonic()
+    response = self.page.goto(resume_url, wait_until="domcontentloaded", timeout=timeout)
+    self._observe_navigation(self.page, started, response, result_page=True)
+    self.pacer.wait(resume_url, "results_load")
+    self._simulate_human_behavior()
+    agql_page = self.extractor.wrap(self.page)
+    yield from self._iter_pages(agql_page, query, num_pages, timeout=timeout, first_page_number=start_page, label=label)
+
+
+  def search_query(self,
+                   url: str,
+                   search_string: str,
+                   query: str,
+                   num_pages: int,
+                   agentql_query_timeout:int=60000) -> List[Dict]:
+    """
+    Given a URL and a search string, 
+    this method will look for the search field and button on the page,
+    type in the search string, and click the search button.
+    
+    This is useful for automating searches on websites like Google, Bing, 
+    or any site with a search functionality.
+    Use iter_search_query() to process the result pages while the crawl is still running.
+    
+    Args:
+      url (str): The URL of the web page to navigate to
+      search_string (str): The search query/term to enter in the search field
+      query (str): The AgentQL query to run after the search is performed
+      num_pages (int): The number of pages to paginate through after the search
+      agentql_query_timeout (int): Timeout for AgentQL queries in milliseconds
+    Returns:
+      List[Dict]: List of dictionaries containing search results from all pages scraped before any error,
+                  or empty list if search failed or no results found
+    """
+    paginated_data = [scraped.data for scraped in self.iter_search_query(url=url,
+                                                                        search_string=search_string,
+                                                                        query=query,
+                                                                        num_pages=num_pages,
+                                                                        agentql_query_timeout=agentql_query_timeout)]
+    if not paginated_data:
+      self.logger.warning("No data returned from pagination")
+    return paginated_data
 
 
 
@@ -469,16 +785,21 @@ class AgentQLPlaywrightScraper:
     Returns:
       dict: The structured data extracted from the page.
     """
+    self.start()
     self.logger.debug(f"Opening page: {url}")
-    self.page.goto(url)
+    started = time.monotonic()
+    response = self.page.goto(url)
+    self._observe_navigation(self.page, started, response)
     
     self.logger.debug("Wrapping playwright page for agentQL querying")
-    agql_page = agentql.wrap(self.page)  # Wrap Playwright page for AgentQL querying
+    self._archive_page(self.page)
+    agql_page = self.extractor.wrap(self.page)  # Wrap Playwright page for AgentQL querying
     self.logger.debug("Running AgentQL query...")
     if elements:
-      result = agql_page.query_elements(query)
+      with metrics.timer("scraper.agentql_query_elements"):
+        result = agql_page.query_elements(query)
     else:
-      result = agql_page.query_data(query)
+      result = self._query_data(agql_page, query)
 
     return result
 
@@ -598,6 +919,8 @@ class AgentQLPlaywrightScraper:
     Callback function for agentql.paginate to perform human-like actions
     on each new page that loads during pagination.
     """
+    if self.replay is not None:
+      return
     self.logger.info(f"Performing human-like actions...")
     
     # mimic some mouse movement
@@ -0,0 +1,426 @@
+import os
+import sys
+import time
+import random
+import asyncio
+from typing import Optional, List, Dict, Any
+from urllib.parse import urlparse
+
+current_dir = os.path.abspath(os.path.dirname(__file__))
+src_dir= os.path.abspath(os.path.join(current_dir, '..'))
+# set sys_path to also look for libs elsewhere
+sys.path.append(src_dir)
+from libs.logger import CustomLogger
+from libs import misc
+from libs.metrics import metrics
+from scraper.agentql_scraper import load_api_key
+from scraper.browser_profile import BASE_HEADERS, BROWSER_ARGS, STEALTH_JS, context_options
+from scraper.pacing import Pacer, pacer_from_env, detect_captcha
+from scraper.resource_policy import ResourcePolicy
+from scraper.snapshot_archive import SnapshotArchive
+
+
+class AsyncAgentQLPlaywrightScraper:
+  """
+  asyncio counterpart of AgentQLPlaywrightScraper built on playwright.async_api and the async AgentQL SDK.
+
+  The public surface is the same (search_query, paginate_query, query, close), but every call runs in its own tab
+  of the shared persistent context and all humanisation delays are asyncio.sleep()s, so many calls can be
+  in flight at once from a single thread. Use AsyncScrapeScheduler to bound how many run concurrently.
+  The first call launches the browser; concurrent first calls wait for that launch instead of starting a
+  second persistent Chromium on the same user_data_dir.
+
+  Example:
+    async with AsyncAgentQLPlaywrightScraper(headless=True) as scraper:
+      data = await scraper.query(url, aql)
+  """
+  def __init__(self,
+               api_key: Optional[str] = None,
+               headless: bool = False,
+               proxy_address: Optional[str] = None,
+               user_data_dir: str = "/tmp/playwright-user-data-async",
+               pacer: Optional[Pacer] = None,
+               resource_policy: Optional[ResourcePolicy] = None,
+               archive: Optional[SnapshotArchive] = None):
+    """
+      Configure the scraper. The browser itself is launched by start() (or by entering the async context manager).
+
+      Args:
+        api_key (str): AgentQL API key (falls back to the ENV / .env file)
+        headless (bool): whether we want to see the browser or not
+        proxy_address (str): the actual Tor proxy address
+        user_data_dir (str): directory to persist browser session data
+        pacer (Pacer): decides the delays between actions per host (default: from SCRAPER_PACING*, see scraper.pacing)
+        resource_policy (ResourcePolicy): blocks the requests text extraction does not need
+                                          (default: from SCRAPER_RESOURCE_POLICY, see scraper.resource_policy)
+        archive (SnapshotArchive): keeps the raw HTML of the pages query() extracts from and of the first result
+                                   page of paginate_query() / search_query(), the later ones are navigated inside
+                                   AgentQL's paginate() (default: built from SCRAPER_ARCHIVE_PATH if set)
+    """
+    self.base_headers = dict(BASE_HEADERS)
+    self.logger = CustomLogger(self.__class__.__name__)
+    load_api_key(self.logger, api_key)
+
+    self.headless = headless
+    self.proxy_address = proxy_address
+    self.user_data_dir = user_data_dir if user_data_dir is not None else "/tmp/playwright-user-data-async"
+    self.pacer = pacer if pacer is not None else pacer_from_env()
+    self.resource_policy = resource_policy if resource_policy is not None else ResourcePolicy.from_env()
+    self.archive = archive if archive is not None else SnapshotArchive.from_env()
+    # the archive opened here (from the environment) is closed by close(), one passed in is the caller's
+    self._owns_archive = archive is None and self.archive is not None
+    self.playwright = None
+    self.context = None
+    # start() and close() of concurrent calls run one at a time
+    self._start_lock = asyncio.Lock()
+
+  async def start(self) -> "AsyncAgentQLPlaywrightScraper":
+    """
+    Starts Playwright and the persistent browser context with anti-detection features, once: called by every
+    method that needs the browser, and calls waiting for a launch in progress get the context it creates.
+    """
+    async with self._start_lock:
+      if self.context is None:
+        self.playwright, self.context = await self._launch()
+    return self
+
+  async def _launch(self) -> tuple:
+    """Launches Playwright and the persistent context, returns (playwright, context)"""
+    from playwright.async_api import async_playwright
+    self.logger.info("Creating new persistent (async) browser context with anti-detection...")
+    playwright = await async_playwright().start()
+    proxy = {"server": self.proxy_address} if self.proxy_address else None
+    try:
+      context = await playwright.chromium.launch_persistent_context(
+          self.user_data_dir,
+          headless=self.headless,
+          proxy=proxy,
+          args=BROWSER_ARGS,
+          **context_options(self.base_headers)
+      )
+    except Exception:
+      await playwright.stop()
+      raise
+    if self.resource_policy is not None:
+      await self.resource_policy.attach_async(context)
+    # every tab opened later gets the anti-detection JavaScript as well
+    await context.add_init_script(STEALTH_JS)
+    self.logger.debug("Anti-detection scripts added")
+    return playwright, context
+
+  async def close(self):
+    """Closing browser and playwright, and the snapshot archive the scraper opened itself"""
+    async with self._start_lock:
+      await self._close()
+
+  async def _close(self):
+    self.logger.info("Closing browser connection and Playwright")
+    self.logger.info(f"Pacing stats: {self.pacer.stats()}")
+    if self.resource_policy is not None:
+      self.logger.info(f"Resource policy stats: {self.resource_policy.stats()}")
+    if self.archive is not None:
+      self.logger.info(f"Snapshot archive stats: {self.archive.stats()}")
+    try:
+      if self.context is not None:
+        await self.context.close()
+    except Exception as e:
+      self.logger.warning(f"Error during browser close: {e}")
+    finally:
+      try:
+        if self.playwright is not None:
+          await self.playwright.stop()
+      except Exception as e:
+        self.logger.warning(f"Error stopping Playwright: {e}")
+      self.context = None
+      self.playwright = None
+      if self._owns_archive:
+        self.archive.close()
+        self.archive, self._owns_archive = None, False
+
+  async def __aenter__(self):
+    return await self.start()
+
+  async def __aexit__(self, exc_type, exc, tb):
+    await self.close()
+
+  @staticmethod
+  async def _wrap(page):
+    """The AgentQL-wrapped (async) page"""
+    import agentql
+    return await self._wrap(page)
+
+  @staticmethod
+  async def _paginate(agql_page, query: str, number_of_pages: int, timeout: int):
+    """AgentQL's async paginate tool"""
+    from agentql.tools.async_api import paginate
+    return await paginate(page=agql_page, query=query, number_of_pages=number_of_pages, timeout=timeout)
+
+  async def _new_page(self, referer: Optional[str] = None):
+    """Opens a new tab for a single call, so concurrent calls never share a page"""
+    await self.start()
+    page = await self.context.new_page()
+    if referer:
+      await page.set_extra_http_headers({**self.base_headers, "Referer": referer})
+    return page
+
+  async def _pace(self, url: Optional[str], action: str) -> None:
+    """Waits the delay the pacer gives for an action on the host of url"""
+    await asyncio.sleep(self.pacer.delay(url, action))
+
+  async def _goto(self, page, url: str, **kwargs):
+    """page.goto() between a paced wait and a report of the outcome (latency, status, CAPTCHA) to the pacer"""
+    await self._pace(url, "navigation")
+    started = time.monotonic()
+    response = await page.goto(url, **kwargs)
+    await self._observe_navigation(page, started, response)
+    return response
+
+  async def _archive_page(self, page, page_number: Optional[int] = None, label: Optional[str] = None) -> None:
+    """Async counterpart of AgentQLPlaywrightScraper._archive_page()"""
+    if self.archive is None:
+      return
+    try:
+      content = await page.content()
+      # compressing and writing the blob would block the event loop
+      await asyncio.to_thread(self.archive.put, content, page.url, page_number, label)
+    except Exception as e:
+      self.logger.warning(f"Could not archive {page.url}: {e}")
+
+  async def _observe_navigation(self, page, started: float, response=None) -> bool:
+    """Async counterpart of AgentQLPlaywrightScraper._observe_navigation()"""
+    latency = time.monotonic() - started
+    metrics.observe("scraper.navigation", latency)
+    status, retry_after = None, None
+    if response is not None:
+      status = response.status
+      retry_after_header = (response.headers or {}).get("retry-after", "")
+      retry_after = float(retry_after_header) if retry_after_header.isdigit() else None
+    try:
+      content = await page.content()
+      metrics.count("scraper.page_bytes", len(content.encode("utf-8")))
+    except Exception:
+      content = None
+    captcha = detect_captcha(page.url, content)
+    if captcha:
+      metrics.count("scraper.captchas")
+      self.logger.warning(f"CAPTCHA / bot challenge detected at {page.url}")
+    if self.resource_policy is not None:
+      self.resource_policy.take_page_stats(page.url)
+    self.pacer.observe(page.url, latency=latency, status=status, captcha=captcha, retry_after=retry_after)
+    return captcha
+
+  async def _simulate_human_behavior(self, page):
+    """Simulate human-like behavior on the page"""
+    try:
+      # Random mouse movements
+      for _ in range(random.randint(2, 5)):
+        await page.mouse.move(random.randint(100, 1800), random.randint(100, 900))
+        await self._pace(page.url, "mouse_move")
+
+      # Random scroll, then scroll back up a bit
+      await page.evaluate(f"window.scrollBy(0, {random.randint(100, 500)})")
+      await self._pace(page.url, "scroll")
+      await page.evaluate(f"window.scrollBy(0, -{random.randint(50, 200)})")
+      await self._pace(page.url, "scroll_back")
+    except Exception as e:
+      self.logger.debug(f"Error in human behavior simulation: {e}")
+
+  async def _human_type(self, element, text, url: Optional[str] = None):
+    """Type text with human-like delays"""
+    try:
+      await element.clear()
+      await self._pace(url, "clear")
+      for char in text:
+        await element.type(char)
+        # Random delay between keystrokes, longer pause at spaces
+        await self._pace(url, "space" if char == ' ' else "keystroke")
+    except Exception as e:
+      self.logger.debug(f"Error in human typing: {e}")
+      # Fallback to regular fill
+      await element.fill(text)
+
+  async def paginate_query(self,
+                           url: str,
+                           query: str,
+                           max_pages: int = 1,
+                           agentql_query_timeout=60000,
+                           referer: Optional[str] = None) -> list:
+    """
+    Loads the page in a new tab, runs the AgentQL query, and paginates through up to max_pages.
+
+    Args:
+      url (str): The base URL to load and start the query process.
+      query (str): AgentQL query
+      max_pages (int, optional): The maximum number of pages to paginate through. Defaults to 1.
+      agentql_query_timeout (int): Timeout for navigation and AgentQL queries in milliseconds
+      referer (str, optional): The HTTP-REFERER string to be set for the browser. If not set the base URL will be used
+    Returns:
+      list: Aggregated results from all pages, or an empty list on error
+    """
+    if not referer:
+      parsed_url = urlparse(url)
+      referer = f"{parsed_url.scheme}://{parsed_url.netloc}"
+    if max_pages is None:
+      self.logger.warning("Pagination depth was not defined...reverting it to 1")
+      max_pages = 1
+
+    page = None
+    try:
+      page = await self._new_page(referer=referer)
+      self.logger.debug(f"Opening page in a new tab: {url}")
+      await self._goto(page, url, wait_until="load", timeout=agentql_query_timeout)
+      agql_page = await self._wrap(page)
+      await agql_page.wait_for_page_ready_state(True)
+      await self._pace(url, "settle")
+
+      await self._simulate_human_behavior(page)
+
+      self.logger.info(f"Scraping {url} started at {misc.get_current_time()} for {max_pages} page(s)")
+      await self._archive_page(page, page_number=1)
+      return await self._paginate(agql_page, query, max_pages, agentql_query_timeout)
+    except Exception as e:
+      self.logger.error(f"AgentQL paginated query failed\n{e}", exc_info=True)
+      return []
+    finally:
+      if page is not None:
+        await page.close()
+
+  async def search_query(self,
+                         url: str,
+                         search_string: str,
+                         query: str,
+                         num_pages: int,
+                         agentql_query_timeout: int = 60000) -> List[Dict]:
+    """
+    Opens the URL in a new tab, types the search string into the search field like a human,
+    submits it and paginates through the results.
+
+    Args:
+      url (str): The URL of the web page to navigate to
+      search_string (str): The search query/term to enter in the search field
+      query (str): The AgentQL query to run after the search is performed
+      num_pages (int): The number of pages to paginate through after the search
+      agentql_query_timeout (int): Timeout for AgentQL queries in milliseconds
+    Returns:
+      List[Dict]: List of dictionaries containing search results from all pages,
+                  or empty list if search failed or no results found
+    """
+    SEARCH_FIELD_QUERY="""
+    {
+      search_query
+      search_button
+    }
+    """
+    if num_pages is None:
+      self.logger.warning("Pagination depth was not defined...reverting it to 1")
+      num_pages = 1
+
+    page = None
+    try:
+      page = await self._new_page()
+      self.logger.debug(f"Opening page: {url}")
+      await self._goto(page, url, wait_until="domcontentloaded", timeout=agentql_query_timeout)
+      await self._pace(url, "page_load")
+      await self._simulate_human_behavior(page)
+
+      agql_page = await self._wrap(page)
+      response = await agql_page.query_elements(SEARCH_FIELD_QUERY, timeout=agentql_query_timeout)
+      if not (response.search_query and response.search_button):
+        self.logger.error("Search field or button not found on the page")
+        return []
+
+      await response.search_query.click()
+      await self._pace(url, "click")
+      self.logger.debug(f"Typing search string: {search_string}")
+      await self._human_type(response.search_query, search_string, url=url)
+      await self._pace(url, "submit")
+      started = time.monotonic()
+      await response.search_button.click()
+      await page.wait_for_load_state("domcontentloaded")
+      await self._observe_navigation(page, started)
+      await self._pace(url, "results_load")
+
+      await self._archive_page(page, page_number=1, label=search_string)
+      agql_page = await self._wrap(page)
+      self.logger.info(f"Scraping '{search_string}' started at {misc.get_current_time()} for {num_pages} page(s)")
+      paginated_data = await self._paginate(agql_page, query, num_pages, agentql_query_timeout)
+      if not paginated_data:
+        self.logger.warning("No data returned from pagination")
+        return []
+      return paginated_data
+    except Exception as e:
+      self.logger.error(f"Error during search: {e}")
+      return []
+    finally:
+      if page is not None:
+        await page.close()
+
+  async def query(self,
+                  url: str,
+                  query: str,
+                  elements: bool = False):
+    """
+    Loads the web page in a new tab, runs the AgentQL query and returns the extracted data.
+
+    Note: with elements=True the returned element handles belong to a tab that is closed
+    when this call returns, so only use it for inspecting the response.
+
+    Args:
+      url (str): The URL of the web page to scrape.
+      query (str): The AgentQL query string to execute on the page.
+      elements (bool): Indicate whether to gather the HTML element instead of the content
+    Returns:
+      dict: The structured data extracted from the page.
+    """
+    page = await self._new_page()
+    try:
+      self.logger.debug(f"Opening page: {url}")
+      started = time.monotonic()
+      response = await page.goto(url)
+      await self._observe_navigation(page, started, response)
+      await self._archive_page(page)
+      agql_page = await self._wrap(page)
+      if elements:
+        return await agql_page.query_elements(query)
+      return await agql_page.query_data(query)
+    finally:
+      await page.close()
+
+
+class AsyncScrapeScheduler:
+  """
+  Bounded-concurrency runner for AsyncAgentQLPlaywrightScraper calls.
+  At most max_concurrency calls (i.e., open tabs) are in flight at any time; results keep the order of the jobs.
+
+  Example:
+    async with AsyncAgentQLPlaywrightScraper(headless=True) as scraper:
+      scheduler = AsyncScrapeScheduler(scraper, max_concurrency=20)
+      results = await scheduler.map("query", [dict(url=u, query=aql) for u in urls])
+  """
+  def __init__(self, scraper: AsyncAgentQLPlaywrightScraper, max_concurrency: int = 8):
+    if max_concurrency < 1:
+      raise ValueError("'max_concurrency' must be at least 1")
+    self.scraper = scraper
+    self.max_concurrency = max_concurrency
+    self.semaphore = asyncio.Semaphore(max_concurrency)
+    self.logger = CustomLogger(self.__class__.__name__)
+
+  async def run(self, method: str, **kwargs) -> Any:
+    """Run a single scraper call once a concurrency slot is free"""
+    async with self.semaphore:
+      return await getattr(self.scraper, method)(**kwargs)
+
+  async def map(self, method: str, jobs: List[Dict[str, Any]], return_exceptions: bool = False) -> list:
+    """
+    Run the given scraper method once per job with bounded concurrency.
+
+    Args:
+      method (str): "search_query", "paginate_query" or "query"
+      jobs (List[Dict]): keyword arguments for each call
+      return_exceptions (bool): return raised exceptions in place of results instead of propagating the first one
+    Returns:
+      list: the results, in the same order as the jobs
+    """
+    self.logger.info(f"Scheduling {len(jobs)} {method} call(s) with at most {self.max_concurrency} in flight")
+    return await asyncio.gather(*(self.run(method, **kwargs) for kwargs in jobs),
+                                return_exceptions=return_exceptions)
@@ -0,0 +1,105 @@
+"""
+Browser fingerprint shared by the sync and the async AgentQL scrapers:
+HTTP headers, Chromium flags, persistent context settings and the anti-detection init script.
+"""
+
+# Realistic browser headers applied to every request of the context
+BASE_HEADERS = {
+  # Realistic User-Agent for Chrome on Windows
+  "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36",
+  # Standard Accept header for HTML documents
+  "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",   
+  # Prioritize US English, then generic English
+  "Accept-Language": "en-US,en;q=0.9",
+  # Common Accept-Encoding for compression
+  "Accept-Encoding": "gzip, deflate, br, zstd",
+  # Keep-alive for persistent connections
+  "Connection": "keep-alive",
+  # Request secure connection if possible
+  "Upgrade-Insecure-Requests": "1",
+  # Additional headers to look more like a real browser
+  "Sec-Fetch-Dest": "document",
+  "Sec-Fetch-Mode": "navigate",
+  "Sec-Fetch-Site": "none",
+  "Sec-Fetch-User": "?1",
+  "Cache-Control": "max-age=0"
+}
+
+# Browser arguments to look more like a real browser
+BROWSER_ARGS = [
+  '--disable-blink-features=AutomationControlled',
+  '--disable-dev-shm-usage',
+  '--disable-ipc-flooding-protection',
+  '--disable-renderer-backgrounding',
+  '--disable-backgrounding-occluded-windows',
+  '--disable-background-timer-throttling',
+  '--disable-features=TranslateUI',
+  '--disable-features=VizDisplayCompositor',
+  '--no-first-run',
+  '--no-default-browser-check',
+  '--no-sandbox',
+  '--disable-web-security',
+  '--disable-extensions-except',
+  '--disable-plugins-discovery',
+  '--start-maximized'
+]
+
+def context_options(base_headers: dict) -> dict:
+  """
+  Keyword arguments for launch_persistent_context() giving a realistic browser profile.
+
+  Args:
+    base_headers (dict): the headers to send with every request (their User-Agent is used too)
+
+  Returns:
+    dict: settings to be passed to launch_persistent_context() next to user_data_dir, headless, proxy and args
+  """
+  return dict(
+    viewport={'width': 1920, 'height': 1080},
+    user_agent=base_headers["User-Agent"],
+    locale='en-US',
+    timezone_id='America/New_York',
+    extra_http_headers=base_headers,
+    ignore_https_errors=True,
+    java_script_enabled=True,
+    accept_downloads=True,
+    bypass_csp=True,
+    color_scheme='light'
+  )
+
+# JavaScript making the browser appear more human-like
+STEALTH_JS = """
+// Remove webdriver property
+Object.defineProperty(navigator, 'webdriver', {
+  get: () => undefined,
+});
+
+// Mock languages and plugins
+Object.defineProperty(navigator, 'languages', {
+  get: () => ['en-US', 'en'],
+});
+
+Object.defineProperty(navigator, 'plugins', {
+  get: () => [1, 2, 3, 4, 5],
+});
+
+// Mock screen resolution
+Object.defineProperty(screen, 'width', {
+  get: () => 1920,
+});
+Object.defineProperty(screen, 'height', {
+  get: () => 1080,
+});
+
+// Add some randomness to mouse movements
+const originalAddEventListener = EventTarget.prototype.addEventListener;
+EventTarget.prototype.addEventListener = function(type, listener, options) {
+  if (type === 'mousemove') {
+    const newListener = function(e) {
+      setTimeout(() => listener(e), Math.random() * 100);
+    };
+    return originalAddEventListener.call(this, type, newListener, options);
+  }
+  return originalAddEventListener.call(this, type, listener, options);
+};
+"""
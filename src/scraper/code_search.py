@@ -0,0 +1,209 @@
+import os
+import re
+import sys
+import math
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Iterator
+from urllib.parse import urlencode
+
+current_dir = os.path.abspath(os.path.dirname(__file__))
+src_dir= os.path.abspath(os.path.join(current_dir, '..'))
+# set sys_path to also look for libs elsewhere
+sys.path.append(src_dir)
+from libs.logger import CustomLogger
+from libs.metrics import metrics
+from libs.github_api import GitHubApiClient, RateLimitExceeded
+from scraper.discovery import DiscoveryBackend, ScrapedPage
+
+# GitHub serves the first 1000 results of a code search only, later pages are answered with 422
+CODE_SEARCH_MAX_RESULTS = 1000
+MAX_PER_PAGE = 100
+
+# qualifiers of GitHub's code search, passed on as they are
+_CODE_SEARCH_QUALIFIERS = ("filename", "path", "extension", "user", "org", "repo", "language", "in", "size")
+_TOKEN_RE = re.compile(r'-?[\w.]+:"[^"]*"|"[^"]*"|\S+')
+
+
+def dork_to_code_search(search_string: str) -> str:
+  """
+  Translates a search engine dork into a GitHub code search query, so the same dorks (and DorkPlanner's shards)
+  work with both discovery backends:
+    inurl:<dir>/<file>          -> filename:<file> path:<dir>  (-inurl: -> -filename:)
+    site:github.com             -> dropped, code search only searches GitHub
+    site:github.com/<developer> -> user:<developer>
+    after: / before:            -> dropped, code search has no date qualifier
+  Code search qualifiers (filename:, path:, user:, ...), quoted phrases and words are kept.
+
+  Args:
+    search_string (str): e.g., 'site:github.com inurl:docker-compose.yml "traefik"'
+
+  Returns:
+    str: e.g., 'filename:docker-compose.yml "traefik"'
+  """
+  terms = []
+  for token in _TOKEN_RE.findall(search_string):
+    negated = token.startswith("-")
+    operator, _, value = token.lstrip("-").partition(":")
+    operator = operator.lower()
+    if not value or operator not in ("inurl", "site", "after", "before"):
+      terms.append(token)
+    elif operator == "inurl":
+      directory, _, filename = value.strip("/").rpartition("/")
+      terms.append(f"{'-' if negated else ''}filename:{filename}")
+      if directory and not negated:
+        terms.append(f"path:{directory}")
+    elif operator == "site":
+      developer = value.lower().removeprefix("github.com").strip("/").split("/")[0]
+      if developer:
+        terms.append(f"{'-' if negated else ''}user:{developer}")
+  return " ".join(terms)
+
+
+class CodeSearchDiscovery(DiscoveryBackend):
+  """
+  Finds compose files with GitHub's code search REST API (GET /search/code) instead of a search engine in a
+  browser: no browser, no AgentQL and no CAPTCHAs, at most 1000 results (10 pages of 100) per query.
+
+  After the first page tells the total, the following pages are fetched on a pool of threads over the pooled
+  keep-alive session of a GitHubApiClient, at most max_workers ahead of the page being yielded, and yielded in
+  page order, so checkpoints stay in order and a caller that stops early wastes at most max_workers requests.
+  Every request goes through the client's RateLimiter on the 'search' resource, which learns the budget from the
+  X-RateLimit-* headers and waits for the reset once it is used up (code search allows 10 requests per minute).
+
+  Results are shaped like the browser's ({"search_results": [{title, about, url}]}, url being the file on GitHub),
+  so they go through CrawlRunner and RepositorySink unchanged. Search strings are translated with
+  dork_to_code_search(); the AgentQL query is not needed.
+
+  Example:
+    discovery = CodeSearchDiscovery.from_env()
+    for scraped in discovery.iter_search_query(url=None, search_string="filename:docker-compose.yml", query=aql, num_pages=10):
+      sink.add_scraped_page(scraped)
+  """
+  def __init__(self,
+               client: GitHubApiClient,
+               per_page: int = MAX_PER_PAGE,
+               max_workers: int = 4,
+               owns_client: bool = True):
+    """
+      Args:
+        client (GitHubApiClient): the API client (needs a token, code search is not available anonymously)
+        per_page (int): results per page (at most 100)
+        max_workers (int): pages fetched at the same time
+        owns_client (bool): close() closes the client too
+    """
+    if not 1 <= per_page <= MAX_PER_PAGE:
+      raise ValueError(f"'per_page' must be between 1 and {MAX_PER_PAGE}")
+    if max_workers < 1:
+      raise ValueError("'max_workers' must be at least 1")
+    self.logger = CustomLogger(self.__class__.__name__)
+    self.client = client
+    self.per_page = per_page
+    self.max_workers = max_workers
+    self.owns_client = owns_client
+
+  @classmethod
+  def from_env(cls, max_workers: Optional[int] = None) -> "CodeSearchDiscovery":
+    """
+    Builds a backend with GitHubApiClient.from_env() (GITHUB_TOKEN, GITHUB_API_URL, ...), CODE_SEARCH_WORKERS
+    (pages fetched at the same time, default: 4) and CODE_SEARCH_PER_PAGE (default: 100)
+    """
+    max_workers = max_workers or int(os.getenv("CODE_SEARCH_WORKERS", 4))
+    return cls(client=GitHubApiClient.from_env(pool_size=max_workers),
+               per_page=int(os.getenv("CODE_SEARCH_PER_PAGE", MAX_PER_PAGE)),
+               max_workers=max_workers)
+
+  def for_job(self) -> "CodeSearchDiscovery":
+    """A backend sharing this one's client (connection pool and rate limit budget) that leaves it open on close()"""
+    return CodeSearchDiscovery(client=self.client, per_page=self.per_page, max_workers=self.max_workers,
+                               owns_client=False)
+
+  def page_url(self, search_query: str, page_number: int) -> str:
+    return f"{self.client.api_url}/search/code?" + urlencode(dict(q=search_query, per_page=self.per_page, page=page_number))
+
+  def _fetch(self, search_query: str, page_number: int) -> Dict[str, Any]:
+    with metrics.timer("discovery.code_search_page"):
+      response = self.client.get("/search/code",
+                                 params=dict(q=search_query, per_page=self.per_page, page=page_number),
+                                 resource="search")
+    if response.data is None:
+      raise RuntimeError(f"Code search '{search_query}' page {page_number} answered {response.status}")
+    if response.data.get("incomplete_results"):
+      # the search timed out on GitHub's side, the page may miss results
+      metrics.count("discovery.incomplete_pages")
+    return response.data
+
+  @staticmethod
+  def search_results(data: Dict[str, Any]) -> Dict[str, Any]:
+    """A code search answer in the shape of the `search_results[] { title about url }` query"""
+    results = []
+    for item in data.get("items") or []:
+      repository = item.get("repository") or {}
+      results.append(dict(title=f"{repository.get('full_name', '')}: {item.get('path', item.get('name', ''))}",
+                          about=repository.get("description"),
+                          url=item.get("html_url")))
+    return {"search_results": results}
+
+  def iter_search_query(self,
+                        url: Optional[str],
+                        search_string: str,
+                        query: str,
+                        num_pages: int,
+                        agentql_query_timeout: int = 60000,
+                        resume_url: Optional[str] = None,
+                        start_page: int = 1,
+                        raise_errors: bool = False) -> Iterator[ScrapedPage]:
+    """
+    Pages through the code search of search_string, see DiscoveryBackend.iter_search_query().
+    url, query and agentql_query_timeout are not used; a resumed search continues at start_page.
+
+    Raises:
+      RateLimitExceeded: whatever raise_errors says, once the search budget is used up for longer than the
+                         client's RateLimiter waits: the search is not exhausted, it has to be resumed later
+    """
+    search_query = dork_to_code_search(search_string)
+    try:
+      first = self._fetch(search_query, start_page)
+      total = min(first.get("total_count") or 0, CODE_SEARCH_MAX_RESULTS)
+      last_page = max(start_page, min(num_pages, math.ceil(total / self.per_page)))
+      self.logger.info(f"Code search '{search_query}': {first.get('total_count')} result(s), "
+                       f"pages {start_page}-{last_page} of {self.per_page}")
+
+      def page(page_number: int, data: Dict[str, Any]) -> ScrapedPage:
+        metrics.count("discovery.code_search_results", len(data.get("items") or []))
+        return ScrapedPage(page_number=page_number,
+                           url=self.page_url(search_query, page_number),
+                           data=self.search_results(data),
+                           next_url=self.page_url(search_query, page_number + 1) if page_number < last_page else None)
+
+      yield page(start_page, first)
+      page_numbers = iter(range(start_page + 1, last_page + 1))
+      executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="code-search")
+      try:
+        in_flight = deque()
+        for page_number in page_numbers:
+          in_flight.append((page_number, executor.submit(self._fetch, search_query, page_number)))
+          if len(in_flight) >= self.max_workers:
+            break
+        while in_flight:
+          page_number, future = in_flight.popleft()
+          data = future.result()
+          next_page = next(page_numbers, None)
+          if next_page is not None:
+            in_flight.append((next_page, executor.submit(self._fetch, search_query, next_page)))
+          yield page(page_number, data)
+      finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+    except RateLimitExceeded:
+      raise
+    except Exception as e:
+      self.logger.error(f"Error during code search '{search_query}': {e}")
+      if raise_errors:
+        raise
+
+  def stats(self) -> Dict[str, Any]:
+    return self.client.stats()
+
+  def close(self) -> None:
+    if self.owns_client:
+      self.client.close()
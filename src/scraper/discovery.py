@@ -0,0 +1,86 @@
+import os
+import sys
+from typing import Optional, List, Dict, Any, Iterator, NamedTuple
+
+current_dir = os.path.abspath(os.path.dirname(__file__))
+src_dir= os.path.abspath(os.path.join(current_dir, '..'))
+# set sys_path to also look for libs elsewhere
+sys.path.append(src_dir)
+
+# the implementations of DiscoveryBackend, see appcollector.py crawl --discovery
+DISCOVERY_BACKENDS = ("browser", "code-search")
+
+
+class SearchBlocked(Exception):
+  """
+  The search engine answered with a CAPTCHA / bot challenge instead of a result page. The search is not
+  exhausted: the pages yielded before stay the crawl position and a later run resumes from there.
+  """
+
+
+class ScrapedPage(NamedTuple):
+  """One result page as yielded by the iter_*_query() methods"""
+  page_number: int # 1-based index of the page within the pagination
+  url: str # the URL the data was extracted from
+  data: Any # whatever AgentQL's query_data() returned for this page
+  next_url: Optional[str] = None # the URL of the next page (already navigated to), None if this is the last one
+
+
+class DiscoveryBackend:
+  """
+  Finds compose files for a search string, a result page at a time. Every backend yields pages shaped like the
+  `search_results[] { title about url }` query of appcollector.py, i.e., {"search_results": [{title, about, url}]}
+  with url pointing to a compose file on GitHub, so CrawlRunner and RepositorySink take them as they are.
+
+  Implementations:
+    browser:     scraper.agentql_scraper.AgentQLPlaywrightScraper, a search engine in a (headful) browser
+    code-search: scraper.code_search.CodeSearchDiscovery, GitHub's code search REST API, no browser
+  """
+  def iter_search_query(self,
+                        url: str,
+                        search_string: str,
+                        query: str,
+                        num_pages: int,
+                        agentql_query_timeout: int = 60000,
+                        resume_url: Optional[str] = None,
+                        start_page: int = 1,
+                        raise_errors: bool = False) -> Iterator[ScrapedPage]:
+    """
+    Searches and yields every result page as soon as it is there, up to page number num_pages.
+    A search interrupted after page N continues with resume_url (the next_url of page N) and start_page N + 1.
+
+    Args:
+      url (str): where to search (e.g., the search engine's home page), backends with a fixed API ignore it
+      search_string (str): what to search for
+      query (str): AgentQL query shaping the results of a page
+      num_pages (int): page number to stop at (inclusive)
+      agentql_query_timeout (int): timeout of a page in milliseconds
+      resume_url (str, optional): the page to continue an interrupted search from
+      start_page (int, optional): page number of resume_url (default: 1)
+      raise_errors (bool, optional): re-raise errors instead of ending the iteration
+
+    Yields:
+      ScrapedPage: the page number, the page URL, the results of the page and the next page's URL
+
+    Raises:
+      SearchBlocked: whatever raise_errors says, if the search engine blocked the search; a challenge page is
+                     never yielded
+    """
+    raise NotImplementedError
+
+  def search_query(self,
+                   url: str,
+                   search_string: str,
+                   query: str,
+                   num_pages: int,
+                   agentql_query_timeout: int = 60000) -> List[Dict]:
+    """The results of every page of iter_search_query() in one list, empty if the search failed"""
+    return [scraped.data for scraped in self.iter_search_query(url=url,
+                                                                search_string=search_string,
+                                                                query=query,
+                                                                num_pages=num_pages,
+                                                                agentql_query_timeout=agentql_query_timeout)]
+
+  def close(self) -> None:
+    pass
+
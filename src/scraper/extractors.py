@@ -0,0 +1,313 @@
+import os
+import re
+import sys
+import json
+import functools
+from types import SimpleNamespace
+from typing import Optional, Dict, Any, NamedTuple
+from urllib.parse import urljoin
+
+import yaml
+
+current_dir = os.path.abspath(os.path.dirname(__file__))
+src_dir= os.path.abspath(os.path.join(current_dir, '..'))
+# set sys_path to also look for libs elsewhere
+sys.path.append(src_dir)
+from libs.logger import CustomLogger
+
+# XPath rules for Google-like result pages (and the local stand-in in benchmarks/serp_server.py, which mirrors
+# Google's markup), shaped like the `search_results[] { title about url }` query of appcollector.py
+GOOGLE_SERP_RULES = {
+  "data": {
+    "search_results": {
+      "xpath": "//div[@id='search']//div[contains(concat(' ', normalize-space(@class), ' '), ' g ')]",
+      "fields": {
+        "title": ".//h3",
+        "about": ".//div[contains(concat(' ', normalize-space(@class), ' '), ' VwiC3b ')]",
+        "url": "(.//a[h3]/@href | .//a/@href)[1]",
+      },
+    },
+  },
+  "elements": {
+    "search_query": "//textarea[@name='q'] | //input[@name='q' and not(@type='hidden')]",
+    "search_button": "//input[@name='btnK'] | //button[@name='btnK'] | //button[@type='submit']",
+  },
+  "next_page": "//a[@id='pnnext']",
+}
+
+
+class QueryField(NamedTuple):
+  """One field of a parsed AgentQL query"""
+  name: str
+  is_list: bool # name[] in the query
+  children: Dict[str, "QueryField"] # empty for leaf fields
+
+
+# identifiers (optionally with []), braces; natural language hints like title(the heading) are dropped before
+_QUERY_TOKEN_RE = re.compile(r"[A-Za-z_]\w*(?:\s*\[\])?|[{}]")
+_QUERY_HINT_RE = re.compile(r"\([^)]*\)")
+
+
+def parse_query(query: str) -> Dict[str, QueryField]:
+  """
+  Parses the shape of an AgentQL query, e.g.
+  `{ search_results[] { title about url } }` -> {"search_results": QueryField(is_list=True, children={title, about, url})}
+
+  Args:
+    query (str): AgentQL query
+
+  Returns:
+    Dict[str, QueryField]: the top-level fields of the query
+  """
+  tokens = _QUERY_TOKEN_RE.findall(_QUERY_HINT_RE.sub("", query))
+  if not tokens or tokens[0] != "{":
+    raise ValueError(f"Not an AgentQL query: {query!r}")
+
+  def parse_block(position: int) -> tuple:
+    # position is right after a "{", returns the fields of the block and the position after its "}"
+    fields = {}
+    while position < len(tokens) and tokens[position] != "}":
+      token = tokens[position]
+      if token == "{":
+        raise ValueError(f"Unexpected '{{' in AgentQL query: {query!r}")
+      is_list = token.endswith("[]")
+      name = token[:-2].strip() if is_list else token
+      children = {}
+      position += 1
+      if position < len(tokens) and tokens[position] == "{":
+        children, position = parse_block(position + 1)
+      fields[name] = QueryField(name=name, is_list=is_list, children=children)
+    if position >= len(tokens):
+      raise ValueError(f"Unbalanced braces in AgentQL query: {query!r}")
+    return fields, position + 1
+
+  fields, _ = parse_block(1)
+  return fields
+
+
+class PageExtractor:
+  """
+  Interface of what the scraper needs to pull data out of a page. wrap() turns a Playwright page into an object
+  with (the used subset of) AgentQL's page API: query_data(), query_elements(), get_pagination_info(),
+  wait_for_page_ready_state(), plus everything of the Playwright page itself.
+  """
+  name = "extractor" # label of the extractor's metrics stages (scraper.<name>_query_data)
+  uses_agentql = False # the AgentQL API key is only needed (and checked) if this is set
+  takes_content = False # query_data() of its pages takes the HTML the scraper already read as content=
+
+  def wrap(self, page):
+    raise NotImplementedError
+
+  def stats(self) -> Dict[str, Any]:
+    return {}
+
+
+class AgentQLExtractor(PageExtractor):
+  """The default: AgentQL's cloud extraction, agentql.wrap()"""
+  name = "agentql"
+  uses_agentql = True
+
+  def wrap(self, page):
+    import agentql
+    return agentql.wrap(page)
+
+
+class LocalExtractor(PageExtractor):
+  """
+  Offline stand-in for AgentQL: extracts the fields of a query from the page's HTML with XPath rules (lxml),
+  finds the search form and the "next" link with the same kind of rules (Playwright locators).
+  No API key, no network, and the same query and the same data shape as with AgentQL, so it can replace it
+  against a known page layout, e.g., the local result pages of benchmarks/serp_server.py.
+
+  Rules (see GOOGLE_SERP_RULES):
+    data: one rule per query field. A leaf field's rule is an XPath (relative to its parent item), whose first
+          match is the value: the text of an element, or the value of an attribute/string expression. It can also
+          be a mapping with that "xpath" and the flags "join_url" (resolve relative links against the page URL)
+          and "optional" (see validate()). A field with children has a mapping with the "xpath" of its item(s)
+          and the rules of its "fields"; list fields (name[]) get one item per match, the others the first match.
+    elements: XPath per query_elements() field, e.g., search_query and search_button
+    next_page: XPath of the "next page" link
+
+  Example:
+    scraper = AgentQLPlaywrightScraper(extractor=LocalExtractor(GOOGLE_SERP_RULES))
+  """
+  name = "local"
+  takes_content = True
+
+  def __init__(self, rules: Optional[Dict[str, Any]] = None):
+    """
+      Args:
+        rules (Dict[str, Any]): extraction rules (default: GOOGLE_SERP_RULES)
+    """
+    self.logger = CustomLogger(self.__class__.__name__)
+    self.rules = rules if rules is not None else GOOGLE_SERP_RULES
+
+  @classmethod
+  def from_file(cls, path: str) -> "LocalExtractor":
+    """Reads the rules from a YAML (.yml/.yaml) or JSON file"""
+    with open(path, encoding="utf-8") as f:
+      rules = yaml.safe_load(f) if path.endswith((".yml", ".yaml")) else json.load(f)
+    return cls(rules)
+
+  def wrap(self, page) -> "LocalPage":
+    return LocalPage(page, self)
+
+  def extract(self, html: str, query: str, base_url: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Extracts the fields of an AgentQL query from an HTML document.
+
+    Args:
+      html (str): the page content
+      query (str): AgentQL query
+      base_url (str, optional): URL of the page, relative links of url rules with join_url are resolved against it
+
+    Returns:
+      Dict[str, Any]: the data in the shape of the query, None for fields that were not found
+    """
+    return extract_fields(parse_html(html), parse_query(query), self.rules.get("data", {}), base_url=base_url)
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_xpath(expression: str):
+  """The compiled lxml XPath of an expression, compiled once per process"""
+  from lxml import etree
+  return etree.XPath(expression)
+
+
+def parse_html(html: Optional[str]):
+  """The lxml document of a page (None for an empty page)"""
+  from lxml import html as lxml_html
+  return lxml_html.fromstring(html) if html and html.strip() else None
+
+
+def text_value(match) -> Optional[str]:
+  """The value of an XPath match: elements give their whitespace-normalized text, attributes and strings their value"""
+  text = match.text_content() if hasattr(match, "text_content") else str(match)
+  return " ".join(text.split()) or None
+
+
+def _rule_xpath(rule) -> str:
+  return rule if isinstance(rule, str) else rule["xpath"]
+
+
+def extract_fields(node, fields: Dict[str, QueryField], rules: Dict[str, Any], base_url: Optional[str] = None) -> Dict[str, Any]:
+  """
+  Applies extraction rules (see LocalExtractor) to a document or element.
+
+  Args:
+    node: lxml document or element the rules are relative to (None: nothing is found)
+    fields (Dict[str, QueryField]): the query fields to extract (see parse_query())
+    rules (Dict[str, Any]): the rule of every field
+    base_url (str, optional): URL the values of rules with join_url are resolved against
+
+  Returns:
+    Dict[str, Any]: the data in the shape of the fields, None (or [] for list fields) for what was not found
+  """
+  data = {}
+  for name, field in fields.items():
+    rule = rules.get(name)
+    if rule is None or node is None:
+      data[name] = [] if field.is_list else None
+      continue
+    matches = compile_xpath(_rule_xpath(rule))(node)
+    if not isinstance(matches, list):
+      # string(), concat(), ... give a single value
+      matches = [matches]
+    if field.children:
+      items = [extract_fields(match, field.children, rule.get("fields", {}), base_url=base_url) for match in matches]
+      data[name] = items if field.is_list else (items[0] if items else None)
+    else:
+      values = [text_value(match) for match in matches]
+      if isinstance(rule, dict) and rule.get("join_url") and base_url:
+        values = [urljoin(base_url, value) if value else value for value in values]
+      data[name] = values if field.is_list else (values[0] if values else None)
+  return data
+
+
+def validate(data: Dict[str, Any], fields: Dict[str, QueryField], rules: Dict[str, Any]) -> bool:
+  """
+  Tells whether data extracted by extract_fields() is complete: every list has items and every field has a value,
+  except the ones whose rule is marked optional.
+  """
+  for name, field in fields.items():
+    rule = rules.get(name)
+    value = data.get(name)
+    optional = isinstance(rule, dict) and rule.get("optional", False)
+    if rule is None:
+      return False
+    if field.is_list and not value and not optional:
+      return False
+    if not field.is_list and value is None and not optional:
+      return False
+    if field.children and value:
+      items = value if field.is_list else [value]
+      if not all(validate(item, field.children, rule.get("fields", {})) for item in items):
+        return False
+  return True
+
+
+class LocalPage:
+  """A Playwright page with the AgentQL page methods the scraper uses, backed by a LocalExtractor"""
+  def __init__(self, page, extractor: LocalExtractor):
+    self._page = page
+    self._extractor = extractor
+
+  def __getattr__(self, name: str):
+    # everything else (url, content(), goto(), mouse, ...) is the Playwright page's
+    return getattr(self._page, name)
+
+  def _locator(self, xpath: Optional[str]):
+    if not xpath:
+      return None
+    locator = self._page.locator(f"xpath={xpath}").first
+    return locator if locator.count() > 0 else None
+
+  def query_data(self, query: str, timeout: Optional[int] = None, content: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+    html = content if content is not None else self._page.content()
+    return self._extractor.extract(html, query, base_url=self._page.url)
+
+  def query_elements(self, query: str, timeout: Optional[int] = None, **kwargs) -> SimpleNamespace:
+    """The first element matching each field's rule as a Playwright Locator (None if there is none)"""
+    rules = self._extractor.rules.get("elements", {})
+    return SimpleNamespace(**{name: self._locator(rules.get(name)) for name in parse_query(query)})
+
+  def get_pagination_info(self, timeout: Optional[int] = None, **kwargs) -> "LocalPaginationInfo":
+    return LocalPaginationInfo(self._page, self._locator(self._extractor.rules.get("next_page")))
+
+  def wait_for_page_ready_state(self, wait_for_network_idle: bool = True) -> None:
+    # the local rules read server-rendered HTML, a loaded document is ready (no network idle heuristics)
+    self._page.wait_for_load_state("load")
+
+
+class LocalPaginationInfo:
+  """AgentQL's PaginationInfo for a LocalPage: follows the "next page" link"""
+  def __init__(self, page, next_link):
+    self._page = page
+    self._next_link = next_link
+
+  @property
+  def has_next_page(self) -> bool:
+    return self._next_link is not None
+
+  def navigate_to_next_page(self) -> None:
+    if self._next_link is None:
+      raise RuntimeError("There is no next page")
+    self._next_link.click()
+    self._page.wait_for_load_state("domcontentloaded")
+
+
+def extractor_from_env() -> PageExtractor:
+  """
+  SCRAPER_EXTRACTOR picks the extractor:
+    fastpath (default): AgentQL behind learned selectors, see scraper.fastpath.FastPathExtractor.from_env()
+    agentql: every page goes to AgentQL
+    local: only a LocalExtractor (rules from SCRAPER_EXTRACTOR_RULES, a YAML/JSON file, default GOOGLE_SERP_RULES)
+  """
+  mode = os.getenv("SCRAPER_EXTRACTOR", "fastpath").lower()
+  if mode == "local":
+    rules_path = os.getenv("SCRAPER_EXTRACTOR_RULES")
+    return LocalExtractor.from_file(rules_path) if rules_path else LocalExtractor()
+  if mode == "agentql":
+    return AgentQLExtractor()
+  from scraper.fastpath import FastPathExtractor
+  return FastPathExtractor.from_env()
@@ -0,0 +1,488 @@
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime
+from urllib.parse import urlparse, urljoin
+from typing import Optional, Dict, Any, List
+
+current_dir = os.path.abspath(os.path.dirname(__file__))
+src_dir= os.path.abspath(os.path.join(current_dir, '..'))
+# set sys_path to also look for libs elsewhere
+sys.path.append(src_dir)
+from libs.logger import CustomLogger
+from libs.metrics import metrics
+from scraper.extractors import (PageExtractor, AgentQLExtractor, QueryField, GOOGLE_SERP_RULES,
+                                parse_query, parse_html, extract_fields, validate, compile_xpath, text_value)
+
+# rules tried first for the hosts containing the key, before anything is learned; like learned rules they are only
+# used once they reproduced an AgentQL response exactly
+SEED_RULES = {
+  "google.": GOOGLE_SERP_RULES["data"],
+}
+
+# tags and class names simple enough to be put into a learned XPath as they are
+_SIMPLE_NAME_RE = re.compile(r"^[A-Za-z][\w-]*$")
+# elements longer than this (in characters of text) are not indexed, no field value is that long
+_MAX_TEXT_LENGTH = 4096
+# how many levels above the fields of an item a container is looked for
+_MAX_CONTAINER_DEPTH = 6
+
+
+def normalize_data(value: Any) -> Any:
+  """AgentQL's and the rules' output in a comparable form: strings with normalized whitespace, empty strings as None"""
+  if isinstance(value, str):
+    return " ".join(value.split()) or None
+  if isinstance(value, dict):
+    return {key: normalize_data(item) for key, item in value.items()}
+  if isinstance(value, list):
+    return [normalize_data(item) for item in value]
+  return value
+
+
+def project(data: Any, fields: Dict[str, QueryField]) -> Dict[str, Any]:
+  """The fields of a query out of a response, normalized (missing lists as [], other missing fields as None)"""
+  data = data if isinstance(data, dict) else {}
+  projected = {}
+  for name, field in fields.items():
+    value = data.get(name)
+    if field.children:
+      items = [project(item, field.children) for item in value or []] if field.is_list \
+        else (project(value, field.children) if value is not None else None)
+      projected[name] = items
+    else:
+      projected[name] = normalize_data(value) if value is not None else ([] if field.is_list else None)
+  return projected
+
+
+class _DocumentIndex:
+  """Where every text and attribute value of a document is, for finding the elements AgentQL took a value from"""
+  def __init__(self, document, base_url: Optional[str] = None):
+    self.texts: Dict[str, List] = {}
+    self.attributes: Dict[str, List[tuple]] = {}
+    if document is None:
+      return
+    for element in document.iter():
+      if not isinstance(element.tag, str) or element.tag in ("script", "style"):
+        continue
+      for attribute, raw in element.attrib.items():
+        value = " ".join(raw.split())
+        if value:
+          self.attributes.setdefault(value, []).append((element, attribute, False))
+          if base_url and attribute in ("href", "src"):
+            joined = urljoin(base_url, value)
+            if joined != value:
+              self.attributes.setdefault(joined, []).append((element, attribute, True))
+      text = element.text_content()
+      if len(text) <= _MAX_TEXT_LENGTH:
+        text = text_value(element)
+        if text:
+          self.texts.setdefault(text, []).append(element)
+    # only the deepest element of a text counts, its ancestors with the very same text are just wrappers
+    for text, elements in self.texts.items():
+      ancestors = {ancestor for element in elements for ancestor in element.iterancestors()}
+      self.texts[text] = [element for element in elements if element not in ancestors]
+
+  def matches(self, context, value: str) -> List[tuple]:
+    """(element, attribute or None, join_url) of every place within context the value is found"""
+    found = [(element, None, False) for element in self.texts.get(value, [])]
+    found += self.attributes.get(value, [])
+    return [match for match in found if match[0] is context or context in match[0].iterancestors()]
+
+
+def _element_xpaths(element, context) -> List[str]:
+  """XPaths (relative to context) that may select element: by tag and class, by tag path, by tag"""
+  tag = element.tag
+  if not _SIMPLE_NAME_RE.match(tag):
+    return []
+  xpaths = [f".//{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {name} ')]"
+            for name in element.get("class", "").split() if _SIMPLE_NAME_RE.match(name)]
+  path = []
+  node = element
+  while node is not None and node is not context:
+    if not _SIMPLE_NAME_RE.match(node.tag):
+      path = None
+      break
+    path.insert(0, node.tag)
+    node = node.getparent()
+  if path and node is context:
+    xpaths.append("./" + "/".join(path))
+  xpaths.append(f".//{tag}")
+  return xpaths
+
+
+def _leaf_rule(xpath: str, join_url: bool, optional: bool):
+  flags = {key: True for key, value in (("join_url", join_url), ("optional", optional)) if value}
+  return dict(xpath=xpath, **flags) if flags else xpath
+
+
+class SelectorLearner:
+  """
+  Derives extraction rules (see LocalExtractor) from a page and the data AgentQL extracted from it:
+  finds the elements/attributes holding the returned values, generalizes them into XPaths (class, tag path or
+  tag based) and keeps the first candidates reproducing every returned value.
+  """
+  def __init__(self, document, base_url: Optional[str] = None):
+    self.document = document
+    self.base_url = base_url
+    self.index = _DocumentIndex(document, base_url)
+
+  def learn(self, fields: Dict[str, QueryField], data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Args:
+      fields (Dict[str, QueryField]): the query (see parse_query())
+      data (Dict[str, Any]): AgentQL's response, projected onto the fields (see project())
+
+    Returns:
+      Dict[str, Any]: rules whose output on this page equals data, None if none were found
+    """
+    if self.document is None:
+      return None
+    rules = self._learn_fields([self.document], fields, [data])
+    if rules is None or project(extract_fields(self.document, fields, rules, base_url=self.base_url), fields) != data:
+      return None
+    return rules
+
+  def _learn_fields(self, contexts: list, fields: Dict[str, QueryField], items: list) -> Optional[Dict[str, Any]]:
+    rules = {}
+    for name, field in fields.items():
+      values = [item.get(name) if isinstance(item, dict) else None for item in items]
+      if field.children:
+        rule = self._learn_container(contexts, field, values)
+      elif field.is_list:
+        # lists of plain values are left to AgentQL
+        rule = None
+      else:
+        rule = self._learn_leaf(contexts, values)
+      if rule is None:
+        return None
+      rules[name] = rule
+    return rules
+
+  def _value(self, context, rule) -> Optional[str]:
+    return extract_fields(context, {"value": QueryField("value", False, {})}, {"value": rule}, base_url=self.base_url)["value"]
+
+  def _learn_leaf(self, contexts: list, values: list):
+    first = next(((context, value) for context, value in zip(contexts, values) if value is not None), None)
+    if first is None:
+      return None
+    optional = any(value is None for value in values)
+    tried = set()
+    for element, attribute, join_url in self.index.matches(*first):
+      for xpath in _element_xpaths(element, first[0]):
+        rule = _leaf_rule(f"{xpath}/@{attribute}" if attribute else xpath, join_url, optional)
+        key = json.dumps(rule, sort_keys=True)
+        if key in tried:
+          continue
+        tried.add(key)
+        if all(self._value(context, rule) == value for context, value in zip(contexts, values)):
+          return rule
+    return None
+
+  def _anchor(self, context, item: Dict[str, Any]):
+    """The lowest common ancestor of where the leaf values of an item are found within context"""
+    elements = []
+    for value in item.values():
+      if isinstance(value, str):
+        matches = self.index.matches(context, value)
+        if matches:
+          elements.append(matches[0][0])
+    if not elements:
+      return None
+    for candidate in [elements[0]] + list(elements[0].iterancestors()):
+      if all(candidate is element or candidate in element.iterancestors() for element in elements):
+        return candidate
+    return None
+
+  def _learn_container(self, contexts: list, field: QueryField, values: list) -> Optional[Dict[str, Any]]:
+    groups = [(value or []) if field.is_list else ([value] if value is not None else []) for value in values]
+    first = next(((context, group[0]) for context, group in zip(contexts, groups) if group), None)
+    if first is None:
+      return None
+    anchor = self._anchor(*first)
+    if anchor is None:
+      return None
+
+    candidates = []
+    node = anchor
+    for _ in range(_MAX_CONTAINER_DEPTH):
+      if node is None or node is first[0]:
+        break
+      candidates.extend(xpath for xpath in _element_xpaths(node, first[0]) if xpath not in candidates)
+      node = node.getparent()
+
+    optional = any(not group for group in groups)
+    for xpath in candidates:
+      nodes, items = [], []
+      for context, group in zip(contexts, groups):
+        matches = [match for match in compile_xpath(xpath)(context) if hasattr(match, "tag")]
+        if field.is_list and len(matches) != len(group):
+          break
+        if not field.is_list and bool(matches) != bool(group):
+          break
+        nodes.extend(matches[:len(group)])
+        items.extend(group)
+      else:
+        child_rules = self._learn_fields(nodes, field.children, items)
+        if child_rules is not None:
+          rule = dict(xpath=xpath, fields=child_rules)
+          if optional:
+            rule["optional"] = True
+          return rule
+    return None
+
+
+class FastPathExtractor(PageExtractor):
+  """
+  AgentQL with a local fast path: query_data() first runs the rules known for the page's host and query on the
+  page's HTML (compiled lxml XPath, see LocalExtractor) and returns their output if it is complete (see validate());
+  only otherwise the page goes to AgentQL. Every AgentQL response is used to confirm the seed rules of its host
+  (SEED_RULES) or to learn new ones, and rules are only used once they reproduced an AgentQL response exactly,
+  so the output is the one AgentQL would give (up to whitespace). Every verify_every-th fast-path page is
+  checked against AgentQL too, and rules that no longer match are dropped. A host whose responses could not be
+  learned from learn_attempts times in a row is not tried again for learn_backoff seconds: learning parses and
+  searches the whole page, which is wasted on a layout the learner does not handle.
+
+  Rules are per host and query, kept in memory and, with cache_path, in a JSON file shared by runs.
+  The hit rate is in stats() (logged when the scraper closes) and in the scraper.fastpath_* metrics.
+  Everything but query_data() (pagination, query_elements(), ...) is AgentQL's.
+
+  Example:
+    scraper = AgentQLPlaywrightScraper(extractor=FastPathExtractor(cache_path="/tmp/selectors.json"))
+  """
+  name = "fastpath"
+  uses_agentql = True
+  takes_content = True
+
+  def __init__(self,
+               fallback: Optional[PageExtractor] = None,
+               cache_path: Optional[str] = None,
+               seed_rules: Optional[Dict[str, Dict[str, Any]]] = None,
+               verify_every: int = 25,
+               learn_attempts: int = 3,
+               learn_backoff: float = 3600.0):
+    """
+      Args:
+        fallback (PageExtractor): extractor of the pages the rules fail on (default: AgentQLExtractor)
+        cache_path (str): JSON file of the learned rules (default: in memory only)
+        seed_rules (Dict[str, Dict]): rules tried for the hosts containing the key (default: SEED_RULES)
+        verify_every (int): every verify_every-th fast-path page is also sent to AgentQL and compared (0: never)
+        learn_attempts (int): failed learn() calls in a row after which a host is backed off
+        learn_backoff (float): seconds a backed off host is not learned from
+    """
+    self.logger = CustomLogger(self.__class__.__name__)
+    self.fallback = fallback if fallback is not None else AgentQLExtractor()
+    self.cache_path = cache_path
+    self.seed_rules = seed_rules if seed_rules is not None else SEED_RULES
+    self.verify_every = verify_every
+    self.learn_attempts = learn_attempts
+    self.learn_backoff = learn_backoff
+    self.hits = 0
+    self.fallbacks = 0
+    self.learned = 0
+    self.mismatches = 0
+    self.learn_skipped = 0
+    # host -> (failed learn() calls in a row, time.monotonic() until which the host is not learned from)
+    self._learn_failures: Dict[str, tuple] = {}
+    self._lock = threading.Lock()
+    self.rule_sets: Dict[str, Dict[str, Any]] = self._load()
+
+  @classmethod
+  def from_env(cls) -> "FastPathExtractor":
+    """
+    Builds the extractor from SCRAPER_SELECTOR_CACHE (JSON file of the rules), SCRAPER_FASTPATH_VERIFY_EVERY,
+    SCRAPER_FASTPATH_LEARN_ATTEMPTS and SCRAPER_FASTPATH_LEARN_BACKOFF (seconds)
+    """
+    return cls(cache_path=os.getenv("SCRAPER_SELECTOR_CACHE") or None,
+               verify_every=int(os.getenv("SCRAPER_FASTPATH_VERIFY_EVERY", 25)),
+               learn_attempts=int(os.getenv("SCRAPER_FASTPATH_LEARN_ATTEMPTS", 3)),
+               learn_backoff=float(os.getenv("SCRAPER_FASTPATH_LEARN_BACKOFF", 3600)))
+
+  def _load(self) -> Dict[str, Dict[str, Any]]:
+    if not self.cache_path or not os.path.exists(self.cache_path):
+      return {}
+    try:
+      with open(self.cache_path, encoding="utf-8") as f:
+        rule_sets = json.load(f)
+      self.logger.info(f"Loaded {len(rule_sets)} selector rule set(s) from {self.cache_path}")
+      return rule_sets
+    except (OSError, ValueError) as e:
+      self.logger.warning(f"Could not read the selector cache {self.cache_path}: {e}")
+      return {}
+
+  def _save(self, key: str, entry: Optional[Dict[str, Any]]) -> None:
+    """Writes (entry) or deletes (None) one rule set, keeping what other scrapers wrote to the file meanwhile"""
+    if not self.cache_path:
+      return
+    try:
+      rule_sets = {}
+      if os.path.exists(self.cache_path):
+        with open(self.cache_path, encoding="utf-8") as f:
+          rule_sets = json.load(f)
+      if entry is None:
+        rule_sets.pop(key, None)
+      else:
+        rule_sets[key] = entry
+      tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+      with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(rule_sets, f, indent=2, sort_keys=True)
+      os.replace(tmp_path, self.cache_path)
+    except (OSError, ValueError) as e:
+      self.logger.warning(f"Could not write the selector cache {self.cache_path}: {e}")
+
+  @staticmethod
+  def _key(url: str, query: str) -> str:
+    host = (urlparse(url).hostname or "").lower()
+    return f"{host}|{hashlib.sha1(' '.join(query.split()).encode('utf-8')).hexdigest()[:16]}"
+
+  def wrap(self, page) -> "FastPathPage":
+    return FastPathPage(page, self.fallback.wrap(page), self)
+
+  def rules_for(self, url: str, query: str) -> Optional[Dict[str, Any]]:
+    """The confirmed rules of the page's host and query, if any"""
+    entry = self.rule_sets.get(self._key(url, query))
+    return entry["rules"] if entry else None
+
+  def try_fast_path(self, url: str, document, query: str) -> Optional[Dict[str, Any]]:
+    """The rules' output if there are rules for the page and their output is complete, None otherwise"""
+    rules = self.rules_for(url, query)
+    if rules is None:
+      return None
+    fields = parse_query(query)
+    with metrics.timer("scraper.fastpath_extract"):
+      data = extract_fields(document, fields, rules, base_url=url)
+    return data if validate(data, fields, rules) else None
+
+  def learn(self, url: str, document, query: str, data: Any) -> bool:
+    """
+    Confirms the seed rules of the page's host, or learns new rules, from an AgentQL response of the page.
+
+    Returns:
+      bool: True if the page's host and query have rules now
+    """
+    host = (urlparse(url).hostname or "").lower()
+    if self._backed_off(host):
+      return False
+    fields = parse_query(query)
+    expected = project(data, fields)
+    source, rules = None, None
+    try:
+      for marker, seed in self.seed_rules.items():
+        if marker in host and project(extract_fields(document, fields, seed, base_url=url), fields) == expected:
+          source, rules = "seed", seed
+          break
+      if rules is None:
+        with metrics.timer("scraper.fastpath_learn"):
+          rules = SelectorLearner(document, base_url=url).learn(fields, expected)
+        source = "learned" if rules is not None else None
+    except Exception as e:
+      self.logger.warning(f"Learning selectors from {url} failed: {e}")
+      rules = None
+    if rules is None or not validate(extract_fields(document, fields, rules, base_url=url), fields, rules):
+      self.logger.debug(f"No selectors reproduce the AgentQL response of {url}")
+      self._learn_failed(host)
+      return False
+
+    key = self._key(url, query)
+    entry = dict(rules=rules, source=source, host=host, learned_at=datetime.now().isoformat(timespec="seconds"))
+    with self._lock:
+      self.rule_sets[key] = entry
+      self.learned += 1
+      self._learn_failures.pop(host, None)
+      self._save(key, entry)
+    self.logger.info(f"Fast path enabled for {host} ({source} selectors reproduce the AgentQL response)")
+    return True
+
+  def _backed_off(self, host: str) -> bool:
+    """Whether learning from the host is skipped for now; a backoff that ran out gives the host learn_attempts again"""
+    with self._lock:
+      failures, until = self._learn_failures.get(host, (0, 0.0))
+      if failures < self.learn_attempts:
+        return False
+      if time.monotonic() >= until:
+        del self._learn_failures[host]
+        return False
+      self.learn_skipped += 1
+    metrics.count("scraper.fastpath_learn_skipped")
+    return True
+
+  def _learn_failed(self, host: str) -> None:
+    with self._lock:
+      failures = self._learn_failures.get(host, (0, 0.0))[0] + 1
+      self._learn_failures[host] = (failures, time.monotonic() + self.learn_backoff)
+    if failures == self.learn_attempts:
+      self.logger.info(f"No selectors learned for {host} after {failures} AgentQL responses, "
+                       f"not trying again for {self.learn_backoff:.0f}s")
+
+  def forget(self, url: str, query: str) -> None:
+    """Drops the rules of the page's host and query"""
+    key = self._key(url, query)
+    with self._lock:
+      self.rule_sets.pop(key, None)
+      self._save(key, None)
+
+  def record(self, hit: bool) -> bool:
+    """Counts a fast-path hit or an AgentQL fallback, returns whether this hit should be verified against AgentQL"""
+    with self._lock:
+      if not hit:
+        self.fallbacks += 1
+        metrics.count("scraper.fastpath_fallbacks")
+        return False
+      self.hits += 1
+      metrics.count("scraper.fastpath_hits")
+      return bool(self.verify_every) and self.hits % self.verify_every == 0
+
+  def verify(self, url: str, document, query: str, data: Dict[str, Any], agentql_data: Any) -> bool:
+    """Compares the fast path's output of a page with AgentQL's, relearns the rules if they differ"""
+    fields = parse_query(query)
+    if project(data, fields) == project(agentql_data, fields):
+      return True
+    with self._lock:
+      self.mismatches += 1
+    metrics.count("scraper.fastpath_mismatches")
+    self.logger.warning(f"Selectors of {url} no longer reproduce the AgentQL response, relearning them")
+    self.forget(url, query)
+    self.learn(url, document, query, agentql_data)
+    return False
+
+  def stats(self) -> Dict[str, Any]:
+    pages = self.hits + self.fallbacks
+    return dict(hits=self.hits,
+                fallbacks=self.fallbacks,
+                hit_rate=round(self.hits / pages, 3) if pages else 0.0,
+                learned=self.learned,
+                mismatches=self.mismatches,
+                learn_skipped=self.learn_skipped,
+                rule_sets=len(self.rule_sets))
+
+
+class FastPathPage:
+  """An AgentQL page whose query_data() goes through the FastPathExtractor's rules first"""
+  def __init__(self, page, fallback_page, extractor: FastPathExtractor):
+    self._page = page
+    self._fallback_page = fallback_page
+    self._extractor = extractor
+
+  def __getattr__(self, name: str):
+    # pagination, query_elements(), the Playwright page methods, ... are the fallback's
+    return getattr(self._fallback_page, name)
+
+  def query_data(self, query: str, content: Optional[str] = None, **kwargs) -> Any:
+    url = self._page.url
+    document = parse_html(content if content is not None else self._page.content())
+    data = self._extractor.try_fast_path(url, document, query)
+    if data is not None:
+      if not self._extractor.record(hit=True):
+        return data
+      agentql_data = self._fallback_page.query_data(query, **kwargs)
+      self._extractor.verify(url, document, query, data, agentql_data)
+      return agentql_data
+
+    self._extractor.record(hit=False)
+    data = self._fallback_page.query_data(query, **kwargs)
+    # no rules yet, or they failed on this page (e.g., a field missing here): (re)learn them from the response
+    self._extractor.learn(url, document, query, data)
+    return data
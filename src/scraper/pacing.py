@@ -0,0 +1,308 @@
+import os
+import sys
+import time
+import random
+import threading
+from typing import Optional, Dict, Any
+from urllib.parse import urlparse
+
+current_dir = os.path.abspath(os.path.dirname(__file__))
+src_dir= os.path.abspath(os.path.join(current_dir, '..'))
+# set sys_path to also look for libs elsewhere
+sys.path.append(src_dir)
+from libs.logger import CustomLogger
+from libs.metrics import metrics
+
+# the human-like delay ranges (in seconds) the scraper always used, per kind of action
+DELAY_RANGES = {
+  "navigation": (2.0, 5.0), # before opening a page
+  "next_page": (0.0, 0.0), # before following a result page's "next" link, only the token bucket paces it
+  "page_load": (3.0, 7.0), # after a page was loaded, before touching it
+  "results_load": (3.0, 6.0), # after submitting a search
+  "settle": (2.0, 2.0), # after AgentQL reported the page ready
+  "click": (1.0, 2.0), # after clicking into a field
+  "submit": (1.0, 3.0), # before clicking the search button
+  "mouse_move": (0.1, 0.5),
+  "scroll": (0.5, 1.5),
+  "scroll_back": (0.3, 1.0),
+  "clear": (0.2, 0.5), # after clearing an input field
+  "keystroke": (0.05, 0.3),
+  "space": (0.1, 0.5), # keystroke of a space, people pause between words
+  "tab_close": (2.0, 2.0), # after closing a tab
+}
+
+# the challenge pages the crawl actually runs into, per host (a host containing the key): Google's /sorry/ page
+# with its CAPTCHA form and GitHub's abuse detection / secondary rate limit page. Generic markers ("captcha",
+# reCAPTCHA or hCaptcha scripts) also turn up in ordinary pages and search results and are not used.
+CAPTCHA_PATHS = {
+  "google.": ("/sorry/",),
+}
+CAPTCHA_CONTENT_MARKERS = {
+  "google.": ('id="captcha-form"', "/sorry/index", "our systems have detected unusual traffic"),
+  "github.com": ("you have triggered an abuse detection mechanism", "you have exceeded a secondary rate limit"),
+}
+
+
+def detect_captcha(url: Optional[str], content: Optional[str] = None) -> bool:
+  """
+  Tells whether a page is a CAPTCHA / bot challenge instead of the requested content.
+
+  Args:
+    url (str): URL the browser ended up at
+    content (str, optional): HTML of the page (None: only the URL is checked)
+
+  Returns:
+    bool: True if the URL or the content carries a challenge marker of the page's host
+  """
+  parsed_url = urlparse(url or "")
+  host, path = (parsed_url.hostname or "").lower(), parsed_url.path.lower()
+  if any(key in host and path.startswith(paths) for key, paths in CAPTCHA_PATHS.items()):
+    return True
+  if content:
+    markers = [marker for key, host_markers in CAPTCHA_CONTENT_MARKERS.items() if key in host
+               for marker in host_markers]
+    if markers:
+      content = content.lower()
+      return any(marker in content for marker in markers)
+  return False
+
+
+def host_of(url: Optional[str]) -> str:
+  """Pacing key of a URL: its lowercase host (empty string if there is none)"""
+  return (urlparse(url).hostname or "") if url else ""
+
+
+class Pacer:
+  """
+  Interface of the scraper's pacing controllers.
+
+  delay() returns how long to wait before an action (so async scrapers can asyncio.sleep() it), wait() sleeps it,
+  and observe() feeds back how the target site responded to a navigation. Subclasses implement _next_delay().
+  """
+  def _next_delay(self, url: Optional[str], action: str) -> float:
+    raise NotImplementedError
+
+  def delay(self, url: Optional[str], action: str) -> float:
+    """Seconds to wait before an action on the host of url (recorded as the pacing.<action> stage)"""
+    seconds = self._next_delay(url, action)
+    metrics.observe(f"pacing.{action}", seconds)
+    return seconds
+
+  def wait(self, url: Optional[str], action: str) -> float:
+    """Sleeps before an action on the host of url, returns the seconds slept"""
+    seconds = self.delay(url, action)
+    if seconds > 0:
+      time.sleep(seconds)
+    return seconds
+
+  def observe(self,
+              url: Optional[str],
+              latency: Optional[float] = None,
+              status: Optional[int] = None,
+              captcha: bool = False,
+              retry_after: Optional[float] = None) -> None:
+    """
+    Reports the outcome of a navigation to the host of url.
+
+    Args:
+      url (str): the requested (or resulting) URL
+      latency (float, optional): seconds the navigation took
+      status (int, optional): HTTP status of the main document, if known
+      captcha (bool): the page turned out to be a CAPTCHA / bot challenge
+      retry_after (float, optional): seconds from a Retry-After header
+    """
+    pass
+
+  def stats(self) -> Dict[str, Any]:
+    return {}
+
+
+class FixedPacer(Pacer):
+  """The original behaviour: uniform random delays from DELAY_RANGES, whatever the site does"""
+  def _next_delay(self, url: Optional[str], action: str) -> float:
+    low, high = DELAY_RANGES[action]
+    return random.uniform(low, high)
+
+
+class NoPacer(Pacer):
+  """No delays at all, for local test servers and benchmarks (never against a real site)"""
+  def _next_delay(self, url: Optional[str], action: str) -> float:
+    return 0.0
+
+
+class _HostState:
+  """Token bucket and AIMD state of one host"""
+  def __init__(self, rate: float, burst: float):
+    self.rate = rate # navigations per minute
+    self.tokens = burst
+    self.updated = time.monotonic()
+    self.cooldown_until = 0.0
+    self.consecutive_blocks = 0
+    self.observations = 0
+    self.throttled = 0
+    self.captchas = 0
+    self.slow = 0
+
+
+class AdaptivePacer(Pacer):
+  """
+  Per-host pacing with a token bucket for navigations and AIMD (additive increase, multiplicative decrease)
+  on the bucket's rate, driven by what the site responds.
+
+  - every healthy navigation (no 429/503, no CAPTCHA, latency under latency_target) adds increase_step
+    navigations/minute to the host's rate, up to max_rate
+  - a slow navigation multiplies the rate by slow_factor, a 429/503 or a CAPTCHA by backoff_factor, and the
+    latter also pause the host for a cooldown (Retry-After if given, doubled for every consecutive block)
+  - navigations (and "next page" clicks) wait for a token of the host's bucket; all the human-like delays
+    (typing, scrolling, ...) are the DELAY_RANGES scaled by initial_rate / rate, so they shrink while the
+    site is healthy and grow after a block
+
+  Every rate change is logged with its reason and the new delay scale, for tuning the parameters.
+
+  Example:
+    pacer = AdaptivePacer(initial_rate=10)
+    pacer.wait(url, "navigation")
+    response = page.goto(url)
+    pacer.observe(url, latency=..., status=response.status, captcha=detect_captcha(page.url, page.content()))
+  """
+  def __init__(self,
+               initial_rate: float = 10.0,
+               min_rate: float = 1.0,
+               max_rate: float = 30.0,
+               burst: float = 3.0,
+               increase_step: float = 1.0,
+               backoff_factor: float = 0.5,
+               slow_factor: float = 0.85,
+               latency_target: float = 5.0,
+               cooldown: float = 60.0,
+               max_cooldown: float = 900.0):
+    """
+      Args:
+        initial_rate (float): navigations per minute per host to start with; at this rate the delays are the original ones
+        min_rate (float): the rate never goes below this
+        max_rate (float): the rate never goes above this (caps how small the delays get)
+        burst (float): token bucket capacity, i.e., navigations allowed back to back
+        increase_step (float): navigations/minute added after a healthy navigation
+        backoff_factor (float): rate multiplier after a 429/503 or a CAPTCHA
+        slow_factor (float): rate multiplier after a navigation slower than latency_target
+        latency_target (float): seconds above which a navigation counts as slow
+        cooldown (float): seconds the host is left alone after the first block (doubled for consecutive ones)
+        max_cooldown (float): upper bound of the cooldown
+    """
+    if not 0 < min_rate <= initial_rate <= max_rate:
+      raise ValueError("rates must satisfy 0 < min_rate <= initial_rate <= max_rate")
+    self.logger = CustomLogger(self.__class__.__name__)
+    self.initial_rate = initial_rate
+    self.min_rate = min_rate
+    self.max_rate = max_rate
+    self.burst = burst
+    self.increase_step = increase_step
+    self.backoff_factor = backoff_factor
+    self.slow_factor = slow_factor
+    self.latency_target = latency_target
+    self.cooldown = cooldown
+    self.max_cooldown = max_cooldown
+    self.hosts: Dict[str, _HostState] = {}
+    # a pacer can be shared by the scrapers of a pool, so per-host pacing holds across them
+    self._lock = threading.Lock()
+
+  @classmethod
+  def from_env(cls) -> "AdaptivePacer":
+    """Builds a pacer from SCRAPER_PACING_RATE, SCRAPER_PACING_MIN_RATE and SCRAPER_PACING_MAX_RATE (navigations/minute)"""
+    return cls(initial_rate=float(os.getenv("SCRAPER_PACING_RATE", 10.0)),
+               min_rate=float(os.getenv("SCRAPER_PACING_MIN_RATE", 1.0)),
+               max_rate=float(os.getenv("SCRAPER_PACING_MAX_RATE", 30.0)))
+
+  def _host(self, url: Optional[str]) -> tuple:
+    host = host_of(url)
+    state = self.hosts.get(host)
+    if state is None:
+      state = self.hosts[host] = _HostState(rate=self.initial_rate, burst=self.burst)
+    return host, state
+
+  def _scale(self, state: _HostState) -> float:
+    return self.initial_rate / state.rate
+
+  def _next_delay(self, url: Optional[str], action: str) -> float:
+    low, high = DELAY_RANGES[action]
+    with self._lock:
+      host, state = self._host(url)
+      seconds = random.uniform(low, high) * self._scale(state)
+      if action not in ("navigation", "next_page"):
+        return seconds
+
+      # take a token of the host's bucket, waiting for the refill (and any cooldown) if there is none
+      now = time.monotonic()
+      state.tokens = min(self.burst, state.tokens + (now - state.updated) * state.rate / 60.0)
+      state.updated = now
+      token_wait = 0.0
+      if state.tokens < 1.0:
+        token_wait = (1.0 - state.tokens) * 60.0 / state.rate
+      # the token is reserved right away, so concurrent callers queue up behind each other
+      state.tokens -= 1.0
+      seconds = max(seconds, token_wait, state.cooldown_until - now)
+    self.logger.debug(f"pacing host={host} action={action} wait={seconds:.2f}s rate={state.rate:.2f}/min")
+    return seconds
+
+  def observe(self,
+              url: Optional[str],
+              latency: Optional[float] = None,
+              status: Optional[int] = None,
+              captcha: bool = False,
+              retry_after: Optional[float] = None) -> None:
+    with self._lock:
+      host, state = self._host(url)
+      state.observations += 1
+      old_rate = state.rate
+      if captcha or status in (429, 503):
+        if captcha:
+          state.captchas += 1
+        else:
+          state.throttled += 1
+        state.consecutive_blocks += 1
+        state.rate = max(self.min_rate, state.rate * self.backoff_factor)
+        cooldown = min(self.max_cooldown,
+                       max(retry_after or 0.0, self.cooldown * 2 ** (state.consecutive_blocks - 1)))
+        state.cooldown_until = time.monotonic() + cooldown
+        state.tokens = 0.0
+        reason = "captcha" if captcha else f"http_{status}"
+        self.logger.warning(f"pacing host={host} event={reason} rate={old_rate:.2f}->{state.rate:.2f}/min "
+                            f"scale={self._scale(state):.2f} cooldown={cooldown:.0f}s")
+        return
+
+      state.consecutive_blocks = 0
+      if latency is not None and latency > self.latency_target:
+        state.slow += 1
+        state.rate = max(self.min_rate, state.rate * self.slow_factor)
+        self.logger.info(f"pacing host={host} event=slow latency={latency:.2f}s rate={old_rate:.2f}->{state.rate:.2f}/min "
+                         f"scale={self._scale(state):.2f}")
+        return
+
+      state.rate = min(self.max_rate, state.rate + self.increase_step)
+      latency_str = f"{latency:.2f}s" if latency is not None else "n/a"
+      self.logger.debug(f"pacing host={host} event=ok latency={latency_str} status={status} "
+                        f"rate={old_rate:.2f}->{state.rate:.2f}/min scale={self._scale(state):.2f}")
+
+  def stats(self) -> Dict[str, Any]:
+    """Current rate, delay scale and event counters per host"""
+    with self._lock:
+      return {host: dict(rate=round(state.rate, 2),
+                         scale=round(self._scale(state), 2),
+                         observations=state.observations,
+                         throttled=state.throttled,
+                         captchas=state.captchas,
+                         slow=state.slow)
+              for host, state in self.hosts.items()}
+
+
+def pacer_from_env() -> Pacer:
+  """
+  SCRAPER_PACING=fixed brings back the original fixed random delays, SCRAPER_PACING=off disables them (local servers only),
+  anything else (default) is AdaptivePacer.from_env()
+  """
+  mode = os.getenv("SCRAPER_PACING", "adaptive").lower()
+  if mode == "fixed":
+    return FixedPacer()
+  if mode == "off":
+    return NoPacer()
+  return AdaptivePacer.from_env()
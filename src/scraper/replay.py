@@ -0,0 +1,135 @@
+import os
+import sys
+import threading
+from typing import Optional, Dict, Any
+
+current_dir = os.path.abspath(os.path.dirname(__file__))
+src_dir= os.path.abspath(os.path.join(current_dir, '..'))
+# set sys_path to also look for libs elsewhere
+sys.path.append(src_dir)
+from libs.logger import CustomLogger
+from libs.metrics import metrics
+from scraper.agentql_cache import normalize_url
+from scraper.snapshot_archive import SnapshotArchive
+
+
+class Replay:
+  """
+  Serves a browser context previously recorded traffic instead of the live sites, see AgentQLPlaywrightScraper(replay=...).
+  In replay mode the scraper drops every humanisation delay, since no site is watching.
+  """
+  def attach(self, context) -> None:
+    """Routes the requests of a (sync API) browser context to the recording"""
+    raise NotImplementedError
+
+  def first_page(self, search_string: str) -> Optional[str]:
+    """The recorded first result page of a search, so the search form can be skipped (None: replay the form too)"""
+    return None
+
+  def stats(self) -> Dict[str, Any]:
+    return {}
+
+
+class HarReplay(Replay):
+  """
+  Replays a HAR file recorded by a scraper run with SCRAPER_RECORD_HAR (or any Playwright HAR) with
+  context.route_from_har(): requests are matched by URL and method, requests that are not in the file fail.
+  The whole session is in the HAR, so searches replay the search form as well.
+  """
+  def __init__(self, path: str):
+    """
+      Args:
+        path (str): the HAR file (.har or .zip)
+    """
+    self.logger = CustomLogger(self.__class__.__name__)
+    if not os.path.exists(path):
+      raise FileNotFoundError(f"No HAR file at {path}")
+    self.path = path
+
+  def attach(self, context) -> None:
+    context.route_from_har(self.path, not_found="abort")
+    self.logger.info(f"Replaying {self.path}")
+
+
+class ArchiveReplay(Replay):
+  """
+  Replays the pages of a SnapshotArchive: navigations to an archived URL are answered with its archived HTML,
+  everything else (subresources, pages never archived) is aborted. Only result pages and queried pages are
+  archived, so searches start at the archived first result page of the search string instead of the search form.
+
+  URLs are matched as they are, then normalized (see scraper.agentql_cache.normalize_url), so tracking parameters
+  that differ between runs do not matter. The latest capture of a URL wins.
+  """
+  def __init__(self, archive: SnapshotArchive, run_id: Optional[str] = None):
+    """
+      Args:
+        archive (SnapshotArchive): the archive to serve from
+        run_id (str, optional): serve the captures of this run only (default: the latest capture of every URL)
+    """
+    self.logger = CustomLogger(self.__class__.__name__)
+    self.archive = archive
+    self.run_id = run_id
+    captures = archive.captures_of_run(run_id) if run_id else archive.all_captures()
+    # one entry per archived page, captures come oldest first so the latest one wins
+    self._pages: Dict[str, str] = {}
+    self._first_pages: Dict[str, str] = {}
+    for row in captures:
+      self._pages[row["url"]] = self._pages[normalize_url(row["url"])] = row["content_hash"]
+      if row["label"] and row["page_number"] == 1:
+        self._first_pages[row["label"]] = row["url"]
+    self.served = 0
+    self.missing = 0
+    self.aborted = 0
+    self._lock = threading.Lock()
+    self.logger.info(f"Replaying {len(captures)} capture(s) of {archive.path} ({'run ' + run_id if run_id else 'all runs'})")
+
+  def content_hash(self, url: str) -> Optional[str]:
+    return self._pages.get(url) or self._pages.get(normalize_url(url))
+
+  def _route(self, route, request) -> None:
+    if not request.is_navigation_request():
+      with self._lock:
+        self.aborted += 1
+      route.abort("blockedbyclient")
+      return
+    content_hash = self.content_hash(request.url)
+    html = self.archive.get(content_hash) if content_hash else None
+    if html is None:
+      with self._lock:
+        self.missing += 1
+      self.logger.warning(f"{request.url} is not in the archive")
+      route.abort("internetdisconnected")
+      return
+    with self._lock:
+      self.served += 1
+    metrics.count("scraper.replayed_pages")
+    route.fulfill(status=200, content_type="text/html; charset=utf-8", body=html)
+
+  def attach(self, context) -> None:
+    context.route("**/*", self._route)
+
+  def first_page(self, search_string: str) -> Optional[str]:
+    return self._first_pages.get(search_string)
+
+  def stats(self) -> Dict[str, Any]:
+    with self._lock:
+      return dict(served=self.served, missing=self.missing, aborted=self.aborted)
+
+
+def replay_from_env() -> Optional[Replay]:
+  """
+  SCRAPER_REPLAY=har:<file.har> replays a HAR file, SCRAPER_REPLAY=archive:<directory>[#<run id>] replays a
+  SnapshotArchive (one run of it, or the latest capture of every page), unset (default) scrapes the live sites.
+  """
+  setting = os.getenv("SCRAPER_REPLAY")
+  if not setting:
+    return None
+  kind, _, location = setting.partition(":")
+  if kind == "har":
+    return HarReplay(location)
+  if kind == "archive":
+    path, _, run_id = location.partition("#")
+    if not os.path.exists(os.path.join(path, "index.sqlite")):
+      raise FileNotFoundError(f"No snapshot archive at {path}")
+    return ArchiveReplay(SnapshotArchive(path), run_id=run_id or None)
+  raise ValueError(f"Unknown SCRAPER_REPLAY '{setting}', use har:<file> or archive:<directory>[#<run id>]")
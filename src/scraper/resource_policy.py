@@ -0,0 +1,263 @@
+import os
+import re
+import sys
+import json
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List
+
+import yaml
+
+current_dir = os.path.abspath(os.path.dirname(__file__))
+src_dir= os.path.abspath(os.path.join(current_dir, '..'))
+# set sys_path to also look for libs elsewhere
+sys.path.append(src_dir)
+from libs.logger import CustomLogger
+from libs.metrics import metrics
+from scraper.pacing import host_of
+
+# what the scraper never needs to extract text: blocked on every host unless a host entry says otherwise
+DEFAULT_BLOCK_TYPES = ["image", "media", "font"]
+
+# third-party analytics and ads; the scraped sites' own pings (e.g., Google's /gen_204) are left alone,
+# a browser that never sends them looks less like a person
+DEFAULT_BLOCK_PATTERNS = [
+  r"google-analytics\.com", r"googletagmanager\.com", r"doubleclick\.net", r"googlesyndication\.com",
+  r"googleadservices\.com", r"adservice\.google\.", r"facebook\.net", r"hotjar\.com", r"segment\.(io|com)",
+]
+
+# never blocked, whatever the rules above say: the bot challenges the anti-detection profile has to pass
+# (a CAPTCHA that cannot render cannot be solved or even detected) and the pages the browser navigates to
+DEFAULT_ALLOW_PATTERNS = [
+  r"recaptcha", r"/sorry/", r"hcaptcha\.com", r"challenges\.cloudflare\.com", r"challenge-platform",
+]
+
+# per host (matched as a substring of the page's host, like scraper.fastpath.SEED_RULES): block_types replaces
+# the default list, block_patterns and allow_patterns extend theirs
+DEFAULT_HOSTS: Dict[str, Dict[str, List[str]]] = {
+  # GitHub's telemetry endpoints, the code and file lists are rendered server-side anyway
+  "github.com": {"block_patterns": [r"collector\.github\.com", r"api\.github\.com/_private/browser/(stats|errors)"]},
+}
+
+# typical transfer size (bytes) of a resource of each type, the estimate of what blocking one saves
+# (a blocked request is never answered, so its real size is unknown)
+TYPICAL_BYTES = {"image": 25000, "media": 500000, "font": 40000, "script": 30000, "stylesheet": 15000,
+                 "xhr": 3000, "fetch": 3000, "ping": 0, "other": 5000}
+
+# resource types a navigation brings, never blocked
+_DOCUMENT_TYPES = ("document",)
+# page URLs whose counters are kept until the scraper collects them
+_MAX_TRACKED_PAGES = 256
+
+
+def _compile(patterns: List[str]) -> Optional[re.Pattern]:
+  return re.compile("|".join(f"(?:{pattern})" for pattern in patterns), re.IGNORECASE) if patterns else None
+
+
+class ResourcePolicy:
+  """
+  Blocks the requests of a Playwright browser context that text extraction does not need, with context.route():
+  resource types (images, media, fonts, ...) and URL patterns (analytics, ads), configurable per host.
+  Documents and the allow patterns (CAPTCHA / bot challenge providers) are always let through, so the
+  anti-detection profile (headers, init scripts) and the CAPTCHA detection work as before.
+
+  Counts what it blocked and what was loaded per page (see take_page_stats()) and in total (see stats());
+  the bytes saved are an estimate from TYPICAL_BYTES, blocked requests have no size.
+  Note that Playwright disables the HTTP cache of a context with routes.
+
+  Example:
+    policy = ResourcePolicy()
+    policy.attach(context)
+    page.goto(url)
+    policy.take_page_stats(page.url) # {'allowed': 12, 'blocked': 31, 'bytes_loaded': ..., 'bytes_saved': ...}
+  """
+  def __init__(self,
+               block_types: Optional[List[str]] = None,
+               block_patterns: Optional[List[str]] = None,
+               allow_patterns: Optional[List[str]] = None,
+               hosts: Optional[Dict[str, Dict[str, List[str]]]] = None,
+               typical_bytes: Optional[Dict[str, int]] = None):
+    """
+      Args:
+        block_types (List[str]): Playwright resource types blocked on every host (default: DEFAULT_BLOCK_TYPES)
+        block_patterns (List[str]): regular expressions of URLs blocked on every host (default: DEFAULT_BLOCK_PATTERNS)
+        allow_patterns (List[str]): regular expressions of URLs never blocked (default: DEFAULT_ALLOW_PATTERNS)
+        hosts (Dict[str, Dict[str, List[str]]]): per host overrides, see DEFAULT_HOSTS (default: DEFAULT_HOSTS)
+        typical_bytes (Dict[str, int]): the estimated size of a blocked resource per type (default: TYPICAL_BYTES)
+    """
+    self.logger = CustomLogger(self.__class__.__name__)
+    self.block_types = frozenset(block_types if block_types is not None else DEFAULT_BLOCK_TYPES)
+    self.block_patterns = list(block_patterns if block_patterns is not None else DEFAULT_BLOCK_PATTERNS)
+    self.allow_patterns = list(allow_patterns if allow_patterns is not None else DEFAULT_ALLOW_PATTERNS)
+    self.hosts = hosts if hosts is not None else DEFAULT_HOSTS
+    self.typical_bytes = {**TYPICAL_BYTES, **(typical_bytes or {})}
+    self._block_re = _compile(self.block_patterns)
+    self._allow_re = _compile(self.allow_patterns)
+    self._host_rules: Dict[str, tuple] = {} # page host -> (block types, block regex, allow regex)
+    self._pages: "OrderedDict[str, Dict[str, int]]" = OrderedDict()
+    self._totals = dict(allowed=0, blocked=0, bytes_loaded=0, bytes_saved=0)
+    self._blocked_by: Dict[str, int] = {} # "type:image" / "pattern" -> count
+    self._lock = threading.Lock()
+
+  @classmethod
+  def from_file(cls, path: str) -> "ResourcePolicy":
+    """
+    Reads a policy from a YAML (.yml/.yaml) or JSON file with the keys of the constructor, e.g.
+      block_types: [image, media, font, stylesheet]
+      hosts:
+        google.: {block_types: [image, media, font]}
+    Keys that are missing keep their defaults.
+    """
+    with open(path, encoding="utf-8") as f:
+      config = yaml.safe_load(f) if path.endswith((".yml", ".yaml")) else json.load(f)
+    return cls(**(config or {}))
+
+  @classmethod
+  def from_env(cls) -> Optional["ResourcePolicy"]:
+    """
+    SCRAPER_RESOURCE_POLICY=off loads everything like a normal browser (returns None), a path to a YAML/JSON file
+    loads that policy, anything else (default) is the default policy.
+    """
+    setting = os.getenv("SCRAPER_RESOURCE_POLICY", "default")
+    if setting.lower() == "off":
+      return None
+    if setting.lower() != "default":
+      return cls.from_file(setting)
+    return cls()
+
+  def _rules_for(self, page_host: str) -> tuple:
+    rules = self._host_rules.get(page_host)
+    if rules is None:
+      block_types, block_patterns, allow_patterns = set(self.block_types), [], []
+      for marker, entry in self.hosts.items():
+        if marker in page_host:
+          if "block_types" in entry:
+            block_types = set(entry["block_types"])
+          block_patterns += entry.get("block_patterns", [])
+          allow_patterns += entry.get("allow_patterns", [])
+      rules = self._host_rules[page_host] = (frozenset(block_types), _compile(block_patterns), _compile(allow_patterns))
+    return rules
+
+  def block_reason(self, url: str, resource_type: str, page_url: Optional[str] = None) -> Optional[str]:
+    """
+    Decides about one request.
+
+    Args:
+      url (str): the requested URL
+      resource_type (str): Playwright's request.resource_type (document, image, script, ...)
+      page_url (str, optional): URL of the page the request comes from, whose host selects the host rules
+                                (default: the host of url)
+
+    Returns:
+      Optional[str]: why the request is blocked ("type:<resource type>" or "pattern"), None if it is allowed
+    """
+    if resource_type in _DOCUMENT_TYPES or (self._allow_re is not None and self._allow_re.search(url)):
+      return None
+    block_types, host_block_re, host_allow_re = self._rules_for(host_of(page_url or url))
+    if host_allow_re is not None and host_allow_re.search(url):
+      return None
+    if resource_type in block_types:
+      return f"type:{resource_type}"
+    if (self._block_re is not None and self._block_re.search(url)) or (host_block_re is not None and host_block_re.search(url)):
+      return "pattern"
+    return None
+
+  @staticmethod
+  def _page_url(request) -> Optional[str]:
+    try:
+      return request.frame.page.url
+    except Exception:
+      # e.g., requests of service workers belong to no page
+      return None
+
+  def _page_counters(self, page_url: Optional[str]) -> Dict[str, int]:
+    key = page_url or ""
+    counters = self._pages.get(key)
+    if counters is None:
+      counters = self._pages[key] = dict(allowed=0, blocked=0, bytes_loaded=0, bytes_saved=0)
+      while len(self._pages) > _MAX_TRACKED_PAGES:
+        self._pages.popitem(last=False)
+    return counters
+
+  def _decide(self, request) -> bool:
+    """Counts a request, True if it is to be blocked"""
+    page_url = self._page_url(request)
+    reason = self.block_reason(request.url, request.resource_type, page_url)
+    with self._lock:
+      counters = self._page_counters(page_url)
+      if reason is None:
+        counters["allowed"] += 1
+        self._totals["allowed"] += 1
+        return False
+      saved = self.typical_bytes.get(request.resource_type, self.typical_bytes["other"])
+      counters["blocked"] += 1
+      counters["bytes_saved"] += saved
+      self._totals["blocked"] += 1
+      self._totals["bytes_saved"] += saved
+      self._blocked_by[reason] = self._blocked_by.get(reason, 0) + 1
+    return True
+
+  def _on_response(self, response) -> None:
+    """Adds the Content-Length of a loaded response (compressed size, 0 if the server sent none)"""
+    try:
+      size = int((response.headers or {}).get("content-length") or 0)
+    except ValueError:
+      size = 0
+    page_url = self._page_url(response.request)
+    with self._lock:
+      self._page_counters(page_url)["bytes_loaded"] += size
+      self._totals["bytes_loaded"] += size
+
+  def _route(self, route, request) -> None:
+    if self._decide(request):
+      route.abort("blockedbyclient")
+    else:
+      route.continue_()
+
+  async def _route_async(self, route, request) -> None:
+    if self._decide(request):
+      await route.abort("blockedbyclient")
+    else:
+      await route.continue_()
+
+  def attach(self, context) -> "ResourcePolicy":
+    """Routes every request of a (sync API) browser context through the policy"""
+    context.route("**/*", self._route)
+    context.on("response", self._on_response)
+    self.logger.info(f"Blocking resource types {sorted(self.block_types)} and {len(self.block_patterns)} URL patterns "
+                     f"({len(self.hosts)} host override(s))")
+    return self
+
+  async def attach_async(self, context) -> "ResourcePolicy":
+    """attach() for a browser context of Playwright's async API"""
+    await context.route("**/*", self._route_async)
+    context.on("response", self._on_response)
+    self.logger.info(f"Blocking resource types {sorted(self.block_types)} and {len(self.block_patterns)} URL patterns "
+                     f"({len(self.hosts)} host override(s))")
+    return self
+
+  def take_page_stats(self, page_url: Optional[str]) -> Dict[str, int]:
+    """
+    The counters of a page since the last call for it, also reported to the metrics
+    (scraper.requests_blocked, scraper.bytes_loaded, scraper.bytes_saved_estimate).
+
+    Args:
+      page_url (str): the URL the page is at
+
+    Returns:
+      Dict[str, int]: allowed and blocked requests, bytes loaded and (estimated) bytes saved
+    """
+    with self._lock:
+      counters = self._pages.pop(page_url or "", None) or dict(allowed=0, blocked=0, bytes_loaded=0, bytes_saved=0)
+    metrics.count("scraper.requests_blocked", counters["blocked"])
+    metrics.count("scraper.bytes_loaded", counters["bytes_loaded"])
+    metrics.count("scraper.bytes_saved_estimate", counters["bytes_saved"])
+    return counters
+
+  def stats(self) -> Dict[str, Any]:
+    """Totals over the lifetime of the policy"""
+    with self._lock:
+      total = self._totals["allowed"] + self._totals["blocked"]
+      return dict(self._totals,
+                  blocked_ratio=round(self._totals["blocked"] / total, 3) if total else 0.0,
+                  blocked_by=dict(self._blocked_by))
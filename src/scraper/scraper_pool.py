@@ -0,0 +1,193 @@
+import os
+import sys
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Optional, List, Dict, Any, Callable, Union
+
+current_dir = os.path.abspath(os.path.dirname(__file__))
+src_dir= os.path.abspath(os.path.join(current_dir, '..'))
+# set sys_path to also look for libs elsewhere
+sys.path.append(src_dir)
+from libs.logger import CustomLogger
+
+
+# sentinel telling a worker to close its browser and exit
+_STOP = object()
+
+
+class AgentQLScraperPool:
+  """
+  Runs N isolated AgentQLPlaywrightScraper instances side by side and hands work out to them from a shared queue.
+
+  Every worker owns its own thread, Playwright instance and persistent browser context (with its own
+  user_data_dir and optional proxy), so the human-like pacing of one context does not block the others.
+  Playwright's sync API is bound to the thread that started it, hence each scraper is created inside its worker
+  thread, with the worker's first job. A job may ask for another headless setting than the pool's, the worker
+  then replaces its scraper; a job that fails leaves the next one a new scraper, in case the browser broke.
+
+  Jobs are either a scraper method by name or a callable run as fn(scraper, worker_id, **kwargs) in the worker,
+  e.g., a whole crawl job (see pipeline.crawl_jobs.CrawlRunner).
+
+  Example:
+    with AgentQLScraperPool(num_contexts=4, headless=True) as pool:
+      results = pool.map("paginate_query", [dict(url=u, query=aql, max_pages=2) for u in urls])
+  """
+  def __init__(self,
+               num_contexts: int = 2,
+               api_key: Optional[str] = None,
+               headless: bool = False,
+               proxies: Optional[List[str]] = None,
+               user_data_dir_base: str = "/tmp/playwright-user-data",
+               scraper_factory: Optional[Callable[..., Any]] = None):
+    """
+      Start the worker threads, their browser contexts start with their first job.
+
+      Args:
+        num_contexts (int): number of parallel browser contexts
+        api_key (str): AgentQL API key passed to each scraper (falls back to the ENV as usual)
+        headless (bool): whether we want to see the browsers or not (jobs may override it)
+        proxies (List[str]): optional list of proxy addresses, assigned to the contexts round-robin
+        user_data_dir_base (str): each context gets its own directory as <user_data_dir_base>-<worker_id>,
+                                  a single context uses <user_data_dir_base> itself
+        scraper_factory (Callable): builds a scraper from the keyword arguments above
+                                    (default: AgentQLPlaywrightScraper, override it for tests)
+    """
+    if num_contexts < 1:
+      raise ValueError("'num_contexts' must be at least 1")
+
+    self.logger = CustomLogger(self.__class__.__name__)
+    if scraper_factory is None:
+      from scraper.agentql_scraper import AgentQLPlaywrightScraper
+      scraper_factory = AgentQLPlaywrightScraper
+    self.scraper_factory = scraper_factory
+    self.headless = headless
+
+    self.jobs: "queue.Queue" = queue.Queue()
+    # guards _alive and _closed, and orders every put of a job before the stop sentinels
+    self._lock = threading.Lock()
+    self._alive = num_contexts
+    self._closed = False
+    self.workers: List[threading.Thread] = []
+    for worker_id in range(num_contexts):
+      scraper_kwargs = dict(api_key=api_key,
+                            proxy_address=proxies[worker_id % len(proxies)] if proxies else None,
+                            user_data_dir=user_data_dir_base if num_contexts == 1 else f"{user_data_dir_base}-{worker_id}")
+      worker = threading.Thread(target=self._worker,
+                                args=(worker_id, scraper_kwargs),
+                                name=f"scraper-{worker_id}",
+                                daemon=True)
+      worker.start()
+      self.workers.append(worker)
+    self.logger.info(f"Started scraper pool with {num_contexts} browser context(s)")
+
+  def _close_scraper(self, worker_id: int, scraper: Any) -> None:
+    try:
+      scraper.close()
+    except Exception as e:
+      self.logger.warning(f"Worker {worker_id} could not close its browser context: {e}")
+
+  def _worker(self, worker_id: int, scraper_kwargs: Dict[str, Any]) -> None:
+    """Processes jobs until the stop sentinel arrives, (re)creating this worker's scraper as the jobs need it"""
+    scraper, scraper_headless = None, None
+    try:
+      while True:
+        job = self.jobs.get()
+        if job is _STOP:
+          break
+        future, method, kwargs, headless = job
+        if not future.set_running_or_notify_cancel():
+          continue
+        try:
+          if scraper is not None and headless != scraper_headless:
+            self._close_scraper(worker_id, scraper)
+            scraper = None
+          if scraper is None:
+            scraper = self.scraper_factory(headless=headless, **scraper_kwargs)
+            scraper_headless = headless
+          self.logger.debug(f"Worker {worker_id} runs {getattr(method, '__name__', method)}({kwargs.get('url', '')})")
+          future.set_result(method(scraper, worker_id, **kwargs) if callable(method) else getattr(scraper, method)(**kwargs))
+        except BaseException as e:  # the scraper calls exit() when no API key is found, the caller re-raises it
+          future.set_exception(e)
+          if scraper is not None:
+            self._close_scraper(worker_id, scraper)
+            scraper = None
+    finally:
+      if scraper is not None:
+        self._close_scraper(worker_id, scraper)
+      with self._lock:
+        self._alive -= 1
+        last_worker = self._alive == 0
+      if last_worker:
+        self._fail_pending("No scraper worker is alive anymore")
+
+  def _fail_pending(self, reason: str) -> None:
+    """Resolves every job left in the queue with an error, so nobody waits forever"""
+    while True:
+      try:
+        job = self.jobs.get_nowait()
+      except queue.Empty:
+        return
+      if job is not _STOP and job[0].set_running_or_notify_cancel():
+        job[0].set_exception(RuntimeError(reason))
+
+  def submit(self, method: Union[str, Callable[..., Any]], headless: Optional[bool] = None, **kwargs) -> Future:
+    """
+    Queue a single scraper call (e.g., submit("query", url=..., query=...)) for the next free context.
+
+    Args:
+      method (str or Callable): name of a scraper method, or a callable run as method(scraper, worker_id, **kwargs)
+      headless (bool, optional): run on a scraper with this headless setting (default: the pool's)
+
+    Returns:
+      Future: resolves to whatever the scraper method returns
+    """
+    future: Future = Future()
+    with self._lock:
+      if self._closed:
+        raise RuntimeError("The scraper pool is already closed")
+      if self._alive == 0:
+        future.set_exception(RuntimeError("No scraper worker is alive anymore"))
+      else:
+        self.jobs.put((future, method, kwargs, self.headless if headless is None else headless))
+    return future
+
+  def map(self, method: Union[str, Callable[..., Any]], jobs: List[Dict[str, Any]]) -> list:
+    """
+    Run the given scraper method once per job across all contexts.
+
+    Args:
+      method (str or Callable): name of the AgentQLPlaywrightScraper method, e.g., "search_query", "paginate_query"
+                                or "query", or a callable as for submit()
+      jobs (List[Dict]): keyword arguments for each call
+
+    Returns:
+      list: the results, in the same order as the jobs
+    """
+    futures = [self.submit(method, **kwargs) for kwargs in jobs]
+    return [future.result() for future in futures]
+
+  def close(self, cancel_pending: bool = False) -> None:
+    """
+    Stops the workers and closes every browser context.
+
+    Args:
+      cancel_pending (bool): fail the jobs still queued instead of running them first
+    """
+    with self._lock:
+      if self._closed:
+        return
+      self._closed = True
+      if cancel_pending:
+        self._fail_pending("The scraper pool was closed")
+      for _ in self.workers:
+        self.jobs.put(_STOP)
+    for worker in self.workers:
+      worker.join()
+    self.logger.info("Scraper pool closed")
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc, tb):
+    self.close(cancel_pending=exc_type is not None)
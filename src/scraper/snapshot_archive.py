@@ -0,0 +1,227 @@
+import os
+import sys
+import time
+import sqlite3
+import hashlib
+import tempfile
+import threading
+from typing import Optional, Any, Dict, List, Iterator
+
+current_dir = os.path.abspath(os.path.dirname(__file__))
+src_dir= os.path.abspath(os.path.join(current_dir, '..'))
+# set sys_path to also look for libs elsewhere
+sys.path.append(src_dir)
+from libs.logger import CustomLogger
+from libs.metrics import metrics
+
+
+def new_run_id() -> str:
+  """A run id from the current time and the process id, e.g., 20240131T120000-4242"""
+  return f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+
+
+class SnapshotArchive:
+  """
+  On-disk archive of the raw HTML of the scraped pages, so the data can be extracted again (e.g., with a new query)
+  without scraping the sites again.
+
+  Every page is stored once as a zstd-compressed blob named after the SHA-256 of its HTML
+  (blobs/<2 hex digits>/<hash>.html.zst), so a page captured again with the very same content costs an index row
+  only. The index (index.sqlite) has one row per capture: the URL, the run, the page number within a pagination,
+  an optional label (e.g., the search string), the content hash and the time.
+
+  Example:
+    archive = SnapshotArchive("/data/snapshots")
+    content_hash = archive.put(html, url, page_number=1, label="site:github.com docker-compose.yml")
+    html = archive.get(content_hash)
+  """
+  def __init__(self,
+               path: str = "/tmp/scraper-archive",
+               run_id: Optional[str] = None,
+               level: int = 10):
+    """
+      Args:
+        path (str): directory of the archive (created if missing)
+        run_id (str, optional): the run the captures of this instance belong to (default: new_run_id())
+        level (int): zstd compression level (1-22, higher is smaller and slower)
+    """
+    # zstandard is only needed when pages are archived
+    import zstandard
+    self._zstd = zstandard
+    self.logger = CustomLogger(self.__class__.__name__)
+    self.path = path
+    self.run_id = run_id or new_run_id()
+    self.level = level
+    self.captures = 0
+    self.duplicates = 0 # captures whose blob was already stored
+    self.raw_bytes = 0
+    self.stored_bytes = 0
+    self._local = threading.local() # zstd (de)compressors are not thread-safe, one per thread
+    os.makedirs(os.path.join(path, "blobs"), exist_ok=True)
+    # one connection shared by the threads of a scraper pool, guarded by a lock
+    self._lock = threading.Lock()
+    self.connection = sqlite3.connect(os.path.join(path, "index.sqlite"), check_same_thread=False, timeout=30)
+    self.connection.execute("PRAGMA journal_mode=WAL")
+    self.connection.execute("""
+      CREATE TABLE IF NOT EXISTS snapshots (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        run_id TEXT NOT NULL,
+        url TEXT NOT NULL,
+        page_number INTEGER,
+        label TEXT,
+        content_hash TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        captured_at REAL NOT NULL
+      )
+    """)
+    self.connection.execute("CREATE INDEX IF NOT EXISTS ix_snapshots_run_id ON snapshots (run_id, id)")
+    self.connection.execute("CREATE INDEX IF NOT EXISTS ix_snapshots_url ON snapshots (url)")
+    self.connection.execute("CREATE INDEX IF NOT EXISTS ix_snapshots_content_hash ON snapshots (content_hash)")
+    self.connection.commit()
+
+  @classmethod
+  def from_env(cls) -> Optional["SnapshotArchive"]:
+    """
+    Builds an archive from SCRAPER_ARCHIVE_PATH, SCRAPER_ARCHIVE_RUN (default: a new run id) and
+    SCRAPER_ARCHIVE_LEVEL (zstd level, default: 10).
+
+    Returns:
+      SnapshotArchive or None: None if SCRAPER_ARCHIVE_PATH is not set
+    """
+    path = os.getenv("SCRAPER_ARCHIVE_PATH")
+    if not path:
+      return None
+    return cls(path=path,
+               run_id=os.getenv("SCRAPER_ARCHIVE_RUN") or None,
+               level=int(os.getenv("SCRAPER_ARCHIVE_LEVEL", 10)))
+
+  def _compressor(self):
+    compressor = getattr(self._local, "compressor", None)
+    if compressor is None:
+      compressor = self._local.compressor = self._zstd.ZstdCompressor(level=self.level)
+    return compressor
+
+  def _decompressor(self):
+    decompressor = getattr(self._local, "decompressor", None)
+    if decompressor is None:
+      decompressor = self._local.decompressor = self._zstd.ZstdDecompressor()
+    return decompressor
+
+  def blob_path(self, content_hash: str) -> str:
+    return os.path.join(self.path, "blobs", content_hash[:2], f"{content_hash}.html.zst")
+
+  def _store_blob(self, content_hash: str, raw: bytes) -> int:
+    """Writes the compressed blob unless it exists, returns the bytes written (0 for a duplicate)"""
+    blob_path = self.blob_path(content_hash)
+    if os.path.exists(blob_path):
+      return 0
+    with metrics.timer("scraper.archive_compress"):
+      compressed = self._compressor().compress(raw)
+    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+    # written under a temporary name and renamed, so a reader (or a crash) never sees half a blob
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(blob_path), suffix=".tmp")
+    try:
+      with os.fdopen(fd, "wb") as f:
+        f.write(compressed)
+      os.replace(tmp_path, blob_path)
+    except Exception:
+      os.unlink(tmp_path)
+      raise
+    return len(compressed)
+
+  def put(self,
+          html: str,
+          url: str,
+          page_number: Optional[int] = None,
+          label: Optional[str] = None) -> str:
+    """
+    Captures a page.
+
+    Args:
+      html (str): the page content
+      url (str): the URL the page was at
+      page_number (int, optional): 1-based page number within a pagination
+      label (str, optional): what the page was scraped for, e.g., the search string
+
+    Returns:
+      str: the content hash (SHA-256 hex digest of the UTF-8 HTML) the page is stored under
+    """
+    raw = html.encode("utf-8")
+    content_hash = hashlib.sha256(raw).hexdigest()
+    stored = self._store_blob(content_hash, raw)
+    with self._lock:
+      self.connection.execute("INSERT INTO snapshots (run_id, url, page_number, label, content_hash, size, captured_at) "
+                              "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                              (self.run_id, url, page_number, label, content_hash, len(raw), time.time()))
+      self.connection.commit()
+      self.captures += 1
+      self.raw_bytes += len(raw)
+      self.stored_bytes += stored
+      if not stored:
+        self.duplicates += 1
+    metrics.count("scraper.archived_pages")
+    return content_hash
+
+  def get(self, content_hash: str) -> Optional[str]:
+    """The HTML stored under a content hash, None if there is no such blob"""
+    try:
+      with open(self.blob_path(content_hash), "rb") as f:
+        compressed = f.read()
+    except FileNotFoundError:
+      return None
+    return self._decompressor().decompress(compressed).decode("utf-8")
+
+  def _rows(self, query: str, params: tuple) -> List[Dict[str, Any]]:
+    with self._lock:
+      cursor = self.connection.execute(query, params)
+      columns = [column[0] for column in cursor.description]
+      return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+  def captures_of_run(self, run_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    The index rows of a run in capture order.
+
+    Args:
+      run_id (str, optional): the run (default: the run of this instance)
+
+    Returns:
+      List[Dict[str, Any]]: id, run_id, url, page_number, label, content_hash, size and captured_at of every capture
+    """
+    return self._rows("SELECT * FROM snapshots WHERE run_id = ? ORDER BY id", (run_id or self.run_id,))
+
+  def all_captures(self) -> List[Dict[str, Any]]:
+    """The index rows of every run in capture order, see captures_of_run()"""
+    return self._rows("SELECT * FROM snapshots ORDER BY id", ())
+
+  def latest(self, url: str) -> Optional[Dict[str, Any]]:
+    """The index row of the most recent capture of a URL, None if it was never captured"""
+    rows = self._rows("SELECT * FROM snapshots WHERE url = ? ORDER BY id DESC LIMIT 1", (url,))
+    return rows[0] if rows else None
+
+  def runs(self) -> List[Dict[str, Any]]:
+    """run_id, number of captures, first and last capture time of every run, oldest first"""
+    return self._rows("SELECT run_id, COUNT(*) AS captures, MIN(captured_at) AS started, MAX(captured_at) AS finished "
+                      "FROM snapshots GROUP BY run_id ORDER BY started", ())
+
+  def iter_pages(self, run_id: Optional[str] = None) -> Iterator[tuple]:
+    """Yields (index row, HTML) of every capture of a run, in capture order"""
+    for row in self.captures_of_run(run_id):
+      yield row, self.get(row["content_hash"])
+
+  def stats(self) -> Dict[str, Any]:
+    """Capture counters of this instance and the size of the whole archive"""
+    with self._lock:
+      captures, blobs, raw_total = self.connection.execute(
+        "SELECT COUNT(*), COUNT(DISTINCT content_hash), COALESCE(SUM(size), 0) FROM snapshots").fetchone()
+    return dict(run_id=self.run_id,
+                captures=self.captures,
+                duplicates=self.duplicates,
+                raw_bytes=self.raw_bytes,
+                stored_bytes=self.stored_bytes,
+                archive_captures=captures,
+                archive_blobs=blobs,
+                archive_raw_bytes=raw_total)
+
+  def close(self) -> None:
+    with self._lock:
+      self.connection.close()
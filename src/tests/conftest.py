@@ -0,0 +1,22 @@
+import os
+import sys
+
+current_dir = os.path.abspath(os.path.dirname(__file__))
+src_dir = os.path.abspath(os.path.join(current_dir, '..'))
+# the modules import each other from src, like when they run as scripts
+sys.path.insert(0, src_dir)
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database.models import Base
+
+
+@pytest.fixture
+def Session(tmp_path):
+  """Session factory of a throw-away SQLite database with the full schema, like the benchmarks use"""
+  engine = create_engine(f"sqlite:///{tmp_path / 'test.sqlite'}")
+  Base.metadata.create_all(engine)
+  yield sessionmaker(bind=engine)
+  engine.dispose()
@@ -0,0 +1,86 @@
+import pytest
+
+import scraper.agentql_cache as agentql_cache
+from scraper.agentql_cache import AgentQLResponseCache, normalize_url
+
+QUERY = "{ search_results[] { title url } }"
+URL = "https://www.google.com/search?q=docker-compose&start=10"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+  now = [1000.0]
+  monkeypatch.setattr(agentql_cache.time, "time", lambda: now[0])
+  return now
+
+
+def make_cache(tmp_path, **kwargs) -> AgentQLResponseCache:
+  return AgentQLResponseCache(path=str(tmp_path / "agentql.sqlite"), **kwargs)
+
+
+def test_urls_are_normalized_for_lookups():
+  assert normalize_url("HTTPS://WWW.Google.com/search?start=10&q=a&ved=x&utm_source=y#top") == \
+    "https://www.google.com/search?q=a&start=10"
+
+
+def test_a_response_is_served_for_the_same_query_and_content_and_counted(tmp_path, clock):
+  cache = make_cache(tmp_path)
+  assert cache.get(QUERY, URL, "<html>1</html>") is None
+  cache.put(QUERY, URL, "<html>1</html>", {"search_results": []})
+
+  assert cache.get(" ".join(QUERY.split()), URL + "&ved=abc", "<html>1</html>") == {"search_results": []}
+  # other content of the same URL is another page
+  assert cache.get(QUERY, URL, "<html>2</html>") is None
+  assert cache.stats() == dict(hits=1, misses=2, hit_rate=1 / 3, evictions=0, entries=1)
+  cache.close()
+
+
+def test_an_entry_expires_after_the_ttl(tmp_path, clock):
+  cache = make_cache(tmp_path, ttl_seconds=60)
+  cache.put(QUERY, URL, "<html/>", {"n": 1})
+  clock[0] += 60
+  assert cache.get(QUERY, URL, "<html/>") == {"n": 1}
+  clock[0] += 1
+  assert cache.get(QUERY, URL, "<html/>") is None
+  assert cache.stats()["entries"] == 0
+
+  # storing it again starts a new ttl
+  cache.put(QUERY, URL, "<html/>", {"n": 2})
+  clock[0] += 30
+  assert cache.get(QUERY, URL, "<html/>") == {"n": 2}
+  cache.close()
+
+
+def test_the_least_recently_used_entries_are_evicted_once_the_cache_is_full(tmp_path, clock):
+  cache = make_cache(tmp_path, max_entries=3)
+  for n in range(3):
+    clock[0] += 1
+    cache.put(QUERY, URL, f"<html>{n}</html>", {"n": n})
+  clock[0] += 1
+  assert cache.get(QUERY, URL, "<html>0</html>") == {"n": 0}
+  # replacing an entry does not grow the cache
+  cache.put(QUERY, URL, "<html>2</html>", {"n": 2})
+  assert cache.stats()["evictions"] == 0
+
+  clock[0] += 1
+  cache.put(QUERY, URL, "<html>3</html>", {"n": 3})
+  assert cache.get(QUERY, URL, "<html>1</html>") is None
+  assert [cache.get(QUERY, URL, f"<html>{n}</html>") for n in (0, 2, 3)] == [{"n": 0}, {"n": 2}, {"n": 3}]
+  assert {key: cache.stats()[key] for key in ("evictions", "entries")} == dict(evictions=1, entries=3)
+  cache.close()
+
+
+def test_a_full_cache_is_evicted_in_a_batch_and_the_count_survives_a_reopen(tmp_path, clock):
+  cache = make_cache(tmp_path, max_entries=20)
+  for n in range(20):
+    clock[0] += 1
+    cache.put(QUERY, URL, f"<html>{n}</html>", {"n": n})
+  cache.close()
+
+  cache = make_cache(tmp_path, max_entries=20)
+  clock[0] += 1
+  cache.put(QUERY, URL, "<html>20</html>", {"n": 20})
+  # down to 90% of max_entries, the oldest first
+  assert {key: cache.stats()[key] for key in ("evictions", "entries")} == dict(evictions=3, entries=18)
+  assert [cache.get(QUERY, URL, f"<html>{n}</html>") is None for n in (2, 3)] == [True, False]
+  cache.close()
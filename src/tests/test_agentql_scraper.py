@@ -0,0 +1,176 @@
+from types import SimpleNamespace
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+
+import database.db_controller as db_controller
+from pipeline.crawl_jobs import CrawlJob, CrawlRunner
+from scraper.agentql_scraper import AgentQLPlaywrightScraper
+from scraper.extractors import PageExtractor
+from scraper.pacing import NoPacer
+
+DORK = "site:github.com inurl:docker-compose.yml"
+SEARCH_URL = "https://www.google.com"
+SORRY_FORM = '<form id="captcha-form" action="index" method="post"><div class="g-recaptcha"></div></form>'
+ABUSE = "<p>You have triggered an abuse detection mechanism. Please wait a few minutes before you try again.</p>"
+
+
+class FakeElement:
+  def __init__(self, on_click=None):
+    self.on_click = on_click
+
+  def click(self):
+    if self.on_click is not None:
+      self.on_click()
+
+  def clear(self):
+    pass
+
+  def type(self, text):
+    pass
+
+  def fill(self, text):
+    pass
+
+
+class FakeSearchPage:
+  """
+  A browser tab on a search engine, already wrapped for AgentQL: the home page's search form leads to `pages`
+  result pages of three results each; with block_at set, following the "next" link to that page lands on
+  Google's /sorry/ page instead.
+  """
+  def __init__(self, pages: int = 3, block_at=None):
+    self.pages = pages
+    self.block_at = block_at
+    self.url = "about:blank"
+    self.gotos = []
+    self.queries = []
+
+  def goto(self, url, **kwargs):
+    self.gotos.append((url, kwargs))
+    self.url = url
+
+  def wait_for_load_state(self, *args, **kwargs):
+    pass
+
+  def wait_for_page_ready_state(self, *args, **kwargs):
+    pass
+
+  def content(self):
+    return f"<html><body>{self.url}</body></html>"
+
+  def page_number(self) -> int:
+    return int(parse_qs(urlparse(self.url).query)["start"][0]) // 10 + 1
+
+  def open(self, page_number: int):
+    result_url = f"{SEARCH_URL}/search?q=compose&start={(page_number - 1) * 10}"
+    self.url = f"{SEARCH_URL}/sorry/index?continue={result_url}" if page_number == self.block_at else result_url
+
+  def query_elements(self, query, **kwargs):
+    self.queries.append(kwargs)
+    return SimpleNamespace(search_query=FakeElement(), search_button=FakeElement(on_click=lambda: self.open(1)))
+
+  def query_data(self, query, **kwargs):
+    self.queries.append(kwargs)
+    page_number = self.page_number()
+    return {"search_results": [dict(title=f"app{page_number}-{i}", about=None,
+                                    url=f"https://github.com/acme/app{page_number}-{i}/blob/main/docker-compose.yml")
+                               for i in range(3)]}
+
+  def get_pagination_info(self, **kwargs):
+    self.queries.append(kwargs)
+    page_number = self.page_number()
+    return SimpleNamespace(has_next_page=page_number < self.pages,
+                           navigate_to_next_page=lambda: self.open(page_number + 1))
+
+
+class FakeExtractor(PageExtractor):
+  """The page is its own AgentQL wrapper"""
+  name = "fake"
+
+  def wrap(self, page):
+    return page
+
+
+@pytest.fixture(autouse=True)
+def environment(monkeypatch):
+  for name in ("AGENTQL_CACHE_PATH", "SCRAPER_ARCHIVE_PATH", "SCRAPER_REPLAY", "SCRAPER_RECORD_HAR"):
+    monkeypatch.delenv(name, raising=False)
+  monkeypatch.setenv("SCRAPER_RESOURCE_POLICY", "off")
+
+
+def browser_scraper(page: FakeSearchPage) -> AgentQLPlaywrightScraper:
+  """The real scraper on a fake browser: start() finds the context already there"""
+  scraper = AgentQLPlaywrightScraper(headless=True, pacer=NoPacer(), extractor=FakeExtractor())
+  scraper.playwright = SimpleNamespace(stop=lambda: None)
+  scraper.context = SimpleNamespace(close=lambda: None)
+  scraper.page = page
+  return scraper
+
+
+def crawl(Session, page: FakeSearchPage, **job):
+  runner = CrawlRunner(query="", workers=1, session_factory=Session,
+                       scraper_factory=lambda **kwargs: browser_scraper(page))
+  result, = runner.run([CrawlJob(dork=DORK, search_url=SEARCH_URL, **job)])
+  session = Session()
+  checkpoint = db_controller.get_crawl_checkpoint(session, DORK)
+  session.close()
+  return result, checkpoint
+
+
+def test_a_captcha_mid_crawl_keeps_the_checkpoint_on_the_last_result_page(Session):
+  page = FakeSearchPage(pages=3, block_at=3)
+  result, checkpoint = crawl(Session, page, pages=3)
+  # page 2 led to the /sorry/ page: neither it nor the challenge page is recorded
+  assert (result.status, result.pages) == ("blocked", 1)
+  assert (checkpoint.status, checkpoint.last_page) == ("blocked", 1)
+  assert checkpoint.next_page_url == f"{SEARCH_URL}/search?q=compose&start=10"
+
+  page.block_at = None
+  result, checkpoint = crawl(Session, page, pages=3)
+  assert page.gotos[-1][0] == f"{SEARCH_URL}/search?q=compose&start=10"
+  assert (result.status, result.pages) == ("finished", 2)
+  assert (checkpoint.status, checkpoint.last_page, checkpoint.next_page_url) == ("finished", 3, None)
+
+
+def test_the_job_timeout_reaches_every_navigation_and_query(Session):
+  page = FakeSearchPage(pages=3, block_at=3)
+  crawl(Session, page, pages=3, timeout=12345)
+  page.block_at = None
+  crawl(Session, page, pages=3, timeout=12345)
+  # the fresh search (home page, search form, result pages) and the resumed one
+  assert [url for url, _ in page.gotos] == [SEARCH_URL, f"{SEARCH_URL}/search?q=compose&start=10"]
+  assert all(kwargs.get("timeout") == 12345 for _, kwargs in page.gotos)
+  assert len(page.queries) == 8 and all(kwargs.get("timeout") == 12345 for kwargs in page.queries)
+
+
+class RecordingPacer(NoPacer):
+  def __init__(self):
+    self.observed = []
+
+  def observe(self, url, **kwargs):
+    self.observed.append((url, kwargs))
+
+
+@pytest.mark.parametrize("url, content, data, captcha", [
+  # a result page quoting a challenge page is no challenge page once its results were extracted
+  ("https://github.com/search?q=abuse", f"<div class='g'>{ABUSE}</div>", {"search_results": [{"title": ABUSE}]}, False),
+  # without results, its host's challenge markers count
+  ("https://github.com/search?q=abuse", ABUSE, {"search_results": []}, True),
+  ("https://example.com/search?q=abuse", ABUSE, {"search_results": []}, False),
+  ("https://www.google.de/search?q=x", SORRY_FORM, None, True),
+])
+def test_a_result_page_is_checked_for_a_challenge_once_its_results_are_known(url, content, data, captcha):
+  scraper = browser_scraper(FakeSearchPage())
+  scraper.pacer = pacer = RecordingPacer()
+  assert scraper._check_result_page(SimpleNamespace(url=url, content=lambda: content), data) is captcha
+  assert pacer.observed == ([(url, dict(captcha=True))] if captcha else [])
+
+
+def test_a_challenge_url_is_a_challenge_whatever_the_page_gave():
+  scraper = browser_scraper(FakeSearchPage())
+  scraper.pacer = pacer = RecordingPacer()
+  page = SimpleNamespace(url="https://www.google.com/sorry/index", content=lambda: "<p>results</p>")
+  assert scraper._check_result_page(page, {"search_results": [{"title": "acme/shop"}]})
+  # reported by the navigation that landed there already
+  assert pacer.observed == []
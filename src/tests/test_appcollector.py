@@ -0,0 +1,32 @@
+import pytest
+
+import appcollector
+
+
+def test_run_takes_a_limit_per_stage():
+  args = appcollector.build_parser().parse_args(["run", "--compose-limit", "10", "--enrich-limit", "20"])
+  assert (args.compose_limit, args.enrich_limit) == (10, 20)
+  with pytest.raises(SystemExit):
+    appcollector.build_parser().parse_args(["run", "--limit", "10"])
+
+
+def test_the_single_stage_commands_keep_limit():
+  assert appcollector.build_parser().parse_args(["compose", "--limit", "10"]).compose_limit == 10
+  assert appcollector.build_parser().parse_args(["enrich", "--limit", "20"]).enrich_limit == 20
+
+
+@pytest.mark.parametrize("token, argv, enriched", [
+  (None, ["run"], False),
+  (None, ["run", "--backend", "rest"], True),
+  ("ghp_test", ["run"], True),
+])
+def test_run_skips_enrich_without_a_token(monkeypatch, token, argv, enriched):
+  called = []
+  for stage in ("crawl", "compose", "enrich"):
+    monkeypatch.setattr(appcollector, stage, lambda args, stage=stage: called.append(stage))
+  if token:
+    monkeypatch.setenv("GITHUB_TOKEN", token)
+  else:
+    monkeypatch.delenv("GITHUB_TOKEN", raising=False)
+  appcollector.run(appcollector.build_parser().parse_args(argv))
+  assert called == ["crawl", "compose"] + (["enrich"] if enriched else [])
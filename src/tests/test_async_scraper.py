@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from scraper.async_agentql_scraper import AsyncAgentQLPlaywrightScraper, AsyncScrapeScheduler
+from scraper.pacing import NoPacer
+
+
+class FakeContext:
+  def __init__(self):
+    self.closed = False
+
+  async def close(self):
+    self.closed = True
+
+
+class FakePlaywright:
+  async def stop(self):
+    pass
+
+
+class LaunchCountingScraper(AsyncAgentQLPlaywrightScraper):
+  """The scraper without a browser: _launch() takes a while and counts its calls"""
+  def __init__(self, **kwargs):
+    super().__init__(api_key="test", pacer=NoPacer(), **kwargs)
+    self.launches = 0
+
+  async def _launch(self) -> tuple:
+    self.launches += 1
+    await asyncio.sleep(0.01)
+    return FakePlaywright(), FakeContext()
+
+
+@pytest.fixture(autouse=True)
+def environment(monkeypatch):
+  monkeypatch.setenv("AGENTQL_API_KEY", "test")
+  monkeypatch.setenv("SCRAPER_RESOURCE_POLICY", "off")
+  monkeypatch.delenv("SCRAPER_ARCHIVE_PATH", raising=False)
+
+
+def test_concurrent_first_calls_launch_one_browser():
+  async def main():
+    scraper = LaunchCountingScraper()
+    started = await asyncio.gather(*(scraper.start() for _ in range(5)))
+    context = scraper.context
+    await scraper.close()
+    return scraper, started, context
+
+  scraper, started, context = asyncio.run(main())
+  assert scraper.launches == 1
+  assert all(result is scraper for result in started)
+  assert context.closed and scraper.context is None
+
+
+def test_a_closed_scraper_launches_again():
+  async def main():
+    scraper = LaunchCountingScraper()
+    async with scraper:
+      pass
+    await scraper.start()
+    await scraper.close()
+    return scraper.launches
+
+  assert asyncio.run(main()) == 2
+
+
+class SleepingScraper:
+  """Stands in for the scraper in the scheduler: query() sleeps and tracks the calls in flight"""
+  def __init__(self):
+    self.in_flight = 0
+    self.most_in_flight = 0
+
+  async def query(self, url: str, delay: float):
+    self.in_flight += 1
+    self.most_in_flight = max(self.most_in_flight, self.in_flight)
+    await asyncio.sleep(delay)
+    self.in_flight -= 1
+    if url == "fail":
+      raise RuntimeError(url)
+    return url
+
+
+def test_the_scheduler_bounds_the_calls_in_flight_and_keeps_the_job_order():
+  scraper = SleepingScraper()
+  jobs = [dict(url=str(i), delay=0.01 * (10 - i)) for i in range(10)]
+  results = asyncio.run(AsyncScrapeScheduler(scraper, max_concurrency=3).map("query", jobs))
+  assert results == [str(i) for i in range(10)]
+  assert scraper.most_in_flight == 3
+
+
+def test_the_scheduler_returns_exceptions_in_place():
+  jobs = [dict(url="a", delay=0), dict(url="fail", delay=0)]
+  results = asyncio.run(AsyncScrapeScheduler(SleepingScraper(), max_concurrency=2).map("query", jobs,
+                                                                                         return_exceptions=True))
+  assert results[0] == "a" and isinstance(results[1], RuntimeError)
+  with pytest.raises(ValueError):
+    AsyncScrapeScheduler(SleepingScraper(), max_concurrency=0)
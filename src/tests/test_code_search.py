@@ -0,0 +1,76 @@
+import pytest
+
+import database.db_controller as db_controller
+from benchmarks.github_api_server import GitHubApiMock
+from libs.github_api import GitHubApiClient, RateLimiter, RateLimitExceeded
+from pipeline.crawl_jobs import CrawlJob, CrawlRunner
+from scraper.code_search import CodeSearchDiscovery, dork_to_code_search
+
+
+@pytest.mark.parametrize("dork, code_search", [
+  ("site:github.com inurl:docker-compose.yml", "filename:docker-compose.yml"),
+  ('site:github.com inurl:deploy/compose.yaml "traefik"', 'filename:compose.yaml path:deploy "traefik"'),
+  ("site:github.com inurl:compose.yml -inurl:docker-compose.yml", "filename:compose.yml -filename:docker-compose.yml"),
+  ("site:github.com/DevOps inurl:docker-compose.yml after:2020-01-01 before:2021-01-01", "user:devops filename:docker-compose.yml"),
+  ("filename:docker-compose.yml language:YAML", "filename:docker-compose.yml language:YAML"),
+])
+def test_dork_to_code_search(dork, code_search):
+  assert dork_to_code_search(dork) == code_search
+
+
+def big_query() -> str:
+  """A dork whose code search has more than 1000 results on the mock"""
+  return next(f"site:github.com inurl:docker-compose.yml \"w{i}\"" for i in range(1000)
+              if GitHubApiMock.search_total(dork_to_code_search(f"site:github.com inurl:docker-compose.yml \"w{i}\"")) > 1000)
+
+
+def search(mock, dork, workers=1, num_pages=20, start_page=1, max_wait=60.0, raise_errors=True) -> list:
+  client = GitHubApiClient(token="test", api_url=mock.url, rate_limiter=RateLimiter(max_wait=max_wait))
+  backend = CodeSearchDiscovery(client=client, max_workers=workers)
+  try:
+    return list(backend.iter_search_query(url=None, search_string=dork, query="", num_pages=num_pages,
+                                          start_page=start_page, raise_errors=raise_errors))
+  finally:
+    backend.close()
+
+
+def test_pages_stop_at_the_1000_result_cap():
+  dork = big_query()
+  with GitHubApiMock(search_rate_limit=1000) as mock:
+    pages = search(mock, dork)
+  assert [page.page_number for page in pages] == list(range(1, 11))
+  assert sum(len(page.data["search_results"]) for page in pages) == 1000
+  assert pages[-1].next_url is None and pages[0].next_url == pages[1].url
+
+
+def test_concurrent_pages_are_yielded_in_order_and_resume_at_start_page():
+  dork = big_query()
+  with GitHubApiMock(search_rate_limit=1000, delay=0.02) as mock:
+    sequential = search(mock, dork, workers=1, num_pages=8)
+    concurrent = search(mock, dork, workers=4, num_pages=8)
+    resumed = search(mock, dork, workers=4, num_pages=8, start_page=5)
+  assert concurrent == sequential
+  assert [page.page_number for page in concurrent] == list(range(1, 9))
+  assert resumed == sequential[4:]
+
+
+def test_a_used_up_search_budget_is_raised_not_taken_for_the_end_of_the_search():
+  dork = big_query()
+  with GitHubApiMock(search_rate_limit=2, search_window=3600) as mock:
+    with pytest.raises(RateLimitExceeded):
+      search(mock, dork, workers=1, max_wait=1, raise_errors=False)
+
+
+def test_a_rate_limited_crawl_job_is_resumed_later(Session):
+  dork = big_query()
+  with GitHubApiMock(search_rate_limit=3, search_window=3600) as mock:
+    client = GitHubApiClient(token="test", api_url=mock.url, rate_limiter=RateLimiter(max_wait=1))
+    backend = CodeSearchDiscovery(client=client, max_workers=1)
+    runner = CrawlRunner(query="", workers=1, session_factory=Session, scraper_factory=lambda **kwargs: backend.for_job())
+    result, = runner.run([CrawlJob(dork=dork, pages=10)])
+    backend.close()
+  assert (result.status, result.pages) == ("rate_limited", 3)
+  session = Session()
+  checkpoint = db_controller.get_crawl_checkpoint(session, dork)
+  assert (checkpoint.status, checkpoint.last_page) == ("rate_limited", 3)
+  session.close()
@@ -0,0 +1,194 @@
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+import database.db_controller as db_controller
+from database.models import ComposeFile, GitHubRepository
+import pipeline.compose_stage as compose_stage
+from pipeline.compose_stage import ComposeParseCache, ComposeStage, DirectoryComposeFetcher, parse_compose
+
+
+def test_version_3_file():
+  summary = parse_compose("""
+version: "3.8"
+services:
+  web:
+    image: nginx:1.25
+    deploy:
+      replicas: 3
+  db:
+    image: postgres:16
+""")
+  assert summary.num_containers == 4
+  assert summary.images == ["nginx:1.25", "postgres:16"]
+
+
+def test_version_1_file_has_the_services_at_the_top_level():
+  summary = parse_compose("""
+web:
+  image: nginx
+redis:
+  image: redis
+""")
+  assert summary.num_containers == 2
+  assert summary.images == ["nginx", "redis"]
+
+
+@pytest.mark.parametrize("content", [
+  "volumes:\n  data: {}\nnetworks:\n  default: {}\n",
+  "name: myapp\n",
+  "include:\n  - other.yml\n",
+  "x-common:\n  image: nginx\n",
+  "version: '3'\n",
+])
+def test_top_level_keys_of_newer_formats_are_not_services(content):
+  with pytest.raises(ValueError, match="no services defined"):
+    parse_compose(content)
+
+
+def test_replicas_zero_runs_no_container():
+  summary = parse_compose("""
+services:
+  worker:
+    image: busybox
+    deploy:
+      replicas: 0
+  web:
+    image: nginx
+    deploy:
+      replicas: ${WEB_REPLICAS}
+""")
+  assert summary.num_containers == 1
+
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "compose")
+FILES = ["https://github.com/acme/shop/blob/main/docker-compose.yml",
+         "https://github.com/acme/shop/blob/main/deploy/compose.yaml",
+         "https://github.com/acme/blog/blob/master/docker-compose.yml",
+         "https://github.com/acme/blog/blob/master/broken.yml",
+         "https://github.com/acme/blog/blob/master/missing.yml"]
+
+
+def test_directory_fetcher_serves_files_laid_out_like_raw_urls():
+  fetcher = DirectoryComposeFetcher(FIXTURES)
+  assert "postgres:16" in fetcher.fetch("https://github.com/acme/shop/blob/main/docker-compose.yml")
+  assert "redis:7" in fetcher.fetch("https://raw.githubusercontent.com/acme/shop/main/deploy/compose.yaml")
+  with pytest.raises(FileNotFoundError):
+    fetcher.fetch("https://github.com/acme/shop/blob/main/missing.yml")
+
+
+def test_directory_fetcher_stays_inside_its_root():
+  with pytest.raises(ValueError, match="outside"):
+    DirectoryComposeFetcher(FIXTURES).fetch("https://github.com/acme/../../../../etc/blob/x/passwd")
+
+
+def seed(Session):
+  session = Session()
+  db_controller.bulk_upsert_github_repositories(session, [
+    dict(url="https://github.com/acme/shop", developer="acme", name="shop"),
+    dict(url="https://github.com/acme/blog", developer="acme", name="blog"),
+  ])
+  db_controller.bulk_add_compose_files(session, [
+    dict(repository_url=url.split("/blob/")[0], branch=url.split("/")[6], path="/".join(url.split("/")[7:]), url=url)
+    for url in FILES])
+  session.commit()
+  session.close()
+
+
+def test_stage_fills_the_repository_totals(Session, tmp_path, monkeypatch):
+  seed(Session)
+  monkeypatch.setattr(db_controller, "get_session", Session)
+  stage = ComposeStage(fetcher=DirectoryComposeFetcher(FIXTURES),
+                       cache=ComposeParseCache(str(tmp_path / "cache.sqlite")),
+                       max_workers=2, write_every=2)
+  stats = stage.run()
+  stage.cache.close()
+  assert (stats["files"], stats["fetched"], stats["parsed"], stats["failed"]) == (5, 4, 3, 2)
+  assert stats["repositories"] == 2
+
+  session = Session()
+  repositories = {r.name: r for r in session.query(GitHubRepository)}
+  assert repositories["shop"].num_containers == 4
+  assert repositories["shop"].docker_images_used == ["nginx:1.25", "postgres:16", "redis:7"]
+  assert repositories["blog"].num_containers == 2
+  # the file that could not be fetched is not tried again before its backoff ran out
+  failed, = session.query(ComposeFile).filter(ComposeFile.fetch_error.isnot(None))
+  assert (failed.url, failed.fetch_attempts, failed.fetched_at) == (FILES[4], 1, None)
+  assert db_controller.get_compose_files_to_fetch(session) == []
+  assert [f.url for f in db_controller.get_compose_files_to_fetch(session, now=failed.retry_after)] == [FILES[4]]
+  session.close()
+
+
+def test_stage_commits_every_write_every_files(Session, tmp_path, monkeypatch):
+  seed(Session)
+  monkeypatch.setattr(db_controller, "get_session", Session)
+  stage = ComposeStage(fetcher=DirectoryComposeFetcher(FIXTURES),
+                       cache=ComposeParseCache(str(tmp_path / "cache.sqlite")),
+                       max_workers=1, write_every=2)
+  written = []
+  original = db_controller.bulk_update_compose_files
+  monkeypatch.setattr(db_controller, "bulk_update_compose_files",
+                      lambda session, updates: (written.append(len(updates)), original(session, updates)))
+  stage.run()
+  stage.cache.close()
+  # the failed fetch is written too
+  assert written == [2, 2, 1]
+
+
+class DeadFetcher:
+  def fetch(self, url: str) -> str:
+    raise FileNotFoundError(f"404 {url}")
+
+
+def test_failed_files_back_off_and_come_after_the_others(Session, tmp_path, monkeypatch):
+  seed(Session)
+  now = [datetime(2026, 1, 1)]
+  monkeypatch.setattr(db_controller, "get_session", Session)
+  monkeypatch.setattr(db_controller, "get_current_utc_time", lambda: now[0])
+  monkeypatch.setattr(compose_stage, "get_current_utc_time", lambda: now[0])
+  stage = ComposeStage(fetcher=DeadFetcher(), cache=ComposeParseCache(str(tmp_path / "cache.sqlite")),
+                       max_workers=1, retry_backoff=timedelta(hours=1), max_retry_backoff=timedelta(hours=3))
+  stage.run(limit=2)
+  # the dead files do not come back at the head of the next run
+  stage.run(limit=2)
+  session = Session()
+  assert [row.fetch_attempts for row in session.query(ComposeFile).order_by(ComposeFile.id)] == [1, 1, 1, 1, None]
+  session.close()
+  for hours, attempts in ((1, 2), (2, 3), (4, 4), (3, 5)):
+    now[0] += timedelta(hours=hours)
+    stage.run()
+    session = Session()
+    rows = session.query(ComposeFile).order_by(ComposeFile.id).all()
+    assert [row.fetch_attempts for row in rows[:4]] == [attempts] * 4
+    assert rows[0].retry_after == now[0] + min(timedelta(hours=2 ** (attempts - 1)), timedelta(hours=3))
+    session.close()
+
+  # a new file is fetched before the failed ones
+  session = Session()
+  db_controller.bulk_add_compose_files(session, [dict(repository_url="https://github.com/acme/shop", branch="main",
+                                                      path="new/compose.yaml",
+                                                      url="https://github.com/acme/shop/blob/main/new/compose.yaml")])
+  session.commit()
+  pending = db_controller.get_compose_files_to_fetch(session, limit=2, now=now[0] + timedelta(days=1))
+  assert [f.path for f in pending][0] == "new/compose.yaml"
+  session.close()
+  stage.close()
+  stage.cache.close()
+
+
+def test_close_closes_what_the_stage_created(tmp_path, monkeypatch):
+  closed = []
+  monkeypatch.setattr(compose_stage.HttpComposeFetcher, "close", lambda self: closed.append("fetcher"))
+  monkeypatch.setattr(compose_stage, "ComposeParseCache", lambda: ComposeParseCache(str(tmp_path / "cache.sqlite")))
+  stage = ComposeStage()
+  stage.close()
+  assert closed == ["fetcher"]
+  with pytest.raises(sqlite3.ProgrammingError):
+    stage.cache.get("0" * 64)
+
+  cache = ComposeParseCache(str(tmp_path / "given.sqlite"))
+  ComposeStage(fetcher=DeadFetcher(), cache=cache).close()
+  assert cache.get("0" * 64) is None
+  cache.close()
@@ -0,0 +1,59 @@
+import pytest
+
+from pipeline.crawl_jobs import CrawlJob, CrawlRunner, load_crawl_jobs
+from scraper.discovery import ScrapedPage
+
+
+class FakeSearch:
+  """Two result pages per dork; dorks containing 'broken' fail on page 2, 'interrupt' raises KeyboardInterrupt"""
+  def __init__(self, **kwargs):
+    pass
+
+  def iter_search_query(self, url, search_string, query, num_pages, start_page=1, **kwargs):
+    for page_number in range(start_page, min(num_pages, 2) + 1):
+      if page_number == 2 and "broken" in search_string:
+        raise RuntimeError("captcha")
+      if "interrupt" in search_string:
+        raise KeyboardInterrupt
+      word = search_string.split()[-1]
+      results = [dict(title=word, about=None, url=f"https://github.com/{word}/app{page_number}-{i}/blob/main/docker-compose.yml")
+                 for i in range(3)]
+      yield ScrapedPage(page_number=page_number, url=f"fake://{word}/{page_number}",
+                        data={"search_results": results},
+                        next_url=f"fake://{word}/{page_number + 1}" if page_number < 2 else None)
+
+  def close(self):
+    pass
+
+
+def runner(Session, workers=2) -> CrawlRunner:
+  return CrawlRunner(query="", workers=workers, session_factory=Session, scraper_factory=FakeSearch)
+
+
+def test_jobs_run_on_the_pool_and_a_failed_job_does_not_stop_the_others(Session):
+  crawl = runner(Session)
+  results = crawl.run([CrawlJob(dork="inurl:docker-compose.yml alpha"),
+                       CrawlJob(dork="inurl:docker-compose.yml broken"),
+                       CrawlJob(dork="inurl:docker-compose.yml gamma", headless=True)])
+  assert [(result.status, result.pages, result.new) for result in results] == \
+    [("finished", 2, 6), ("failed", 1, 3), ("finished", 2, 6)]
+  assert results[1].error == "captcha"
+  assert crawl.new_repositories == 15
+  # the failed job's checkpoint lets the next run continue on page 2
+  again = crawl.run_job(CrawlJob(dork="inurl:docker-compose.yml broken"))
+  assert (again.status, again.pages) == ("failed", 0)
+  crawl.close()
+
+
+def test_keyboard_interrupt_is_not_swallowed(Session):
+  with pytest.raises(KeyboardInterrupt):
+    runner(Session, workers=1).run([CrawlJob(dork="inurl:docker-compose.yml interrupt"),
+                                    CrawlJob(dork="inurl:docker-compose.yml alpha")])
+
+
+def test_load_crawl_jobs_applies_defaults_and_overrides(tmp_path):
+  path = tmp_path / "dorks.yml"
+  path.write_text("- site:github.com inurl:docker-compose.yml\n- dork: inurl:compose.yaml\n  pages: 20\n")
+  jobs = load_crawl_jobs(str(path), defaults=dict(pages=5, headless=True, timeout=None))
+  assert [(job.dork, job.pages, job.headless, job.timeout) for job in jobs] == \
+    [("site:github.com inurl:docker-compose.yml", 5, True, 60000), ("inurl:compose.yaml", 20, True, 60000)]
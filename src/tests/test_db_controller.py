@@ -0,0 +1,106 @@
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.schema import CreateTable
+
+import database.db_controller as db_controller
+from database.models import ComposeFile, GitHubRepository
+from libs.github_url import GitHubUrlDeduplicator
+
+SHA = "3f2c1e0d9b8a7f6e5d4c3b2a1f0e9d8c7b6a5f4e"
+
+
+def compose_file(branch: str, path: str = "docker-compose.yml") -> dict:
+  return dict(repository_url="https://github.com/acme/shop", branch=branch, path=path,
+              url=f"https://github.com/acme/shop/blob/{branch}/{path}")
+
+
+def test_a_path_is_one_file_whatever_branch_it_was_found_on(Session):
+  session = Session()
+  db_controller.bulk_upsert_github_repositories(session, [dict(url="https://github.com/acme/shop", developer="acme", name="shop")])
+  db_controller.bulk_add_compose_files(session, [compose_file(SHA), compose_file("master")])
+  db_controller.bulk_add_compose_files(session, [compose_file("main"), compose_file(SHA, "deploy/compose.yaml")])
+  files = {f.path: f.branch for f in session.query(ComposeFile)}
+  # the named branch wins over the commit SHA, the first named branch stays
+  assert files == {"docker-compose.yml": "master", "deploy/compose.yaml": SHA}
+  session.close()
+
+
+def test_a_file_found_on_a_named_branch_later_is_fetched_again(Session):
+  session = Session()
+  db_controller.bulk_upsert_github_repositories(session, [dict(url="https://github.com/acme/shop", developer="acme", name="shop")])
+  db_controller.bulk_add_compose_files(session, [compose_file(SHA)])
+  file = session.query(ComposeFile).one()
+  db_controller.bulk_update_compose_files(session, [dict(id=file.id, content_hash="x", num_containers=3, fetched_at=datetime.now())])
+  db_controller.bulk_add_compose_files(session, [compose_file("main")])
+  session.expire_all()
+  file = session.query(ComposeFile).one()
+  assert (file.branch, file.url, file.fetched_at) == ("main", "https://github.com/acme/shop/blob/main/docker-compose.yml", None)
+  session.close()
+
+
+def test_files_written_before_the_pinned_column_are_marked_by_the_upgrade(Session):
+  session = Session()
+  db_controller.bulk_upsert_github_repositories(session, [dict(url="https://github.com/acme/shop", developer="acme", name="shop")])
+  db_controller.bulk_add_compose_files(session, [compose_file(SHA), compose_file("master", "deploy/compose.yaml")])
+  session.execute(text("ALTER TABLE compose_files DROP COLUMN pinned"))
+  session.commit()
+
+  assert "compose_files.pinned" in db_controller.upgrade_db(session.get_bind())
+  assert {f.path: f.pinned for f in session.query(ComposeFile)} == {"docker-compose.yml": True, "deploy/compose.yaml": False}
+  db_controller.bulk_add_compose_files(session, [compose_file("main"), compose_file("main", "deploy/compose.yaml")])
+  session.expire_all()
+  assert {f.path: (f.branch, f.pinned) for f in session.query(ComposeFile)} == \
+    {"docker-compose.yml": ("main", False), "deploy/compose.yaml": ("master", False)}
+  session.close()
+
+
+def legacy_compose_files(session) -> None:
+  """compose_files as created before files were keyed by path"""
+  ddl = str(CreateTable(ComposeFile.__table__).compile(session.get_bind()))
+  session.execute(text("DROP TABLE compose_files"))
+  session.execute(text(ddl.replace("uq_compose_files_repository_path UNIQUE (repository_id, path)",
+                                   "uq_compose_files_repository_branch_path UNIQUE (repository_id, branch, path)")))
+
+
+def test_stats_count_a_path_once(Session):
+  session = Session()
+  legacy_compose_files(session)
+  db_controller.bulk_upsert_github_repositories(session, [dict(url="https://github.com/acme/shop", developer="acme", name="shop")])
+  repository_id = session.query(GitHubRepository.id).scalar()
+  # rows a database keyed by branch may still hold
+  session.add_all([ComposeFile(repository_id=repository_id, branch=branch, path="docker-compose.yml", url=branch,
+                               content_hash=branch, num_containers=containers, docker_images=[f"app:{branch}"],
+                               fetched_at=datetime(2026, 1, day))
+                   for branch, containers, day in ((SHA, 5, 3), ("master", 2, 1), ("main", 3, 2))])
+  session.flush()
+  assert db_controller.refresh_repository_compose_stats(session, [repository_id]) == 1
+  repository = session.get(GitHubRepository, repository_id)
+  assert (repository.num_containers, repository.docker_images_used) == (3, ["app:main"])
+  session.close()
+
+
+def test_dedupe_passes_a_file_on_once_more_when_it_leaves_a_commit_sha():
+  deduplicator = GitHubUrlDeduplicator()
+  _, files = deduplicator.dedupe([{"url": f"https://github.com/acme/shop/blob/{SHA}/docker-compose.yml"},
+                                  {"url": "https://github.com/acme/shop/blob/main/docker-compose.yml"},
+                                  {"url": "https://github.com/acme/shop/blob/master/docker-compose.yml"}])
+  assert [f.branch for f in files] == [SHA, "main"]
+
+
+def test_upsert_merges_rows_by_url_and_sends_them_sorted(Session, monkeypatch):
+  session = Session()
+  statements = []
+  original = db_controller._upsert_chunk
+  monkeypatch.setattr(db_controller, "_upsert_chunk",
+                      lambda session, rows: (statements.append([row["url"] for row in rows]), original(session, rows)))
+  written = db_controller.bulk_upsert_github_repositories(session, [
+    dict(url="https://github.com/b/b", developer="b", name="b", about="first"),
+    dict(url="https://github.com/a/a", developer="a", name="a"),
+    dict(url="https://github.com/b/b", developer="b", name="b", about=None, num_stars=3),
+  ])
+  assert written == 2
+  assert statements == [["https://github.com/a/a", "https://github.com/b/b"]]
+  repository = session.query(GitHubRepository).filter_by(url="https://github.com/b/b").one()
+  assert (repository.about, repository.num_stars) == ("first", 3)
+  session.close()
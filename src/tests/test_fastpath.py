@@ -0,0 +1,127 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import scraper.fastpath as fastpath
+from benchmarks.serp_server import SerpServer
+from scraper.fastpath import FastPathExtractor
+from scraper.extractors import LocalExtractor, parse_html
+
+QUERY = "{ search_results[] { title about url } }"
+PAGE = parse_html("<html><body><p>Nothing the learner can anchor on</p></body></html>")
+DATA = {"search_results": [{"title": "acme/shop", "about": "A shop", "url": "https://github.com/acme/shop"}]}
+
+
+def test_a_host_is_backed_off_after_failed_learning_until_the_backoff_ran_out(monkeypatch):
+  now = [1000.0]
+  monkeypatch.setattr(fastpath.time, "monotonic", lambda: now[0])
+  extractor = FastPathExtractor(fallback=object(), seed_rules={}, learn_attempts=2, learn_backoff=60)
+  learned = []
+  monkeypatch.setattr(fastpath.SelectorLearner, "learn", lambda self, fields, expected: learned.append(1))
+
+  for _ in range(4):
+    assert not extractor.learn("https://example.com/search?q=a", PAGE, QUERY, DATA)
+  assert (len(learned), extractor.stats()["learn_skipped"]) == (2, 2)
+  # other hosts are learned from meanwhile
+  assert not extractor.learn("https://example.org/search?q=a", PAGE, QUERY, DATA)
+  assert len(learned) == 3
+
+  now[0] += 61
+  assert not extractor.learn("https://example.com/search?q=a", PAGE, QUERY, DATA)
+  assert len(learned) == 4
+
+
+class FakeAgentQL:
+  """A fallback extractor whose pages answer like AgentQL would, from the page's result markup"""
+  def __init__(self, answer=None):
+    self.answer = answer or (lambda data: data)
+    self.queries = []
+
+  def wrap(self, page):
+    return SimpleNamespace(query_data=lambda query, **kwargs: self._query_data(page, query))
+
+  def _query_data(self, page, query: str):
+    self.queries.append(page.url)
+    return self.answer(LocalExtractor().extract(page.content(), query, base_url=page.url))
+
+
+@pytest.fixture
+def serp():
+  with SerpServer(num_pages=3, filler_kb=0) as server:
+    yield server
+
+
+def result_page(server: SerpServer, page_number: int):
+  html = server.result_page("acme", page_number)
+  return SimpleNamespace(url=server.search_url("acme", page_number), content=lambda: html)
+
+
+def query_data(extractor: FastPathExtractor, page) -> dict:
+  return extractor.wrap(page).query_data(QUERY)
+
+
+def test_selectors_are_learned_from_an_agentql_answer_and_skip_agentql_on_later_pages(serp):
+  agentql = FakeAgentQL()
+  extractor = FastPathExtractor(fallback=agentql, verify_every=0)
+
+  first = query_data(extractor, result_page(serp, 1))
+  # no seed rules for the local host: the selectors are learned from the answer
+  assert extractor.rules_for(serp.search_url("acme", 1), QUERY) is not None
+  assert extractor.rule_sets[extractor._key(serp.url, QUERY)]["source"] == "learned"
+  assert len(first["search_results"]) == serp.results_per_page
+
+  second_page = result_page(serp, 2)
+  second = query_data(extractor, second_page)
+  assert agentql.queries == [serp.search_url("acme", 1)]
+  assert second == LocalExtractor().extract(second_page.content(), QUERY, base_url=second_page.url)
+  assert [item["url"] for item in second["search_results"]] == serp.result_urls("acme", 2)
+  assert {key: extractor.stats()[key] for key in ("hits", "fallbacks", "learned")} == dict(hits=1, fallbacks=1, learned=1)
+
+
+def test_a_verified_page_that_no_longer_matches_agentql_relearns_the_selectors(serp):
+  swapped = [False]
+
+  def answer(data):
+    if swapped[0]:
+      for item in data["search_results"]:
+        item["title"], item["about"] = item["about"], item["title"]
+    return data
+
+  agentql = FakeAgentQL(answer)
+  extractor = FastPathExtractor(fallback=agentql, verify_every=1)
+  query_data(extractor, result_page(serp, 1))
+  old_rules = extractor.rules_for(serp.url, QUERY)
+
+  swapped[0] = True
+  page = result_page(serp, 2)
+  data = query_data(extractor, page)
+  # the verified page gives AgentQL's answer, and the rules are relearned from it
+  assert len(agentql.queries) == 2
+  assert data == answer(LocalExtractor().extract(page.content(), QUERY, base_url=page.url))
+  assert extractor.stats()["mismatches"] == 1
+  new_rules = extractor.rules_for(serp.url, QUERY)
+  assert new_rules is not None and new_rules != old_rules
+
+  # the relearned rules reproduce the new answer on the next verified page
+  page = result_page(serp, 3)
+  assert query_data(extractor, page) == answer(LocalExtractor().extract(page.content(), QUERY, base_url=page.url))
+  assert (len(agentql.queries), extractor.stats()["mismatches"]) == (3, 1)
+
+
+def test_learned_selectors_are_persisted_and_used_by_the_next_run(serp, tmp_path):
+  cache_path = str(tmp_path / "selectors.json")
+  query_data(FastPathExtractor(fallback=FakeAgentQL(), cache_path=cache_path, verify_every=0), result_page(serp, 1))
+  with open(cache_path, encoding="utf-8") as f:
+    saved = json.load(f)
+  assert [entry["host"] for entry in saved.values()] == ["127.0.0.1"]
+
+  agentql = FakeAgentQL()
+  extractor = FastPathExtractor(fallback=agentql, cache_path=cache_path, verify_every=0)
+  data = query_data(extractor, result_page(serp, 2))
+  assert agentql.queries == []
+  assert [item["url"] for item in data["search_results"]] == serp.result_urls("acme", 2)
+
+  extractor.forget(serp.url, QUERY)
+  with open(cache_path, encoding="utf-8") as f:
+    assert json.load(f) == {}
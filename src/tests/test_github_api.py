@@ -0,0 +1,80 @@
+from datetime import timedelta
+
+import pytest
+
+import database.db_controller as db_controller
+from benchmarks.github_api_server import GitHubApiMock
+from database.models import GitHubRepository
+from libs.github_api import ETagCache, GitHubApiClient, RateLimiter, RateLimitExceeded
+from libs.misc import get_current_utc_time
+from pipeline.enrichment_stage import EnrichmentStage, GraphQLMetadataFetcher
+
+
+def repository_names(exists: bool, count: int = 1) -> list:
+  """Names of acme's repositories that the mock answers as existing (or not)"""
+  names = (f"app{i}" for i in range(10000) if (GitHubApiMock.repository("acme", f"app{i}") is not None) == exists)
+  return [next(names) for _ in range(count)]
+
+
+def test_a_304_is_served_from_the_etag_cache_and_costs_no_budget(tmp_path):
+  name, = repository_names(exists=True)
+  with GitHubApiMock(rate_limit=100) as mock:
+    client = GitHubApiClient(api_url=mock.url, etag_cache=ETagCache(str(tmp_path / "etags.sqlite")))
+    first = client.get(f"/repos/acme/{name}")
+    remaining = client.rate_limiter.budgets["core"].remaining
+    second = client.get(f"/repos/acme/{name}")
+    client.close()
+  assert (first.from_cache, second.from_cache) == (False, True)
+  assert second.data == first.data and second.status == 200
+  assert (client.requests, client.not_modified, mock.requests["not_modified"]) == (2, 1, 1)
+  assert client.rate_limiter.budgets["core"].remaining == remaining
+
+
+def test_the_client_waits_for_the_reset_of_a_used_up_budget():
+  with GitHubApiMock(rate_limit=2, window=1) as mock:
+    client = GitHubApiClient(api_url=mock.url, rate_limiter=RateLimiter(max_wait=5))
+    statuses = [client.get(f"/repos/acme/app{i}").status for i in range(3)]
+    client.close()
+  assert all(status in (200, 404) for status in statuses)
+  assert client.rate_limiter.waited > 0
+  assert mock.requests.get("rate_limited", 0) == 0
+
+
+def test_a_reset_further_away_than_max_wait_raises_rate_limit_exceeded():
+  with GitHubApiMock(rate_limit=1, window=3600) as mock:
+    client = GitHubApiClient(api_url=mock.url, rate_limiter=RateLimiter(max_wait=1))
+    client.get("/repos/acme/shop")
+    with pytest.raises(RateLimitExceeded) as raised:
+      client.get("/repos/acme/blog")
+    client.close()
+  assert raised.value.resource == "core" and raised.value.reset_in > 1
+
+
+def test_graphql_not_found_repositories_come_back_as_none():
+  name, = repository_names(exists=True)
+  gone, = repository_names(exists=False)
+  with GitHubApiMock() as mock:
+    client = GitHubApiClient(token="test", api_url=mock.url)
+    results = GraphQLMetadataFetcher(client).fetch([("acme", name), ("acme", gone)])
+    client.close()
+  assert results[1] is None
+  assert results[0].num_stars == GitHubApiMock.repository("acme", name)["stargazers_count"]
+  assert client.rate_limiter.budgets["graphql"].remaining is not None
+
+
+@pytest.mark.parametrize("backend", ["graphql", "rest"])
+def test_enrichment_writes_metadata_and_utc_fetch_times(Session, backend):
+  names = repository_names(exists=True, count=2) + repository_names(exists=False)
+  session = Session()
+  db_controller.bulk_upsert_github_repositories(session, [
+    dict(url=f"https://github.com/acme/{name}", developer="acme", name=name) for name in names])
+  session.commit()
+  with GitHubApiMock() as mock:
+    stage = EnrichmentStage(client=GitHubApiClient(token="test", api_url=mock.url), backend=backend)
+    stats = stage.run(session=session)
+    stage.client.close()
+  session.commit()
+  assert (stats["enriched"], stats["not_found"], stats["failed"]) == (2, 1, 0)
+  fetched = [repository.metadata_fetched_at for repository in session.query(GitHubRepository)]
+  assert all(abs(get_current_utc_time() - fetched_at) < timedelta(minutes=1) for fetched_at in fetched)
+  session.close()
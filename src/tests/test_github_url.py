@@ -0,0 +1,27 @@
+from libs.github_url import GitHubUrlDeduplicator, canonicalize_github_url
+
+
+def test_canonical_url_keeps_the_spelling_of_owner_and_name():
+  canonical = canonicalize_github_url("HTTPS://GitHub.com/DevOps/MyApp.git/blob/main/deploy/docker-compose.yml?utm_source=x")
+  assert canonical.project_url == "https://github.com/DevOps/MyApp"
+  assert canonical.key == ("devops", "myapp")
+  assert (canonical.branch, canonical.path) == ("main", "deploy/docker-compose.yml")
+
+
+def test_dedupe_ignores_case_and_keeps_the_first_spelling():
+  deduplicator = GitHubUrlDeduplicator()
+  repositories, files = deduplicator.dedupe([
+    {"url": "https://github.com/DevOps/MyApp/blob/main/docker-compose.yml"},
+    {"url": "https://github.com/devops/myapp/blob/main/docker-compose.yml"},
+    {"url": "https://raw.githubusercontent.com/devops/MYAPP/main/compose.yaml"},
+  ])
+  assert [canonical.project_url for canonical, _ in repositories] == ["https://github.com/DevOps/MyApp"]
+  # files of a later spelling belong to the repository row of the first one
+  assert [(canonical.project_url, canonical.path) for canonical in files] == [
+    ("https://github.com/DevOps/MyApp", "docker-compose.yml"), ("https://github.com/DevOps/MyApp", "compose.yaml")]
+  assert deduplicator.stats()["unique_repositories"] == 1
+
+
+def test_reserved_paths_and_other_hosts_are_not_repositories():
+  assert canonicalize_github_url("https://github.com/Topics/docker") is None
+  assert canonicalize_github_url("https://gitlab.com/a/b") is None
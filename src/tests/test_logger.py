@@ -0,0 +1,20 @@
+import logging
+
+from libs.logger import LogConfig
+
+
+def test_log_levels_are_read_by_name_or_number(monkeypatch):
+  monkeypatch.setenv("LOG_LEVEL", "warning")
+  monkeypatch.setenv("LOG_FILE_LEVEL", "5")
+  monkeypatch.delenv("LOG_CONSOLE_LEVEL", raising=False)
+  config = LogConfig()
+  assert (config.level, config.console_level, config.file_level) == (logging.WARNING, logging.WARNING, 5)
+
+
+def test_an_unknown_log_level_falls_back_to_info(monkeypatch, capsys):
+  monkeypatch.setenv("LOG_LEVEL", "verbose")
+  monkeypatch.delenv("LOG_CONSOLE_LEVEL", raising=False)
+  monkeypatch.delenv("LOG_FILE_LEVEL", raising=False)
+  config = LogConfig()
+  assert (config.level, config.console_level, config.file_level) == (logging.INFO,) * 3
+  assert "LOG_LEVEL='VERBOSE'" in capsys.readouterr().err
@@ -0,0 +1,13 @@
+import sys
+
+import pytest
+
+from libs.misc import convert_relative_date
+
+
+def test_a_missing_dateparser_is_raised_instead_of_giving_no_date(monkeypatch):
+  monkeypatch.setitem(sys.modules, "dateparser", None)
+  with pytest.raises(ImportError):
+    convert_relative_date("2 days ago")
+  # nothing to parse, nothing imported
+  assert convert_relative_date(None) is None
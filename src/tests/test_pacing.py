@@ -0,0 +1,21 @@
+import pytest
+
+from scraper.pacing import detect_captcha
+
+SORRY_FORM = '<form id="captcha-form" action="index" method="post"><div class="g-recaptcha"></div></form>'
+ABUSE = "<p>You have triggered an abuse detection mechanism. Please wait a few minutes before you try again.</p>"
+
+
+@pytest.mark.parametrize("url, content, captcha", [
+  ("https://www.google.com/sorry/index?continue=https://www.google.com/search", None, True),
+  ("https://www.google.de/search?q=x", SORRY_FORM, True),
+  ("https://github.com/search?q=x&type=code", ABUSE, True),
+  # a repository called captcha, reCAPTCHA and hCaptcha widgets on ordinary pages
+  ("https://github.com/acme/captcha/blob/main/docker-compose.yml", None, False),
+  ("https://example.com/signup", '<div class="g-recaptcha"></div><script src="https://hcaptcha.com/1/api.js">', False),
+  # the markers of one site do not count on another
+  ("https://example.com/blog", ABUSE, False),
+])
+def test_detect_captcha(url, content, captcha):
+  assert detect_captcha(url, content) is captcha
+
@@ -0,0 +1,101 @@
+import threading
+import time
+
+import pytest
+
+from scraper.scraper_pool import AgentQLScraperPool
+
+
+class FakeScraper:
+  instances = []
+
+  def __init__(self, headless=False, user_data_dir=None, **kwargs):
+    self.headless = headless
+    self.user_data_dir = user_data_dir
+    self.closed = False
+    FakeScraper.instances.append(self)
+
+  def query(self, url, delay=0.0):
+    time.sleep(delay)
+    if url == "fail":
+      raise RuntimeError("page crashed")
+    return (url, threading.current_thread().name)
+
+  def close(self):
+    self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def reset_instances():
+  FakeScraper.instances = []
+
+
+def test_map_keeps_the_job_order_across_workers():
+  with AgentQLScraperPool(num_contexts=3, scraper_factory=FakeScraper) as pool:
+    results = pool.map("query", [dict(url=str(i), delay=0.01 * (i % 3)) for i in range(12)])
+  assert [url for url, _ in results] == [str(i) for i in range(12)]
+  assert len({worker for _, worker in results}) > 1
+  assert all(scraper.closed for scraper in FakeScraper.instances)
+  assert sorted(scraper.user_data_dir for scraper in FakeScraper.instances) == \
+    ["/tmp/playwright-user-data-0", "/tmp/playwright-user-data-1", "/tmp/playwright-user-data-2"]
+
+
+def test_callables_get_the_scraper_and_the_worker_id():
+  with AgentQLScraperPool(num_contexts=1, scraper_factory=FakeScraper) as pool:
+    assert pool.submit(lambda scraper, worker_id, n: (scraper.user_data_dir, worker_id, n), n=5).result() == \
+      ("/tmp/playwright-user-data", 0, 5)
+
+
+def test_a_worker_replaces_its_scraper_for_another_headless_setting_and_after_a_failure():
+  with AgentQLScraperPool(num_contexts=1, scraper_factory=FakeScraper) as pool:
+    pool.submit("query", url="a").result()
+    pool.submit("query", url="a").result()
+    pool.submit("query", headless=True, url="b").result()
+    with pytest.raises(RuntimeError, match="page crashed"):
+      pool.submit("query", headless=True, url="fail").result()
+    pool.submit("query", headless=True, url="c").result()
+  assert [scraper.headless for scraper in FakeScraper.instances] == [False, True, True]
+  assert all(scraper.closed for scraper in FakeScraper.instances)
+
+
+def test_system_exit_of_the_scraper_reaches_the_caller():
+  def no_api_key(**kwargs):
+    raise SystemExit(1)
+
+  with AgentQLScraperPool(num_contexts=1, scraper_factory=no_api_key) as pool:
+    with pytest.raises(SystemExit):
+      pool.submit("query", url="a").result()
+
+
+def test_close_can_fail_the_queued_jobs():
+  pool = AgentQLScraperPool(num_contexts=1, scraper_factory=FakeScraper)
+  running = pool.submit("query", url="slow", delay=0.2)
+  queued = [pool.submit("query", url=str(i)) for i in range(3)]
+  time.sleep(0.05)
+  pool.close(cancel_pending=True)
+  assert running.result(timeout=1)[0] == "slow"
+  for future in queued:
+    with pytest.raises(RuntimeError, match="closed"):
+      future.result(timeout=1)
+  with pytest.raises(RuntimeError, match="already closed"):
+    pool.submit("query", url="late")
+
+
+def test_no_job_is_left_hanging_when_submit_races_close():
+  for _ in range(20):
+    pool = AgentQLScraperPool(num_contexts=2, scraper_factory=FakeScraper)
+    futures = []
+
+    def submit():
+      for i in range(50):
+        try:
+          futures.append(pool.submit("query", url=str(i)))
+        except RuntimeError:
+          return
+
+    submitter = threading.Thread(target=submit)
+    submitter.start()
+    pool.close()
+    submitter.join()
+    # every job queued before the close ran
+    assert all(future.result(timeout=1) for future in futures)